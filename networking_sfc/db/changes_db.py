@@ -0,0 +1,139 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Feed of the changes of the SFC and flow classifier resources.
+
+A change is recorded in the transaction changing the resource, with a
+sequence number growing with every change. The consumers read the
+changes following the last one they saw instead of listing the
+resources again.
+
+The sequence number is given when the change is inserted, and the
+transactions may commit in another order. The changes are only listed
+once they are older than the settle time, when the transactions which
+recorded the previous changes are over, so that a consumer does not
+skip a change committed after a later one.
+
+The feed is compacted: only the last change of a resource is kept once
+it is older than the compaction delay. The changes older than the
+retention period are dropped, except the last one of the feed. A
+consumer asking for the changes following a change older than the first
+one kept is told to list the resources again.
+"""
+
+import datetime
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from neutron.db import model_base
+
+from networking_sfc._i18n import _LI
+
+LOG = logging.getLogger(__name__)
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+class SfcChange(model_base.BASEV2, model_base.HasProject):
+    """Change of a SFC or flow classifier resource."""
+    __tablename__ = 'sfc_changes'
+    seqnum = sa.Column(sa.Integer(), primary_key=True, autoincrement=True)
+    resource_type = sa.Column(sa.String(36), nullable=False)
+    resource_id = sa.Column(sa.String(36), nullable=False, index=True)
+    operation = sa.Column(sa.String(16), nullable=False)
+    created_at = sa.Column(sa.DateTime(), nullable=False)
+
+
+def make_change_dict(change):
+    return {
+        'id': change.seqnum,
+        'tenant_id': change.tenant_id,
+        'resource_type': change.resource_type,
+        'resource_id': change.resource_id,
+        'operation': change.operation,
+        'created_at': str(change.created_at).replace(' ', 'T') + 'Z'
+    }
+
+
+def record(session, resource_type, resource_id, operation, tenant_id):
+    """Record a change of a resource in the transaction of session."""
+    with session.begin(subtransactions=True):
+        session.add(SfcChange(
+            resource_type=resource_type,
+            resource_id=resource_id,
+            operation=operation,
+            tenant_id=tenant_id,
+            created_at=timeutils.utcnow()))
+
+
+def get_settled_before(settle_time):
+    """Time before which the recorded changes are listed."""
+    return timeutils.utcnow() - datetime.timedelta(seconds=settle_time)
+
+
+def get_first_seqnum(session):
+    """Sequence number of the oldest change kept, None without changes."""
+    return session.query(sa.func.min(SfcChange.seqnum)).scalar()
+
+
+def is_expired(session, since):
+    """Whether changes following since may have been dropped.
+
+    The first change kept may also follow changes dropped because they
+    were superseded, in which case no change is actually missing.
+    """
+    first_seqnum = get_first_seqnum(session)
+    return first_seqnum is not None and first_seqnum > since + 1
+
+
+def compact(session, compaction_delay, retention):
+    """Drop the superseded and the expired changes.
+
+    :param compaction_delay: seconds a superseded change is kept.
+    :param retention: seconds a change is kept, the last change of the
+        feed is always kept.
+    """
+    now = timeutils.utcnow()
+    later = orm.aliased(SfcChange)
+    with session.begin(subtransactions=True):
+        superseded = [
+            seqnum for seqnum, in session.query(SfcChange.seqnum).filter(
+                SfcChange.created_at <
+                now - datetime.timedelta(seconds=compaction_delay),
+                sa.exists().where(sa.and_(
+                    later.resource_id == SfcChange.resource_id,
+                    later.seqnum > SfcChange.seqnum)))
+        ]
+        if superseded:
+            session.query(SfcChange).filter(
+                SfcChange.seqnum.in_(superseded)
+            ).delete(synchronize_session=False)
+        last_seqnum = session.query(sa.func.max(SfcChange.seqnum)).scalar()
+        expired = 0
+        if last_seqnum is not None:
+            expired = session.query(SfcChange).filter(
+                SfcChange.created_at <
+                now - datetime.timedelta(seconds=retention),
+                SfcChange.seqnum < last_seqnum
+            ).delete(synchronize_session=False)
+    if superseded or expired:
+        LOG.info(_LI("Dropped %(superseded)d superseded and %(expired)d "
+                     "expired sfc changes"),
+                 {'superseded': len(superseded), 'expired': expired})
+    return len(superseded) + expired
@@ -15,6 +15,7 @@
 import netaddr
 import six
 
+from oslo_config import cfg
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from oslo_utils import uuidutils
@@ -31,9 +32,19 @@ from neutron.db import common_db_mixin
 from neutron.db import models_v2
 
 from networking_sfc._i18n import _LI
+from networking_sfc.db import changes_db
+from networking_sfc.db import flowclassifier_index
+from networking_sfc.db import pagination
+from networking_sfc.db import resource_cache
 from networking_sfc.extensions import flowclassifier as fc_ext
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('resource_cache_size',
+                    'networking_sfc.services.flowclassifier.common.config',
+                    group='flowclassifier')
+cfg.CONF.import_opt('resource_cache_ttl',
+                    'networking_sfc.services.flowclassifier.common.config',
+                    group='flowclassifier')
 UUID_LEN = 36
 
 
@@ -68,15 +79,32 @@ class FlowClassifier(model_base.BASEV2, model_base.HasId,
     logical_destination_port = sa.Column(
         sa.String(UUID_LEN),
         sa.ForeignKey('ports.id', ondelete='RESTRICT'))
+    created_at = pagination.created_at_column()
     l7_parameters = orm.relationship(
         L7Parameter,
         collection_class=attribute_mapped_collection('keyword'),
         cascade='all, delete-orphan')
 
+    __table_args__ = (
+        pagination.created_at_index(__tablename__),
+        model_base.BASEV2.__table_args__
+    )
+
 
 class FlowClassifierDbPlugin(fc_ext.FlowClassifierPluginBase,
                              common_db_mixin.CommonDbMixin):
 
+    __native_bulk_support = True
+    __native_pagination_support = True
+    __native_sorting_support = True
+
+    def __init__(self):
+        super(FlowClassifierDbPlugin, self).__init__()
+        # flow classifiers read by the drivers
+        self.resource_cache = resource_cache.ResourceCache(
+            cfg.CONF.flowclassifier.resource_cache_size,
+            cfg.CONF.flowclassifier.resource_cache_ttl)
+
     @classmethod
     def _check_port_range_valid(cls, port_range_min,
                                 port_range_max,
@@ -206,29 +234,86 @@ class FlowClassifierDbPlugin(fc_ext.FlowClassifierPluginBase,
             )
         ])
 
-    @log_helpers.log_method_call
-    def create_flow_classifier(self, context, flow_classifier):
-        fc = flow_classifier['flow_classifier']
-        tenant_id = fc['tenant_id']
-        l7_parameters = {
-            key: L7Parameter(key, val)
-            for key, val in six.iteritems(fc['l7_parameters'])}
-        ethertype = fc['ethertype']
+    @classmethod
+    def _nullable_column_match(cls, column, value):
+        if value is None:
+            return sa.true()
+        return sa.or_(column == value, column.is_(None))
+
+    def _get_conflict_candidates(self, context, fc):
+        """Query the flow classifiers which may conflict with fc.
+
+        The ethertype, protocol, logical ports and port ranges are
+        compared by the database, only the ip prefixes are left to
+        check.
+        """
+        query = self._model_query(context, FlowClassifier)
+        if fc['ethertype'] is None:
+            query = query.filter(FlowClassifier.ethertype.is_(None))
+        else:
+            query = query.filter(FlowClassifier.ethertype == fc['ethertype'])
+        for column, key in (
+            (FlowClassifier.protocol, 'protocol'),
+            (FlowClassifier.logical_source_port, 'logical_source_port'),
+            (FlowClassifier.logical_destination_port,
+             'logical_destination_port')
+        ):
+            query = query.filter(
+                self._nullable_column_match(column, fc[key]))
+        for min_column, max_column, prefix in (
+            (FlowClassifier.source_port_range_min,
+             FlowClassifier.source_port_range_max, 'source'),
+            (FlowClassifier.destination_port_range_min,
+             FlowClassifier.destination_port_range_max, 'destination')
+        ):
+            port_range_min = fc['%s_port_range_min' % prefix]
+            port_range_max = fc['%s_port_range_max' % prefix]
+            if port_range_min is not None:
+                query = query.filter(sa.or_(
+                    max_column.is_(None), max_column >= port_range_min))
+            if port_range_max is not None:
+                query = query.filter(sa.or_(
+                    min_column.is_(None), min_column <= port_range_max))
+        return query
+
+    def _check_flow_classifier_valid(self, fc):
         protocol = fc['protocol']
-        source_port_range_min = fc['source_port_range_min']
-        source_port_range_max = fc['source_port_range_max']
-        self._check_port_range_valid(source_port_range_min,
-                                     source_port_range_max,
+        self._check_port_range_valid(fc['source_port_range_min'],
+                                     fc['source_port_range_max'],
                                      protocol)
-        destination_port_range_min = fc['destination_port_range_min']
-        destination_port_range_max = fc['destination_port_range_max']
-        self._check_port_range_valid(destination_port_range_min,
-                                     destination_port_range_max,
+        self._check_port_range_valid(fc['destination_port_range_min'],
+                                     fc['destination_port_range_max'],
                                      protocol)
-        source_ip_prefix = fc['source_ip_prefix']
-        self._check_ip_prefix_valid(source_ip_prefix, ethertype)
-        destination_ip_prefix = fc['destination_ip_prefix']
-        self._check_ip_prefix_valid(destination_ip_prefix, ethertype)
+        self._check_ip_prefix_valid(fc['source_ip_prefix'], fc['ethertype'])
+        self._check_ip_prefix_valid(fc['destination_ip_prefix'],
+                                    fc['ethertype'])
+
+    def _create_flow_classifier_db(self, fc):
+        l7_parameters = {
+            key: L7Parameter(key, val)
+            for key, val in six.iteritems(fc['l7_parameters'])}
+        return FlowClassifier(
+            id=uuidutils.generate_uuid(),
+            tenant_id=fc['tenant_id'],
+            name=fc['name'],
+            description=fc['description'],
+            ethertype=fc['ethertype'],
+            protocol=fc['protocol'],
+            source_port_range_min=fc['source_port_range_min'],
+            source_port_range_max=fc['source_port_range_max'],
+            destination_port_range_min=fc['destination_port_range_min'],
+            destination_port_range_max=fc['destination_port_range_max'],
+            source_ip_prefix=fc['source_ip_prefix'],
+            destination_ip_prefix=fc['destination_ip_prefix'],
+            logical_source_port=fc['logical_source_port'],
+            logical_destination_port=fc['logical_destination_port'],
+            l7_parameters=l7_parameters
+        )
+
+    @log_helpers.log_method_call
+    def create_flow_classifier(self, context, flow_classifier):
+        fc = flow_classifier['flow_classifier']
+        self._check_flow_classifier_valid(fc)
         logical_source_port = fc['logical_source_port']
         logical_destination_port = fc['logical_destination_port']
         with context.session.begin(subtransactions=True):
@@ -236,35 +321,107 @@ class FlowClassifierDbPlugin(fc_ext.FlowClassifierPluginBase,
                 self._get_port(context, logical_source_port)
             if logical_destination_port is not None:
                 self._get_port(context, logical_destination_port)
-            query = self._model_query(context, FlowClassifier)
-            for flow_classifier_db in query.all():
-                if self.flowclassifier_conflict(
-                    fc,
-                    flow_classifier_db
-                ):
-                    raise fc_ext.FlowClassifierInConflict(
-                        id=flow_classifier_db['id']
-                    )
-            flow_classifier_db = FlowClassifier(
-                id=uuidutils.generate_uuid(),
-                tenant_id=tenant_id,
-                name=fc['name'],
-                description=fc['description'],
-                ethertype=ethertype,
-                protocol=protocol,
-                source_port_range_min=source_port_range_min,
-                source_port_range_max=source_port_range_max,
-                destination_port_range_min=destination_port_range_min,
-                destination_port_range_max=destination_port_range_max,
-                source_ip_prefix=source_ip_prefix,
-                destination_ip_prefix=destination_ip_prefix,
-                logical_source_port=logical_source_port,
-                logical_destination_port=logical_destination_port,
-                l7_parameters=l7_parameters
-            )
+            conflict_index = flowclassifier_index.FlowClassifierConflictIndex(
+                self._get_conflict_candidates(context, fc))
+            conflict_id = conflict_index.find_conflict(fc)
+            if conflict_id is not None:
+                raise fc_ext.FlowClassifierInConflict(id=conflict_id)
+            flow_classifier_db = self._create_flow_classifier_db(fc)
             context.session.add(flow_classifier_db)
+            changes_db.record(context.session, 'flow_classifier',
+                              flow_classifier_db['id'], changes_db.CREATE,
+                              flow_classifier_db['tenant_id'])
             return self._make_flow_classifier_dict(flow_classifier_db)
 
+    @classmethod
+    def _nullable_column_in(cls, column, values):
+        if None in values:
+            return sa.true()
+        return sa.or_(column.in_(values), column.is_(None))
+
+    def _get_bulk_conflict_candidates(self, context, fcs):
+        """Query the flow classifiers which may conflict with any of fcs.
+
+        Only the ethertypes, protocols and logical ports are compared by
+        the database, the conflict index does the rest.
+        """
+        query = self._model_query(context, FlowClassifier)
+        ethertypes = set(fc['ethertype'] for fc in fcs)
+        ethertype_match = FlowClassifier.ethertype.in_(
+            ethertypes - set([None]))
+        if None in ethertypes:
+            ethertype_match = sa.or_(ethertype_match,
+                                     FlowClassifier.ethertype.is_(None))
+        query = query.filter(ethertype_match)
+        for column, key in (
+            (FlowClassifier.protocol, 'protocol'),
+            (FlowClassifier.logical_source_port, 'logical_source_port'),
+            (FlowClassifier.logical_destination_port,
+             'logical_destination_port')
+        ):
+            query = query.filter(self._nullable_column_in(
+                column, set(fc[key] for fc in fcs)))
+        return query
+
+    def _get_ports(self, context, ids):
+        ports = self._model_query(context, models_v2.Port).filter(
+            models_v2.Port.id.in_(ids)).all()
+        self._check_ports_found(ids, ports)
+        return ports
+
+    @classmethod
+    def _check_ports_found(cls, ids, ports):
+        found_ids = set(port['id'] for port in ports)
+        for id in sorted(ids):
+            if id not in found_ids:
+                raise fc_ext.FlowClassifierPortNotFound(id=id)
+
+    @log_helpers.log_method_call
+    def create_flow_classifier_bulk(self, context, flow_classifiers):
+        """Create the flow classifiers of a bulk request.
+
+        The logical ports of all the classifiers are looked up by one
+        query, and the classifiers are checked against the existing ones
+        and against each other with one conflict index.
+        """
+        fcs = [item['flow_classifier']
+               for item in flow_classifiers['flow_classifiers']]
+        for fc in fcs:
+            self._check_flow_classifier_valid(fc)
+        if not fcs:
+            return []
+        port_ids = set()
+        for fc in fcs:
+            for key in ('logical_source_port', 'logical_destination_port'):
+                if fc[key] is not None:
+                    port_ids.add(fc[key])
+        with context.session.begin(subtransactions=True):
+            if port_ids:
+                self._get_ports(context, list(port_ids))
+            conflict_index = flowclassifier_index.FlowClassifierConflictIndex(
+                self._get_bulk_conflict_candidates(context, fcs))
+            positions = {}
+            flow_classifier_dbs = []
+            for position, fc in enumerate(fcs):
+                flow_classifier_db = self._create_flow_classifier_db(fc)
+                conflict_id = conflict_index.find_conflict(flow_classifier_db)
+                if conflict_id in positions:
+                    raise fc_ext.FlowClassifierBulkConflict(
+                        first=positions[conflict_id], second=position)
+                elif conflict_id is not None:
+                    raise fc_ext.FlowClassifierInConflict(id=conflict_id)
+                conflict_index.add(flow_classifier_db)
+                positions[flow_classifier_db.id] = position
+                flow_classifier_dbs.append(flow_classifier_db)
+            context.session.add_all(flow_classifier_dbs)
+            for flow_classifier_db in flow_classifier_dbs:
+                changes_db.record(context.session, 'flow_classifier',
+                                  flow_classifier_db['id'],
+                                  changes_db.CREATE,
+                                  flow_classifier_db['tenant_id'])
+            return [self._make_flow_classifier_dict(flow_classifier_db)
+                    for flow_classifier_db in flow_classifier_dbs]
+
     def _make_flow_classifier_dict(self, flow_classifier, fields=None):
         res = {
             'id': flow_classifier['id'],
@@ -302,14 +459,35 @@ class FlowClassifierDbPlugin(fc_ext.FlowClassifierPluginBase,
                                     FlowClassifier,
                                     self._make_flow_classifier_dict,
                                     filters=filters, fields=fields,
-                                    sorts=sorts,
+                                    sorts=pagination.get_sorts(
+                                        sorts, limit, marker),
                                     limit=limit, marker_obj=marker_obj,
                                     page_reverse=page_reverse)
 
+    @log_helpers.log_method_call
+    def get_flow_classifiers_by_ids(self, context, ids, fields=None):
+        """Return the flow classifiers of ids, in the order of ids.
+
+        The flow classifiers and their l7 parameters are loaded by one
+        query. The ids which do not exist are skipped.
+        """
+        if not ids:
+            return []
+        query = self._model_query(context, FlowClassifier).options(
+            orm.joinedload(FlowClassifier.l7_parameters)
+        ).filter(FlowClassifier.id.in_(set(ids)))
+        fcs = dict(
+            (fc['id'], self._make_flow_classifier_dict(fc, fields))
+            for fc in query)
+        return [fcs[id] for id in ids if id in fcs]
+
     @log_helpers.log_method_call
     def get_flow_classifier(self, context, id, fields=None):
-        flow_classifier = self._get_flow_classifier(context, id)
-        return self._make_flow_classifier_dict(flow_classifier, fields)
+        flow_classifier = self.resource_cache.get(
+            context, 'flow_classifier', id,
+            lambda: self._make_flow_classifier_dict(
+                self._get_flow_classifier(context, id)))
+        return self._fields(flow_classifier, fields)
 
     def _get_flow_classifier(self, context, id):
         try:
@@ -329,14 +507,46 @@ class FlowClassifierDbPlugin(fc_ext.FlowClassifierPluginBase,
         with context.session.begin(subtransactions=True):
             old_fc = self._get_flow_classifier(context, id)
             old_fc.update(new_fc)
+            changes_db.record(context.session, 'flow_classifier', id,
+                              changes_db.UPDATE, old_fc['tenant_id'])
+            self.resource_cache.invalidate(
+                context.session, 'flow_classifier', id)
             return self._make_flow_classifier_dict(old_fc)
 
+    @log_helpers.log_method_call
+    def delete_flow_classifier_bulk(self, context, ids):
+        """Delete the flow classifiers of ids in one transaction.
+
+        The flow classifiers which do not exist are skipped, none is
+        deleted if one of them is in use.
+        """
+        with context.session.begin(subtransactions=True):
+            fcs = self._model_query(context, FlowClassifier).filter(
+                FlowClassifier.id.in_(ids)).all()
+            for fc in fcs:
+                try:
+                    context.session.delete(fc)
+                    context.session.flush()
+                except AssertionError:
+                    raise fc_ext.FlowClassifierInUse(id=fc['id'])
+                changes_db.record(context.session, 'flow_classifier',
+                                  fc['id'], changes_db.DELETE,
+                                  fc['tenant_id'])
+                self.resource_cache.invalidate(
+                    context.session, 'flow_classifier', fc['id'])
+        if len(fcs) < len(set(ids)):
+            LOG.info(_LI("Deleting non-existing flow classifiers."))
+
     @log_helpers.log_method_call
     def delete_flow_classifier(self, context, id):
         try:
             with context.session.begin(subtransactions=True):
                 fc = self._get_flow_classifier(context, id)
                 context.session.delete(fc)
+                changes_db.record(context.session, 'flow_classifier', id,
+                                  changes_db.DELETE, fc['tenant_id'])
+                self.resource_cache.invalidate(
+                    context.session, 'flow_classifier', id)
         except AssertionError:
             raise fc_ext.FlowClassifierInUse(id=id)
         except fc_ext.FlowClassifierNotFound:
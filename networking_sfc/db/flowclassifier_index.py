@@ -0,0 +1,379 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Index of flow classifiers for conflict detection.
+
+Two flow classifiers conflict when they may match the same packet, see
+FlowClassifierDbPlugin.flowclassifier_conflict. The index answers the
+same question for one classifier against all the indexed ones, but only
+compares the classifiers which share the ethertype and protocol and are
+candidates on the most selective of the other fields. Without the
+logical ports, it answers as flowclassifier_basic_conflict instead.
+"""
+
+import bisect
+
+import netaddr
+
+
+def _ip_prefix_key(ip_prefix):
+    """Return (version, network as int, prefix length) of ip_prefix."""
+    cidr = netaddr.IPNetwork(ip_prefix).cidr
+    return cidr.version, int(cidr.network), cidr.prefixlen
+
+
+def _ip_prefix_conflict(first_key, second_key):
+    # two cidrs overlap if and only if one of them contains the other
+    if first_key is None or second_key is None:
+        return True
+    first_version, first_network, first_len = first_key
+    second_version, second_network, second_len = second_key
+    if first_version != second_version:
+        return False
+    width = 32 if first_version == 4 else 128
+    shift = width - min(first_len, second_len)
+    return first_network >> shift == second_network >> shift
+
+
+def _port_range_conflict(first_min, first_max, second_min, second_max):
+    if (
+        first_min is not None and second_max is not None and
+        first_min > second_max
+    ):
+        return False
+    if (
+        first_max is not None and second_min is not None and
+        second_min > first_max
+    ):
+        return False
+    return True
+
+
+def _value_conflict(first_value, second_value):
+    if first_value is None or second_value is None:
+        return True
+    return first_value == second_value
+
+
+class _IndexedFlowClassifier(object):
+    __slots__ = ('id', 'protocol', 'source', 'destination',
+                 'source_ports', 'destination_ports',
+                 'logical_source_port', 'logical_destination_port')
+
+    def __init__(self, flow_classifier, logical_ports=True):
+        self.id = flow_classifier.get('id')
+        self.protocol = flow_classifier['protocol']
+        self.source = (
+            _ip_prefix_key(flow_classifier['source_ip_prefix'])
+            if flow_classifier['source_ip_prefix'] is not None else None)
+        self.destination = (
+            _ip_prefix_key(flow_classifier['destination_ip_prefix'])
+            if flow_classifier['destination_ip_prefix'] is not None
+            else None)
+        self.source_ports = (flow_classifier['source_port_range_min'],
+                             flow_classifier['source_port_range_max'])
+        self.destination_ports = (
+            flow_classifier['destination_port_range_min'],
+            flow_classifier['destination_port_range_max'])
+        self.logical_source_port = None
+        self.logical_destination_port = None
+        if logical_ports:
+            self.logical_source_port = flow_classifier['logical_source_port']
+            self.logical_destination_port = flow_classifier[
+                'logical_destination_port']
+
+    def conflict(self, other):
+        return (
+            _value_conflict(self.protocol, other.protocol) and
+            _value_conflict(self.logical_source_port,
+                            other.logical_source_port) and
+            _value_conflict(self.logical_destination_port,
+                            other.logical_destination_port) and
+            _port_range_conflict(self.source_ports[0],
+                                 self.source_ports[1],
+                                 other.source_ports[0],
+                                 other.source_ports[1]) and
+            _port_range_conflict(self.destination_ports[0],
+                                 self.destination_ports[1],
+                                 other.destination_ports[0],
+                                 other.destination_ports[1]) and
+            _ip_prefix_conflict(self.source, other.source) and
+            _ip_prefix_conflict(self.destination, other.destination)
+        )
+
+
+class _PrefixTrieNode(object):
+    __slots__ = ('children', 'ids', 'count')
+
+    def __init__(self):
+        self.children = [None, None]
+        # ids of the classifiers whose prefix ends at this node
+        self.ids = set()
+        # number of classifiers in this node and below
+        self.count = 0
+
+
+class _PrefixTrie(object):
+    """Binary trie of the ip prefixes of one field.
+
+    The classifiers overlapping a prefix are the ones on the path from
+    the root to the prefix, all the ones below it and the wildcards.
+    """
+
+    def __init__(self):
+        self._roots = {4: _PrefixTrieNode(), 6: _PrefixTrieNode()}
+        self._wildcards = set()
+
+    @staticmethod
+    def _bits(key):
+        version, network, length = key
+        width = 32 if version == 4 else 128
+        for i in range(length):
+            yield (network >> (width - 1 - i)) & 1
+
+    def add(self, fc_id, key):
+        if key is None:
+            self._wildcards.add(fc_id)
+            return
+        node = self._roots[key[0]]
+        node.count += 1
+        for bit in self._bits(key):
+            if node.children[bit] is None:
+                node.children[bit] = _PrefixTrieNode()
+            node = node.children[bit]
+            node.count += 1
+        node.ids.add(fc_id)
+
+    def remove(self, fc_id, key):
+        if key is None:
+            self._wildcards.discard(fc_id)
+            return
+        node = self._roots[key[0]]
+        node.count -= 1
+        for bit in self._bits(key):
+            node = node.children[bit]
+            node.count -= 1
+        node.ids.discard(fc_id)
+
+    def _path(self, key):
+        """Return the nodes on the path to key and if key was reached."""
+        node = self._roots[key[0]]
+        path = [node]
+        for bit in self._bits(key):
+            node = node.children[bit]
+            if node is None or not node.count:
+                return path, False
+            path.append(node)
+        return path, True
+
+    def count(self, key):
+        if key is None:
+            return (sum(root.count for root in self._roots.values()) +
+                    len(self._wildcards))
+        path, reached = self._path(key)
+        count = len(self._wildcards) + sum(len(node.ids) for node in path)
+        if reached:
+            count += path[-1].count - len(path[-1].ids)
+        return count
+
+    def candidates(self, key):
+        for fc_id in self._wildcards:
+            yield fc_id
+        if key is None:
+            roots = list(self._roots.values())
+            path, reached = [], False
+        else:
+            path, reached = self._path(key)
+            roots = [path[-1]] if reached else []
+        for node in path[:-1] if reached else path:
+            for fc_id in node.ids:
+                yield fc_id
+        stack = roots
+        while stack:
+            node = stack.pop()
+            for fc_id in node.ids:
+                yield fc_id
+            stack.extend(child for child in node.children
+                         if child is not None and child.count)
+
+
+class _RangeIndex(object):
+    """Port ranges sorted by their lower bound.
+
+    The ranges which may overlap [min, max] are the ones starting at or
+    before max, with an open lower bound counted as 0.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._ids = []
+
+    def add(self, fc_id, port_range):
+        start = port_range[0] or 0
+        position = bisect.bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._ids.insert(position, fc_id)
+
+    def remove(self, fc_id, port_range):
+        start = port_range[0] or 0
+        position = bisect.bisect_left(self._starts, start)
+        while self._ids[position] != fc_id:
+            position += 1
+        del self._starts[position]
+        del self._ids[position]
+
+    def _end(self, port_range):
+        if port_range[1] is None:
+            return len(self._starts)
+        return bisect.bisect_right(self._starts, port_range[1])
+
+    def count(self, port_range):
+        return self._end(port_range)
+
+    def candidates(self, port_range):
+        return iter(self._ids[:self._end(port_range)])
+
+
+class _ValueIndex(object):
+    """Buckets of the classifiers by the value of one field."""
+
+    def __init__(self):
+        self._buckets = {}
+
+    def add(self, fc_id, value):
+        self._buckets.setdefault(value, set()).add(fc_id)
+
+    def remove(self, fc_id, value):
+        bucket = self._buckets[value]
+        bucket.discard(fc_id)
+        if not bucket:
+            del self._buckets[value]
+
+    def count(self, value):
+        if value is None:
+            return sum(len(bucket) for bucket in self._buckets.values())
+        return (len(self._buckets.get(value, ())) +
+                len(self._buckets.get(None, ())))
+
+    def candidates(self, value):
+        if value is None:
+            buckets = list(self._buckets.values())
+        else:
+            buckets = [self._buckets.get(value, ()),
+                       self._buckets.get(None, ())]
+        for bucket in buckets:
+            for fc_id in bucket:
+                yield fc_id
+
+
+class _Bucket(object):
+    """The classifiers of one ethertype and protocol."""
+
+    def __init__(self):
+        self.size = 0
+        self.source = _PrefixTrie()
+        self.destination = _PrefixTrie()
+        self.source_ports = _RangeIndex()
+        self.destination_ports = _RangeIndex()
+        self.logical_source_port = _ValueIndex()
+        self.logical_destination_port = _ValueIndex()
+
+    def _fields(self, fc):
+        return ((self.source, fc.source),
+                (self.destination, fc.destination),
+                (self.source_ports, fc.source_ports),
+                (self.destination_ports, fc.destination_ports),
+                (self.logical_source_port, fc.logical_source_port),
+                (self.logical_destination_port,
+                 fc.logical_destination_port))
+
+    def add(self, fc):
+        self.size += 1
+        for index, value in self._fields(fc):
+            index.add(fc.id, value)
+
+    def remove(self, fc):
+        self.size -= 1
+        for index, value in self._fields(fc):
+            index.remove(fc.id, value)
+
+    def candidates(self, fc):
+        """Return the ids of the most selective field for fc."""
+        index, value = min(self._fields(fc),
+                           key=lambda field: field[0].count(field[1]))
+        return index.candidates(value)
+
+
+class FlowClassifierConflictIndex(object):
+    """Finds the indexed flow classifiers conflicting with a classifier.
+
+    Gives the same answers as calling
+    FlowClassifierDbPlugin.flowclassifier_conflict against each indexed
+    classifier, or flowclassifier_basic_conflict without logical_ports.
+    """
+
+    def __init__(self, flow_classifiers=(), logical_ports=True):
+        self._logical_ports = logical_ports
+        self._flow_classifiers = {}
+        # ethertype -> protocol -> _Bucket
+        self._buckets = {}
+        for flow_classifier in flow_classifiers:
+            self.add(flow_classifier)
+
+    def __len__(self):
+        return len(self._flow_classifiers)
+
+    def __contains__(self, fc_id):
+        return fc_id in self._flow_classifiers
+
+    def add(self, flow_classifier):
+        fc = _IndexedFlowClassifier(flow_classifier, self._logical_ports)
+        if fc.id in self._flow_classifiers:
+            self.remove(fc.id)
+        self._flow_classifiers[fc.id] = (flow_classifier['ethertype'], fc)
+        protocols = self._buckets.setdefault(flow_classifier['ethertype'], {})
+        if fc.protocol not in protocols:
+            protocols[fc.protocol] = _Bucket()
+        protocols[fc.protocol].add(fc)
+
+    def remove(self, fc_id):
+        ethertype, fc = self._flow_classifiers.pop(fc_id)
+        protocols = self._buckets[ethertype]
+        protocols[fc.protocol].remove(fc)
+        if not protocols[fc.protocol].size:
+            del protocols[fc.protocol]
+
+    def _buckets_of(self, ethertype, protocol):
+        protocols = self._buckets.get(ethertype, {})
+        if protocol is None:
+            return list(protocols.values())
+        return [protocols[key] for key in (protocol, None)
+                if key in protocols]
+
+    def conflicts(self, flow_classifier):
+        """Yield the ids of the indexed classifiers in conflict."""
+        fc = _IndexedFlowClassifier(flow_classifier, self._logical_ports)
+        for bucket in self._buckets_of(flow_classifier['ethertype'],
+                                       fc.protocol):
+            for fc_id in bucket.candidates(fc):
+                if fc_id == fc.id and fc_id is not None:
+                    continue
+                if fc.conflict(self._flow_classifiers[fc_id][1]):
+                    yield fc_id
+
+    def find_conflict(self, flow_classifier):
+        """Return the id of one classifier in conflict, or None."""
+        for fc_id in self.conflicts(flow_classifier):
+            return fc_id
+        return None
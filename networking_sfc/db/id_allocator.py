@@ -0,0 +1,241 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Allocation of small integer ids from ranges of free ids.
+
+The free ids of a pool are kept as [first_id, last_id] ranges keyed by
+their first id, so allocating the lowest free id, allocating a given id
+and releasing an id only look up the ranges next to it.
+
+Ranges are changed with compare and swap statements. When another
+neutron-server worker changed a range first the lookup is tried again,
+and once the attempts run out the whole request is retried by the API.
+
+The ids taken without the pool, e.g. by the servers of the former
+release during an upgrade, are still free in the ranges: an allocated
+id is checked against the ids in use, and taken out of the pool when
+it is already used.
+"""
+
+from neutron_lib import exceptions as n_exc
+from oslo_db import exception as db_exc
+from oslo_log import log as logging
+import sqlalchemy as sa
+
+from neutron.db import model_base
+
+from networking_sfc._i18n import _
+
+LOG = logging.getLogger(__name__)
+
+DB_MAX_ATTEMPTS = 10
+
+
+class IdPoolBusy(n_exc.Conflict):
+    message = _("Unable to change id pool %(pool)s after %(attempts)s "
+                "attempts.")
+
+
+class IdPool(model_base.BASEV2):
+    """Bounds of a pool of ids."""
+    __tablename__ = 'sfc_id_pools'
+    name = sa.Column(sa.String(64), primary_key=True)
+    min_id = sa.Column(sa.Integer(), nullable=False)
+    max_id = sa.Column(sa.Integer(), nullable=False)
+
+
+class IdFreeRange(model_base.BASEV2):
+    """Range of free ids of a pool, bounds included."""
+    __tablename__ = 'sfc_id_free_ranges'
+    pool = sa.Column(
+        sa.String(64),
+        sa.ForeignKey('sfc_id_pools.name', ondelete='CASCADE'),
+        primary_key=True)
+    first_id = sa.Column(sa.Integer(), primary_key=True,
+                         autoincrement=False)
+    last_id = sa.Column(sa.Integer(), nullable=False)
+
+
+def column_ids(column, **filters):
+    """Return the used_ids function of the ids of a column."""
+    def used_ids(session, id_=None):
+        query = session.query(column).filter_by(**filters)
+        if id_ is not None:
+            query = query.filter(column == id_)
+        return query
+    return used_ids
+
+
+def _free_ranges(min_id, max_id, used_ids):
+    """Yield the (first_id, last_id) ranges not covered by used_ids."""
+    first_id = min_id
+    for used_id in sorted(used_ids):
+        if first_id < used_id:
+            yield first_id, used_id - 1
+        first_id = max(first_id, used_id + 1)
+    if first_id <= max_id:
+        yield first_id, max_id
+
+
+class IdAllocator(object):
+    """Allocates the ids of one pool.
+
+    :param pool: name of the pool.
+    :param min_id: lowest id of the pool.
+    :param max_id: highest id of the pool.
+    :param used_ids: function of a session and an optional id returning
+        a query of the ids already in use, or of the id if it is in use.
+        All the ids are read once when the pool is first used, see
+        column_ids.
+    """
+
+    def __init__(self, pool, min_id, max_id, used_ids):
+        self.pool = pool
+        self.min_id = min_id
+        self.max_id = max_id
+        self.used_ids = used_ids
+
+    def _ensure_pool(self, session):
+        if session.query(IdPool.name).filter_by(name=self.pool).first():
+            return
+        used_ids = {
+            used_id for used_id, in self.used_ids(session)
+            if used_id is not None and self.min_id <= used_id <= self.max_id
+        }
+        # a worker creating the same pool concurrently makes this fail
+        # with a duplicate entry, which the API retries.
+        session.add(IdPool(name=self.pool, min_id=self.min_id,
+                           max_id=self.max_id))
+        session.flush()
+        for first_id, last_id in _free_ranges(
+            self.min_id, self.max_id, used_ids
+        ):
+            self._insert(session, first_id, last_id)
+
+    def _insert(self, session, first_id, last_id):
+        # ranges are only changed through statements, an ORM object could
+        # clash with a stale one of a range deleted earlier in the session.
+        session.execute(IdFreeRange.__table__.insert().values(
+            pool=self.pool, first_id=first_id, last_id=last_id))
+
+    def _ranges(self, session):
+        return session.query(
+            IdFreeRange.first_id, IdFreeRange.last_id
+        ).filter_by(pool=self.pool)
+
+    def _range_at_or_before(self, session, id_):
+        return self._ranges(session).filter(
+            IdFreeRange.first_id <= id_
+        ).order_by(IdFreeRange.first_id.desc()).first()
+
+    def _range_starting_at(self, session, id_):
+        return self._ranges(session).filter_by(first_id=id_).first()
+
+    def _swap(self, session, free_range, values=None):
+        """Update or delete free_range if nobody changed it meanwhile."""
+        query = session.query(IdFreeRange).filter_by(
+            pool=self.pool, first_id=free_range[0], last_id=free_range[1])
+        if values is None:
+            return query.delete(synchronize_session=False) == 1
+        return query.update(values, synchronize_session=False) == 1
+
+    def _retry(self):
+        raise db_exc.RetryRequest(
+            IdPoolBusy(pool=self.pool, attempts=DB_MAX_ATTEMPTS))
+
+    def _take(self, session, free_range, id_):
+        first_id, last_id = free_range
+        if first_id == last_id:
+            return self._swap(session, free_range)
+        if id_ == first_id:
+            return self._swap(session, free_range, {'first_id': id_ + 1})
+        if id_ == last_id:
+            return self._swap(session, free_range, {'last_id': id_ - 1})
+        if not self._swap(session, free_range, {'last_id': id_ - 1}):
+            return False
+        self._insert(session, id_ + 1, last_id)
+        return True
+
+    def allocate(self, session, id_=None):
+        """Allocate id_, or the lowest free id if id_ is None.
+
+        Returns the allocated id, or None when id_ is not free or the pool
+        is exhausted.
+        """
+        with session.begin(subtransactions=True):
+            self._ensure_pool(session)
+            attempt = 0
+            while attempt < DB_MAX_ATTEMPTS:
+                if id_ is None:
+                    free_range = self._ranges(session).order_by(
+                        IdFreeRange.first_id).first()
+                    if free_range is None:
+                        return None
+                    allocated_id = free_range[0]
+                else:
+                    free_range = self._range_at_or_before(session, id_)
+                    if free_range is None or free_range[1] < id_:
+                        return None
+                    allocated_id = id_
+                if not self._take(session, free_range, allocated_id):
+                    LOG.debug("Free range %(range)s of id pool %(pool)s "
+                              "changed concurrently, retrying",
+                              {'range': free_range, 'pool': self.pool})
+                    attempt += 1
+                    continue
+                if self.used_ids(session, allocated_id).first() is None:
+                    return allocated_id
+                # taken without the pool, it is left out of the pool
+                LOG.debug("Id %(id)s of id pool %(pool)s is already used",
+                          {'id': allocated_id, 'pool': self.pool})
+                if id_ is not None:
+                    return None
+            self._retry()
+
+    def _give_back(self, session, id_, before, after):
+        if before is not None and after is not None:
+            if not self._swap(session, before, {'last_id': after[1]}):
+                return False
+            # before now covers after, so it is too late to retry here
+            if not self._swap(session, after):
+                self._retry()
+            return True
+        if before is not None:
+            return self._swap(session, before, {'last_id': id_})
+        if after is not None:
+            return self._swap(session, after, {'first_id': id_})
+        self._insert(session, id_, id_)
+        return True
+
+    def release(self, session, id_):
+        """Release id_, merging it with the free ranges next to it."""
+        if id_ is None or not self.min_id <= id_ <= self.max_id:
+            return
+        with session.begin(subtransactions=True):
+            self._ensure_pool(session)
+            for attempt in range(DB_MAX_ATTEMPTS):
+                before = self._range_at_or_before(session, id_)
+                if before is not None and before[1] >= id_:
+                    LOG.debug("Id %(id)s of id pool %(pool)s is already "
+                              "free", {'id': id_, 'pool': self.pool})
+                    return
+                if before is not None and before[1] != id_ - 1:
+                    before = None
+                after = self._range_starting_at(session, id_ + 1)
+                if self._give_back(session, id_, before, after):
+                    return
+                LOG.debug("Free ranges next to id %(id)s of id pool "
+                          "%(pool)s changed concurrently, retrying",
+                          {'id': id_, 'pool': self.pool})
+            self._retry()
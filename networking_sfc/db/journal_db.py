@@ -0,0 +1,131 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Journal of the driver calls run in the background.
+
+An entry is recorded in the transaction changing the resource, so the
+driver call is not lost when neutron-server stops before running it.
+The entries of one resource are run in the order they were recorded: an
+entry is only claimed once all older entries of its resource are done.
+"""
+
+import datetime
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from neutron.db import model_base
+
+from networking_sfc._i18n import _LW
+
+LOG = logging.getLogger(__name__)
+
+DB_MAX_ATTEMPTS = 10
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+
+# entries processed for longer than this are assumed to be left over by a
+# neutron-server that stopped and are run again.
+PROCESSING_TIMEOUT = 600
+
+
+class SfcJournalEntry(model_base.BASEV2):
+    """Driver call waiting to be run for a resource."""
+    __tablename__ = 'sfc_journal'
+    seqnum = sa.Column(sa.Integer(), primary_key=True, autoincrement=True)
+    resource_type = sa.Column(sa.String(36), nullable=False)
+    resource_id = sa.Column(sa.String(36), nullable=False, index=True)
+    operation = sa.Column(sa.String(36), nullable=False)
+    data = sa.Column(sa.Text(), nullable=False)
+    state = sa.Column(sa.String(16), nullable=False, index=True)
+    last_changed = sa.Column(sa.DateTime(), nullable=False)
+
+
+def _make_entry_dict(entry):
+    return {
+        'seqnum': entry.seqnum,
+        'resource_type': entry.resource_type,
+        'resource_id': entry.resource_id,
+        'operation': entry.operation,
+        'data': jsonutils.loads(entry.data)
+    }
+
+
+def record(session, resource_type, resource_id, operation, data):
+    """Record a driver call for a resource."""
+    with session.begin(subtransactions=True):
+        session.add(SfcJournalEntry(
+            resource_type=resource_type,
+            resource_id=resource_id,
+            operation=operation,
+            data=jsonutils.dumps(data),
+            state=PENDING,
+            last_changed=timeutils.utcnow()))
+
+
+def has_entries(session, resource_id):
+    return session.query(SfcJournalEntry.seqnum).filter_by(
+        resource_id=resource_id).first() is not None
+
+
+def reset_stale_entries(session, timeout=PROCESSING_TIMEOUT):
+    """Make the entries processed for too long pending again."""
+    now = timeutils.utcnow()
+    with session.begin(subtransactions=True):
+        count = session.query(SfcJournalEntry).filter(
+            SfcJournalEntry.state == PROCESSING,
+            SfcJournalEntry.last_changed <
+            now - datetime.timedelta(seconds=timeout)
+        ).update({'state': PENDING, 'last_changed': now},
+                 synchronize_session=False)
+    if count:
+        LOG.warning(_LW("Reset %d stale sfc journal entries"), count)
+    return count
+
+
+def claim_next_entry(session):
+    """Claim the oldest entry whose resource has no older entries.
+
+    Returns the entry as a dict, or None when no entry can run now.
+    """
+    older = orm.aliased(SfcJournalEntry)
+    query = session.query(SfcJournalEntry).filter(
+        SfcJournalEntry.state == PENDING,
+        ~sa.exists().where(sa.and_(
+            older.resource_id == SfcJournalEntry.resource_id,
+            older.seqnum < SfcJournalEntry.seqnum))
+    ).order_by(SfcJournalEntry.seqnum)
+    for attempt in range(DB_MAX_ATTEMPTS):
+        with session.begin(subtransactions=True):
+            entry = query.first()
+            if entry is None:
+                return None
+            # another neutron-server worker may have claimed it first
+            if session.query(SfcJournalEntry).filter_by(
+                seqnum=entry.seqnum, state=PENDING
+            ).update({'state': PROCESSING,
+                      'last_changed': timeutils.utcnow()},
+                     synchronize_session=False):
+                return _make_entry_dict(entry)
+    return None
+
+
+def complete_entry(session, seqnum):
+    with session.begin(subtransactions=True):
+        session.query(SfcJournalEntry).filter_by(
+            seqnum=seqnum).delete(synchronize_session=False)
@@ -0,0 +1,51 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""count group refcounts
+
+Revision ID: 3b29b4b3b672
+Revises: 85c37863415d
+Create Date: 2016-10-18 09:12:44.203117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3b29b4b3b672'
+down_revision = '85c37863415d'
+depends_on = ('1089dab85e85',)
+
+from alembic import op
+
+
+def upgrade():
+    # the servers of the former release changed the paths without
+    # counting their references, count them all again now that they are
+    # stopped
+    op.execute("DELETE FROM sfc_group_refcounts")
+    op.execute(
+        "INSERT INTO sfc_group_refcounts (host_id, next_group_id, refcnt) "
+        "SELECT d.host_id, n.next_group_id, COUNT(*) "
+        "FROM sfc_path_port_associations a "
+        "JOIN sfc_portpair_details d ON d.id = a.portpair_id "
+        "JOIN sfc_path_nodes n ON n.id = a.pathnode_id "
+        "WHERE n.next_group_id IS NOT NULL AND d.host_id != '' "
+        "GROUP BY d.host_id, n.next_group_id")
+    op.execute(
+        "INSERT INTO sfc_group_refcounts (host_id, next_group_id, refcnt) "
+        "SELECT '', n.next_group_id, COUNT(*) "
+        "FROM sfc_path_nodes n "
+        "WHERE n.nsi = 255 AND n.next_group_id IS NOT NULL AND NOT EXISTS "
+        "(SELECT 1 FROM sfc_path_port_associations a "
+        "WHERE a.pathnode_id = n.id) "
+        "GROUP BY n.next_group_id")
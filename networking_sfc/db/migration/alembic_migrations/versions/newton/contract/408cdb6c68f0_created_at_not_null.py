@@ -0,0 +1,46 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""created_at not null
+
+Revision ID: 408cdb6c68f0
+Revises: 3b29b4b3b672
+Create Date: 2016-10-18 11:02:37.845120
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '408cdb6c68f0'
+down_revision = '3b29b4b3b672'
+depends_on = ('c12bea3134ce',)
+
+from alembic import op
+import sqlalchemy as sa
+
+
+TABLES = ('sfc_port_chains', 'sfc_port_pair_groups', 'sfc_port_pairs',
+          'sfc_flow_classifiers')
+
+
+def upgrade():
+    for table_name in TABLES:
+        # the existing rows are paged in the order of their id
+        table = sa.sql.table(table_name,
+                             sa.sql.column('created_at', sa.DateTime()))
+        op.execute(table.update().where(
+            table.c.created_at.is_(None)).values(created_at=sa.func.now()))
+        op.alter_column(table_name, 'created_at',
+                        existing_type=sa.DateTime(),
+                        existing_server_default=sa.func.now(),
+                        nullable=False)
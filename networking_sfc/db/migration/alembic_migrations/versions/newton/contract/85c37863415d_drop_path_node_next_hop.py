@@ -0,0 +1,61 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""drop path node next hop
+
+Revision ID: 85c37863415d
+Revises: 010308b06b49
+Create Date: 2016-09-02 10:15:03.519462
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '85c37863415d'
+down_revision = '010308b06b49'
+depends_on = ('11ae3f815dde',)
+
+from alembic import op
+from oslo_serialization import jsonutils
+import sqlalchemy as sa
+
+
+def upgrade():
+    # copy the next hops the servers of the former release wrote, now
+    # that they are stopped, before the column holding them is dropped
+    next_hops = sa.sql.table('sfc_path_node_next_hops',
+                             sa.sql.column('pathnode_id', sa.String()),
+                             sa.sql.column('portpair_id', sa.String()),
+                             sa.sql.column('weight', sa.Integer()))
+    bind = op.get_bind()
+    port_details = set(
+        row[0] for row in bind.execute(
+            sa.text("SELECT id FROM sfc_portpair_details")))
+    rows = []
+    for node_id, next_hop in bind.execute(sa.text(
+        "SELECT id, next_hop FROM sfc_path_nodes n "
+        "WHERE next_hop IS NOT NULL AND NOT EXISTS "
+        "(SELECT 1 FROM sfc_path_node_next_hops h "
+        "WHERE h.pathnode_id = n.id)"
+    )):
+        weights = {}
+        for member in jsonutils.loads(next_hop) or []:
+            if member['portpair_id'] in port_details:
+                weights[member['portpair_id']] = member.get('weight', 1)
+        rows.extend({'pathnode_id': node_id,
+                     'portpair_id': portpair_id,
+                     'weight': weight}
+                    for portpair_id, weight in weights.items())
+    if rows:
+        op.bulk_insert(next_hops, rows)
+    op.drop_column('sfc_path_nodes', 'next_hop')
@@ -0,0 +1,47 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add changes
+
+Revision ID: 0276d773d0fb
+Revises: c12bea3134ce
+Create Date: 2016-09-14 16:03:52.118634
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0276d773d0fb'
+down_revision = 'c12bea3134ce'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'sfc_changes',
+        sa.Column('project_id', sa.String(length=255), nullable=True),
+        sa.Column('seqnum', sa.Integer(), autoincrement=True,
+                  nullable=False),
+        sa.Column('resource_type', sa.String(length=36), nullable=False),
+        sa.Column('resource_id', sa.String(length=36), nullable=False),
+        sa.Column('operation', sa.String(length=16), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seqnum'),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(op.f('ix_sfc_changes_project_id'), 'sfc_changes',
+                    ['project_id'], unique=False)
+    op.create_index(op.f('ix_sfc_changes_resource_id'), 'sfc_changes',
+                    ['resource_id'], unique=False)
@@ -0,0 +1,42 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add group refcounts
+
+Revision ID: 1089dab85e85
+Revises: a7110d87ea19
+Create Date: 2016-08-18 15:02:41.623018
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1089dab85e85'
+down_revision = 'a7110d87ea19'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'sfc_group_refcounts',
+        sa.Column('host_id', sa.String(length=255), nullable=False),
+        sa.Column('next_group_id', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('refcnt', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('host_id', 'next_group_id'),
+        mysql_engine='InnoDB'
+    )
+    # the counts are filled by the contract migration 3b29b4b3b672, the
+    # servers count the missing ones from the paths until then
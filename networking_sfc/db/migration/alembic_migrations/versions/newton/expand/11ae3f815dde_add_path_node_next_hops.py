@@ -0,0 +1,48 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add path node next hops
+
+Revision ID: 11ae3f815dde
+Revises: b3adaf631bab
+Create Date: 2016-09-02 10:12:47.208614
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '11ae3f815dde'
+down_revision = 'b3adaf631bab'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'sfc_path_node_next_hops',
+        sa.Column('pathnode_id', sa.String(length=36), nullable=False),
+        sa.Column('portpair_id', sa.String(length=36), nullable=False),
+        sa.Column('weight', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['pathnode_id'], ['sfc_path_nodes.id'],
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['portpair_id'], ['sfc_portpair_details.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('pathnode_id', 'portpair_id'),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(op.f('ix_sfc_path_node_next_hops_portpair_id'),
+                    'sfc_path_node_next_hops', ['portpair_id'],
+                    unique=False)
+    # the next hops are copied by the contract migration 85c37863415d,
+    # the servers take the missing ones from the paths until then
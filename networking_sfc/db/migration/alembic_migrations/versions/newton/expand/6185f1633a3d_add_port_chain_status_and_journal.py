@@ -0,0 +1,51 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add port chain status and journal
+
+Revision ID: 6185f1633a3d
+Revises: 1089dab85e85
+Create Date: 2016-08-24 10:12:07.335941
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6185f1633a3d'
+down_revision = '1089dab85e85'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('sfc_port_chains',
+                  sa.Column('status', sa.String(length=16), nullable=False,
+                            server_default='ACTIVE'))
+    op.create_table(
+        'sfc_journal',
+        sa.Column('seqnum', sa.Integer(), autoincrement=True,
+                  nullable=False),
+        sa.Column('resource_type', sa.String(length=36), nullable=False),
+        sa.Column('resource_id', sa.String(length=36), nullable=False),
+        sa.Column('operation', sa.String(length=36), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('state', sa.String(length=16), nullable=False),
+        sa.Column('last_changed', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seqnum'),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(op.f('ix_sfc_journal_resource_id'), 'sfc_journal',
+                    ['resource_id'], unique=False)
+    op.create_index(op.f('ix_sfc_journal_state'), 'sfc_journal',
+                    ['state'], unique=False)
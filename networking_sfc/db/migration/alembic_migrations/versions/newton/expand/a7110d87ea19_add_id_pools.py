@@ -0,0 +1,50 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add id pools
+
+Revision ID: a7110d87ea19
+Revises: fa75d46a7f11
+Create Date: 2016-08-16 10:21:05.415822
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a7110d87ea19'
+down_revision = 'fa75d46a7f11'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'sfc_id_pools',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('min_id', sa.Integer(), nullable=False),
+        sa.Column('max_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+        mysql_engine='InnoDB'
+    )
+    op.create_table(
+        'sfc_id_free_ranges',
+        sa.Column('pool', sa.String(length=64), nullable=False),
+        sa.Column('first_id', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['pool'], ['sfc_id_pools.name'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('pool', 'first_id'),
+        mysql_engine='InnoDB'
+    )
@@ -0,0 +1,61 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add host flowrules
+
+Revision ID: b3adaf631bab
+Revises: 6185f1633a3d
+Create Date: 2016-08-29 16:40:12.807346
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b3adaf631bab'
+down_revision = '6185f1633a3d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'sfc_portchain_generations',
+        sa.Column('portchain_id', sa.String(length=36), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['portchain_id'], ['sfc_port_chains.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('portchain_id'),
+        mysql_engine='InnoDB'
+    )
+    op.create_table(
+        'sfc_host_flowrules',
+        sa.Column('host_id', sa.String(length=255), nullable=False),
+        sa.Column('pathnode_id', sa.String(length=36), nullable=False),
+        sa.Column('portpair_id', sa.String(length=36), nullable=False),
+        sa.Column('portchain_id', sa.String(length=36), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.Column('flowrule', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('host_id', 'pathnode_id', 'portpair_id'),
+        mysql_engine='InnoDB'
+    )
+    op.create_table(
+        'sfc_host_flowrule_versions',
+        sa.Column('host_id', sa.String(length=255), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('purged_version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('host_id'),
+        mysql_engine='InnoDB'
+    )
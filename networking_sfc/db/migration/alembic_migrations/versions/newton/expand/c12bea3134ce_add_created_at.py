@@ -0,0 +1,44 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add created_at
+
+Revision ID: c12bea3134ce
+Revises: f642cdde0837
+Create Date: 2016-09-12 10:41:26.530214
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c12bea3134ce'
+down_revision = 'f642cdde0837'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+TABLES = ('sfc_port_chains', 'sfc_port_pair_groups', 'sfc_port_pairs',
+          'sfc_flow_classifiers')
+
+
+def upgrade():
+    for table_name in TABLES:
+        # the servers of the former release insert rows without created_at,
+        # the column is filled by the database until the contract migration
+        # makes it NOT NULL
+        op.add_column(table_name,
+                      sa.Column('created_at', sa.DateTime(), nullable=True,
+                                server_default=sa.func.now()))
+        op.create_index('ix_%s_created_at_id' % table_name, table_name,
+                        ['created_at', 'id'], unique=False)
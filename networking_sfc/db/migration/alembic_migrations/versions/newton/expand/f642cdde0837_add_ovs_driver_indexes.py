@@ -0,0 +1,44 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add ovs driver indexes
+
+Revision ID: f642cdde0837
+Revises: 11ae3f815dde
+Create Date: 2016-09-05 14:27:31.905127
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f642cdde0837'
+down_revision = '11ae3f815dde'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('ix_sfc_portpair_details_ingress_egress',
+                    'sfc_portpair_details', ['ingress', 'egress'],
+                    unique=False)
+    op.create_index(op.f('ix_sfc_portpair_details_egress'),
+                    'sfc_portpair_details', ['egress'], unique=False)
+    op.create_index(op.f('ix_sfc_portpair_details_host_id'),
+                    'sfc_portpair_details', ['host_id'], unique=False)
+    op.create_index('ix_sfc_path_nodes_portchain_id_next_group_id',
+                    'sfc_path_nodes', ['portchain_id', 'next_group_id'],
+                    unique=False)
+    op.create_index(op.f('ix_sfc_path_nodes_next_group_id'),
+                    'sfc_path_nodes', ['next_group_id'], unique=False)
+    op.create_index('ix_sfc_path_nodes_nsp_nsi',
+                    'sfc_path_nodes', ['nsp', 'nsi'], unique=False)
@@ -14,7 +14,10 @@
 
 from neutron.db import model_base
 
+from networking_sfc.db import changes_db  # noqa
 from networking_sfc.db import flowclassifier_db  # noqa
+from networking_sfc.db import id_allocator  # noqa
+from networking_sfc.db import journal_db  # noqa
 from networking_sfc.db import sfc_db  # noqa
 from networking_sfc.services.sfc.drivers.ovs import db as ovs_db  # noqa
 
@@ -0,0 +1,59 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Keyset pagination of the resource collections.
+
+A page is the rows following the marker in the order of the sort keys,
+so its cost does not depend on how deep it is, as long as an index
+covers the sort keys. The pages are in created order by default: the
+paged resources have a created_at column indexed with their id.
+"""
+
+from oslo_utils import timeutils
+import sqlalchemy as sa
+
+CREATED_AT = 'created_at'
+PRIMARY_KEY = 'id'
+
+
+def created_at_column():
+    return sa.Column(sa.DateTime(), nullable=False, default=timeutils.utcnow,
+                     server_default=sa.func.now())
+
+
+def created_at_index(table_name):
+    """Index of the created order pages of the table."""
+    return sa.Index('ix_%s_created_at_id' % table_name,
+                    CREATED_AT, PRIMARY_KEY)
+
+
+def get_sorts(sorts, limit=None, marker=None):
+    """Return the sort keys of a list call.
+
+    The pages are sorted by the requested keys, or in created order when
+    they are not sorted by other keys than the id. The id is always the
+    last sort key, so that the rows are in a total order and the marker
+    row tells where the next page starts. The lists which are not paged
+    keep the requested sort keys.
+    """
+    if not limit and not marker:
+        return sorts
+    sorts = list(sorts or [])
+    keys = [key for key, direction in sorts]
+    if not [key for key in keys if key != PRIMARY_KEY]:
+        direction = dict(sorts).get(PRIMARY_KEY, True)
+        return [(CREATED_AT, direction), (PRIMARY_KEY, direction)]
+    if PRIMARY_KEY not in keys:
+        sorts.append((PRIMARY_KEY, True))
+    return sorts
@@ -0,0 +1,128 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Read-through cache of the resource dicts of a db plugin.
+
+The drivers get the same port pairs, port pair groups and flow
+classifiers again and again. The cache keeps the dicts of the most
+recently read resources for a limited time. The writes of the plugin
+invalidate them, once when they are done and again when their
+transaction commits, so a dict read meanwhile from the former state is
+not kept. Reads inside a transaction do not use the cache, since they
+may see changes that are not committed yet.
+
+The writes of the other neutron-server processes are only seen once
+the cached dicts expire.
+"""
+
+import collections
+import copy
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy import orm
+
+# key of the session info holding the invalidations to repeat on commit
+_PENDING_INVALIDATIONS = 'networking_sfc_pending_invalidations'
+
+
+class ResourceCache(object):
+    """Bounded LRU cache of resource dicts with a time to live.
+
+    :param size: number of dicts kept, 0 disables the cache.
+    :param ttl: seconds a dict is kept, 0 disables the cache.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        # changed by every invalidation, a dict loaded meanwhile is not
+        # cached since it may be from the former state.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0 and self.ttl > 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries)
+            }
+
+    def get(self, context, resource, id, load):
+        """Return a copy of the dict of the resource id.
+
+        :param load: function returning the dict when it is not cached;
+            it raises the not found exception of the resource.
+        """
+        if not self.enabled or context.session.is_active:
+            return load()
+        key = (resource, id)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > now:
+                self._entries[key] = entry
+                # the dict of another tenant is not found by the query
+                if (
+                    context.is_admin or
+                    entry[1].get('tenant_id') == context.tenant_id
+                ):
+                    self.hits += 1
+                    return copy.deepcopy(entry[1])
+            self.misses += 1
+            generation = self._generation
+        value = load()
+        with self._lock:
+            if generation == self._generation:
+                self._entries.pop(key, None)
+                self._entries[key] = (now + self.ttl, copy.deepcopy(value))
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, session, resource, id):
+        """Drop the dict of the resource id written in session."""
+        self._invalidate((resource, id))
+        if session.is_active:
+            session.info.setdefault(_PENDING_INVALIDATIONS, []).append(
+                (self, (resource, id)))
+
+    def _invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+@event.listens_for(orm.Session, 'after_commit')
+@event.listens_for(orm.Session, 'after_rollback')
+def _invalidate_pending(session):
+    for cache, key in session.info.pop(_PENDING_INVALIDATIONS, []):
+        cache._invalidate(key)
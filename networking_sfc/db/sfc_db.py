@@ -12,8 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import time
+
 import six
 
+from neutron_lib import constants as const
+from oslo_config import cfg
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
@@ -32,13 +37,35 @@ from neutron.db import common_db_mixin
 from neutron.db import model_base
 from neutron.db import models_v2
 
+from networking_sfc._i18n import _LE
 from networking_sfc._i18n import _LI
+from networking_sfc.db import changes_db
 from networking_sfc.db import flowclassifier_db as fc_db
+from networking_sfc.db import flowclassifier_index
+from networking_sfc.db import id_allocator
+from networking_sfc.db import pagination
+from networking_sfc.db import resource_cache
 from networking_sfc.extensions import flowclassifier as ext_fc
 from networking_sfc.extensions import sfc as ext_sfc
+from networking_sfc.extensions import sfc_changes as ext_changes
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('resource_cache_size',
+                    'networking_sfc.services.sfc.common.config',
+                    group='sfc')
+cfg.CONF.import_opt('resource_cache_ttl',
+                    'networking_sfc.services.sfc.common.config',
+                    group='sfc')
+cfg.CONF.import_opt('check_port_chain_conflicts',
+                    'networking_sfc.services.sfc.common.config',
+                    group='sfc')
+cfg.CONF.import_opt('change_feed_compaction_delay',
+                    'networking_sfc.services.sfc.common.config',
+                    group='sfc')
+cfg.CONF.import_opt('change_feed_retention',
+                    'networking_sfc.services.sfc.common.config',
+                    group='sfc')
 
 UUID_LEN = 36
 PARAM_LEN = 255
@@ -110,6 +137,7 @@ class PortPair(model_base.BASEV2, model_base.HasId, model_base.HasProject):
         sa.String(UUID_LEN),
         sa.ForeignKey('ports.id', ondelete='RESTRICT'),
         nullable=False)
+    created_at = pagination.created_at_column()
 
     portpairgroup_id = sa.Column(
         sa.String(UUID_LEN),
@@ -124,6 +152,7 @@ class PortPair(model_base.BASEV2, model_base.HasId, model_base.HasProject):
             ingress, egress,
             name='uniq_sfc_port_pairs0ingress0egress'
         ),
+        pagination.created_at_index(__tablename__),
         model_base.BASEV2.__table_args__
     )
 
@@ -149,6 +178,7 @@ class PortPairGroup(model_base.BASEV2, model_base.HasId,
     group_id = sa.Column(sa.Integer(), unique=True, nullable=False)
     name = sa.Column(sa.String(NAME_MAX_LEN))
     description = sa.Column(sa.String(DESCRIPTION_MAX_LEN))
+    created_at = pagination.created_at_column()
     port_pairs = orm.relationship(
         PortPair,
         backref='port_pair_group'
@@ -161,6 +191,11 @@ class PortPairGroup(model_base.BASEV2, model_base.HasId,
         ChainGroupAssoc,
         backref='port_pair_groups')
 
+    __table_args__ = (
+        pagination.created_at_index(__tablename__),
+        model_base.BASEV2.__table_args__
+    )
+
 
 class PortChain(model_base.BASEV2, model_base.HasId, model_base.HasProject):
     """Represents a Neutron service function Port Chain."""
@@ -168,6 +203,9 @@ class PortChain(model_base.BASEV2, model_base.HasId, model_base.HasProject):
     chain_id = sa.Column(sa.Integer(), unique=True, nullable=False)
     name = sa.Column(sa.String(NAME_MAX_LEN))
     description = sa.Column(sa.String(DESCRIPTION_MAX_LEN))
+    status = sa.Column(sa.String(16), nullable=False,
+                       default=const.ACTIVE, server_default=const.ACTIVE)
+    created_at = pagination.created_at_column()
     chain_group_associations = orm.relationship(
         ChainGroupAssoc,
         backref='port_chain',
@@ -183,84 +221,224 @@ class PortChain(model_base.BASEV2, model_base.HasId, model_base.HasProject):
         collection_class=attribute_mapped_collection('keyword'),
         cascade='all, delete-orphan')
 
+    __table_args__ = (
+        pagination.created_at_index(__tablename__),
+        model_base.BASEV2.__table_args__
+    )
+
+
+# the relationships read by the dict of each resource, by dict field. The
+# list calls load the ones of the requested fields for all the rows up
+# front, the others are not loaded.
+_PORT_CHAIN_RELATIONSHIPS = {
+    'port_pair_groups': [PortChain.chain_group_associations],
+    'flow_classifiers': [PortChain.chain_classifier_associations],
+    'chain_parameters': [PortChain.chain_parameters]
+}
+_PORT_PAIR_GROUP_RELATIONSHIPS = {
+    'port_pairs': [PortPairGroup.port_pairs],
+    'port_pair_group_parameters': [PortPairGroup.port_pair_group_parameters]
+}
+_PORT_PAIR_RELATIONSHIPS = {
+    'service_function_parameters': [PortPair.service_function_parameters]
+}
+
+_CHAIN_IDS = id_allocator.IdAllocator(
+    'sfc_chain_id', 1, ext_sfc.MAX_CHAIN_ID,
+    id_allocator.column_ids(PortChain.chain_id))
+_GROUP_IDS = id_allocator.IdAllocator(
+    'sfc_group_id', 1, ext_sfc.MAX_GROUP_ID,
+    id_allocator.column_ids(PortPairGroup.group_id))
+
 
 class SfcDbPlugin(
     ext_sfc.SfcPluginBase,
+    ext_changes.SfcChangesPluginBase,
     common_db_mixin.CommonDbMixin
 ):
     """Mixin class to add port chain to db_plugin_base_v2."""
+
+    __native_bulk_support = True
+    __native_pagination_support = True
+    __native_sorting_support = True
+
+    def __init__(self):
+        super(SfcDbPlugin, self).__init__()
+        # port pairs and port pair groups read by the drivers
+        self.resource_cache = resource_cache.ResourceCache(
+            cfg.CONF.sfc.resource_cache_size,
+            cfg.CONF.sfc.resource_cache_ttl)
+        self._changes_compacted_at = 0
+
+    @staticmethod
+    def _is_field_wanted(field, fields):
+        return not fields or field in fields
+
+    def _get_collection_eager(self, context, model, dict_func,
+                              relationships, filters=None, fields=None,
+                              sorts=None, limit=None, marker_obj=None,
+                              page_reverse=False):
+        """_get_collection loading the relationships of the dicts up front.
+
+        :param relationships: dict of the relationships read by dict_func,
+            by dict field. The ones of the requested fields are loaded by
+            one query each for all the rows, instead of one per row.
+        """
+        query = self._get_collection_query(
+            context, model, filters=filters, sorts=sorts, limit=limit,
+            marker_obj=marker_obj, page_reverse=page_reverse)
+        options = [
+            orm.subqueryload(relationship)
+            for field, field_relationships in six.iteritems(relationships)
+            if self._is_field_wanted(field, fields)
+            for relationship in field_relationships
+        ]
+        if options:
+            query = query.options(*options)
+        items = [dict_func(c, fields) for c in query]
+        if limit and page_reverse:
+            items.reverse()
+        return items
+
     def _make_port_chain_dict(self, port_chain, fields=None):
         res = {
             'id': port_chain['id'],
             'name': port_chain['name'],
             'tenant_id': port_chain['tenant_id'],
             'description': port_chain['description'],
-            'port_pair_groups': [
+            'chain_id': port_chain['chain_id'],
+            'status': port_chain['status'],
+        }
+        # the relationships of the fields which are not requested are not
+        # loaded
+        if self._is_field_wanted('port_pair_groups', fields):
+            res['port_pair_groups'] = [
                 assoc['portpairgroup_id']
                 for assoc in port_chain['chain_group_associations']
-            ],
-            'flow_classifiers': [
+            ]
+        if self._is_field_wanted('flow_classifiers', fields):
+            res['flow_classifiers'] = [
                 assoc['flowclassifier_id']
                 for assoc in port_chain['chain_classifier_associations']
-            ],
-            'chain_parameters': {
+            ]
+        if self._is_field_wanted('chain_parameters', fields):
+            res['chain_parameters'] = {
                 param['keyword']: jsonutils.loads(param['value'])
                 for k, param in six.iteritems(port_chain['chain_parameters'])
-            },
-            'chain_id': port_chain['chain_id'],
-        }
+            }
         return self._fields(res, fields)
 
     def _validate_port_pair_groups(self, context, pg_ids, pc_id=None):
+        """Check the port pair groups of pg_ids for the port chain pc_id.
+
+        They must exist. With the check_port_chain_conflicts option, no
+        other port chain may have the same port pair groups: only the
+        chains with the first of the groups are compared.
+        """
+        if not pg_ids:
+            return
         with context.session.begin(subtransactions=True):
+            found_ids = set(
+                pg_id for pg_id, in self._model_query(
+                    context, PortPairGroup.id
+                ).filter(PortPairGroup.id.in_(set(pg_ids))))
             for pg_id in pg_ids:
-                self._get_port_pair_group(context, pg_id)
-            query = self._model_query(context, PortChain)
-
-            for port_chain_db in query.all():
-                if port_chain_db['id'] == pc_id:
-                    continue
-                pc_pg_ids = [
-                    assoc['portpairgroup_id']
-                    for assoc in port_chain_db.chain_group_associations
-                ]
-                #JEDif pc_pg_ids and pg_ids and pc_pg_ids == pg_ids:
-                #    raise ext_sfc.InvalidPortPairGroups(
-                #        port_pair_groups=pg_ids, port_chain=port_chain_db.id)
+                if pg_id not in found_ids:
+                    raise ext_sfc.PortPairGroupNotFound(id=pg_id)
+            if not cfg.CONF.sfc.check_port_chain_conflicts:
+                return
+            chain_ids = context.session.query(
+                ChainGroupAssoc.portchain_id
+            ).filter(ChainGroupAssoc.portpairgroup_id == pg_ids[0])
+            if pc_id is not None:
+                chain_ids = chain_ids.filter(
+                    ChainGroupAssoc.portchain_id != pc_id)
+            chain_ids = [chain_id for chain_id, in chain_ids]
+            if not chain_ids:
+                return
+            chain_pg_ids = collections.defaultdict(list)
+            for chain_id, pg_id in context.session.query(
+                ChainGroupAssoc.portchain_id,
+                ChainGroupAssoc.portpairgroup_id
+            ).filter(
+                ChainGroupAssoc.portchain_id.in_(chain_ids)
+            ).order_by(ChainGroupAssoc.position):
+                chain_pg_ids[chain_id].append(pg_id)
+            for chain_id in sorted(chain_pg_ids):
+                if chain_pg_ids[chain_id] == list(pg_ids):
+                    raise ext_sfc.InvalidPortPairGroups(
+                        port_pair_groups=pg_ids, port_chain=chain_id)
 
     def _validate_flow_classifiers(self, context, fc_ids, pc_id=None):
+        """Check the flow classifiers of fc_ids for the port chain pc_id.
+
+        They must exist and not belong to another port chain. With the
+        check_port_chain_conflicts option, they must not conflict with the
+        flow classifiers of the other port chains either.
+        """
+        if not fc_ids:
+            return
         with context.session.begin(subtransactions=True):
-            fcs = [
-                self._get_flow_classifier(context, fc_id)
-                for fc_id in fc_ids
-            ]
-            for fc in fcs:
-                fc_assoc = fc.chain_classifier_association
-                if fc_assoc and fc_assoc['portchain_id'] != pc_id:
-                    raise ext_fc.FlowClassifierInUse(id=fc.id)
-
-            query = self._model_query(context, PortChain)
-            for port_chain_db in query.all():
-                if port_chain_db['id'] == pc_id:
-                    continue
-                pc_fc_ids = [
-                    assoc['flowclassifier_id']
-                    for assoc in port_chain_db.chain_classifier_associations
-                ]
-                pc_fcs = [
-                    self._get_flow_classifier(context, pc_fc_id)
-                    for pc_fc_id in pc_fc_ids
-                ]
-                #for pc_fc in pc_fcs:
-                #    for fc in fcs:
-                #        fc_cls = fc_db.FlowClassifierDbPlugin
-                #        if fc_cls.flowclassifier_basic_conflict(
-                #            pc_fc, fc
-                #        ):
-                #            raise ext_sfc.PortChainFlowClassifierInConflict(
-                #                fc_id=fc['id'], pc_id=port_chain_db['id'],
-                #                pc_fc_id=pc_fc['id']
-                #           )
+            fcs = dict(
+                (fc['id'], fc) for fc in self._model_query(
+                    context, fc_db.FlowClassifier
+                ).filter(fc_db.FlowClassifier.id.in_(set(fc_ids))))
+            for fc_id in fc_ids:
+                if fc_id not in fcs:
+                    raise ext_fc.FlowClassifierNotFound(id=fc_id)
+            query = context.session.query(
+                ChainClassifierAssoc.flowclassifier_id
+            ).filter(
+                ChainClassifierAssoc.flowclassifier_id.in_(set(fc_ids)))
+            if pc_id is not None:
+                query = query.filter(
+                    ChainClassifierAssoc.portchain_id != pc_id)
+            in_use = set(fc_id for fc_id, in query)
+            for fc_id in fc_ids:
+                if fc_id in in_use:
+                    raise ext_fc.FlowClassifierInUse(id=fc_id)
+            if cfg.CONF.sfc.check_port_chain_conflicts:
+                self._check_flow_classifier_conflicts(
+                    context, [fcs[fc_id] for fc_id in fc_ids], pc_id)
+
+    def _check_flow_classifier_conflicts(self, context, fcs, pc_id=None):
+        """Check fcs against the flow classifiers of the other chains.
+
+        Only the classifiers of the other chains sharing an ethertype and
+        a protocol with fcs are read, and they are compared through a
+        conflict index.
+        """
+        FlowClassifier = fc_db.FlowClassifier
+        ethertypes = set(fc['ethertype'] for fc in fcs)
+        ethertype_match = FlowClassifier.ethertype.in_(
+            ethertypes - set([None]))
+        if None in ethertypes:
+            ethertype_match = sa.or_(ethertype_match,
+                                     FlowClassifier.ethertype.is_(None))
+        protocols = set(fc['protocol'] for fc in fcs)
+        query = self._model_query(context, FlowClassifier).join(
+            ChainClassifierAssoc,
+            ChainClassifierAssoc.flowclassifier_id == FlowClassifier.id
+        ).add_columns(
+            ChainClassifierAssoc.portchain_id
+        ).filter(
+            ethertype_match,
+            fc_db.FlowClassifierDbPlugin._nullable_column_in(
+                FlowClassifier.protocol, protocols))
+        if pc_id is not None:
+            query = query.filter(ChainClassifierAssoc.portchain_id != pc_id)
+        chain_ids = {}
+        conflict_index = flowclassifier_index.FlowClassifierConflictIndex(
+            logical_ports=False)
+        for pc_fc, pc_fc_chain_id in query:
+            chain_ids[pc_fc['id']] = pc_fc_chain_id
+            conflict_index.add(pc_fc)
+        for fc in fcs:
+            pc_fc_id = conflict_index.find_conflict(fc)
+            if pc_fc_id is not None:
+                raise ext_sfc.PortChainFlowClassifierInConflict(
+                    fc_id=fc['id'], pc_id=chain_ids[pc_fc_id],
+                    pc_fc_id=pc_fc_id)
 
     def _setup_chain_group_associations(
         self, context, port_chain, pg_ids
@@ -313,52 +491,56 @@ class SfcDbPlugin(
             fc_ids = pc['flow_classifiers']
             self._validate_port_pair_groups(context, pg_ids)
             self._validate_flow_classifiers(context, fc_ids)
-            assigned_chain_ids = {}
-            query = self._model_query(context, PortChain)
-            for port_chain_db in query.all():
-                assigned_chain_ids[port_chain_db['chain_id']] = (
-                    port_chain_db['id']
-                )
             if not chain_id:
-                available_chain_id = 1
-                while available_chain_id < ext_sfc.MAX_CHAIN_ID:
-                    if available_chain_id not in assigned_chain_ids:
-                        chain_id = available_chain_id
-                        break
-                    available_chain_id += 1
+                chain_id = _CHAIN_IDS.allocate(context.session)
                 if not chain_id:
                     raise ext_sfc.PortChainUnavailableChainId()
-            else:
-                if chain_id not in assigned_chain_ids:
-                    raise ext_sfc.PortChainChainIdInConflict(
-                        chain_id=chain_id, pc_id=assigned_chain_ids[chain_id])
+            elif not _CHAIN_IDS.allocate(context.session, chain_id):
+                port_chain_db = self._model_query(
+                    context, PortChain).filter_by(chain_id=chain_id).first()
+                raise ext_sfc.PortChainChainIdInConflict(
+                    chain_id=chain_id,
+                    pc_id=port_chain_db and port_chain_db['id'])
             port_chain_db = PortChain(id=uuidutils.generate_uuid(),
                                       tenant_id=tenant_id,
                                       description=pc['description'],
                                       name=pc['name'],
                                       chain_parameters=chain_parameters,
-                                      chain_id=chain_id)
+                                      chain_id=chain_id,
+                                      status=const.ACTIVE)
             self._setup_chain_group_associations(
                 context, port_chain_db, pg_ids)
             self._setup_chain_classifier_associations(
                 context, port_chain_db, fc_ids)
             context.session.add(port_chain_db)
+            changes_db.record(context.session, 'port_chain',
+                              port_chain_db['id'], changes_db.CREATE,
+                              tenant_id)
 
             return self._make_port_chain_dict(port_chain_db)
 
+    @log_helpers.log_method_call
+    def create_port_chain_bulk(self, context, port_chains):
+        """Create the port chains of a bulk request in one transaction."""
+        with context.session.begin(subtransactions=True):
+            return [self.create_port_chain(context, item)
+                    for item in port_chains['port_chains']]
+
     @log_helpers.log_method_call
     def get_port_chains(self, context, filters=None, fields=None,
                         sorts=None, limit=None,
                         marker=None, page_reverse=False, default_sg=False):
 
         marker_obj = self._get_marker_obj(context, 'port_chain', limit, marker)
-        return self._get_collection(context,
-                                    PortChain,
-                                    self._make_port_chain_dict,
-                                    filters=filters, fields=fields,
-                                    sorts=sorts,
-                                    limit=limit, marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+        return self._get_collection_eager(context,
+                                          PortChain,
+                                          self._make_port_chain_dict,
+                                          _PORT_CHAIN_RELATIONSHIPS,
+                                          filters=filters, fields=fields,
+                                          sorts=pagination.get_sorts(
+                                              sorts, limit, marker),
+                                          limit=limit, marker_obj=marker_obj,
+                                          page_reverse=page_reverse)
 
     def get_port_chains_count(self, context, filters=None):
         return self._get_collection_count(context, PortChain,
@@ -376,6 +558,13 @@ class SfcDbPlugin(
         except exc.NoResultFound:
             raise ext_sfc.PortChainNotFound(id=id)
 
+    def _set_port_chain_status(self, context, id, status):
+        with context.session.begin(subtransactions=True):
+            pc_db = self._get_port_chain(context, id)
+            pc_db.status = status
+            changes_db.record(context.session, 'port_chain', id,
+                              changes_db.UPDATE, pc_db['tenant_id'])
+
     @log_helpers.log_method_call
     def delete_port_chain(self, context, id):
         try:
@@ -383,6 +572,9 @@ class SfcDbPlugin(
                 pc = self._get_port_chain(context, id)
 
                 context.session.delete(pc)
+                _CHAIN_IDS.release(context.session, pc['chain_id'])
+                changes_db.record(context.session, 'port_chain', id,
+                                  changes_db.DELETE, pc['tenant_id'])
         except ext_sfc.PortChainNotFound:
             LOG.info(_LI("Deleting a non-existing port chain."))
 
@@ -404,6 +596,8 @@ class SfcDbPlugin(
                         context, pc_db, v)
                 else:
                     pc_db[k] = v
+            changes_db.record(context.session, 'port_chain', id,
+                              changes_db.UPDATE, pc_db['tenant_id'])
             return self._make_port_chain_dict(pc_db)
 
     def _make_port_pair_dict(self, port_pair, fields=None):
@@ -413,13 +607,14 @@ class SfcDbPlugin(
             'description': port_pair['description'],
             'tenant_id': port_pair['tenant_id'],
             'ingress': port_pair['ingress'],
-            'egress': port_pair['egress'],
-            'service_function_parameters': {
+            'egress': port_pair['egress']
+        }
+        if self._is_field_wanted('service_function_parameters', fields):
+            res['service_function_parameters'] = {
                 param['keyword']: jsonutils.loads(param['value'])
                 for k, param in six.iteritems(
                     port_pair['service_function_parameters'])
             }
-        }
 
         return self._fields(res, fields)
 
@@ -437,11 +632,28 @@ class SfcDbPlugin(
                 ingress=ingress['id'],
                 egress=egress['id'])
 
+    def _create_port_pair_db(self, pp):
+        service_function_parameters = {
+            key: ServiceFunctionParam(
+                keyword=key, value=jsonutils.dumps(val))
+            for key, val in six.iteritems(
+                pp['service_function_parameters']
+            )
+        }
+        return PortPair(
+            id=uuidutils.generate_uuid(),
+            name=pp['name'],
+            description=pp['description'],
+            tenant_id=pp['tenant_id'],
+            ingress=pp['ingress'],
+            egress=pp['egress'],
+            service_function_parameters=service_function_parameters
+        )
+
     @log_helpers.log_method_call
     def create_port_pair(self, context, port_pair):
         """Create a port pair."""
         pp = port_pair['port_pair']
-        tenant_id = pp['tenant_id']
         with context.session.begin(subtransactions=True):
             query = self._model_query(context, PortPair)
             pp_in_use = query.filter_by(
@@ -454,41 +666,59 @@ class SfcDbPlugin(
             #        id=pp_in_use['id']
             #    )
 
-            service_function_parameters = {
-                key: ServiceFunctionParam(
-                    keyword=key, value=jsonutils.dumps(val))
-                for key, val in six.iteritems(
-                    pp['service_function_parameters']
-                )
-            }
             ingress = self._get_port(context, pp['ingress'])
             egress = self._get_port(context, pp['egress'])
             self._validate_port_pair_ingress_egress(ingress, egress)
-            port_pair_db = PortPair(
-                id=uuidutils.generate_uuid(),
-                name=pp['name'],
-                description=pp['description'],
-                tenant_id=tenant_id,
-                ingress=pp['ingress'],
-                egress=pp['egress'],
-                service_function_parameters=service_function_parameters
-            )
+            port_pair_db = self._create_port_pair_db(pp)
             context.session.add(port_pair_db)
+            changes_db.record(context.session, 'port_pair',
+                              port_pair_db['id'], changes_db.CREATE,
+                              port_pair_db['tenant_id'])
             return self._make_port_pair_dict(port_pair_db)
 
+    @log_helpers.log_method_call
+    def create_port_pair_bulk(self, context, port_pairs):
+        """Create the port pairs of a bulk request in one transaction.
+
+        The ingress and egress ports of all the port pairs are looked up
+        by one query.
+        """
+        pps = [item['port_pair'] for item in port_pairs['port_pairs']]
+        if not pps:
+            return []
+        with context.session.begin(subtransactions=True):
+            ports = self._get_ports(
+                context,
+                set(pp['ingress'] for pp in pps) |
+                set(pp['egress'] for pp in pps))
+            port_pair_dbs = []
+            for pp in pps:
+                self._validate_port_pair_ingress_egress(
+                    ports[pp['ingress']], ports[pp['egress']])
+                port_pair_dbs.append(self._create_port_pair_db(pp))
+            context.session.add_all(port_pair_dbs)
+            for port_pair_db in port_pair_dbs:
+                changes_db.record(context.session, 'port_pair',
+                                  port_pair_db['id'], changes_db.CREATE,
+                                  port_pair_db['tenant_id'])
+            return [self._make_port_pair_dict(port_pair_db)
+                    for port_pair_db in port_pair_dbs]
+
     @log_helpers.log_method_call
     def get_port_pairs(self, context, filters=None, fields=None,
                        sorts=None, limit=None, marker=None,
                        page_reverse=False):
         marker_obj = self._get_marker_obj(context, 'port_pair',
                                           limit, marker)
-        return self._get_collection(context,
-                                    PortPair,
-                                    self._make_port_pair_dict,
-                                    filters=filters, fields=fields,
-                                    sorts=sorts,
-                                    limit=limit, marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+        return self._get_collection_eager(context,
+                                          PortPair,
+                                          self._make_port_pair_dict,
+                                          _PORT_PAIR_RELATIONSHIPS,
+                                          filters=filters, fields=fields,
+                                          sorts=pagination.get_sorts(
+                                              sorts, limit, marker),
+                                          limit=limit, marker_obj=marker_obj,
+                                          page_reverse=page_reverse)
 
     def get_port_pairs_count(self, context, filters=None):
         return self._get_collection_count(context, PortPair,
@@ -496,8 +726,11 @@ class SfcDbPlugin(
 
     @log_helpers.log_method_call
     def get_port_pair(self, context, id, fields=None):
-        port_pair = self._get_port_pair(context, id)
-        return self._make_port_pair_dict(port_pair, fields)
+        port_pair = self.resource_cache.get(
+            context, 'port_pair', id,
+            lambda: self._make_port_pair_dict(
+                self._get_port_pair(context, id)))
+        return self._fields(port_pair, fields)
 
     def _get_port_pair(self, context, id):
         try:
@@ -511,12 +744,26 @@ class SfcDbPlugin(
         except exc.NoResultFound:
             raise ext_sfc.PortPairPortNotFound(id=id)
 
+    def _get_ports(self, context, ids):
+        """Return the ports of ids by id, all of them must exist."""
+        ports = dict(
+            (port['id'], port)
+            for port in self._model_query(context, models_v2.Port).filter(
+                models_v2.Port.id.in_(ids)))
+        for id in sorted(ids):
+            if id not in ports:
+                raise ext_sfc.PortPairPortNotFound(id=id)
+        return ports
+
     @log_helpers.log_method_call
     def update_port_pair(self, context, id, port_pair):
         new_pp = port_pair['port_pair']
         with context.session.begin(subtransactions=True):
             old_pp = self._get_port_pair(context, id)
             old_pp.update(new_pp)
+            changes_db.record(context.session, 'port_pair', id,
+                              changes_db.UPDATE, old_pp['tenant_id'])
+            self.resource_cache.invalidate(context.session, 'port_pair', id)
             return self._make_port_pair_dict(old_pp)
 
     @log_helpers.log_method_call
@@ -527,6 +774,10 @@ class SfcDbPlugin(
                 if pp.portpairgroup_id:
                     raise ext_sfc.PortPairInUse(id=id)
                 context.session.delete(pp)
+                changes_db.record(context.session, 'port_pair', id,
+                                  changes_db.DELETE, pp['tenant_id'])
+                self.resource_cache.invalidate(
+                    context.session, 'port_pair', id)
         except ext_sfc.PortPairNotFound:
             LOG.info(_LI("Deleting a non-existing port pair."))
 
@@ -536,15 +787,18 @@ class SfcDbPlugin(
             'name': port_pair_group['name'],
             'description': port_pair_group['description'],
             'tenant_id': port_pair_group['tenant_id'],
-            'port_pairs': [pp['id'] for pp in port_pair_group['port_pairs']],
-            'port_pair_group_parameters': {
+            'group_id': port_pair_group.get('group_id') or 0
+        }
+        if self._is_field_wanted('port_pairs', fields):
+            res['port_pairs'] = [
+                pp['id'] for pp in port_pair_group['port_pairs']]
+        if self._is_field_wanted('port_pair_group_parameters', fields):
+            res['port_pair_group_parameters'] = {
                 param['keyword']: jsonutils.loads(param['value'])
                 for k, param in six.iteritems(
                     port_pair_group['port_pair_group_parameters']
                 )
-            },
-            'group_id': port_pair_group.get('group_id') or 0
-        }
+            }
 
         return self._fields(res, fields)
 
@@ -567,19 +821,9 @@ class SfcDbPlugin(
                     pg['port_pair_group_parameters']
                 )
             }
-            assigned_group_ids = {}
-            query = self._model_query(context, PortPairGroup)
-            for port_pair_group_db in query.all():
-                assigned_group_ids[port_pair_group_db['group_id']] = (
-                    port_pair_group_db['id']
-                )
-            group_id = 0
-            available_group_id = 1
-            while True:
-                if available_group_id not in assigned_group_ids:
-                    group_id = available_group_id
-                    break
-                available_group_id += 1
+            group_id = _GROUP_IDS.allocate(context.session)
+            if not group_id:
+                raise ext_sfc.PortPairGroupUnavailableGroupId()
             port_pair_group_db = PortPairGroup(
                 id=uuidutils.generate_uuid(),
                 name=pg['name'],
@@ -589,21 +833,77 @@ class SfcDbPlugin(
                 port_pair_group_parameters=port_pair_group_parameters,
                 group_id=group_id)
             context.session.add(port_pair_group_db)
+            changes_db.record(context.session, 'port_pair_group',
+                              port_pair_group_db['id'], changes_db.CREATE,
+                              tenant_id)
             return self._make_port_pair_group_dict(port_pair_group_db)
 
+    @log_helpers.log_method_call
+    def create_port_pair_group_bulk(self, context, port_pair_groups):
+        """Create the port pair groups of a bulk request in one transaction.
+
+        The port pairs of all the groups are looked up by one query.
+        """
+        pgs = [item['port_pair_group']
+               for item in port_pair_groups['port_pair_groups']]
+        if not pgs:
+            return []
+        with context.session.begin(subtransactions=True):
+            pp_ids = set(pp_id for pg in pgs for pp_id in pg['port_pairs'])
+            port_pairs = {}
+            if pp_ids:
+                port_pairs = dict(
+                    (pp['id'], pp)
+                    for pp in self._model_query(context, PortPair).filter(
+                        PortPair.id.in_(pp_ids)))
+            for pp_id in sorted(pp_ids):
+                if pp_id not in port_pairs:
+                    raise ext_sfc.PortPairNotFound(id=pp_id)
+            port_pair_group_dbs = []
+            for pg in pgs:
+                port_pair_group_parameters = {
+                    key: PortPairGroupParam(
+                        keyword=key, value=jsonutils.dumps(val))
+                    for key, val in six.iteritems(
+                        pg['port_pair_group_parameters']
+                    )
+                }
+                group_id = _GROUP_IDS.allocate(context.session)
+                if not group_id:
+                    raise ext_sfc.PortPairGroupUnavailableGroupId()
+                port_pair_group_dbs.append(PortPairGroup(
+                    id=uuidutils.generate_uuid(),
+                    name=pg['name'],
+                    description=pg['description'],
+                    tenant_id=pg['tenant_id'],
+                    port_pairs=[port_pairs[pp_id]
+                                for pp_id in pg['port_pairs']],
+                    port_pair_group_parameters=port_pair_group_parameters,
+                    group_id=group_id))
+            context.session.add_all(port_pair_group_dbs)
+            for port_pair_group_db in port_pair_group_dbs:
+                changes_db.record(context.session, 'port_pair_group',
+                                  port_pair_group_db['id'],
+                                  changes_db.CREATE,
+                                  port_pair_group_db['tenant_id'])
+            return [self._make_port_pair_group_dict(port_pair_group_db)
+                    for port_pair_group_db in port_pair_group_dbs]
+
     @log_helpers.log_method_call
     def get_port_pair_groups(self, context, filters=None, fields=None,
                              sorts=None, limit=None, marker=None,
                              page_reverse=False):
         marker_obj = self._get_marker_obj(context, 'port_pair_group',
                                           limit, marker)
-        return self._get_collection(context,
-                                    PortPairGroup,
-                                    self._make_port_pair_group_dict,
-                                    filters=filters, fields=fields,
-                                    sorts=sorts,
-                                    limit=limit, marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+        return self._get_collection_eager(context,
+                                          PortPairGroup,
+                                          self._make_port_pair_group_dict,
+                                          _PORT_PAIR_GROUP_RELATIONSHIPS,
+                                          filters=filters, fields=fields,
+                                          sorts=pagination.get_sorts(
+                                              sorts, limit, marker),
+                                          limit=limit, marker_obj=marker_obj,
+                                          page_reverse=page_reverse)
 
     def get_port_pair_groups_count(self, context, filters=None):
         return self._get_collection_count(context, PortPairGroup,
@@ -611,8 +911,11 @@ class SfcDbPlugin(
 
     @log_helpers.log_method_call
     def get_port_pair_group(self, context, id, fields=None):
-        port_pair_group = self._get_port_pair_group(context, id)
-        return self._make_port_pair_group_dict(port_pair_group, fields)
+        port_pair_group = self.resource_cache.get(
+            context, 'port_pair_group', id,
+            lambda: self._make_port_pair_group_dict(
+                self._get_port_pair_group(context, id)))
+        return self._fields(port_pair_group, fields)
 
     def _get_port_pair_group(self, context, id):
         try:
@@ -651,6 +954,10 @@ class SfcDbPlugin(
                 else:
                     old_pg[k] = v
 
+            changes_db.record(context.session, 'port_pair_group', id,
+                              changes_db.UPDATE, old_pg['tenant_id'])
+            self.resource_cache.invalidate(
+                context.session, 'port_pair_group', id)
             return self._make_port_pair_group_dict(old_pg)
 
     @log_helpers.log_method_call
@@ -661,5 +968,87 @@ class SfcDbPlugin(
                 if pg.chain_group_associations:
                     raise ext_sfc.PortPairGroupInUse(id=id)
                 context.session.delete(pg)
+                _GROUP_IDS.release(context.session, pg['group_id'])
+                changes_db.record(context.session, 'port_pair_group', id,
+                                  changes_db.DELETE, pg['tenant_id'])
+                self.resource_cache.invalidate(
+                    context.session, 'port_pair_group', id)
         except ext_sfc.PortPairGroupNotFound:
             LOG.info(_LI("Deleting a non-existing port pair group."))
+
+    def _make_change_dict(self, change, fields=None):
+        return self._fields(changes_db.make_change_dict(change), fields)
+
+    @staticmethod
+    def _get_change_seqnum(value):
+        if isinstance(value, list):
+            value = value[-1] if value else None
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ext_changes.InvalidChangeSeqnum(seqnum=value)
+
+    def _compact_changes(self, context):
+        now = time.time()
+        if now - self._changes_compacted_at < (
+            cfg.CONF.sfc.change_feed_compaction_delay
+        ):
+            return
+        self._changes_compacted_at = now
+        try:
+            changes_db.compact(context.session,
+                               cfg.CONF.sfc.change_feed_compaction_delay,
+                               cfg.CONF.sfc.change_feed_retention)
+        except Exception:
+            LOG.exception(_LE("Failed to compact the sfc changes"))
+
+    @log_helpers.log_method_call
+    def get_changes(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
+        """List the changes in the order they were made.
+
+        The since filter gives the last change seen by the consumer, the
+        marker the last change of the previous page. The changes are
+        always sorted by their id, and listed once they are settled.
+        """
+        self._compact_changes(context)
+        filters = dict(filters or {})
+        since = self._get_change_seqnum(filters.pop('since', None))
+        marker = self._get_change_seqnum(marker)
+        seqnum = changes_db.SfcChange.seqnum
+        query = self._model_query(context, changes_db.SfcChange)
+        query = self._apply_filters_to_query(
+            query, changes_db.SfcChange, filters, context)
+        query = query.filter(
+            changes_db.SfcChange.created_at <= changes_db.get_settled_before(
+                cfg.CONF.sfc.change_feed_settle_time))
+        if since is not None:
+            if changes_db.is_expired(context.session, since):
+                raise ext_changes.ChangesExpired(since=since)
+            query = query.filter(seqnum > since)
+        if page_reverse:
+            if marker is not None:
+                query = query.filter(seqnum < marker)
+            query = query.order_by(seqnum.desc())
+        else:
+            if marker is not None:
+                query = query.filter(seqnum > marker)
+            query = query.order_by(seqnum)
+        if limit:
+            query = query.limit(limit)
+        changes = [self._make_change_dict(change, fields)
+                   for change in query]
+        if page_reverse:
+            changes.reverse()
+        return changes
+
+    @log_helpers.log_method_call
+    def get_change(self, context, id, fields=None):
+        change = self._model_query(context, changes_db.SfcChange).filter_by(
+            seqnum=self._get_change_seqnum(id)).first()
+        if change is None:
+            raise ext_changes.ChangeNotFound(id=id)
+        return self._make_change_dict(change, fields)
@@ -74,6 +74,11 @@ class FlowClassifierInConflict(neutron_exc.InvalidInput):
                 "another Flow Classifier %(id)s.")
 
 
+class FlowClassifierBulkConflict(neutron_exc.InvalidInput):
+    message = _("Flow Classifiers at positions %(first)s and %(second)s "
+                "of the bulk request conflict with each other.")
+
+
 class FlowClassifierInvalidProtocol(neutron_exc.InvalidInput):
     message = _("Flow Classifier does not support protocol %(protocol)s. "
                 "Supported protocol values are %(values)s.")
@@ -277,7 +282,8 @@ class Flowclassifier(neutron_ext.ExtensionDescriptor):
             plural_mappings,
             RESOURCE_ATTRIBUTE_MAP,
             FLOW_CLASSIFIER_EXT,
-            register_quota=True)
+            register_quota=True,
+            allow_bulk=True)
 
     def get_extended_resources(self, version):
         if version == "2.0":
@@ -83,6 +83,8 @@ SUPPORTED_PPG_PARAMETERS = {
     }
 }
 MAX_CHAIN_ID = 65535
+# highest OpenFlow group id, OFPG_MAX
+MAX_GROUP_ID = 0xffffff00
 
 
 # Port Chain Exceptions
@@ -104,6 +106,10 @@ class PortChainChainIdInConflict(neutron_exc.InvalidInput):
                 "Chain id in port chain %(pc_id)s.")
 
 
+class PortChainPendingDelete(neutron_exc.InUse):
+    message = _("Port Chain %(id)s is being deleted.")
+
+
 class InvalidChainParameter(neutron_exc.InvalidInput):
     message = _(
         "Invalid chain parameter: %%(error_message)s. "
@@ -171,6 +177,10 @@ class PortPairGroupInUse(neutron_exc.InUse):
     message = _("Port Pair Group %(id)s in use.")
 
 
+class PortPairGroupUnavailableGroupId(neutron_exc.InvalidInput):
+    message = _("Port Pair Group has no available group id.")
+
+
 class PortPairInUse(neutron_exc.InUse):
     message = _("Port Pair %(id)s in use.")
 
@@ -312,7 +322,10 @@ RESOURCE_ATTRIBUTE_MAP = {
             'allow_post': True, 'allow_put': False,
             'is_visible': True, 'default': None,
             'validate': {'type:dict': None},
-            'convert_to': normalize_chain_parameters}
+            'convert_to': normalize_chain_parameters},
+        'status': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True}
     },
     'port_pair_groups': {
         'id': {
@@ -407,7 +420,8 @@ class Sfc(neutron_ext.ExtensionDescriptor):
             plural_mappings,
             RESOURCE_ATTRIBUTE_MAP,
             SFC_EXT,
-            register_quota=True)
+            register_quota=True,
+            allow_bulk=True)
 
     def get_extended_resources(self, version):
         if version == "2.0":
@@ -0,0 +1,150 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from abc import ABCMeta
+from abc import abstractmethod
+
+import six
+
+from neutron_lib import exceptions as neutron_exc
+
+from neutron.api import extensions as neutron_ext
+from neutron.api.v2 import attributes as attr
+from neutron.api.v2 import resource_helper
+
+from networking_sfc._i18n import _
+from networking_sfc.extensions import sfc as sfc_ext
+
+SFC_CHANGES_EXT = "sfc_changes"
+
+RESOURCE_ATTRIBUTE_MAP = {
+    'changes': {
+        'id': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True
+        },
+        'tenant_id': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True
+        },
+        'resource_type': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True
+        },
+        'resource_id': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True
+        },
+        'operation': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True
+        },
+        'created_at': {
+            'allow_post': False, 'allow_put': False,
+            'is_visible': True
+        },
+    },
+}
+
+
+class ChangeNotFound(neutron_exc.NotFound):
+    message = _("Change %(id)s not found.")
+
+
+class ChangesExpired(neutron_exc.Conflict):
+    message = _("The changes following change %(since)s are no longer "
+                "kept, list the resources again.")
+
+
+class InvalidChangeSeqnum(neutron_exc.InvalidInput):
+    message = _("Invalid change sequence number %(seqnum)s.")
+
+
+class Sfc_changes(neutron_ext.ExtensionDescriptor):
+    """Feed of the changes of the SFC and flow classifier resources.
+
+    GET /sfc/changes?since=<id> lists the changes following the change
+    id, in the order they were made.
+    """
+
+    @classmethod
+    def get_name(cls):
+        return "SFC Change Feed"
+
+    @classmethod
+    def get_alias(cls):
+        return SFC_CHANGES_EXT
+
+    @classmethod
+    def get_description(cls):
+        return "Changes of the SFC and flow classifier resources."
+
+    @classmethod
+    def get_plugin_interface(cls):
+        return SfcChangesPluginBase
+
+    @classmethod
+    def get_updated(cls):
+        return "2016-09-12T10:00:00-00:00"
+
+    def update_attributes_map(self, attributes):
+        super(Sfc_changes, self).update_attributes_map(
+            attributes, extension_attrs_map=RESOURCE_ATTRIBUTE_MAP)
+
+    @classmethod
+    def get_resources(cls):
+        """Returns Ext Resources."""
+        plural_mappings = resource_helper.build_plural_mappings(
+            {}, RESOURCE_ATTRIBUTE_MAP)
+        attr.PLURALS.update(plural_mappings)
+        return resource_helper.build_resource_info(
+            plural_mappings,
+            RESOURCE_ATTRIBUTE_MAP,
+            sfc_ext.SFC_EXT)
+
+    def get_extended_resources(self, version):
+        if version == "2.0":
+            return RESOURCE_ATTRIBUTE_MAP
+        else:
+            return {}
+
+
+@six.add_metaclass(ABCMeta)
+class SfcChangesPluginBase(object):
+
+    @abstractmethod
+    def get_changes(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
+        pass
+
+    @abstractmethod
+    def get_change(self, context, id, fields=None):
+        pass
+
+    def create_change(self, context, change):
+        """The changes are only recorded by the plugins.
+
+        @raise exceptions.BadRequest:
+        """
+        raise neutron_exc.BadRequest(
+            resource='change', msg=_("Changes can not be created."))
+
+    def update_change(self, context, id, change):
+        raise neutron_exc.BadRequest(
+            resource='change', msg=_("Changes can not be updated."))
+
+    def delete_change(self, context, id):
+        raise neutron_exc.BadRequest(
+            resource='change', msg=_("Changes can not be deleted."))
@@ -0,0 +1,198 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Dispatch of the driver calls of the sfc and flow classifier managers.
+
+Every driver call is timed. The latencies are kept in histograms per
+manager, driver and method, and are passed to the metrics hooks
+registered with register_metrics_hook, e.g. by a driver forwarding them
+to a monitoring system.
+"""
+
+import bisect
+import copy
+import sys
+import threading
+
+from eventlet import greenthread
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import six
+
+from neutron import context as n_context
+
+from networking_sfc._i18n import _LE
+
+LOG = logging.getLogger(__name__)
+
+# upper bounds in seconds of the latency histogram buckets, the last
+# bucket counts the slower calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class LatencyHistograms(object):
+    """Latency histograms of the driver calls.
+
+    A histogram is kept per (manager, driver, method) as a dict with the
+    'count' of calls, the 'failures' among them, the 'sum' of their
+    latencies and the call counts of the LATENCY_BUCKETS 'buckets', plus
+    one bucket for the calls slower than the last bound.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def __call__(self, manager, driver, method, seconds, failed):
+        key = (manager, driver, method)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'count': 0,
+                    'failures': 0,
+                    'sum': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            histogram['count'] += 1
+            histogram['failures'] += int(failed)
+            histogram['sum'] += seconds
+            histogram['buckets'][
+                bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def get(self):
+        """Return a copy of the histograms, by (manager, driver, method)."""
+        with self._lock:
+            return dict(
+                (key, dict(histogram, buckets=list(histogram['buckets'])))
+                for key, histogram in six.iteritems(self._histograms))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+LATENCIES = LatencyHistograms()
+
+_metrics_hooks = [LATENCIES]
+
+
+def register_metrics_hook(hook):
+    """Call hook(manager, driver, method, seconds, failed) after each call.
+
+    The hook runs in the thread of the driver call and must not raise.
+    """
+    if hook not in _metrics_hooks:
+        _metrics_hooks.append(hook)
+
+
+def unregister_metrics_hook(hook):
+    if hook in _metrics_hooks:
+        _metrics_hooks.remove(hook)
+
+
+def get_latency_histograms():
+    return LATENCIES.get()
+
+
+def _notify_metrics_hooks(manager, driver, method, seconds, failed):
+    for hook in list(_metrics_hooks):
+        try:
+            hook(manager, driver, method, seconds, failed)
+        except Exception:
+            LOG.exception(_LE("Driver metrics hook %s failed"), hook)
+
+
+def timed_call(manager, driver, method_name, context):
+    """Call method_name of the driver extension and record its latency."""
+    watch = timeutils.StopWatch()
+    watch.start()
+    failed = True
+    try:
+        getattr(driver.obj, method_name)(context)
+        failed = False
+    finally:
+        _notify_metrics_hooks(manager, driver.name, method_name,
+                              watch.elapsed(), failed)
+
+
+def is_independent(driver):
+    """Whether the driver extension can be called alongside the others."""
+    return getattr(driver.obj, 'independent', False) is True
+
+
+def _copy_context(context, plugin_contexts):
+    """Copy the driver context with a plugin context of its own.
+
+    plugin_contexts maps the plugin contexts of the request to their
+    copies, so that the contexts of a bulk call share one session.
+    """
+    plugin_context = getattr(context, '_plugin_context', None)
+    if plugin_context is None:
+        return context
+    if id(plugin_context) not in plugin_contexts:
+        plugin_contexts[id(plugin_context)] = n_context.Context.from_dict(
+            plugin_context.to_dict())
+    context = copy.copy(context)
+    context._plugin_context = plugin_contexts[id(plugin_context)]
+    return context
+
+
+def _thread_context(context):
+    """Driver context, or list of them, for a call in a green thread.
+
+    The session of the request can not be used by several green threads
+    at once, the call gets a copy of the plugin context with a new
+    session.
+    """
+    plugin_contexts = {}
+    if isinstance(context, list):
+        return [_copy_context(item, plugin_contexts) for item in context]
+    return _copy_context(context, plugin_contexts)
+
+
+def call_drivers(drivers, call, method_name, context, parallel=False):
+    """Run call(driver, method_name, context) for every driver extension.
+
+    The drivers are called one after another in their order. With
+    parallel, the drivers marked independent are called in green threads
+    instead, with a plugin context and a session of their own, while the
+    others are still called one after another in their order. The first
+    exception is raised once all the calls are done.
+    """
+    if not parallel:
+        for driver in drivers:
+            call(driver, method_name, context)
+        return
+
+    threads = [
+        greenthread.spawn(call, driver, method_name,
+                          _thread_context(context))
+        for driver in drivers if is_independent(driver)
+    ]
+    error = None
+    try:
+        for driver in drivers:
+            if not is_independent(driver):
+                call(driver, method_name, context)
+    except Exception:
+        error = sys.exc_info()
+    for thread in threads:
+        try:
+            thread.wait()
+        except Exception:
+            if error is None:
+                error = sys.exc_info()
+    if error is not None:
+        six.reraise(*error)
@@ -22,6 +22,22 @@ FLOWCLASSIFIER_DRIVER_OPTS = [
                 help=_("An ordered list of flow classifier drivers "
                        "entrypoints to be loaded from the "
                        "networking_sfc.flowclassifier.drivers namespace.")),
+    cfg.BoolOpt('parallel_driver_calls',
+                default=False,
+                help=_("Call the drivers marked independent concurrently "
+                       "with the other drivers instead of one after "
+                       "another. The other drivers are still called in "
+                       "the order of the drivers option.")),
+    cfg.IntOpt('resource_cache_size',
+               default=1000,
+               help=_("Number of flow classifiers kept in the cache of the "
+                      "resources read by the drivers.")),
+    cfg.IntOpt('resource_cache_ttl',
+               default=0,
+               help=_("Seconds the flow classifiers read by the drivers "
+                      "are kept in the cache. The changes made by other "
+                      "neutron-server processes are only seen once they "
+                      "expire. 0 disables the cache.")),
 ]
 
 
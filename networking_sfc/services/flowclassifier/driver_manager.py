@@ -17,6 +17,7 @@ from oslo_log import log
 import stevedore
 
 from networking_sfc._i18n import _LE, _LI
+from networking_sfc.services import driver_dispatch
 from networking_sfc.services.flowclassifier.common import exceptions as fc_exc
 
 
@@ -24,6 +25,9 @@ LOG = log.getLogger(__name__)
 cfg.CONF.import_opt('drivers',
                     'networking_sfc.services.flowclassifier.common.config',
                     group='flowclassifier')
+cfg.CONF.import_opt('parallel_driver_calls',
+                    'networking_sfc.services.flowclassifier.common.config',
+                    group='flowclassifier')
 
 
 class FlowClassifierDriverManager(stevedore.named.NamedExtensionManager):
@@ -68,6 +72,26 @@ class FlowClassifierDriverManager(stevedore.named.NamedExtensionManager):
             self.native_bulk_support &= getattr(driver.obj,
                                                 'native_bulk_support', True)
 
+    def _call_driver(self, driver, method_name, context,
+                     raise_orig_exc=False):
+        try:
+            driver_dispatch.timed_call(
+                'flowclassifier', driver, method_name, context)
+        except Exception as e:
+            # This is an internal failure.
+            LOG.exception(e)
+            LOG.error(
+                _LE("Flow Classifier driver '%(name)s' "
+                    "failed in %(method)s"),
+                {'name': driver.name, 'method': method_name}
+            )
+            if raise_orig_exc:
+                raise
+            else:
+                raise fc_exc.FlowClassifierDriverError(
+                    method=method_name
+                )
+
     def _call_drivers(self, method_name, context, raise_orig_exc=False):
         """Helper method for calling a method across all drivers.
 
@@ -76,23 +100,16 @@ class FlowClassifierDriverManager(stevedore.named.NamedExtensionManager):
         :param raise_orig_exc: whether or not to raise the original
         driver exception, or use a general one
         """
-        for driver in self.ordered_drivers:
-            try:
-                getattr(driver.obj, method_name)(context)
-            except Exception as e:
-                # This is an internal failure.
-                LOG.exception(e)
-                LOG.error(
-                    _LE("Flow Classifier driver '%(name)s' "
-                        "failed in %(method)s"),
-                    {'name': driver.name, 'method': method_name}
-                )
-                if raise_orig_exc:
-                    raise
-                else:
-                    raise fc_exc.FlowClassifierDriverError(
-                        method=method_name
-                    )
+        if raise_orig_exc:
+            # the precommit calls share the session of the transaction,
+            # they are always called one after another
+            for driver in self.ordered_drivers:
+                self._call_driver(driver, method_name, context,
+                                  raise_orig_exc=True)
+            return
+        driver_dispatch.call_drivers(
+            self.ordered_drivers, self._call_driver, method_name, context,
+            parallel=cfg.CONF.flowclassifier.parallel_driver_calls)
 
     def create_flow_classifier(self, context):
         self._call_drivers("create_flow_classifier", context)
@@ -107,3 +124,14 @@ class FlowClassifierDriverManager(stevedore.named.NamedExtensionManager):
         """Driver precommit before the db transaction committed."""
         self._call_drivers("create_flow_classifier_precommit", context,
                            raise_orig_exc=True)
+
+    def create_flow_classifier_bulk(self, contexts):
+        self._call_drivers("create_flow_classifier_bulk", contexts)
+
+    def delete_flow_classifier_bulk(self, contexts):
+        self._call_drivers("delete_flow_classifier_bulk", contexts)
+
+    def create_flow_classifier_bulk_precommit(self, contexts):
+        """Driver precommit of a bulk create before the db commit."""
+        self._call_drivers("create_flow_classifier_bulk_precommit",
+                           contexts, raise_orig_exc=True)
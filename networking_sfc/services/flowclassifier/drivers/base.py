@@ -20,6 +20,13 @@ import six
 class FlowClassifierDriverBase(object):
     """Flow Classifier Driver Base Class."""
 
+    # whether the driver does not depend on the drivers before it, and
+    # can be called concurrently with them when parallel_driver_calls is
+    # set. It is then called in a green thread with a copy of the
+    # context, whose _plugin_context has a session of its own which only
+    # sees the committed changes.
+    independent = False
+
     @abc.abstractmethod
     def create_flow_classifier(self, context):
         pass
@@ -35,3 +42,15 @@ class FlowClassifierDriverBase(object):
     @abc.abstractmethod
     def create_flow_classifier_precommit(self, context):
         pass
+
+    def create_flow_classifier_bulk_precommit(self, contexts):
+        for context in contexts:
+            self.create_flow_classifier_precommit(context)
+
+    def create_flow_classifier_bulk(self, contexts):
+        for context in contexts:
+            self.create_flow_classifier(context)
+
+    def delete_flow_classifier_bulk(self, contexts):
+        for context in contexts:
+            self.delete_flow_classifier(context)
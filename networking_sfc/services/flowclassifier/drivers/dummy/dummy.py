@@ -19,6 +19,9 @@ from networking_sfc.services.flowclassifier.drivers import base as fc_driver
 
 class DummyDriver(fc_driver.FlowClassifierDriverBase):
     """Flow Classifier Driver Dummy Class."""
+
+    independent = True
+
     def initialize(self):
         pass
 
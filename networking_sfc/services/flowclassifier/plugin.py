@@ -34,17 +34,26 @@ class FlowClassifierPlugin(fc_db.FlowClassifierDbPlugin):
     """Implementation of the Plugin."""
     supported_extension_aliases = [fc_ext.FLOW_CLASSIFIER_EXT]
     path_prefix = fc_ext.FLOW_CLASSIFIER_PREFIX
+    __native_pagination_support = True
+    __native_sorting_support = True
 
     def __init__(self):
         self.driver_manager = fc_driver.FlowClassifierDriverManager()
         super(FlowClassifierPlugin, self).__init__()
         self.driver_manager.initialize()
+        self.__native_bulk_support = self.driver_manager.native_bulk_support
 
     def _get_port(self, context, id):
         port = super(FlowClassifierPlugin, self)._get_port(context, id)
         core_plugin = manager.NeutronManager.get_plugin()
         return core_plugin.get_port(context, port['id'])
 
+    def _get_ports(self, context, ids):
+        core_plugin = manager.NeutronManager.get_plugin()
+        ports = core_plugin.get_ports(context, filters={'id': ids})
+        self._check_ports_found(ids, ports)
+        return ports
+
     @log_helpers.log_method_call
     def create_flow_classifier(self, context, flow_classifier):
         with context.session.begin(subtransactions=True):
@@ -65,6 +74,30 @@ class FlowClassifierPlugin(fc_db.FlowClassifierDbPlugin):
                 self.delete_flow_classifier(context, fc_db['id'])
         return fc_db
 
+    @log_helpers.log_method_call
+    def create_flow_classifier_bulk(self, context, flow_classifiers):
+        with context.session.begin(subtransactions=True):
+            fc_dbs = super(
+                FlowClassifierPlugin, self
+            ).create_flow_classifier_bulk(context, flow_classifiers)
+            fc_db_contexts = [
+                fc_ctx.FlowClassifierContext(self, context, fc_db)
+                for fc_db in fc_dbs]
+            self.driver_manager.create_flow_classifier_bulk_precommit(
+                fc_db_contexts)
+
+        try:
+            self.driver_manager.create_flow_classifier_bulk(fc_db_contexts)
+        except fc_exc.FlowClassifierDriverError as e:
+            LOG.exception(e)
+            with excutils.save_and_reraise_exception():
+                fc_ids = [fc_db['id'] for fc_db in fc_dbs]
+                LOG.error(_LE("Create flow classifiers failed, "
+                              "deleting flow_classifiers %s"),
+                          fc_ids)
+                self.delete_flow_classifier_bulk(context, fc_ids)
+        return fc_dbs
+
     @log_helpers.log_method_call
     def update_flow_classifier(self, context, id, flow_classifier):
         original_flowclassifier = self.get_flow_classifier(context, id)
@@ -101,3 +134,20 @@ class FlowClassifierPlugin(fc_db.FlowClassifierDbPlugin):
 
         super(FlowClassifierPlugin, self).delete_flow_classifier(
             context, fc_id)
+
+    @log_helpers.log_method_call
+    def delete_flow_classifier_bulk(self, context, ids):
+        fcs = self.get_flow_classifiers(context, filters={'id': ids})
+        fc_contexts = [fc_ctx.FlowClassifierContext(self, context, fc)
+                       for fc in fcs]
+        try:
+            self.driver_manager.delete_flow_classifier_bulk(fc_contexts)
+        except fc_exc.FlowClassifierDriverError as e:
+            LOG.exception(e)
+            with excutils.save_and_reraise_exception():
+                LOG.error(_LE("Delete flow classifiers failed, "
+                              "flow_classifiers %s"),
+                          ids)
+
+        super(FlowClassifierPlugin, self).delete_flow_classifier_bulk(
+            context, ids)
@@ -12,13 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
 import six
 import sys
+import time
 
 from neutron_lib import constants as n_const
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_service import loopingcall
 
 from networking_sfc.services.sfc.agent import br_int
 from networking_sfc.services.sfc.agent import br_phys
@@ -36,7 +39,7 @@ from neutron.plugins.ml2.drivers.openvswitch.agent.common import (
     constants as ovs_const)
 from neutron.plugins.ml2.drivers.openvswitch.agent import ovs_neutron_agent
 
-from networking_sfc._i18n import _LE, _LI
+from networking_sfc._i18n import _LE, _LI, _LW
 
 LOG = logging.getLogger(__name__)
 
@@ -62,6 +65,16 @@ INGRESS_TABLE = 10
 PC_DEF_PRI = 20
 PC_INGRESS_PRI = 30
 
+# sfc flows carry SFC_COOKIE_TAG in the high bits of their cookie and a
+# random agent generation in the low bits, so that the flows of a former
+# agent run can be told apart and removed after a restart.
+SFC_COOKIE_TAG = 0x5fc0 << 48
+SFC_COOKIE_MASK = 0xffff << 48
+
+# a flow rule whose path changed is removed before it is installed again
+FLOWRULE_PATH_FIELDS = ('nsp', 'nsi', 'node_type', 'next_group_id',
+                        'next_hops', 'ingress', 'egress')
+
 
 class SfcPluginApi(object):
     def __init__(self, topic, host):
@@ -81,10 +94,28 @@ class SfcPluginApi(object):
             context, 'get_flowrules_by_host_portid',
             host=self.host, port_id=port_id)
 
+    def get_flowrules_by_host_portids(self, context, port_ids):
+        cctxt = self.client.prepare(version='1.1')
+        return cctxt.call(
+            context, 'get_flowrules_by_host_portids',
+            host=self.host, port_ids=port_ids)
+
+    def get_flowrules_by_host(self, context):
+        cctxt = self.client.prepare(version='1.1')
+        return cctxt.call(
+            context, 'get_flowrules_by_host', host=self.host)
+
+    def get_flowrule_changes_by_host(self, context, version):
+        cctxt = self.client.prepare(version='1.2')
+        return cctxt.call(
+            context, 'get_flowrule_changes_by_host',
+            host=self.host, version=version)
+
 
 class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
     # history
     # 1.0 Initial version
+    # 1.1 Add update_flow_rules_batch
     """This class will support MPLS frame
 
     Ethernet + MPLS
@@ -97,11 +128,39 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
     def __init__(self, bridge_classes, conf=None):
 
         """to get network info from ovs agent."""
+        self.sfc_start_time = time.time()
         super(OVSSfcAgent, self).__init__(
             bridge_classes, conf=conf)
 
         self._sfc_setup_rpc()
-        self._clear_sfc_flow_on_int_br()
+        self.sfc_cookie = SFC_COOKIE_TAG | random.getrandbits(48)
+        self.int_br.reserve_cookie(self.sfc_cookie)
+        # conjunctive matches by flow classifier match, with their
+        # conj_id and the flow rules using them, see _get_conj_flow_infos
+        self.sfc_conj_ids = {}
+        # conjunction actions of the clause flows by match, a clause flow
+        # is shared by the conjunctions with the same clause match
+        self.sfc_conj_clauses = {}
+        self.sfc_next_conj_id = 1
+        # the sfc only tables are mirrored by int_br
+        self.int_br.mirrored_tables = (ACROSS_SUBNET_TABLE, INGRESS_TABLE)
+        if cfg.CONF.sfc_agent.drop_flows_on_start:
+            self._clear_sfc_flow_on_int_br()
+        else:
+            # keep forwarding with the flows of the former run until the
+            # current state is installed, see _sfc_cleanup_stale
+            self.int_br.seed_mirror_groups()
+            # the conj_ids of the former run stay in use until then
+            conj_ids = self.int_br.dump_conj_ids(ovs_const.LOCAL_SWITCHING)
+            self.sfc_next_conj_id = max(conj_ids or [0]) + 1
+        self._install_sfc_default_flows()
+        self.sfc_stale_cleaned = False
+        self._sfc_start_audit()
+        # flow rules of the host by (pathnode_id, portpair_id) as of
+        # sfc_flowrules_version, see _sfc_sync_flowrules
+        self.sfc_flowrules = {}
+        self.sfc_flowrules_version = None
+        self._sfc_start_flowrule_sync()
 
     def _sfc_setup_rpc(self):
         self.sfc_plugin_rpc = SfcPluginApi(
@@ -180,14 +239,138 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
                 source_port_masks, destination_port_masks
                 )
 
+    def _sfc_start_audit(self):
+        interval = cfg.CONF.sfc_agent.audit_interval
+        if interval > 0:
+            self.sfc_audit = loopingcall.FixedIntervalLoopingCall(
+                self._sfc_audit_int_br)
+            self.sfc_audit.start(interval=interval)
+
+    def _sfc_start_flowrule_sync(self):
+        interval = cfg.CONF.sfc_agent.flowrule_sync_interval
+        if interval > 0:
+            self.sfc_flowrule_sync = loopingcall.FixedIntervalLoopingCall(
+                self._sfc_sync_flowrules)
+            self.sfc_flowrule_sync.start(interval=interval)
+
+    def _sfc_sync_flowrules(self):
+        """Apply the flow rules of the host changed since the last sync.
+
+        The first sync only records the flow rules, they are installed
+        when their ports are bound.
+        """
+        try:
+            changes = self.sfc_plugin_rpc.get_flowrule_changes_by_host(
+                self.context, self.sfc_flowrules_version)
+        except oslo_messaging.RemoteError as e:
+            if e.exc_type == 'UnsupportedVersion':
+                LOG.warning(_LW("The server can not send flow rule "
+                                "changes, flow rule sync stopped"))
+                raise loopingcall.LoopingCallDone()
+            LOG.exception(e)
+            LOG.error(_LE("sfc flow rule sync failed"))
+            return
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("sfc flow rule sync failed"))
+            return
+
+        flowrules = dict(
+            ((entry['pathnode_id'], entry['portpair_id']), entry['flowrule'])
+            for entry in changes['flowrules'])
+        deleted_keys = [(entry['pathnode_id'], entry['portpair_id'])
+                        for entry in changes['deleted']]
+        if changes['full']:
+            deleted_keys = [key for key in self.sfc_flowrules
+                            if key not in flowrules]
+        if self.sfc_flowrules_version is None:
+            self.sfc_flowrules = flowrules
+            self.sfc_flowrules_version = changes['version']
+            return
+
+        LOG.debug("sfc flow rule sync from version %(old)s to %(new)s: "
+                  "%(changed)d changed, %(deleted)d deleted",
+                  {'old': self.sfc_flowrules_version,
+                   'new': changes['version'],
+                   'changed': len(flowrules),
+                   'deleted': len(deleted_keys)})
+        flowrule_status = []
+        for key in deleted_keys:
+            if key in self.sfc_flowrules:
+                self._delete_synced_flowrule(key, flowrule_status)
+        for key, flowrule in six.iteritems(flowrules):
+            old = self.sfc_flowrules.get(key)
+            del_fcs = []
+            if old is not None:
+                if any(old.get(field) != flowrule.get(field)
+                       for field in FLOWRULE_PATH_FIELDS):
+                    self._delete_synced_flowrule(key, flowrule_status)
+                else:
+                    del_fcs = [fc for fc in old['add_fcs']
+                               if fc not in flowrule['add_fcs']]
+            self._update_flow_rules_with_mpls_enc(
+                dict(flowrule, del_fcs=del_fcs), flowrule_status)
+            self.sfc_flowrules[key] = flowrule
+        self.sfc_flowrules_version = changes['version']
+
+        if flowrule_status:
+            self.sfc_plugin_rpc.update_flowrules_status(
+                self.context, flowrule_status)
+
+    def _delete_synced_flowrule(self, key, flowrule_status):
+        flowrule = self.sfc_flowrules.pop(key)
+        # the group is shared with the other flow rules of the host going
+        # to it, the reference count of the server may be out of date
+        group_refcnt = 1 + sum(
+            1 for other in six.itervalues(self.sfc_flowrules)
+            if other.get('next_group_id') == flowrule.get('next_group_id'))
+        self._delete_flow_rule_with_mpls_enc(
+            dict(flowrule, add_fcs=[], del_fcs=flowrule['add_fcs'],
+                 group_refcnt=group_refcnt),
+            flowrule_status)
+
+    def _sfc_audit_int_br(self):
+        try:
+            self.int_br.audit_mirror()
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("sfc flow audit failed"))
+
     def _clear_sfc_flow_on_int_br(self):
         self.int_br.delete_group(group_id='all')
         self.int_br.delete_flows(table=ACROSS_SUBNET_TABLE)
         self.int_br.delete_flows(table=INGRESS_TABLE)
-        self.int_br.install_goto(dest_table_id=INGRESS_TABLE,
-                                 priority=PC_DEF_PRI,
-                                 dl_type=0x8847)
-        self.int_br.install_drop(table_id=INGRESS_TABLE)
+
+    def _install_sfc_default_flows(self):
+        with self.int_br.bundle(cookie=self.sfc_cookie):
+            self.int_br.install_goto(dest_table_id=INGRESS_TABLE,
+                                     priority=PC_DEF_PRI,
+                                     dl_type=0x8847)
+            self.int_br.install_drop(table_id=INGRESS_TABLE)
+
+    def _sfc_cleanup_stale(self):
+        """Delete the sfc flows and groups left by the former agent run.
+
+        Called once all ports have been processed after the start, the
+        time it took is logged as the reconvergence time.
+        """
+        try:
+            flows = self.int_br.delete_stale_flows(
+                (ovs_const.LOCAL_SWITCHING, ACROSS_SUBNET_TABLE,
+                 INGRESS_TABLE),
+                self.sfc_cookie, SFC_COOKIE_MASK)
+            groups = self.int_br.delete_stale_groups()
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("sfc stale flow cleanup failed"))
+            return
+        self.sfc_stale_cleaned = True
+        self.sfc_reconvergence_time = time.time() - self.sfc_start_time
+        LOG.info(_LI("sfc flows reconverged %(time).3f seconds after agent "
+                     "start, removed %(flows)d stale flow cookies and "
+                     "%(groups)d stale groups"),
+                 {'time': self.sfc_reconvergence_time,
+                  'flows': flows, 'groups': groups})
 
     def _get_flow_infos_from_flow_classifier(self, flow_classifier):
         flow_infos = []
@@ -211,6 +394,16 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
             nw_dst = '0.0.0.0/0.0.0.0'
 
         if source_port_masks and destination_port_masks:
+            threshold = cfg.CONF.sfc_agent.conjunction_threshold
+            if (
+                nw_proto is not None and threshold > 0 and
+                len(source_port_masks) * len(destination_port_masks) >
+                threshold
+            ):
+                return self._get_conj_flow_infos(
+                    dict(dl_type=dl_type, nw_proto=nw_proto,
+                         nw_src=nw_src, nw_dst=nw_dst),
+                    source_port_masks, destination_port_masks)
             for destination_port in destination_port_masks:
                 for source_port in source_port_masks:
                     if nw_proto is None:
@@ -233,6 +426,90 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
 
         return flow_infos
 
+    def _get_conj_flow_infos(self, match, source_port_masks,
+                             destination_port_masks):
+        """Flow infos matching the port masks with a conjunctive match.
+
+        One flow per source mask (clause 1), one per destination mask
+        (clause 2) and a conj_id flow carrying the actions, instead of
+        one flow per pair of masks. conj_key identifies the conjunction
+        by its whole match, the conj_id is assigned when the flows are
+        installed.
+        """
+        conj_key = (tuple(sorted(match.items())), tuple(source_port_masks),
+                    tuple(destination_port_masks))
+        flow_infos = [
+            dict(match, tp_src='%s' % source_port, conj_key=conj_key,
+                 conj_clause=1)
+            for source_port in source_port_masks]
+        flow_infos.extend(
+            dict(match, tp_dst='%s' % destination_port, conj_key=conj_key,
+                 conj_clause=2)
+            for destination_port in destination_port_masks)
+        flow_infos.append(dict(conj_key=conj_key))
+        return flow_infos
+
+    def _add_conj_flows(self, conj_key, owner, priority, clauses, actions):
+        """Install a conjunctive match for the owner flow rule.
+
+        The conj_ids are never reused by an agent run, and start after
+        the ones installed by the former run, so that the flows of both
+        runs do not mix until the stale ones are deleted.
+        """
+        conj = self.sfc_conj_ids.get(conj_key)
+        if conj is None:
+            conj = dict(conj_id=self.sfc_next_conj_id, owners=set())
+            self.sfc_next_conj_id += 1
+            self.sfc_conj_ids[conj_key] = conj
+        conj['owners'].add(owner)
+        for match_info, conj_clause in clauses:
+            self._update_conj_clause(
+                priority, match_info, (conj['conj_id'], conj_clause), True)
+        self.int_br.add_flow(
+            table=ovs_const.LOCAL_SWITCHING, priority=priority,
+            actions=actions, conj_id=conj['conj_id'])
+
+    def _delete_conj_flows(self, conj_key, owner, priority, clauses):
+        """Remove a conjunctive match once no flow rule uses it."""
+        conj = self.sfc_conj_ids.get(conj_key)
+        if conj is None:
+            # installed by a former agent run, the cookie based cleanup
+            # takes care of its flows
+            return
+        conj['owners'].discard(owner)
+        if conj['owners']:
+            return
+        del self.sfc_conj_ids[conj_key]
+        for match_info, conj_clause in clauses:
+            self._update_conj_clause(
+                priority, match_info, (conj['conj_id'], conj_clause), False)
+        self.int_br.delete_flows(
+            table=ovs_const.LOCAL_SWITCHING, conj_id=conj['conj_id'])
+
+    def _update_conj_clause(self, priority, match_info, conjunction, add):
+        """Add or remove a conjunction action of a clause flow.
+
+        The clause flow is deleted with its last conjunction action.
+        """
+        clause_key = (priority, tuple(sorted(match_info.items())))
+        conjunctions = self.sfc_conj_clauses.setdefault(clause_key, set())
+        if add == (conjunction in conjunctions):
+            return
+        if add:
+            conjunctions.add(conjunction)
+        else:
+            conjunctions.discard(conjunction)
+        if conjunctions:
+            self.int_br.add_flow(
+                table=ovs_const.LOCAL_SWITCHING, priority=priority,
+                actions=','.join('conjunction(%d,%d/2)' % item
+                                 for item in sorted(conjunctions)),
+                **match_info)
+        else:
+            del self.sfc_conj_clauses[clause_key]
+            self.int_br.delete_flows(
+                table=ovs_const.LOCAL_SWITCHING, **match_info)
+
     def _get_flow_infos_from_flow_classifier_list(self, flow_classifier_list):
         flow_infos = []
         if not flow_classifier_list:
@@ -257,11 +534,30 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
                 inport_match = dict(in_port=egress_port.ofport)
                 priority = PC_INGRESS_PRI
 
+        # the conjunctions are shared by the flow rules with the same
+        # match, each flow rule egress port holds a reference
+        owner = (flowrule.get('id'), flowrule.get('egress'))
+        clauses = []
         for flow_info in self._get_flow_infos_from_flow_classifier_list(
             flow_classifier_list
         ):
             match_info = dict(inport_match, **flow_info)
-            if add_flow:
+            conj_key = match_info.pop('conj_key', None)
+            conj_clause = match_info.pop('conj_clause', None)
+            if conj_clause:
+                clauses.append((match_info, conj_clause))
+                continue
+            if conj_key is not None:
+                conj_key = (priority, tuple(sorted(inport_match.items())),
+                            conj_key)
+                if add_flow:
+                    self._add_conj_flows(
+                        conj_key, owner, priority, clauses, actions)
+                else:
+                    self._delete_conj_flows(
+                        conj_key, owner, priority, clauses)
+                clauses = []
+            elif add_flow:
                 self.int_br.add_flow(
                     table=ovs_const.LOCAL_SWITCHING,
                     priority=priority,
@@ -321,12 +617,7 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
                     actions="%s" % ','.join(subnet_actions_list))
 
             buckets = ','.join(buckets)
-            group_content = self.int_br.dump_group_for_id(group_id)
-            if group_content.find('group_id=%d' % group_id) == -1:
-                self.int_br.add_group(group_id=group_id,
-                                      type='select', buckets=buckets)
-            else:
-                self.int_br.mod_group(group_id=group_id,
+            self.int_br.install_group(group_id=group_id,
                                       type='select', buckets=buckets)
 
             # 2nd, install br-int flow rule on table 0  for egress traffic
@@ -393,10 +684,12 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
 
     def _update_flow_rules_with_mpls_enc(self, flowrule, flowrule_status):
         try:
-            if flowrule.get('egress', None):
-                self._setup_egress_flow_rules_with_mpls(flowrule)
-            if flowrule.get('ingress', None):
-                self._setup_ingress_flow_rules_with_mpls(flowrule)
+            # all flow and group changes of the flowrule go in one bundle
+            with self.int_br.bundle(cookie=self.sfc_cookie):
+                if flowrule.get('egress', None):
+                    self._setup_egress_flow_rules_with_mpls(flowrule)
+                if flowrule.get('ingress', None):
+                    self._setup_ingress_flow_rules_with_mpls(flowrule)
 
             flowrule_status_temp = {}
             flowrule_status_temp['id'] = flowrule['id']
@@ -438,38 +731,40 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
         try:
             LOG.debug("_delete_flow_rule_with_mpls_enc, flowrule = %s",
                       flowrule)
-
-            # delete tunnel table flow rule on br-int(egress match)
-            if flowrule['egress'] is not None:
-                self._setup_local_switch_flows_on_int_br(
-                    flowrule,
-                    flowrule['del_fcs'],
-                    None,
-                    add_flow=False,
-                    match_inport=True
-                )
-                # delete group table, need to check again
-                group_id = flowrule.get('next_group_id', None)
-                if group_id and flowrule.get('group_refcnt', None) <= 1:
-                    self.int_br.delete_group(group_id=group_id)
-                    for item in flowrule['next_hops']:
-                        self.int_br.delete_flows(
-                            table=ACROSS_SUBNET_TABLE,
-                            dl_dst=item['mac_address'])
-
-            if flowrule['ingress'] is not None:
-                # delete table INGRESS_TABLE ingress match flow rule
-                # on br-int(ingress match)
-                vif_port = self.int_br.get_vif_port_by_id(flowrule['ingress'])
-                if vif_port:
-                    # third, install br-int flow rule on table INGRESS_TABLE
-                    # for ingress traffic
-                    self.int_br.delete_flows(
-                        table=INGRESS_TABLE,
-                        dl_type=0x8847,
-                        dl_dst=vif_port.vif_mac,
-                        mpls_label=flowrule['nsp'] << 8 | (flowrule['nsi'] + 1)
+            with self.int_br.bundle(cookie=self.sfc_cookie):
+                # delete tunnel table flow rule on br-int(egress match)
+                if flowrule['egress'] is not None:
+                    self._setup_local_switch_flows_on_int_br(
+                        flowrule,
+                        flowrule['del_fcs'],
+                        None,
+                        add_flow=False,
+                        match_inport=True
                     )
+                    # delete group table, need to check again
+                    group_id = flowrule.get('next_group_id', None)
+                    if group_id and flowrule.get('group_refcnt', None) <= 1:
+                        self.int_br.delete_group(group_id=group_id)
+                        for item in flowrule['next_hops']:
+                            self.int_br.delete_flows(
+                                table=ACROSS_SUBNET_TABLE,
+                                dl_dst=item['mac_address'])
+
+                if flowrule['ingress'] is not None:
+                    # delete table INGRESS_TABLE ingress match flow rule
+                    # on br-int(ingress match)
+                    vif_port = self.int_br.get_vif_port_by_id(
+                        flowrule['ingress'])
+                    if vif_port:
+                        # third, install br-int flow rule on table
+                        # INGRESS_TABLE for ingress traffic
+                        self.int_br.delete_flows(
+                            table=INGRESS_TABLE,
+                            dl_type=0x8847,
+                            dl_dst=vif_port.vif_mac,
+                            mpls_label=(flowrule['nsp'] << 8 |
+                                        (flowrule['nsi'] + 1))
+                        )
         except Exception as e:
             flowrule_status_temp = {}
             flowrule_status_temp['id'] = flowrule['id']
@@ -496,6 +791,28 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
             self.sfc_plugin_rpc.update_flowrules_status(
                 self.context, flowrule_status)
 
+    def update_flow_rules_batch(self, context, **kwargs):
+        """Apply the ordered flow rule updates and deletes of one cast."""
+        flowrule_status = []
+        try:
+            entries = kwargs['flowrule_entries']
+            LOG.debug("update_flow_rules_batch received, %d flowrules",
+                      len(entries))
+            for entry in entries:
+                if entry['action'] == constants.FLOWRULE_DELETE:
+                    self._delete_flow_rule_with_mpls_enc(
+                        entry['flowrule'], flowrule_status)
+                else:
+                    self._update_flow_rules_with_mpls_enc(
+                        entry['flowrule'], flowrule_status)
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("update_flow_rules_batch failed"))
+
+        if flowrule_status:
+            self.sfc_plugin_rpc.update_flowrules_status(
+                self.context, flowrule_status)
+
     def delete_flow_rules(self, context, **kwargs):
         flowrule_status = []
         try:
@@ -537,6 +854,41 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
 
         return resync
 
+    def sfc_treat_devices_added_updated_batch(self, port_ids):
+        """Install the flow rules of port_ids fetched by one RPC call.
+
+        Falls back to one call per port when the server does not know
+        the bulk call yet.
+        """
+        resync = False
+        flowrule_status = []
+        try:
+            LOG.debug("new devices %s are found", port_ids)
+            flows_list = (
+                self.sfc_plugin_rpc.get_flowrules_by_host_portids(
+                    self.context, port_ids
+                )
+            )
+        except oslo_messaging.RemoteError as e:
+            LOG.warning(_LW("bulk flow rules query failed (%s), falling "
+                            "back to one query per port"), e)
+            for port_id in port_ids:
+                resync |= self.sfc_treat_devices_added_updated(port_id)
+            return resync
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("sfc_treat_devices_added_updated_batch failed"))
+            return True
+
+        for flow in flows_list or []:
+            self._update_flow_rules_with_mpls_enc(flow, flowrule_status)
+
+        if flowrule_status:
+            self.sfc_plugin_rpc.update_flowrules_status(
+                self.context, flowrule_status)
+
+        return resync
+
     def sfc_treat_devices_removed(self, port_ids):
         resync = False
         for port_id in port_ids:
@@ -555,11 +907,14 @@ class OVSSfcAgent(ovs_neutron_agent.OVSNeutronAgent):
 
     def _bind_devices(self, need_binding_ports):
         ret = super(OVSSfcAgent, self)._bind_devices(need_binding_ports)
-        for port_detail in need_binding_ports:
-            if 'port_id' in port_detail:
-                self.sfc_treat_devices_added_updated(
-                    port_detail['port_id']
-                )
+        resync = False
+        port_ids = [port_detail['port_id']
+                    for port_detail in need_binding_ports
+                    if 'port_id' in port_detail]
+        if port_ids:
+            resync = self.sfc_treat_devices_added_updated_batch(port_ids)
+        if not self.sfc_stale_cleaned and not resync:
+            self._sfc_cleanup_stale()
         return ret
 
     def process_deleted_ports(self, port_info):
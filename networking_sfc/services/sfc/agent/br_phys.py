@@ -32,3 +32,6 @@ class OVSPhysicalBridge(br_phys.OVSPhysicalBridge, ovs_ext_lib.OVSBridgeExt):
     def run_ofctl(self, cmd, args, process_input=None):
         return ovs_ext_lib.OVSBridgeExt.run_ofctl(
             self, cmd, args, process_input=process_input)
+
+    def do_action_flows(self, action, kwargs_list):
+        ovs_ext_lib.OVSBridgeExt.do_action_flows(self, action, kwargs_list)
@@ -36,6 +36,9 @@ class OVSTunnelBridge(br_tun.OVSTunnelBridge, ovs_ext_lib.OVSBridgeExt):
         return ovs_ext_lib.OVSBridgeExt.run_ofctl(
             self, cmd, args, process_input=process_input)
 
+    def do_action_flows(self, action, kwargs_list):
+        ovs_ext_lib.OVSBridgeExt.do_action_flows(self, action, kwargs_list)
+
     def install_flood_to_tun(self, vlan, tun_id, ports, deferred_br=None):
         br = deferred_br if deferred_br else self
         br.add_flow(
@@ -22,7 +22,109 @@ SFC_DRIVER_OPTS = [
                 help=_("An ordered list of service chain drivers "
                        "entrypoints to be loaded from the "
                        "networking_sfc.sfc.drivers namespace.")),
+    cfg.BoolOpt('async_driver_calls',
+                default=False,
+                help=_("Return port chain create, update and delete "
+                       "requests once the database is changed, with the "
+                       "port chain in a PENDING_* status, and run the "
+                       "driver calls in the background. The status then "
+                       "becomes ACTIVE or ERROR.")),
+    cfg.IntOpt('journal_sync_interval',
+               default=5,
+               help=_("Seconds between runs of the journal of background "
+                      "driver calls, used when async_driver_calls is "
+                      "set. The journal also runs right after each "
+                      "request recording a call.")),
+    cfg.BoolOpt('parallel_driver_calls',
+                default=False,
+                help=_("Call the drivers marked independent concurrently "
+                       "with the other drivers instead of one after "
+                       "another. The other drivers are still called in "
+                       "the order of the drivers option.")),
+    cfg.IntOpt('resource_cache_size',
+               default=1000,
+               help=_("Number of port pairs and port pair groups kept "
+                      "in the cache of the resources read by the "
+                      "drivers.")),
+    cfg.IntOpt('resource_cache_ttl',
+               default=0,
+               help=_("Seconds the port pairs and port pair groups read "
+                      "by the drivers are kept in the cache. The changes "
+                      "made by other neutron-server processes are only "
+                      "seen once they expire. 0 disables the cache.")),
+    cfg.BoolOpt('check_port_chain_conflicts',
+                default=False,
+                help=_("Reject the port chains with the same port pair "
+                       "groups as another port chain, or with a flow "
+                       "classifier that may match the same packets as a "
+                       "flow classifier of another port chain whatever "
+                       "their logical ports.")),
+    cfg.IntOpt('change_feed_compaction_delay',
+               default=300,
+               help=_("Seconds a change of the SFC change feed is kept "
+                      "once a later change of its resource is recorded. "
+                      "The feed is compacted at most once per delay.")),
+    cfg.IntOpt('change_feed_retention',
+               default=86400,
+               help=_("Seconds a change of the SFC change feed is kept. "
+                      "The consumers asking for older changes have to "
+                      "list the resources again.")),
+    cfg.IntOpt('change_feed_settle_time',
+               default=10,
+               help=_("Seconds a change of the SFC change feed is hidden "
+                      "once recorded. The ids of the changes are given in "
+                      "the order they are recorded, not in the order their "
+                      "transactions commit, so a change is only listed "
+                      "once the transactions recording the previous "
+                      "changes are over. It has to be longer than the "
+                      "transactions changing the resources.")),
+]
+
+
+SFC_AGENT_OPTS = [
+    cfg.StrOpt('of_backend',
+               default='ovs-ofctl',
+               choices=['ovs-ofctl', 'native'],
+               help=_("How the sfc agent programs OpenFlow rules. "
+                      "'ovs-ofctl' spawns ovs-ofctl for every request, "
+                      "'native' keeps one OpenFlow 1.3 connection per "
+                      "bridge and falls back to ovs-ofctl for rules it "
+                      "can not encode, or when the connection fails. "
+                      "'native' needs write access to the root owned "
+                      "<bridge>.mgmt sockets of ovs_rundir.")),
+    cfg.StrOpt('ovs_rundir',
+               default='/var/run/openvswitch',
+               help=_("Directory holding the <bridge>.mgmt sockets used "
+                      "by the native OpenFlow backend.")),
+    cfg.IntOpt('of_request_timeout',
+               default=10,
+               help=_("Timeout in seconds for the native OpenFlow "
+                      "backend to connect and to get a barrier reply.")),
+    cfg.BoolOpt('drop_flows_on_start',
+                default=False,
+                help=_("Delete all sfc groups and flows when the agent "
+                       "starts. By default they are kept forwarding, "
+                       "reinstalled under a new cookie and only the stale "
+                       "ones are deleted once the agent has resynced.")),
+    cfg.IntOpt('conjunction_threshold',
+               default=16,
+               help=_("Classify with an OpenFlow conjunctive match when "
+                      "the source and destination port masks of a flow "
+                      "classifier would need more flows than this as a "
+                      "cross product. 0 always uses the cross product.")),
+    cfg.IntOpt('audit_interval',
+               default=0,
+               help=_("Seconds between audits of the sfc groups and flows "
+                      "on br-int against the agent's local copy; missing "
+                      "entries are reinstalled. 0 disables the audit.")),
+    cfg.IntOpt('flowrule_sync_interval',
+               default=0,
+               help=_("Seconds between resyncs of the flow rules of the "
+                      "host with the server. Only the flow rules changed "
+                      "since the former resync are fetched and applied. "
+                      "0 disables the resync.")),
 ]
 
 
 cfg.CONF.register_opts(SFC_DRIVER_OPTS, "sfc")
+cfg.CONF.register_opts(SFC_AGENT_OPTS, "sfc_agent")
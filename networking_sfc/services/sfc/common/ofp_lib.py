@@ -0,0 +1,683 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Minimal OpenFlow 1.3 encoder and persistent switch channel.
+
+Only the subset of matches and actions used by the sfc agent (and the
+neutron base flows it shares bridges with) is supported. Anything else
+raises UnsupportedFlow so the caller can fall back to ovs-ofctl.
+"""
+
+import itertools
+import socket
+import struct
+import threading
+
+import six
+
+from oslo_log import log as logging
+
+from networking_sfc._i18n import _, _LW
+
+LOG = logging.getLogger(__name__)
+
+OFP_VERSION = 0x04
+OFP_HEADER = struct.Struct('!BBHI')
+
+OFPT_HELLO = 0
+OFPT_ERROR = 1
+OFPT_ECHO_REQUEST = 2
+OFPT_ECHO_REPLY = 3
+OFPT_EXPERIMENTER = 4
+OFPT_FLOW_MOD = 14
+OFPT_GROUP_MOD = 15
+OFPT_MULTIPART_REQUEST = 18
+OFPT_MULTIPART_REPLY = 19
+OFPT_BARRIER_REQUEST = 20
+OFPT_BARRIER_REPLY = 21
+
+OFPFC_ADD = 0
+OFPFC_MODIFY = 1
+OFPFC_DELETE = 3
+
+OFPGC_ADD = 0
+OFPGC_MODIFY = 1
+OFPGC_DELETE = 2
+
+OFPGT_ALL = 0
+OFPGT_SELECT = 1
+OFPGT_INDIRECT = 2
+OFPGT_FF = 3
+
+OFPP_IN_PORT = 0xfffffff8
+OFPP_NORMAL = 0xfffffffa
+OFPP_FLOOD = 0xfffffffb
+OFPP_ALL = 0xfffffffc
+OFPP_LOCAL = 0xfffffffe
+OFPP_ANY = 0xffffffff
+OFPG_ALL = 0xfffffffc
+OFPG_ANY = 0xffffffff
+OFPTT_ALL = 0xff
+OFP_NO_BUFFER = 0xffffffff
+OFPVID_PRESENT = 0x1000
+
+OFPET_BAD_REQUEST = 1
+OFPBRC_BAD_TYPE = 1
+OFPBRC_BAD_EXPERIMENTER = 3
+OFPBRC_BAD_EXP_TYPE = 4
+
+OFPIT_GOTO_TABLE = 1
+OFPIT_APPLY_ACTIONS = 4
+
+OFPAT_OUTPUT = 0
+OFPAT_SET_MPLS_TTL = 15
+OFPAT_PUSH_VLAN = 17
+OFPAT_POP_VLAN = 18
+OFPAT_PUSH_MPLS = 19
+OFPAT_POP_MPLS = 20
+OFPAT_GROUP = 22
+OFPAT_SET_FIELD = 25
+OFPAT_EXPERIMENTER = 0xffff
+
+NX_VENDOR_ID = 0x00002320
+NXAST_RESUBMIT_TABLE = 14
+NXAST_CONJUNCTION = 34
+
+ONF_VENDOR_ID = 0x4f4e4600
+ONF_ET_BUNDLE_CONTROL = 2300
+ONF_ET_BUNDLE_ADD_MESSAGE = 2301
+ONF_BCT_OPEN_REQUEST = 0
+ONF_BCT_COMMIT_REQUEST = 4
+ONF_BCT_DISCARD_REQUEST = 6
+ONF_BF_ATOMIC = 1
+ONF_BF_ORDERED = 2
+
+OFPXMC_NXM_1 = 0x0001
+OFPXMC_OPENFLOW_BASIC = 0x8000
+
+# ofctl field name: (oxm class, oxm field, length, encoder type)
+_OXM_FIELDS = [
+    ('in_port', (OFPXMC_OPENFLOW_BASIC, 0, 4, 'int')),
+    ('dl_dst', (OFPXMC_OPENFLOW_BASIC, 3, 6, 'mac')),
+    ('dl_src', (OFPXMC_OPENFLOW_BASIC, 4, 6, 'mac')),
+    ('dl_type', (OFPXMC_OPENFLOW_BASIC, 5, 2, 'int')),
+    ('dl_vlan', (OFPXMC_OPENFLOW_BASIC, 6, 2, 'vlan')),
+    ('nw_proto', (OFPXMC_OPENFLOW_BASIC, 10, 1, 'int')),
+    ('nw_src', (OFPXMC_OPENFLOW_BASIC, 11, 4, 'ipv4')),
+    ('nw_dst', (OFPXMC_OPENFLOW_BASIC, 12, 4, 'ipv4')),
+    ('tcp_src', (OFPXMC_OPENFLOW_BASIC, 13, 2, 'int')),
+    ('tcp_dst', (OFPXMC_OPENFLOW_BASIC, 14, 2, 'int')),
+    ('udp_src', (OFPXMC_OPENFLOW_BASIC, 15, 2, 'int')),
+    ('udp_dst', (OFPXMC_OPENFLOW_BASIC, 16, 2, 'int')),
+    ('mpls_label', (OFPXMC_OPENFLOW_BASIC, 34, 4, 'int')),
+    ('tun_id', (OFPXMC_OPENFLOW_BASIC, 38, 8, 'int')),
+    ('conj_id', (OFPXMC_NXM_1, 37, 4, 'int')),
+]
+_OXM_FIELD_MAP = dict(_OXM_FIELDS)
+
+_PROTO_SHORTHANDS = {
+    'ip': {'dl_type': 0x0800},
+    'arp': {'dl_type': 0x0806},
+    'icmp': {'dl_type': 0x0800, 'nw_proto': 1},
+    'tcp': {'dl_type': 0x0800, 'nw_proto': 6},
+    'udp': {'dl_type': 0x0800, 'nw_proto': 17},
+    'mpls': {'dl_type': 0x8847},
+}
+
+_TP_FIELDS = {6: ('tcp_src', 'tcp_dst'), 17: ('udp_src', 'udp_dst')}
+
+_NAMED_PORTS = {
+    'in_port': OFPP_IN_PORT,
+    'normal': OFPP_NORMAL,
+    'flood': OFPP_FLOOD,
+    'all': OFPP_ALL,
+    'local': OFPP_LOCAL,
+}
+
+_GROUP_TYPES = {
+    'all': OFPGT_ALL,
+    'select': OFPGT_SELECT,
+    'indirect': OFPGT_INDIRECT,
+    'fast_failover': OFPGT_FF,
+}
+
+_FLOW_COMMANDS = {'add': OFPFC_ADD, 'mod': OFPFC_MODIFY, 'del': OFPFC_DELETE}
+_GROUP_COMMANDS = {'add': OFPGC_ADD, 'mod': OFPGC_MODIFY, 'del': OFPGC_DELETE}
+
+UINT64_MAX = 0xffffffffffffffff
+
+
+class UnsupportedFlow(Exception):
+    """The flow can not be expressed by this encoder."""
+
+
+class OpenFlowError(Exception):
+    """The switch rejected a request or the channel failed."""
+
+
+class OpenFlowRejected(OpenFlowError):
+    """The switch answered a request with an error."""
+
+
+class BundleUnsupported(OpenFlowError):
+    """The switch does not support the ONF bundle extension."""
+
+
+def _pad8(data):
+    return data + b'\x00' * (-len(data) % 8)
+
+
+def _to_int(value):
+    if isinstance(value, six.integer_types):
+        return value
+    return int(str(value).strip(), 0)
+
+
+def _split_masked(value):
+    value = str(value)
+    if '/' in value:
+        return value.split('/', 1)
+    return value, None
+
+
+def _encode_mac(value):
+    parts = value.split(':')
+    if len(parts) != 6:
+        raise UnsupportedFlow(_("Invalid MAC address %s") % value)
+    return struct.pack('!6B', *[int(p, 16) for p in parts])
+
+
+def _encode_ipv4(value):
+    try:
+        return socket.inet_aton(value)
+    except (socket.error, TypeError):
+        raise UnsupportedFlow(_("Invalid IPv4 address %s") % value)
+
+
+def _ipv4_mask(mask):
+    if '.' in mask:
+        return _encode_ipv4(mask)
+    bits = int(mask)
+    return struct.pack('!I', (UINT64_MAX << (32 - bits)) & 0xffffffff)
+
+
+def _encode_oxm(name, value):
+    oxm_class, oxm_field, length, kind = _OXM_FIELD_MAP[name]
+    mask = None
+    if kind == 'int':
+        val, msk = _split_masked(value)
+        val = _to_int(val)
+        fmt = {1: '!B', 2: '!H', 4: '!I', 8: '!Q'}[length]
+        data = struct.pack(fmt, val & ((1 << (length * 8)) - 1))
+        if msk is not None:
+            mask = struct.pack(
+                fmt, _to_int(msk) & ((1 << (length * 8)) - 1))
+    elif kind == 'vlan':
+        data = struct.pack('!H', _to_int(value) | OFPVID_PRESENT)
+    elif kind == 'mac':
+        val, msk = _split_masked(value)
+        data = _encode_mac(val)
+        if msk is not None:
+            mask = _encode_mac(msk)
+    else:
+        val, msk = _split_masked(value)
+        data = _encode_ipv4(val)
+        if msk is not None:
+            mask = _ipv4_mask(msk)
+    if mask is not None:
+        if not mask.strip(b'\x00'):
+            # fully wildcarded, the field does not need to be matched
+            return b''
+        if mask == b'\xff' * length:
+            mask = None
+    has_mask = 1 if mask is not None else 0
+    header = ((oxm_class << 16) | (oxm_field << 9) | (has_mask << 8) |
+              (length * (1 + has_mask)))
+    return struct.pack('!I', header) + data + (mask or b'')
+
+
+def encode_match(match):
+    """Encode an ofctl style match dict into an OXM ofp_match."""
+    match = dict(match)
+    proto = match.pop('proto', None)
+    if proto is not None:
+        if proto not in _PROTO_SHORTHANDS:
+            raise UnsupportedFlow(_("Unsupported protocol %s") % proto)
+        for key, value in six.iteritems(_PROTO_SHORTHANDS[proto]):
+            match.setdefault(key, value)
+    nw_proto = match.get('nw_proto')
+    for key in ('tp_src', 'tp_dst'):
+        if key not in match:
+            continue
+        value = match.pop(key)
+        if nw_proto is None:
+            raise UnsupportedFlow(_("%s requires nw_proto") % key)
+        fields = _TP_FIELDS.get(_to_int(nw_proto))
+        if not fields:
+            raise UnsupportedFlow(_("%s requires tcp or udp") % key)
+        match[fields[0] if key == 'tp_src' else fields[1]] = value
+    unknown = set(match) - set(_OXM_FIELD_MAP)
+    if unknown:
+        raise UnsupportedFlow(_("Unsupported match fields %s") %
+                              sorted(unknown))
+    oxms = b''.join(_encode_oxm(name, match[name])
+                    for name, _spec in _OXM_FIELDS if name in match)
+    return _pad8(struct.pack('!HH', 1, 4 + len(oxms)) + oxms)
+
+
+def _split_actions(actions):
+    """Split an ofctl action string on the top level commas."""
+    result = []
+    depth = 0
+    current = []
+    for char in actions:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            result.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    result.append(''.join(current).strip())
+    return [action for action in result if action]
+
+
+def _action_output(port):
+    return struct.pack('!HHIH6x', OFPAT_OUTPUT, 16, port, 0)
+
+
+def _action_ethertype(action_type, ethertype):
+    return struct.pack('!HHH2x', action_type, 8, _to_int(ethertype))
+
+
+def _action_set_field(name, value):
+    oxm = _encode_oxm(name, value)
+    return _pad8(struct.pack('!HH', OFPAT_SET_FIELD,
+                             len(_pad8(b'\x00' * 4 + oxm))) + oxm)
+
+
+def _action_nx(subtype, body):
+    data = struct.pack('!IH', NX_VENDOR_ID, subtype) + body
+    return _pad8(struct.pack('!HH', OFPAT_EXPERIMENTER,
+                             len(_pad8(b'\x00' * 4 + data))) + data)
+
+
+def _parse_port(value):
+    value = value.strip().lower()
+    if value in _NAMED_PORTS:
+        return _NAMED_PORTS[value]
+    return _to_int(value)
+
+
+def encode_actions(actions, has_vlan=False):
+    """Encode an ofctl action string into OpenFlow 1.3 instructions."""
+    apply_actions = []
+    goto_table = None
+    for action in _split_actions(actions or ''):
+        name, sep, arg = action.partition(':')
+        name = name.strip().lower()
+        if action.lower() == 'drop':
+            continue
+        elif not sep and name in _NAMED_PORTS:
+            apply_actions.append(_action_output(_NAMED_PORTS[name]))
+        elif name == 'output':
+            apply_actions.append(_action_output(_parse_port(arg)))
+        elif name == 'group':
+            apply_actions.append(
+                struct.pack('!HHI', OFPAT_GROUP, 8, _to_int(arg)))
+        elif name == 'goto_table':
+            goto_table = _to_int(arg)
+        elif name.startswith('resubmit'):
+            if sep:
+                port, table = arg, ''
+            else:
+                args = name[len('resubmit'):].strip('()').split(',')
+                if len(args) != 2:
+                    raise UnsupportedFlow(_("Invalid action %s") % action)
+                port, table = args
+            port = _parse_port(port) & 0xffff if port.strip() else 0xfff8
+            table = _to_int(table) if table.strip() else 0xff
+            apply_actions.append(_action_nx(
+                NXAST_RESUBMIT_TABLE, struct.pack('!HB3x', port, table)))
+        elif name.startswith('conjunction'):
+            args = name[len('conjunction'):].strip('()').split(',')
+            clause, n_clauses = args[1].split('/')
+            apply_actions.append(_action_nx(
+                NXAST_CONJUNCTION,
+                struct.pack('!BBI', _to_int(clause) - 1,
+                            _to_int(n_clauses), _to_int(args[0]))))
+        elif name == 'push_mpls':
+            apply_actions.append(_action_ethertype(OFPAT_PUSH_MPLS, arg))
+        elif name == 'pop_mpls':
+            apply_actions.append(_action_ethertype(OFPAT_POP_MPLS, arg))
+        elif name == 'set_mpls_label':
+            apply_actions.append(_action_set_field('mpls_label', arg))
+        elif name == 'set_mpls_ttl':
+            apply_actions.append(struct.pack(
+                '!HHB3x', OFPAT_SET_MPLS_TTL, 8, _to_int(arg)))
+        elif name == 'push_vlan':
+            apply_actions.append(_action_ethertype(OFPAT_PUSH_VLAN, arg))
+            has_vlan = True
+        elif name in ('strip_vlan', 'pop_vlan'):
+            apply_actions.append(struct.pack('!HH4x', OFPAT_POP_VLAN, 8))
+            has_vlan = False
+        elif name == 'mod_vlan_vid':
+            # same as ovs-ofctl: push a tag first when the packet has none
+            if not has_vlan:
+                apply_actions.append(
+                    _action_ethertype(OFPAT_PUSH_VLAN, 0x8100))
+                has_vlan = True
+            apply_actions.append(_action_set_field('dl_vlan', arg))
+        elif name == 'mod_dl_dst':
+            apply_actions.append(_action_set_field('dl_dst', arg.strip()))
+        elif name == 'mod_dl_src':
+            apply_actions.append(_action_set_field('dl_src', arg.strip()))
+        elif name in ('set_tunnel', 'set_tunnel64'):
+            apply_actions.append(_action_set_field('tun_id', arg))
+        else:
+            raise UnsupportedFlow(_("Unsupported action %s") % action)
+
+    instructions = b''
+    if apply_actions:
+        body = b''.join(apply_actions)
+        instructions += struct.pack(
+            '!HH4x', OFPIT_APPLY_ACTIONS, 8 + len(body)) + body
+    if goto_table is not None:
+        instructions += struct.pack('!HHB3x', OFPIT_GOTO_TABLE, 8,
+                                    goto_table)
+    return instructions
+
+
+def _header(msg_type, length, xid):
+    return OFP_HEADER.pack(OFP_VERSION, msg_type, length, xid)
+
+
+def _message(msg_type, body, xid=0):
+    return _header(msg_type, OFP_HEADER.size + len(body), xid) + body
+
+
+def encode_flow_mod(action, flow):
+    """Encode an ofctl style flow dict into an OFPT_FLOW_MOD message.
+
+    :param action: 'add', 'mod' or 'del', as for ovs-ofctl *-flows
+    :param flow: the kwargs accepted by OVSBridge.add_flow/delete_flows
+    """
+    if action not in _FLOW_COMMANDS:
+        raise UnsupportedFlow(_("Unsupported flow action %s") % action)
+    flow = dict(flow)
+    table = flow.pop('table', flow.pop('table_id', None))
+    priority = flow.pop('priority', None)
+    idle_timeout = _to_int(flow.pop('idle_timeout', 0))
+    hard_timeout = _to_int(flow.pop('hard_timeout', 0))
+    actions = flow.pop('actions', None)
+    cookie, cookie_mask = _split_masked(flow.pop('cookie', 0))
+    cookie = _to_int(cookie)
+    cookie_mask = (_to_int(cookie_mask) & UINT64_MAX
+                   if cookie_mask is not None else 0)
+    if action == 'del':
+        if actions is not None:
+            raise UnsupportedFlow(_("Actions are not allowed on delete"))
+        if priority is not None:
+            raise UnsupportedFlow(_("Priority is not allowed on delete"))
+        if cookie and not cookie_mask:
+            cookie_mask = UINT64_MAX
+        table = OFPTT_ALL if table is None else _to_int(table)
+    else:
+        if actions is None:
+            raise UnsupportedFlow(_("Actions are required"))
+        if action == 'mod' and priority is not None:
+            raise UnsupportedFlow(_("Priority is not allowed on modify"))
+        table = 0 if table is None else _to_int(table)
+
+    # same default as ovs_lib._build_flow_expr_str
+    priority = 1 if priority is None else _to_int(priority)
+    match = encode_match(flow)
+    instructions = b''
+    if action != 'del':
+        instructions = encode_actions(actions, has_vlan='dl_vlan' in flow)
+    body = struct.pack(
+        '!QQBBHHHIIIH2x', cookie, cookie_mask, table,
+        _FLOW_COMMANDS[action], idle_timeout, hard_timeout, priority,
+        OFP_NO_BUFFER, OFPP_ANY, OFPG_ANY, 0) + match + instructions
+    return _message(OFPT_FLOW_MOD, body)
+
+
+def _encode_buckets(buckets):
+    result = b''
+    for bucket in buckets.split('bucket=')[1:]:
+        weight = 0
+        actions = []
+        for item in _split_actions(bucket):
+            if item.startswith('weight='):
+                weight = _to_int(item[len('weight='):])
+            elif item.startswith('actions='):
+                actions.append(item[len('actions='):])
+            else:
+                actions.append(item)
+        instructions = encode_actions(','.join(actions))
+        # buckets carry a bare action list, drop the instruction header
+        action_list = instructions[8:] if instructions else b''
+        if instructions and struct.unpack(
+                '!H', instructions[:2])[0] != OFPIT_APPLY_ACTIONS:
+            raise UnsupportedFlow(_("goto_table is not allowed in buckets"))
+        result += struct.pack('!HHII4x', 16 + len(action_list), weight,
+                              OFPP_ANY, OFPG_ANY) + action_list
+    return result
+
+
+def encode_group_mod(action, group):
+    """Encode an ofctl style group dict into an OFPT_GROUP_MOD message."""
+    if action not in _GROUP_COMMANDS:
+        raise UnsupportedFlow(_("Unsupported group action %s") % action)
+    group = dict(group)
+    group_id = group.pop('group_id', None)
+    group_type = group.pop('type', 'all')
+    buckets = group.pop('buckets', '')
+    if group:
+        raise UnsupportedFlow(_("Unsupported group fields %s") %
+                              sorted(group))
+    if group_id is None:
+        raise UnsupportedFlow(_("Must specify one group Id"))
+    if str(group_id) == 'all':
+        group_id = OFPG_ALL
+    if group_type not in _GROUP_TYPES:
+        raise UnsupportedFlow(_("Unsupported group type %s") % group_type)
+    body = struct.pack('!HBxI', _GROUP_COMMANDS[action],
+                       _GROUP_TYPES[group_type], _to_int(group_id))
+    if action != 'del':
+        body += _encode_buckets(buckets)
+    return _message(OFPT_GROUP_MOD, body)
+
+
+def encode_bundle_control(bundle_id, control_type,
+                          flags=ONF_BF_ATOMIC | ONF_BF_ORDERED):
+    """Encode an ONF bundle control message (OpenFlow 1.3 extension)."""
+    body = struct.pack('!IIIHH', ONF_VENDOR_ID, ONF_ET_BUNDLE_CONTROL,
+                       bundle_id, control_type, flags)
+    return _message(OFPT_EXPERIMENTER, body)
+
+
+def encode_bundle_add(bundle_id, message, xid,
+                      flags=ONF_BF_ATOMIC | ONF_BF_ORDERED):
+    """Wrap a message into an ONF bundle add message.
+
+    The xid of the wrapped message has to match the outer one.
+    """
+    body = struct.pack('!IIIHH', ONF_VENDOR_ID, ONF_ET_BUNDLE_ADD_MESSAGE,
+                       bundle_id, 0, flags) + message
+    return _message(OFPT_EXPERIMENTER, body, xid)
+
+
+class OpenFlowChannel(object):
+    """A long-lived OpenFlow 1.3 connection to one switch.
+
+    The target uses the ovs-ofctl syntax, e.g.
+    unix:/var/run/openvswitch/br-int.mgmt or tcp:127.0.0.1:6653.
+    """
+
+    def __init__(self, target, timeout=10):
+        self.target = target
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self._xids = itertools.count(1)
+        self._bundle_ids = itertools.count(1)
+
+    def _open_socket(self):
+        proto, _sep, address = self.target.partition(':')
+        if proto == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        elif proto == 'tcp':
+            host, _sep, port = address.rpartition(':')
+            address = (host, int(port))
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        else:
+            raise OpenFlowError(_("Unsupported target %s") % self.target)
+        sock.settimeout(self.timeout)
+        sock.connect(address)
+        return sock
+
+    def _recv_exact(self, length):
+        data = b''
+        while len(data) < length:
+            chunk = self._sock.recv(length - len(data))
+            if not chunk:
+                raise OpenFlowError(_("Connection to %s closed") %
+                                    self.target)
+            data += chunk
+        return data
+
+    def _recv_message(self):
+        header = self._recv_exact(OFP_HEADER.size)
+        version, msg_type, length, xid = OFP_HEADER.unpack(header)
+        body = self._recv_exact(length - OFP_HEADER.size)
+        return version, msg_type, xid, body
+
+    def connect(self):
+        self._sock = self._open_socket()
+        try:
+            self._sock.sendall(_message(OFPT_HELLO, b'', next(self._xids)))
+            version, msg_type, xid, body = self._recv_message()
+            if msg_type != OFPT_HELLO or version < OFP_VERSION:
+                raise OpenFlowError(
+                    _("%s does not speak OpenFlow 1.3") % self.target)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except socket.error:
+                pass
+            self._sock = None
+
+    def _stamp(self, message, xids):
+        xid = next(self._xids)
+        xids.add(xid)
+        return message[:4] + struct.pack('!I', xid) + message[8:], xid
+
+    def _transact(self, messages, xids):
+        """Send stamped messages and a barrier, return the errors."""
+        barrier_xid = next(self._xids)
+        self._sock.sendall(b''.join(messages) +
+                           _message(OFPT_BARRIER_REQUEST, b'', barrier_xid))
+        errors = []
+        while True:
+            version, msg_type, xid, body = self._recv_message()
+            if msg_type == OFPT_ECHO_REQUEST:
+                self._sock.sendall(_message(OFPT_ECHO_REPLY, body, xid))
+            elif msg_type == OFPT_ERROR and xid in xids:
+                err_type, err_code = struct.unpack('!HH', body[:4])
+                errors.append((xid, err_type, err_code))
+            elif msg_type == OFPT_BARRIER_REPLY and xid == barrier_xid:
+                return errors
+
+    def _send_messages(self, messages):
+        xids = set()
+        return self._transact(
+            [self._stamp(message, xids)[0] for message in messages], xids)
+
+    def _send_bundle(self, messages):
+        """Open a bundle, add the messages and commit it atomically.
+
+        The bundle is discarded without commit if any message is rejected
+        while being added, so the switch state is left untouched.
+        """
+        bundle_id = next(self._bundle_ids) & 0xffffffff
+        xids = set()
+        open_request, open_xid = self._stamp(encode_bundle_control(
+            bundle_id, ONF_BCT_OPEN_REQUEST), xids)
+        data = [open_request]
+        for message in messages:
+            inner, xid = self._stamp(message, xids)
+            data.append(encode_bundle_add(bundle_id, inner, xid))
+        errors = self._transact(data, xids)
+        if [error for error in errors
+                if error[0] == open_xid and error[1] == OFPET_BAD_REQUEST and
+                error[2] in (OFPBRC_BAD_TYPE, OFPBRC_BAD_EXPERIMENTER,
+                             OFPBRC_BAD_EXP_TYPE)]:
+            # no bundle was opened, so there is nothing to discard
+            raise BundleUnsupported(
+                _("%s does not support bundles") % self.target)
+        control = (ONF_BCT_DISCARD_REQUEST if errors
+                   else ONF_BCT_COMMIT_REQUEST)
+        xids_commit = set()
+        commit = self._stamp(encode_bundle_control(bundle_id, control),
+                             xids_commit)[0]
+        commit_errors = self._transact([commit], xids_commit)
+        return errors or commit_errors
+
+    def send(self, messages, bundle=False):
+        """Send messages followed by a barrier and wait for the reply.
+
+        :param bundle: apply all messages in one atomic bundle
+        :raises OpenFlowRejected: if the switch rejects any of the messages
+        :raises BundleUnsupported: if bundle is set and the switch does not
+                                   support bundles
+        :raises OpenFlowError: if the channel can not be (re)established
+        """
+        if not messages:
+            return
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    if bundle:
+                        errors = self._send_bundle(messages)
+                    else:
+                        errors = self._send_messages(messages)
+                    break
+                except BundleUnsupported:
+                    raise
+                except (socket.error, OpenFlowError) as e:
+                    self.close()
+                    if attempt:
+                        raise OpenFlowError(
+                            _("OpenFlow request to %(target)s failed: "
+                              "%(error)s") % {'target': self.target,
+                                              'error': e})
+                    LOG.warning(_LW("OpenFlow channel to %(target)s lost "
+                                    "(%(error)s), reconnecting"),
+                                {'target': self.target, 'error': e})
+        if errors:
+            raise OpenFlowRejected(
+                _("Switch %(target)s rejected %(count)d of %(total)d "
+                  "messages: %(errors)s") % {
+                    'target': self.target, 'count': len(errors),
+                    'total': len(messages), 'errors': errors})
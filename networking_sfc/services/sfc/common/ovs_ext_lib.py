@@ -13,10 +13,15 @@
 #    under the License.
 
 import collections
+import contextlib
+import itertools
+import re
 import six
 
 from neutron_lib import exceptions
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
 
 from neutron.agent.common import ovs_lib
 from neutron.agent.common import utils
@@ -24,13 +29,25 @@ from neutron.plugins.common import constants
 from neutron.plugins.ml2.drivers.openvswitch.agent.openflow.ovs_ofctl import (
     ovs_bridge)
 
-from networking_sfc._i18n import _, _LE
+from networking_sfc._i18n import _, _LE, _LW
+from networking_sfc.services.sfc.common import config  # noqa
+from networking_sfc.services.sfc.common import ofp_lib
 
 # Special return value for an invalid OVS ofport
 INVALID_OFPORT = '-1'
 
 LOG = logging.getLogger(__name__)
 
+# keywords of ovs-ofctl bundle files for the add/mod/del actions
+BUNDLE_COMMANDS = {'add': 'add', 'mod': 'modify', 'del': 'delete'}
+
+# group deleted to probe the bundles of ovs-ofctl, the highest group id
+BUNDLE_PROBE_GROUP_ID = 0xffffff00
+
+# flow fields that are not part of the match
+FLOW_NON_MATCH_FIELDS = ('table', 'priority', 'actions', 'cookie',
+                         'idle_timeout', 'hard_timeout')
+
 
 def get_port_mask(min_port, max_port):
     """get port/mask serial by port range."""
@@ -54,11 +71,253 @@ def get_port_mask(min_port, max_port):
     return masks
 
 
+def _cookie_value(cookie):
+    return int(str(cookie).split('/')[0], 0)
+
+
+def _flow_match(flow):
+    return frozenset((key, str(value)) for key, value in six.iteritems(flow)
+                     if key not in FLOW_NON_MATCH_FIELDS)
+
+
 class OVSBridgeExt(ovs_bridge.OVSAgentBridge):
+    _of_channel = None
+    _native_bundles = True
+    _ofctl_bundles = None
+    _bundle = None
+    _bundle_cookie = None
+    # flows in these tables are owned by this bridge object and mirrored
+    mirrored_tables = ()
+
+    def __init__(self, *args, **kwargs):
+        super(OVSBridgeExt, self).__init__(*args, **kwargs)
+        # local copy of the installed groups and of the flows in the
+        # mirrored tables, so add-vs-mod never needs a dump
+        self._mirror_groups = {}
+        self._mirror_flows = {}
+
     def setup_controllers(self, conf):
         self.set_protocols("[]")
         self.del_controller()
 
+    @property
+    def of_channel(self):
+        """OpenFlow channel of the native backend, None for ovs-ofctl.
+
+        The channel connects to the <bridge>.mgmt socket of ovs-vswitchd,
+        which is owned by root: the agent needs write access to it, e.g.
+        by running as root or through the group owning the socket.
+        """
+        if cfg.CONF.sfc_agent.of_backend != 'native':
+            return None
+        if self._of_channel is None:
+            target = 'unix:%s/%s.mgmt' % (cfg.CONF.sfc_agent.ovs_rundir,
+                                          self.br_name)
+            self._of_channel = ofp_lib.OpenFlowChannel(
+                target, timeout=cfg.CONF.sfc_agent.of_request_timeout)
+        return self._of_channel
+
+    def _send_native(self, encoder, action, kwargs_list):
+        """Send the changes over the OpenFlow channel.
+
+        Returns False when the ovs-ofctl path has to be used instead,
+        either because a change can not be encoded or the channel failed.
+        The changes rejected by the switch are not retried with ovs-ofctl.
+
+        :raises OpenFlowRejected: if the switch rejects any of the changes
+        """
+        channel = self.of_channel
+        if channel is None:
+            return False
+        try:
+            messages = [encoder(action, kw) for kw in kwargs_list]
+        except ofp_lib.UnsupportedFlow as e:
+            LOG.debug('fall back to ovs-ofctl for %(action)s %(kw)s: %(e)s',
+                      {'action': action, 'kw': kwargs_list, 'e': e})
+            return False
+        try:
+            channel.send(messages)
+        except ofp_lib.OpenFlowRejected:
+            raise
+        except ofp_lib.OpenFlowError as e:
+            LOG.warning(_LW("OpenFlow backend failed on %(br)s, "
+                            "fall back to ovs-ofctl: %(e)s"),
+                        {'br': self.br_name, 'e': e})
+            return False
+        return True
+
+    @contextlib.contextmanager
+    def bundle(self, cookie=None):
+        """Collect flow and group changes and apply them atomically.
+
+        Changes made inside the block are buffered and committed as one
+        OpenFlow bundle when the block exits. Nothing is applied if the
+        block raises, and a failed commit raises in turn; in both cases
+        the mirror is rolled back. Nested blocks join the outermost one.
+
+        :param cookie: cookie of the flows added in the block, instead of
+                       the default cookie of the bridge
+        """
+        if self._bundle is not None:
+            yield self
+            return
+        self._bundle = []
+        self._bundle_cookie = cookie
+        groups = dict(self._mirror_groups)
+        flows = dict(self._mirror_flows)
+        try:
+            yield self
+            changes = self._bundle
+            self._bundle = None
+            self._commit_bundle(changes)
+        except Exception:
+            self._mirror_groups = groups
+            self._mirror_flows = flows
+            raise
+        finally:
+            self._bundle = None
+            self._bundle_cookie = None
+
+    def _run_ofctl_bundle(self, lines, **kwargs):
+        # bundles need OpenFlow1.4 or the ONF extension of OpenFlow1.3
+        full_args = ["ovs-ofctl", "-O", "OpenFlow13,OpenFlow14",
+                     "bundle", self.br_name, "-"]
+        LOG.debug('execute ovs command %s with %d changes',
+                  full_args, len(lines))
+        utils.execute(full_args, run_as_root=True,
+                      process_input='\n'.join(lines), **kwargs)
+
+    def _supports_ofctl_bundles(self):
+        """Whether ovs-ofctl can apply the changes as one bundle.
+
+        The bundle command, and group changes in bundles, need OVS 2.6. The
+        bridge is probed once by deleting a group which is never used.
+        """
+        if self._ofctl_bundles is None:
+            try:
+                self._run_ofctl_bundle(
+                    ['group delete group_id=%d' % BUNDLE_PROBE_GROUP_ID],
+                    log_fail_as_error=False)
+                self._ofctl_bundles = True
+            except RuntimeError as e:
+                LOG.warning(_LW("ovs-ofctl can not send bundles to %(br)s, "
+                                "the changes are applied one by one: "
+                                "%(e)s"), {'br': self.br_name, 'e': e})
+                self._ofctl_bundles = False
+        return self._ofctl_bundles
+
+    def _commit_bundle(self, changes):
+        if not changes:
+            return
+        encoders = {'flow': ofp_lib.encode_flow_mod,
+                    'group': ofp_lib.encode_group_mod}
+        channel = self.of_channel
+        if channel is not None and self._native_bundles:
+            try:
+                messages = [encoders[kind](action, kw)
+                            for kind, action, kw in changes]
+                channel.send(messages, bundle=True)
+                return
+            except ofp_lib.UnsupportedFlow as e:
+                LOG.debug('fall back to ovs-ofctl bundle: %s', e)
+            except ofp_lib.OpenFlowRejected:
+                raise
+            except ofp_lib.BundleUnsupported as e:
+                LOG.warning(_LW("OpenFlow backend of %(br)s can not "
+                                "send bundles, use ovs-ofctl for them: "
+                                "%(e)s"), {'br': self.br_name, 'e': e})
+                self._native_bundles = False
+            except ofp_lib.OpenFlowError as e:
+                LOG.warning(_LW("OpenFlow backend failed on %(br)s, "
+                                "fall back to ovs-ofctl: %(e)s"),
+                            {'br': self.br_name, 'e': e})
+
+        if not self._supports_ofctl_bundles():
+            for (kind, action), items in itertools.groupby(
+                    changes, lambda change: change[:2]):
+                kwargs_list = [kw for _kind, _action, kw in items]
+                if kind == 'flow':
+                    applied = self._apply_flows(action, kwargs_list)
+                else:
+                    applied = self._apply_groups(action, kwargs_list)
+                if not applied:
+                    # the mirror is restored to before the bundle, the
+                    # changes already applied are repaired by an audit
+                    raise RuntimeError(
+                        _("Unable to apply the changes to %s") %
+                        self.br_name)
+            return
+        lines = []
+        for kind, action, kw in changes:
+            if kind == 'flow':
+                expr = ovs_lib._build_flow_expr_str(kw, action)
+            else:
+                expr = _build_group_expr_str(kw, action)
+            lines.append('%s %s %s' % (kind, BUNDLE_COMMANDS[action], expr))
+        self._run_ofctl_bundle(lines)
+
+    def _is_mirrored(self, flow):
+        return flow.get('table', flow.get('table_id')) in self.mirrored_tables
+
+    def _mirrored_flows(self, flow):
+        """Keys of the mirrored flows a non-strict match would hit."""
+        table = flow.get('table', flow.get('table_id'))
+        match = _flow_match(flow)
+        return [key for key in self._mirror_flows
+                if (table is None or key[0] == table) and match <= key[2]]
+
+    def _update_flow_mirror(self, action, kwargs_list):
+        for kw in kwargs_list:
+            if action == 'del':
+                cookie = kw.get('cookie')
+                for key in self._mirrored_flows(kw):
+                    if (cookie is None or _cookie_value(cookie) ==
+                            self._mirror_flows[key].get('cookie')):
+                        del self._mirror_flows[key]
+            elif action == 'mod':
+                # replaced, not changed in place, so that the snapshot of
+                # a bundle keeps the former actions
+                for key in self._mirrored_flows(kw):
+                    self._mirror_flows[key] = dict(self._mirror_flows[key],
+                                                   actions=kw['actions'])
+            elif self._is_mirrored(kw):
+                key = (kw.get('table', kw.get('table_id')),
+                       str(kw.get('priority', 1)), _flow_match(kw))
+                self._mirror_flows[key] = dict(kw)
+
+    def _update_group_mirror(self, action, kwargs_list):
+        for kw in kwargs_list:
+            group_id = kw.get('group_id')
+            if action != 'del':
+                if group_id is not None:
+                    self._mirror_groups[int(group_id)] = dict(kw)
+            elif group_id is None or group_id == 'all':
+                self._mirror_groups.clear()
+            else:
+                self._mirror_groups.pop(int(group_id), None)
+
+    def do_action_flows(self, action, kwargs_list):
+        if action == 'add':
+            for kw in kwargs_list:
+                kw.setdefault('cookie',
+                              self._bundle_cookie or self._default_cookie)
+        if self._bundle is not None:
+            # the bundle restores the mirror if its commit fails
+            self._update_flow_mirror(action, kwargs_list)
+            self._bundle.extend(('flow', action, dict(kw))
+                                for kw in kwargs_list)
+            return
+        if self._apply_flows(action, kwargs_list):
+            self._update_flow_mirror(action, kwargs_list)
+
+    def _apply_flows(self, action, kwargs_list):
+        """Send the flow changes, return whether they were applied."""
+        if self._send_native(ofp_lib.encode_flow_mod, action, kwargs_list):
+            return True
+        flow_strs = [ovs_lib._build_flow_expr_str(kw, action)
+                     for kw in kwargs_list]
+        return self._apply_ofctl('%s-flows' % action, '\n'.join(flow_strs))
+
     def dump_flows_full_match(self, flow_str):
         retval = None
         flows = self.run_ofctl("dump-flows", [flow_str])
@@ -68,6 +327,12 @@ class OVSBridgeExt(ovs_bridge.OVSAgentBridge):
         return retval
 
     def mod_flow(self, **kwargs):
+        if self._is_mirrored(kwargs):
+            if self._mirrored_flows(kwargs):
+                self.do_action_flows('mod', [kwargs])
+            else:
+                self.do_action_flows('add', [kwargs])
+            return
         flow_copy = kwargs.copy()
         flow_copy.pop('actions')
         flow_str = ovs_lib._build_flow_expr_str(flow_copy, 'del')
@@ -117,6 +382,13 @@ class OVSBridgeExt(ovs_bridge.OVSAgentBridge):
         return ofport
 
     def run_ofctl(self, cmd, args, process_input=None):
+        try:
+            return self._run_ofctl_checked(cmd, args, process_input)
+        except Exception:
+            pass
+
+    def _run_ofctl_checked(self, cmd, args, process_input=None):
+        """Run an ovs-ofctl command, logging and raising its failure."""
         # We need to dump-groups according to group Id,
         # which is a feature of OpenFlow1.5
         full_args = [
@@ -127,19 +399,41 @@ class OVSBridgeExt(ovs_bridge.OVSAgentBridge):
             return utils.execute(full_args, run_as_root=True,
                                  process_input=process_input)
         except Exception as e:
-            LOG.exception(e)
-            LOG.error(_LE("Unable to execute %(args)s."),
-                      {'args': full_args})
+            with excutils.save_and_reraise_exception():
+                LOG.exception(e)
+                LOG.error(_LE("Unable to execute %(args)s."),
+                          {'args': full_args})
+
+    def _apply_ofctl(self, cmd, process_input):
+        """Run a change command of ovs-ofctl, return whether it worked."""
+        try:
+            self._run_ofctl_checked(cmd, ['-'], process_input)
+        except Exception:
+            return False
+        return True
 
     def do_action_groups(self, action, kwargs_list):
+        if action not in BUNDLE_COMMANDS:
+            msg = _("Action is illegal")
+            raise exceptions.InvalidInput(error_message=msg)
+        if self._bundle is not None:
+            self._update_group_mirror(action, kwargs_list)
+            self._bundle.extend(('group', action, dict(kw))
+                                for kw in kwargs_list)
+            return
+        if self._apply_groups(action, kwargs_list):
+            self._update_group_mirror(action, kwargs_list)
+
+    def _apply_groups(self, action, kwargs_list):
+        """Send the group changes, return whether they were applied."""
+        if self._send_native(ofp_lib.encode_group_mod, action, kwargs_list):
+            return True
         group_strs = [_build_group_expr_str(kw, action) for kw in kwargs_list]
         if action == 'add' or action == 'del':
-            self.run_ofctl('%s-groups' % action, ['-'], '\n'.join(group_strs))
-        elif action == 'mod':
-            self.run_ofctl('%s-group' % action, ['-'], '\n'.join(group_strs))
+            cmd = '%s-groups' % action
         else:
-            msg = _("Action is illegal")
-            raise exceptions.InvalidInput(error_message=msg)
+            cmd = '%s-group' % action
+        return self._apply_ofctl(cmd, '\n'.join(group_strs))
 
     def add_group(self, **kwargs):
         self.do_action_groups('add', [kwargs])
@@ -150,6 +444,121 @@ class OVSBridgeExt(ovs_bridge.OVSAgentBridge):
     def delete_group(self, **kwargs):
         self.do_action_groups('del', [kwargs])
 
+    def install_group(self, **kwargs):
+        """Add the group, or modify it if it is already installed."""
+        if int(kwargs['group_id']) in self._mirror_groups:
+            self.mod_group(**kwargs)
+        else:
+            self.add_group(**kwargs)
+
+    def dump_group_ids(self):
+        """Return the ids of the groups on the switch, None on failure."""
+        dump = self.run_ofctl('dump-groups', [])
+        if dump is None:
+            return None
+        return set(int(group_id) for group_id in
+                   re.findall(r'group_id=(\d+)', dump))
+
+    def dump_conj_ids(self, table):
+        """Return the conjunction ids used in the table, None on failure."""
+        dump = self.run_ofctl('dump-flows', ['table=%d' % table])
+        if dump is None:
+            return None
+        return set(int(conj_id) for conj_id in
+                   re.findall(r'(?:conj_id=|conjunction\()(\d+)', dump))
+
+    def seed_mirror_groups(self):
+        """Mirror the groups left on the switch by a previous run.
+
+        They are kept as stale until installed again, which then modifies
+        them in place instead of re-adding them.
+        """
+        for group_id in self.dump_group_ids() or ():
+            self._mirror_groups.setdefault(group_id, None)
+
+    def delete_stale_groups(self):
+        """Delete the seeded groups that have not been installed again."""
+        stale = [dict(group_id=group_id) for group_id, group in
+                 six.iteritems(self._mirror_groups) if group is None]
+        if stale:
+            self.do_action_groups('del', stale)
+        return len(stale)
+
+    def reserve_cookie(self, cookie):
+        """Keep flows with this cookie from neutron's stale flow cleanup."""
+        self._reserved_cookies.add(cookie)
+
+    def delete_stale_flows(self, tables, cookie, cookie_mask):
+        """Delete flows of an older generation of the given cookie.
+
+        Flows in the tables whose cookie matches cookie/cookie_mask, but
+        is not cookie itself, are deleted. Returns the number of stale
+        cookies found.
+        """
+        stale = set()
+        for table in tables:
+            dump = self.run_ofctl('dump-flows', ['table=%d' % table]) or ''
+            for value in re.findall(r'cookie=(0x[0-9a-fA-F]+)', dump):
+                value = int(value, 16)
+                if (value & cookie_mask == cookie & cookie_mask and
+                        value != cookie):
+                    stale.add((table, value))
+        if stale:
+            self.do_action_flows(
+                'del', [dict(table=table, cookie='0x%x/-1' % value)
+                        for table, value in sorted(stale)])
+        return len(stale)
+
+    def audit_mirror(self):
+        """Repair the switch from the mirror of groups and flows.
+
+        Missing groups are added and unknown groups deleted, then any
+        mirrored flow the switch lacks or has with other actions is
+        reinstalled. Returns the number of repaired entries.
+        """
+        installed = self.dump_group_ids()
+        if installed is None:
+            return 0
+        missing = [dict(group) for group_id, group in
+                   six.iteritems(self._mirror_groups)
+                   if group is not None and group_id not in installed]
+        stale = [dict(group_id=group_id) for group_id in
+                 installed - set(self._mirror_groups)]
+        if missing:
+            self.do_action_groups('add', missing)
+        if stale:
+            self.do_action_groups('del', stale)
+
+        flow_strs = [ovs_lib._build_flow_expr_str(dict(flow), 'add')
+                     for flow in six.itervalues(self._mirror_flows)]
+        lost = []
+        if flow_strs:
+            # diff-flows exits with 2 when the flow tables differ, lines
+            # starting with '+' are mirrored flows the switch does not have
+            full_args = ["ovs-ofctl", "-O openflow13", "diff-flows",
+                         self.br_name, "-"]
+            try:
+                diff = utils.execute(full_args, run_as_root=True,
+                                     process_input='\n'.join(flow_strs),
+                                     extra_ok_codes=[2])
+            except Exception as e:
+                LOG.exception(e)
+                LOG.error(_LE("Unable to execute %(args)s."),
+                          {'args': full_args})
+                diff = ''
+            lost = [line[1:].strip() for line in diff.splitlines()
+                    if line.startswith('+')]
+            if lost:
+                self.run_ofctl('add-flows', ['-'], '\n'.join(lost))
+        repaired = len(missing) + len(stale) + len(lost)
+        if repaired:
+            LOG.warning(_LW("Audit of %(br)s repaired %(groups)d groups and "
+                            "%(flows)d flows"),
+                        {'br': self.br_name,
+                         'groups': len(missing) + len(stale),
+                         'flows': len(lost)})
+        return repaired
+
     def dump_group_for_id(self, group_id):
         retval = None
         group_str = "%d" % group_id
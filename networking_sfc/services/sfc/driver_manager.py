@@ -17,6 +17,7 @@ from oslo_log import log
 import stevedore
 
 from networking_sfc._i18n import _LE, _LI
+from networking_sfc.services import driver_dispatch
 from networking_sfc.services.sfc.common import exceptions as sfc_exc
 
 
@@ -24,6 +25,9 @@ LOG = log.getLogger(__name__)
 cfg.CONF.import_opt('drivers',
                     'networking_sfc.services.sfc.common.config',
                     group='sfc')
+cfg.CONF.import_opt('parallel_driver_calls',
+                    'networking_sfc.services.sfc.common.config',
+                    group='sfc')
 
 
 class SfcDriverManager(stevedore.named.NamedExtensionManager):
@@ -65,25 +69,29 @@ class SfcDriverManager(stevedore.named.NamedExtensionManager):
             self.native_bulk_support &= getattr(driver.obj,
                                                 'native_bulk_support', True)
 
+    def _call_driver(self, driver, method_name, context):
+        try:
+            driver_dispatch.timed_call('sfc', driver, method_name, context)
+        except Exception as e:
+            # This is an internal failure.
+            LOG.exception(e)
+            LOG.error(
+                _LE("SFC driver '%(name)s' failed in %(method)s"),
+                {'name': driver.name, 'method': method_name}
+            )
+            raise sfc_exc.SfcDriverError(
+                method=method_name
+            )
+
     def _call_drivers(self, method_name, context):
         """Helper method for calling a method across all SFC drivers.
 
         :param method_name: name of the method to call
         :param context: context parameter to pass to each method call
         """
-        for driver in self.ordered_drivers:
-            try:
-                getattr(driver.obj, method_name)(context)
-            except Exception as e:
-                # This is an internal failure.
-                LOG.exception(e)
-                LOG.error(
-                    _LE("SFC driver '%(name)s' failed in %(method)s"),
-                    {'name': driver.name, 'method': method_name}
-                )
-                raise sfc_exc.SfcDriverError(
-                    method=method_name
-                )
+        driver_dispatch.call_drivers(
+            self.ordered_drivers, self._call_driver, method_name, context,
+            parallel=cfg.CONF.sfc.parallel_driver_calls)
 
     def create_port_chain(self, context):
         self._call_drivers("create_port_chain", context)
@@ -97,6 +105,9 @@ class SfcDriverManager(stevedore.named.NamedExtensionManager):
     def create_port_pair(self, context):
         self._call_drivers("create_port_pair", context)
 
+    def create_port_pair_bulk(self, contexts):
+        self._call_drivers("create_port_pair_bulk", contexts)
+
     def update_port_pair(self, context):
         self._call_drivers("update_port_pair", context)
 
@@ -106,6 +117,9 @@ class SfcDriverManager(stevedore.named.NamedExtensionManager):
     def create_port_pair_group(self, context):
         self._call_drivers("create_port_pair_group", context)
 
+    def create_port_pair_group_bulk(self, contexts):
+        self._call_drivers("create_port_pair_group_bulk", contexts)
+
     def update_port_pair_group(self, context):
         self._call_drivers("update_port_pair_group", context)
 
@@ -20,6 +20,13 @@ import six
 class SfcDriverBase(object):
     """SFC Driver Base Class."""
 
+    # whether the driver does not depend on the drivers before it, and
+    # can be called concurrently with them when parallel_driver_calls is
+    # set. It is then called in a green thread with a copy of the
+    # context, whose _plugin_context has a session of its own which only
+    # sees the committed changes.
+    independent = False
+
     @abc.abstractmethod
     def create_port_chain(self, context):
         pass
@@ -55,3 +62,11 @@ class SfcDriverBase(object):
     @abc.abstractmethod
     def update_port_pair_group(self, context):
         pass
+
+    def create_port_pair_bulk(self, contexts):
+        for context in contexts:
+            self.create_port_pair(context)
+
+    def create_port_pair_group_bulk(self, contexts):
+        for context in contexts:
+            self.create_port_pair_group(context)
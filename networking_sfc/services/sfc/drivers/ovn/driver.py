@@ -68,11 +68,8 @@ class OVNSfcDriver(driver_base.SfcDriverBase,
             LOG.warning(_LW("Not found the flow classifier service plugin"))
             return flow_classifiers
 
-        for fc_id in fc_ids:
-            fc = fc_plugin.get_flow_classifier(self.admin_context, fc_id)
-            flow_classifiers.append(fc)
-
-        return flow_classifiers
+        return fc_plugin.get_flow_classifiers_by_ids(
+            self.admin_context, fc_ids)
 
     def _create_ovn_dict(self, context, port_chain):
         ovn_dict = {}
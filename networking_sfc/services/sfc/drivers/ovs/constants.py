@@ -19,6 +19,10 @@ STATUS_BUILDING = 'building'
 STATUS_ACTIVE = 'active'
 STATUS_ERROR = 'error'
 
+# actions of the entries of an update_flow_rules_batch cast
+FLOWRULE_UPDATE = 'update'
+FLOWRULE_DELETE = 'delete'
+
 SRC_NODE = 'src_node'
 DST_NODE = 'dst_node'
 SF_NODE = 'sf_node'
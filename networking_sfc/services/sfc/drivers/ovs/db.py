@@ -13,6 +13,8 @@
 #    under the License.
 #
 
+import collections
+
 import six
 import sqlalchemy as sa
 from sqlalchemy import orm
@@ -20,14 +22,21 @@ from sqlalchemy.orm import exc
 from sqlalchemy import sql
 
 from neutron_lib import exceptions as n_exc
+from oslo_db import exception as db_exc
 from oslo_log import helpers as log_helpers
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 
 from neutron import context as n_context
 from neutron.db import common_db_mixin
 from neutron.db import model_base
+from neutron.db import models_v2
 
 from networking_sfc._i18n import _
+from networking_sfc.db import id_allocator
+
+LOG = logging.getLogger(__name__)
 
 
 class PortPairDetailNotFound(n_exc.NotFound):
@@ -51,43 +60,27 @@ class UuidIntidAssoc(model_base.BASEV2, model_base.HasId):
         self.type_ = type_
 
 
-def singleton(class_):
-    instances = {}
-
-    def getinstance(*args, **kwargs):
-        if class_ not in instances:
-            instances[class_] = class_(*args, **kwargs)
-        return instances[class_]
-    return getinstance
-
-
-@singleton
 class IDAllocation(object):
     def __init__(self, context):
         # Get the inital range from conf file.
         conf_obj = {'group': [1, 255], 'portchain': [256, 65536]}
         self.conf_obj = conf_obj
         self.session = context.session
+        self.allocators = {
+            type_: id_allocator.IdAllocator(
+                'sfc_intid_%s' % type_, start, end,
+                id_allocator.column_ids(UuidIntidAssoc.intid, type_=type_))
+            for type_, (start, end) in six.iteritems(conf_obj)
+        }
 
     @log_helpers.log_method_call
     def assign_intid(self, type_, uuid):
-        query = self.session.query(UuidIntidAssoc).filter_by(
-            type_=type_).order_by(UuidIntidAssoc.intid)
-
-        allocated_int_ids = {obj.intid for obj in query.all()}
-
-        # Find the first one from the available range that
-        # is not in allocated_int_ids
-        start, end = self.conf_obj[type_][0], self.conf_obj[type_][1] + 1
-        for init_id in six.moves.range(start, end):
-            if init_id not in allocated_int_ids:
-                with self.session.begin(subtransactions=True):
-                    uuid_intid = UuidIntidAssoc(
-                        uuid, init_id, type_)
-                    self.session.add(uuid_intid)
-                return init_id
-        else:
-            return None
+        with self.session.begin(subtransactions=True):
+            intid = self.allocators[type_].allocate(self.session)
+            if intid is not None:
+                uuid_intid = UuidIntidAssoc(uuid, intid, type_)
+                self.session.add(uuid_intid)
+            return intid
 
     @log_helpers.log_method_call
     def get_intid_by_uuid(self, type_, uuid):
@@ -112,6 +105,7 @@ class IDAllocation(object):
 
             if query_obj:
                 self.session.delete(query_obj)
+                self.allocators[type_].release(self.session, intid)
 
 
 class PathPortAssoc(model_base.BASEV2):
@@ -132,12 +126,26 @@ class PathPortAssoc(model_base.BASEV2):
     weight = sa.Column(sa.Integer, nullable=False, default=1)
 
 
+class PathNodeNextHop(model_base.BASEV2):
+    """Port pair detail of the next group a path node sends to."""
+    __tablename__ = 'sfc_path_node_next_hops'
+    pathnode_id = sa.Column(sa.String(36),
+                            sa.ForeignKey(
+                                'sfc_path_nodes.id', ondelete='CASCADE'),
+                            primary_key=True)
+    portpair_id = sa.Column(sa.String(36),
+                            sa.ForeignKey('sfc_portpair_details.id',
+                                          ondelete='CASCADE'),
+                            primary_key=True, index=True)
+    weight = sa.Column(sa.Integer, nullable=False, default=1)
+
+
 class PortPairDetail(model_base.BASEV2, model_base.HasId,
                      model_base.HasProject):
     __tablename__ = 'sfc_portpair_details'
     ingress = sa.Column(sa.String(36), nullable=True)
-    egress = sa.Column(sa.String(36), nullable=True)
-    host_id = sa.Column(sa.String(255), nullable=False)
+    egress = sa.Column(sa.String(36), nullable=True, index=True)
+    host_id = sa.Column(sa.String(255), nullable=False, index=True)
     mac_address = sa.Column(sa.String(32), nullable=False)
     network_type = sa.Column(sa.String(8))
     segment_id = sa.Column(sa.Integer)
@@ -147,6 +155,12 @@ class PortPairDetail(model_base.BASEV2, model_base.HasId,
                                   lazy="joined",
                                   cascade='all,delete')
 
+    __table_args__ = (
+        sa.Index('ix_sfc_portpair_details_ingress_egress',
+                 ingress, egress),
+        model_base.BASEV2.__table_args__
+    )
+
 
 class PathNode(model_base.BASEV2, model_base.HasId, model_base.HasProject):
     __tablename__ = 'sfc_path_nodes'
@@ -161,8 +175,88 @@ class PathNode(model_base.BASEV2, model_base.HasId, model_base.HasProject):
                                         backref='path_nodes',
                                         lazy="joined",
                                         cascade='all,delete')
-    next_group_id = sa.Column(sa.Integer)
-    next_hop = sa.Column(sa.String(512))
+    next_group_id = sa.Column(sa.Integer, index=True)
+    next_hops = orm.relationship(PathNodeNextHop,
+                                 lazy="subquery",
+                                 order_by=PathNodeNextHop.portpair_id,
+                                 cascade='all,delete-orphan')
+
+    __table_args__ = (
+        sa.Index('ix_sfc_path_nodes_portchain_id_next_group_id',
+                 portchain_id, next_group_id),
+        sa.Index('ix_sfc_path_nodes_nsp_nsi', nsp, nsi),
+        model_base.BASEV2.__table_args__
+    )
+
+
+# host_id of the reference counts of the groups used by source nodes
+# which have no port pair details; those are counted on every host.
+SRC_NODE_HOST_ID = ''
+
+
+class GroupRefcount(model_base.BASEV2):
+    """Number of references to a next group on a host.
+
+    A group is referenced once for each port pair detail on the host
+    associated with a path node going to that group, and once on every
+    host for each source node going to that group without port pair
+    details.
+    """
+    __tablename__ = 'sfc_group_refcounts'
+    host_id = sa.Column(sa.String(255), primary_key=True)
+    next_group_id = sa.Column(sa.Integer, primary_key=True,
+                              autoincrement=False)
+    refcnt = sa.Column(sa.Integer, nullable=False, default=0)
+
+
+class PortChainGeneration(model_base.BASEV2):
+    """Generation of the flow rules of a port chain.
+
+    Bumped by the writes changing the flow rules of the port chain, the
+    cached flow rules built from an older generation are rebuilt.
+    """
+    __tablename__ = 'sfc_portchain_generations'
+    portchain_id = sa.Column(
+        sa.String(36),
+        sa.ForeignKey('sfc_port_chains.id', ondelete='CASCADE'),
+        primary_key=True)
+    generation = sa.Column(sa.Integer, nullable=False)
+
+
+class HostFlowRule(model_base.BASEV2):
+    """Flow rule of a port pair detail of a path node, as last built.
+
+    A flow rule which is gone is kept as deleted, so that the agents
+    which still have it learn about the delete.
+    """
+    __tablename__ = 'sfc_host_flowrules'
+    host_id = sa.Column(sa.String(255), primary_key=True)
+    pathnode_id = sa.Column(sa.String(36), primary_key=True)
+    portpair_id = sa.Column(sa.String(36), primary_key=True)
+    portchain_id = sa.Column(sa.String(36), nullable=False)
+    generation = sa.Column(sa.Integer, nullable=False)
+    version = sa.Column(sa.Integer, nullable=False)
+    deleted = sa.Column(sa.Boolean, nullable=False)
+    flowrule = sa.Column(sa.Text, nullable=False)
+
+
+class HostFlowRuleVersion(model_base.BASEV2):
+    """Version of the flow rules of a host.
+
+    Increased every time a flow rule of the host changes. The deleted
+    flow rules up to purged_version are forgotten, agents with an older
+    version need all the flow rules.
+    """
+    __tablename__ = 'sfc_host_flowrule_versions'
+    host_id = sa.Column(sa.String(255), primary_key=True)
+    version = sa.Column(sa.Integer, nullable=False)
+    purged_version = sa.Column(sa.Integer, nullable=False)
+
+
+# number of versions deleted flow rules are kept for
+HOST_FLOWRULE_DELETED_VERSIONS = 100
+
+DB_MAX_ATTEMPTS = 10
 
 
 class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
@@ -170,13 +264,20 @@ class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
         self.admin_context = n_context.get_admin_context()
 
     def _make_pathnode_dict(self, node, fields=None):
+        next_hop = [{'portpair_id': next_hop['portpair_id'],
+                     'weight': next_hop['weight']}
+                    for next_hop in node['next_hops']]
+        if not next_hop and node['next_group_id'] is not None:
+            next_hop = [{'portpair_id': portpair_id, 'weight': weight}
+                        for node_id, portpair_id, weight in
+                        self._query_derived_next_hops([node['id']])]
         res = {'id': node['id'],
                'tenant_id': node['tenant_id'],
                'node_type': node['node_type'],
                'nsp': node['nsp'],
                'nsi': node['nsi'],
                'next_group_id': node['next_group_id'],
-               'next_hop': node['next_hop'],
+               'next_hop': next_hop or None,
                'portchain_id': node['portchain_id'],
                'status': node['status'],
                'portpair_details': [pair_detail['portpair_id']
@@ -225,38 +326,560 @@ class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
             raise PortPairDetailNotFound(port_id=id)
         return port
 
+    def _get_group_refcnt_keys(self, node_ids):
+        """Return the (host_id, next_group_id) referenced by the nodes.
+
+        A key is repeated once per reference.
+        """
+        if not node_ids:
+            return []
+        rows = self.admin_context.session.query(
+            PathNode.id, PathNode.nsi, PathNode.next_group_id,
+            PathPortAssoc.portpair_id, PortPairDetail.host_id
+        ).outerjoin(
+            PathPortAssoc, PathPortAssoc.pathnode_id == PathNode.id
+        ).outerjoin(
+            PortPairDetail, PortPairDetail.id == PathPortAssoc.portpair_id
+        ).filter(
+            PathNode.id.in_(set(node_ids)),
+            PathNode.next_group_id.isnot(None))
+        keys = []
+        for node_id, nsi, group_id, portpair_id, host_id in rows:
+            if portpair_id is not None:
+                # unbound port pair details have no flow rules
+                if host_id:
+                    keys.append((host_id, group_id))
+            elif nsi == 0xff:
+                keys.append((SRC_NODE_HOST_ID, group_id))
+        return keys
+
+    def _count_group_refcnts(self, keys):
+        """Count the references of the (host_id, next_group_id) keys.
+
+        The references are counted from the paths, for the keys without a
+        stored reference count: the paths written by the servers of the
+        former release during an online upgrade have none until the
+        contract migration counts them.
+
+        @return: dict of the reference counts by key
+        """
+        keys = set(keys)
+        counts = dict((key, 0) for key in keys)
+        if not keys:
+            return counts
+        session = self.admin_context.session
+        group_ids = set(group_id for host_id, group_id in keys)
+        host_ids = set(host_id for host_id, group_id in keys)
+        if host_ids - set([SRC_NODE_HOST_ID]):
+            rows = session.query(
+                PortPairDetail.host_id, PathNode.next_group_id,
+                sa.func.count(PathPortAssoc.portpair_id)
+            ).join(
+                PathPortAssoc, PathPortAssoc.portpair_id == PortPairDetail.id
+            ).join(
+                PathNode, PathNode.id == PathPortAssoc.pathnode_id
+            ).filter(
+                PortPairDetail.host_id.in_(
+                    host_ids - set([SRC_NODE_HOST_ID])),
+                PathNode.next_group_id.in_(group_ids)
+            ).group_by(PortPairDetail.host_id, PathNode.next_group_id)
+            for host_id, group_id, refcnt in rows:
+                if (host_id, group_id) in counts:
+                    counts[host_id, group_id] = refcnt
+        if SRC_NODE_HOST_ID in host_ids:
+            rows = session.query(
+                PathNode.next_group_id, sa.func.count(PathNode.id)
+            ).filter(
+                PathNode.nsi == 0xff,
+                PathNode.next_group_id.in_(group_ids),
+                ~sa.exists().where(PathPortAssoc.pathnode_id == PathNode.id)
+            ).group_by(PathNode.next_group_id)
+            for group_id, refcnt in rows:
+                if (SRC_NODE_HOST_ID, group_id) in counts:
+                    counts[SRC_NODE_HOST_ID, group_id] = refcnt
+        return counts
+
+    def _update_group_refcnt(self, host_id, group_id, delta):
+        """Add delta to a reference count, once the paths are changed.
+
+        A missing count is counted from the paths instead.
+        """
+        session = self.admin_context.session
+        with session.begin(subtransactions=True):
+            # the flow rules going to the group carry its reference count
+            self.invalidate_flowrules(group_ids=[group_id])
+            query = session.query(GroupRefcount).filter_by(
+                host_id=host_id, next_group_id=group_id)
+            values = {'refcnt': GroupRefcount.refcnt + delta}
+            if not query.update(values, synchronize_session=False):
+                refcnt = self._count_group_refcnts(
+                    [(host_id, group_id)])[host_id, group_id]
+                if refcnt <= 0:
+                    return
+                try:
+                    with session.begin_nested():
+                        session.execute(
+                            GroupRefcount.__table__.insert().values(
+                                host_id=host_id, next_group_id=group_id,
+                                refcnt=refcnt))
+                    return
+                except db_exc.DBDuplicateEntry:
+                    # another worker counted the paths first, without the
+                    # change of this transaction
+                    LOG.debug("Reference count of group %(group)s on "
+                              "%(host)s inserted concurrently",
+                              {'group': group_id, 'host': host_id})
+                    query.update(values, synchronize_session=False)
+            if delta < 0:
+                query.filter(GroupRefcount.refcnt <= 0).delete(
+                    synchronize_session=False)
+
+    def _update_group_refcnts(self, old_keys, new_keys):
+        deltas = collections.Counter(new_keys)
+        deltas.subtract(old_keys)
+        for (host_id, group_id), delta in six.iteritems(deltas):
+            if delta:
+                self._update_group_refcnt(host_id, group_id, delta)
+
+    def get_group_refcnts(self, host_id, group_ids):
+        """Return the reference count on host_id of each group."""
+        group_refcnts = dict((group_id, 0) for group_id in group_ids)
+        if not group_refcnts:
+            return group_refcnts
+        with self.admin_context.session.begin(subtransactions=True):
+            rows = self.admin_context.session.query(
+                GroupRefcount.host_id, GroupRefcount.next_group_id,
+                GroupRefcount.refcnt
+            ).filter(
+                GroupRefcount.host_id.in_(set([host_id, SRC_NODE_HOST_ID])),
+                GroupRefcount.next_group_id.in_(list(group_refcnts)))
+            counted = set()
+            for row_host_id, group_id, refcnt in rows:
+                group_refcnts[group_id] += refcnt
+                if row_host_id == host_id:
+                    counted.add(group_id)
+            # a flow rule of the host references its group on the host,
+            # a missing count is likely not counted yet
+            missing = set(group_refcnts) - counted
+            if missing:
+                counts = self._count_group_refcnts(
+                    [(key_host_id, group_id) for group_id in missing
+                     for key_host_id in (host_id, SRC_NODE_HOST_ID)])
+                for group_id in missing:
+                    group_refcnts[group_id] = (
+                        counts[host_id, group_id] +
+                        counts[SRC_NODE_HOST_ID, group_id])
+        return group_refcnts
+
+    def invalidate_flowrules(self, portchain_ids=(), node_ids=(),
+                             group_ids=()):
+        """Make the cached flow rules of port chains be rebuilt.
+
+        @param: portchain_ids: the port chains
+        @param: node_ids: path nodes whose port chains are invalidated
+        @param: group_ids: next groups whose port chains are invalidated
+        """
+        session = self.admin_context.session
+        portchain_ids = set(portchain_ids)
+        if node_ids:
+            portchain_ids.update(
+                portchain_id for portchain_id, in session.query(
+                    PathNode.portchain_id
+                ).filter(PathNode.id.in_(set(node_ids))))
+        if group_ids:
+            portchain_ids.update(
+                portchain_id for portchain_id, in session.query(
+                    PathNode.portchain_id
+                ).filter(PathNode.next_group_id.in_(set(group_ids))))
+        portchain_ids.discard(None)
+        for portchain_id in portchain_ids:
+            query = session.query(PortChainGeneration).filter_by(
+                portchain_id=portchain_id)
+            if not query.update(
+                {'generation': PortChainGeneration.generation + 1},
+                synchronize_session=False
+            ):
+                session.execute(PortChainGeneration.__table__.insert().values(
+                    portchain_id=portchain_id, generation=1))
+
+    def get_host_flowrule_keys(self, host_id):
+        """Return the port chain of the flow rules which host_id needs.
+
+        @return: dict of the portchain_id by (pathnode_id, portpair_id)
+        """
+        rows = self.admin_context.session.query(
+            PathPortAssoc.pathnode_id, PathPortAssoc.portpair_id,
+            PathNode.portchain_id
+        ).join(
+            PortPairDetail, PortPairDetail.id == PathPortAssoc.portpair_id
+        ).join(
+            PathNode, PathNode.id == PathPortAssoc.pathnode_id
+        ).filter(PortPairDetail.host_id == host_id)
+        return dict(((pathnode_id, portpair_id), portchain_id)
+                    for pathnode_id, portpair_id, portchain_id in rows)
+
+    def get_portchain_generations(self, portchain_ids):
+        generations = dict(
+            (portchain_id, 0) for portchain_id in portchain_ids)
+        if not generations:
+            return generations
+        rows = self.admin_context.session.query(
+            PortChainGeneration.portchain_id, PortChainGeneration.generation
+        ).filter(PortChainGeneration.portchain_id.in_(list(generations)))
+        generations.update(rows)
+        return generations
+
+    def _get_host_flowrules(self, host_id):
+        rows = self.admin_context.session.query(
+            HostFlowRule.pathnode_id, HostFlowRule.portpair_id,
+            HostFlowRule.portchain_id, HostFlowRule.generation,
+            HostFlowRule.deleted, HostFlowRule.flowrule
+        ).filter_by(host_id=host_id)
+        return dict(
+            ((pathnode_id, portpair_id), {
+                'portchain_id': portchain_id,
+                'generation': generation,
+                'deleted': deleted,
+                'flowrule': flowrule})
+            for pathnode_id, portpair_id, portchain_id, generation,
+            deleted, flowrule in rows)
+
+    def _get_host_flowrule_version(self, host_id):
+        row = self.admin_context.session.query(
+            HostFlowRuleVersion.version, HostFlowRuleVersion.purged_version
+        ).filter_by(host_id=host_id).first()
+        return tuple(row) if row else (0, 0)
+
+    def _next_host_flowrule_version(self, host_id):
+        session = self.admin_context.session
+        query = session.query(HostFlowRuleVersion).filter_by(
+            host_id=host_id)
+        if not query.update(
+            {'version': HostFlowRuleVersion.version + 1},
+            synchronize_session=False
+        ):
+            session.execute(HostFlowRuleVersion.__table__.insert().values(
+                host_id=host_id, version=1, purged_version=0))
+        return self._get_host_flowrule_version(host_id)[0]
+
+    def _save_host_flowrule(self, host_id, key, values):
+        session = self.admin_context.session
+        pathnode_id, portpair_id = key
+        if not session.query(HostFlowRule).filter_by(
+            host_id=host_id, pathnode_id=pathnode_id,
+            portpair_id=portpair_id
+        ).update(values, synchronize_session=False):
+            session.execute(HostFlowRule.__table__.insert().values(
+                host_id=host_id, pathnode_id=pathnode_id,
+                portpair_id=portpair_id, **values))
+
+    def refresh_host_flowrules(self, host_id, build_flowrules):
+        """Rebuild the cached flow rules of host_id which are out of date.
+
+        A cached flow rule is out of date when the generation of its port
+        chain changed since it was built. The version of the host is only
+        increased when a rebuilt flow rule is different.
+
+        @param: build_flowrules: function taking a list of (pathnode_id,
+        portpair_id) and returning their flow rules in a dict by key
+        """
+        keys = self.get_host_flowrule_keys(host_id)
+        cached = self._get_host_flowrules(host_id)
+        generations = self.get_portchain_generations(
+            set(keys.values()) | set(
+                row['portchain_id'] for row in cached.values()))
+        stale = [
+            key for key, portchain_id in six.iteritems(keys)
+            if key not in cached or cached[key]['deleted'] or
+            cached[key]['generation'] != generations[portchain_id]
+        ]
+        gone = [key for key, row in six.iteritems(cached)
+                if key not in keys and not row['deleted']]
+        if not stale and not gone:
+            return
+        # built outside of the transaction, a flow rule changed meanwhile
+        # is saved with the former generation and rebuilt next time.
+        flowrules = build_flowrules(stale) if stale else {}
+        with self.admin_context.session.begin(subtransactions=True):
+            version = None
+            for key in stale:
+                values = {'portchain_id': keys[key],
+                          'generation': generations[keys[key]]}
+                flowrule = flowrules.get(key)
+                if flowrule is not None:
+                    values['flowrule'] = jsonutils.dumps(
+                        flowrule, sort_keys=True)
+                    values['deleted'] = False
+                    if (
+                        key in cached and not cached[key]['deleted'] and
+                        cached[key]['flowrule'] == values['flowrule']
+                    ):
+                        self._save_host_flowrule(host_id, key, values)
+                        continue
+                elif key not in cached or cached[key]['deleted']:
+                    continue
+                else:
+                    values['deleted'] = True
+                version = version or self._next_host_flowrule_version(
+                    host_id)
+                values['version'] = version
+                self._save_host_flowrule(host_id, key, values)
+            for key in gone:
+                version = version or self._next_host_flowrule_version(
+                    host_id)
+                self._save_host_flowrule(
+                    host_id, key, {'deleted': True, 'version': version})
+            if version:
+                self._purge_host_flowrules(host_id, version)
+
+    def _purge_host_flowrules(self, host_id, version):
+        purged_version = version - HOST_FLOWRULE_DELETED_VERSIONS
+        if purged_version <= 0:
+            return
+        session = self.admin_context.session
+        if session.query(HostFlowRule).filter(
+            HostFlowRule.host_id == host_id,
+            HostFlowRule.deleted.is_(True),
+            HostFlowRule.version <= purged_version
+        ).delete(synchronize_session=False):
+            session.query(HostFlowRuleVersion).filter_by(
+                host_id=host_id
+            ).update({'purged_version': purged_version},
+                     synchronize_session=False)
+
+    def get_host_flowrule_changes(self, host_id, version=None):
+        """Return the cached flow rules of host_id changed since version.
+
+        @return: dict with the current 'version' of the host, whether
+        the changes are 'full', the 'flowrules' changed or added and the
+        'deleted' flow rules. Each flow rule is a dict with the
+        'pathnode_id', 'portpair_id' and the 'flowrule'. All the flow
+        rules are returned as full when version is not given, is too old
+        or is unknown.
+        """
+        current, purged_version = self._get_host_flowrule_version(host_id)
+        full = not version or version < purged_version or version > current
+        query = self.admin_context.session.query(
+            HostFlowRule.pathnode_id, HostFlowRule.portpair_id,
+            HostFlowRule.deleted, HostFlowRule.flowrule
+        ).filter(HostFlowRule.host_id == host_id)
+        if full:
+            query = query.filter(HostFlowRule.deleted.is_(False))
+        else:
+            query = query.filter(HostFlowRule.version > version)
+        changes = {'version': current, 'full': full,
+                   'flowrules': [], 'deleted': []}
+        for pathnode_id, portpair_id, deleted, flowrule in query.order_by(
+            HostFlowRule.pathnode_id, HostFlowRule.portpair_id
+        ):
+            changes['deleted' if deleted else 'flowrules'].append({
+                'pathnode_id': pathnode_id,
+                'portpair_id': portpair_id,
+                'flowrule': jsonutils.loads(flowrule)})
+        return changes
+
     def create_port_detail(self, port):
+        return self.create_port_details([port])[0]
+
+    def create_port_details(self, ports):
         with self.admin_context.session.begin(subtransactions=True):
-            args = self._filter_non_model_columns(port, PortPairDetail)
-            args['id'] = uuidutils.generate_uuid()
-            port_obj = PortPairDetail(**args)
-            self.admin_context.session.add(port_obj)
-            return self._make_port_detail_dict(port_obj)
+            port_objs = []
+            for port in ports:
+                args = self._filter_non_model_columns(port, PortPairDetail)
+                args['id'] = uuidutils.generate_uuid()
+                port_objs.append(PortPairDetail(**args))
+            self.admin_context.session.add_all(port_objs)
+            return [self._make_port_detail_dict(port_obj)
+                    for port_obj in port_objs]
+
+    def _set_next_hops(self, node_obj, next_hop):
+        """Make the members of next_hop the next hops of node_obj."""
+        weights = dict((member['portpair_id'], member.get('weight', 1))
+                       for member in next_hop or [])
+        next_hops = []
+        for next_hop_obj in node_obj.next_hops:
+            weight = weights.pop(next_hop_obj.portpair_id, None)
+            if weight is not None:
+                next_hop_obj.weight = weight
+                next_hops.append(next_hop_obj)
+        for portpair_id, weight in sorted(weights.items()):
+            next_hops.append(PathNodeNextHop(pathnode_id=node_obj.id,
+                                             portpair_id=portpair_id,
+                                             weight=weight))
+        node_obj.next_hops = next_hops
+
+    def _query_derived_next_hops(self, node_ids=None, *entities):
+        """Query the next hops of the path nodes without stored next hops.
+
+        The path nodes written by the servers of the former release
+        during an online upgrade have their next hops in the next_hop
+        column only, until the contract migration copies them. Their next
+        hops are the port pair details of the next node of the path,
+        which both releases keep up to date.
+
+        @param: node_ids: the path nodes, all of them by default
+        @param: entities: queried after the next hops, PathPortAssoc
+        stands for the next hops
+        @return: query of (pathnode_id, portpair_id, weight, *entities)
+        """
+        next_node = orm.aliased(PathNode)
+        query = self.admin_context.session.query(
+            PathNode.id, PathPortAssoc.portpair_id, PathPortAssoc.weight,
+            *entities
+        ).join(
+            next_node, sa.and_(next_node.portchain_id == PathNode.portchain_id,
+                               next_node.nsi == PathNode.nsi - 1)
+        ).join(
+            PathPortAssoc, PathPortAssoc.pathnode_id == next_node.id
+        ).filter(
+            PathNode.next_group_id.isnot(None),
+            ~sa.exists().where(PathNodeNextHop.pathnode_id == PathNode.id))
+        if node_ids is not None:
+            query = query.filter(PathNode.id.in_(list(set(node_ids))))
+        return query.order_by(PathNode.id, PathPortAssoc.portpair_id)
+
+    def _get_next_hop_node_ids(self, portpair_id):
+        node_ids = [
+            node_id for node_id, in self.admin_context.session.query(
+                PathNodeNextHop.pathnode_id
+            ).filter_by(portpair_id=portpair_id)
+        ]
+        node_ids.extend(
+            node_id for node_id, pp_id, weight in
+            self._query_derived_next_hops().filter(
+                PathPortAssoc.portpair_id == portpair_id))
+        return node_ids
+
+    def get_next_hop_details(self, node_ids):
+        """Return the next hops of the nodes with what the agents need.
+
+        The next hops, their port pair details and ingress ports are read
+        by one query. The port pair details not bound to a host are left
+        out.
+
+        @return: dict of the lists of next hop details by node id
+        """
+        next_hop_details = {}
+        if not node_ids:
+            return next_hop_details
+        details = (PortPairDetail.local_endpoint, PortPairDetail.mac_address,
+                   PortPairDetail.segment_id, PortPairDetail.network_type,
+                   models_v2.Port.network_id)
+        query = self.admin_context.session.query(
+            PathNodeNextHop.pathnode_id, PathNodeNextHop.portpair_id,
+            PathNodeNextHop.weight, *details
+        ).join(
+            PortPairDetail, PortPairDetail.id == PathNodeNextHop.portpair_id
+        ).join(
+            models_v2.Port, models_v2.Port.id == PortPairDetail.ingress
+        ).filter(
+            PathNodeNextHop.pathnode_id.in_(list(set(node_ids))),
+            PortPairDetail.host_id != ''
+        ).order_by(PathNodeNextHop.pathnode_id, PathNodeNextHop.portpair_id)
+        rows = query.all()
+        missing = set(node_ids) - set(row[0] for row in rows)
+        if missing:
+            rows.extend(self._query_derived_next_hops(
+                missing, *details
+            ).join(
+                PortPairDetail, PortPairDetail.id == PathPortAssoc.portpair_id
+            ).join(
+                models_v2.Port, models_v2.Port.id == PortPairDetail.ingress
+            ).filter(PortPairDetail.host_id != ''))
+        for (node_id, portpair_id, weight, local_endpoint, mac_address,
+             segment_id, network_type, net_uuid) in rows:
+            next_hop_details.setdefault(node_id, []).append({
+                'local_endpoint': local_endpoint,
+                'weight': weight,
+                'mac_address': mac_address,
+                'segment_id': segment_id,
+                'network_type': network_type,
+                'net_uuid': net_uuid
+            })
+        return next_hop_details
 
     def create_path_node(self, node):
         with self.admin_context.session.begin(subtransactions=True):
             args = self._filter_non_model_columns(node, PathNode)
             args['id'] = uuidutils.generate_uuid()
             node_obj = PathNode(**args)
+            self._set_next_hops(node_obj, node.get('next_hop'))
             self.admin_context.session.add(node_obj)
+            self.invalidate_flowrules(portchain_ids=[node_obj.portchain_id])
+            # a new node has no port pair details yet
+            if (
+                node_obj.nsi == 0xff and
+                node_obj.next_group_id is not None
+            ):
+                self._update_group_refcnt(
+                    SRC_NODE_HOST_ID, node_obj.next_group_id, 1)
             return self._make_pathnode_dict(node_obj)
 
+    def _get_assoc_group_refcnt_keys(self, pathnode_id, portpair_id):
+        """Return the references of the node with and without the assoc.
+
+        Only the node and the port pair detail are read, in one query.
+        """
+        session = self.admin_context.session
+        host_id = session.query(PortPairDetail.host_id).filter(
+            PortPairDetail.id == portpair_id).as_scalar()
+        others = session.query(
+            sa.func.count(PathPortAssoc.portpair_id)
+        ).filter(
+            PathPortAssoc.pathnode_id == PathNode.id,
+            PathPortAssoc.portpair_id != portpair_id
+        ).as_scalar()
+        node = session.query(
+            PathNode.nsi, PathNode.next_group_id, host_id, others
+        ).filter(PathNode.id == pathnode_id).first()
+        if node is None or node[1] is None:
+            return [], []
+        nsi, group_id, host_id, others = node
+        without_keys = []
+        if not others and nsi == 0xff:
+            without_keys.append((SRC_NODE_HOST_ID, group_id))
+        with_keys = [(host_id, group_id)] if host_id else []
+        return without_keys, with_keys
+
     def create_pathport_assoc(self, assoc):
         with self.admin_context.session.begin(subtransactions=True):
             args = self._filter_non_model_columns(assoc, PathPortAssoc)
+            without_keys, with_keys = self._get_assoc_group_refcnt_keys(
+                args['pathnode_id'], args['portpair_id'])
             assoc_obj = PathPortAssoc(**args)
             self.admin_context.session.add(assoc_obj)
+            self.invalidate_flowrules(node_ids=[args['pathnode_id']])
+            self._update_group_refcnts(without_keys, with_keys)
             return self._make_pathport_assoc_dict(assoc_obj)
 
     def delete_pathport_assoc(self, pathnode_id, portdetail_id):
         with self.admin_context.session.begin(subtransactions=True):
-            self.admin_context.session.query(PathPortAssoc).filter_by(
+            without_keys, with_keys = self._get_assoc_group_refcnt_keys(
+                pathnode_id, portdetail_id)
+            if self.admin_context.session.query(PathPortAssoc).filter_by(
                 pathnode_id=pathnode_id,
-                portpair_id=portdetail_id).delete()
+                portpair_id=portdetail_id
+            ).delete():
+                self._update_group_refcnts(with_keys, without_keys)
+                self.invalidate_flowrules(node_ids=[pathnode_id])
 
     def update_port_detail(self, id, port):
         with self.admin_context.session.begin(subtransactions=True):
             port_obj = self._get_port_detail(id)
+            node_ids = []
+            if 'host_id' in port or 'path_nodes' in port:
+                node_ids = [assoc['pathnode_id']
+                            for assoc in port_obj['path_nodes']]
+                node_ids.extend(pn['pathnode_id']
+                                for pn in port.get('path_nodes', []))
+            old_keys = self._get_group_refcnt_keys(node_ids)
+            # any field of the port pair detail may be in a flow rule, of
+            # its own nodes or of the nodes sending to it
+            self.invalidate_flowrules(
+                node_ids=[assoc['pathnode_id']
+                          for assoc in port_obj['path_nodes']] +
+                [pn['pathnode_id'] for pn in port.get('path_nodes', [])] +
+                self._get_next_hop_node_ids(id))
             for key, value in six.iteritems(port):
                 if key == 'path_nodes':
                     pns = []
@@ -280,11 +903,22 @@ class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
                 else:
                     port_obj[key] = value
             port_obj.update(port)
+            if node_ids:
+                self.admin_context.session.flush()
+                self._update_group_refcnts(
+                    old_keys, self._get_group_refcnt_keys(node_ids))
             return self._make_port_detail_dict(port_obj)
 
     def update_path_node(self, id, node):
         with self.admin_context.session.begin(subtransactions=True):
             node_obj = self._get_path_node(id)
+            node_ids = []
+            if set(node) & set(['nsi', 'next_group_id', 'portpair_details']):
+                node_ids = [id]
+            old_keys = self._get_group_refcnt_keys(node_ids)
+            # the cached flow rules leave out the status the agents report
+            if set(node) - set(['status']):
+                self.invalidate_flowrules(node_ids=[id])
             for key, value in six.iteritems(node):
                 if key == 'portpair_details':
                     pds = []
@@ -303,19 +937,38 @@ class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
                             )
                         pds.append(pd_association)
                     node_obj[key] = pds
+                elif key == 'next_hop':
+                    self._set_next_hops(node_obj, value)
                 else:
                     node_obj[key] = value
+            if node_ids:
+                self.admin_context.session.flush()
+                self._update_group_refcnts(
+                    old_keys, self._get_group_refcnt_keys(node_ids))
             return self._make_pathnode_dict(node_obj)
 
     def delete_port_detail(self, id):
         with self.admin_context.session.begin(subtransactions=True):
             port_obj = self._get_port_detail(id)
+            node_ids = [assoc['pathnode_id']
+                        for assoc in port_obj['path_nodes']]
+            old_keys = self._get_group_refcnt_keys(node_ids)
+            self.invalidate_flowrules(
+                node_ids=node_ids + self._get_next_hop_node_ids(id))
             self.admin_context.session.delete(port_obj)
+            if node_ids:
+                self.admin_context.session.flush()
+                self._update_group_refcnts(
+                    old_keys, self._get_group_refcnt_keys(node_ids))
 
     def delete_path_node(self, id):
         with self.admin_context.session.begin(subtransactions=True):
             node_obj = self._get_path_node(id)
+            old_keys = self._get_group_refcnt_keys([id])
+            self.invalidate_flowrules(portchain_ids=[node_obj.portchain_id])
             self.admin_context.session.delete(node_obj)
+            self.admin_context.session.flush()
+            self._update_group_refcnts(old_keys, [])
 
     def get_port_detail(self, id):
         with self.admin_context.session.begin(subtransactions=True):
@@ -373,6 +1026,8 @@ class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
                 if column:
                     if not value:
                         qry = qry.filter(sql.false())
+                    elif isinstance(value, (list, set, tuple)):
+                        qry = qry.filter(column.in_(value))
                     else:
                         qry = qry.filter(column == value)
         return qry
@@ -416,6 +1071,8 @@ class OVSSfcDriverDB(common_db_mixin.CommonDbMixin):
                 if column:
                     if not value:
                         qry = qry.filter(sql.false())
+                    elif isinstance(value, (list, set, tuple)):
+                        qry = qry.filter(column.in_(value))
                     else:
                         qry = qry.filter(column == value)
 
@@ -12,11 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import threading
+
 import netaddr
 
+from oslo_db import api as oslo_db_api
+from oslo_db import exception as db_exc
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 
 from neutron.common import constants as nc_const
 from neutron.common import rpc as n_rpc
@@ -46,6 +50,11 @@ from networking_sfc.services.sfc.drivers.ovs import (
 LOG = logging.getLogger(__name__)
 
 
+def _next_hop_weights(next_hop):
+    return dict((member['portpair_id'], member['weight'])
+                for member in next_hop or [])
+
+
 class OVSSfcDriver(driver_base.SfcDriverBase,
                    ovs_sfc_db.OVSSfcDriverDB):
     """Sfc Driver Base Class."""
@@ -56,6 +65,8 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             sfc_topics.SFC_AGENT
         )
         self.rpc_ctx = n_context.get_admin_context_without_session()
+        # flow rules collected by _batch_flowrules, per green thread
+        self._flowrule_batch = threading.local()
         self._setup_rpc()
 
     def _setup_rpc(self):
@@ -211,17 +222,6 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             if cidr_set.issubset(subnet_cidr_set):
                 return subnet
 
-    def _get_subnet_by_port(self, id):
-        core_plugin = manager.NeutronManager.get_plugin()
-        port = core_plugin.get_port(self.admin_context, id)
-        for ip in port['fixed_ips']:
-            subnet = core_plugin.get_subnet(self.admin_context,
-                                            ip["subnet_id"])
-            # currently only support one subnet for a port
-            break
-
-        return subnet
-
     @log_helpers.log_method_call
     def _get_portgroup_members(self, context, pg_id):
         next_group_members = []
@@ -244,6 +244,82 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
                     dict(portpair_id=pd['id'], weight=1))
         return group_intid, next_group_members
 
+    def _prefetch_portchain_data(self, context, port_chain):
+        """Fetch everything _create_portchain_path looks up.
+
+        The port pair groups, port pairs, port details, ports and subnets
+        of the chain are each fetched by one query, so that building the
+        path does not query per port pair.
+
+        @return: dict with the port pair groups and port pairs by id, the
+        port details by port pair id, the subnet cidrs by port id and the
+        flow classifiers of the chain
+        """
+        plugin = context._plugin
+        plugin_context = context._plugin_context
+        groups = dict(
+            (ppg['id'], ppg) for ppg in plugin.get_port_pair_groups(
+                plugin_context,
+                filters={'id': port_chain['port_pair_groups']}))
+        pp_ids = [pp_id for ppg in groups.values()
+                  for pp_id in ppg['port_pairs']]
+        port_pairs = {}
+        if pp_ids:
+            for pp in plugin.get_port_pairs(plugin_context,
+                                            filters={'id': pp_ids}):
+                port_pairs[pp['id']] = pp
+
+        ingress_ports = [pp['ingress'] for pp in port_pairs.values()
+                         if pp.get('ingress')]
+        pds = dict(
+            ((pd['ingress'], pd['egress']), pd)
+            for pd in self.get_port_details_by_filter(
+                dict(ingress=ingress_ports)) or [])
+        port_details = {}
+        for pp in port_pairs.values():
+            pd = pds.get((pp.get('ingress'), pp.get('egress')))
+            if pd:
+                port_details[pp['id']] = pd
+
+        port_ids = set(ingress_ports)
+        port_ids.update(pp['egress'] for pp in port_pairs.values()
+                        if pp.get('egress'))
+        fcs = self._get_fcs_by_ids(port_chain['flow_classifiers'])
+        port_ids.update(fc['logical_source_port'] for fc in fcs)
+        cidrs = {}
+        if port_ids:
+            core_plugin = manager.NeutronManager.get_plugin()
+            ports = core_plugin.get_ports(
+                self.admin_context, filters={'id': list(port_ids)},
+                fields=['id', 'fixed_ips'])
+            # currently only support one subnet for a port
+            port_subnets = dict(
+                (port['id'], port['fixed_ips'][0]['subnet_id'])
+                for port in ports if port['fixed_ips'])
+            if port_subnets:
+                subnets = core_plugin.get_subnets(
+                    self.admin_context,
+                    filters={'id': list(set(port_subnets.values()))},
+                    fields=['id', 'cidr'])
+                subnet_cidrs = dict(
+                    (subnet['id'], subnet['cidr']) for subnet in subnets)
+                for port_id, subnet_id in port_subnets.items():
+                    cidrs[port_id] = subnet_cidrs.get(subnet_id)
+
+        return {'groups': groups, 'port_pairs': port_pairs,
+                'port_details': port_details, 'cidrs': cidrs,
+                'flow_classifiers': fcs}
+
+    def _get_prefetched_portgroup_members(self, chain_data, pg_id):
+        pg = chain_data['groups'][pg_id]
+        next_group_members = []
+        for pp_id in pg['port_pairs']:
+            pd = chain_data['port_details'].get(pp_id)
+            if pd:
+                next_group_members.append(
+                    dict(portpair_id=pd['id'], weight=1))
+        return pg['group_id'], next_group_members
+
     def _get_port_pair_detail_by_port_pair(self, context, port_pair_id):
         pp = context._plugin.get_port_pair(context._plugin_context,
                                            port_pair_id)
@@ -309,76 +385,50 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
                         if len(pd['path_nodes']) == 1:
                             self.delete_port_detail(pd['id'])
 
-    @log_helpers.log_method_call
-    def _create_portchain_path(self, context, port_chain):
-        src_node, src_pd, dst_node, dst_pd = (({}, ) * 4)
-        path_nodes = []
-        # Create an assoc object for chain_id and path_id
-        # context = context._plugin_context
-        path_id = port_chain['chain_id']
-
-        if not path_id:
-            LOG.error(_LE('No path_id available for creating port chain path'))
-            return
-
+    def _check_portchain_subnets(self, port_chain, chain_data):
         port_pair_groups = port_chain['port_pair_groups']
-        sf_path_length = len(port_pair_groups)
+        cidrs = chain_data['cidrs']
+
+        def _group_cidrs(pg_id, direction):
+            return set(
+                cidrs.get(chain_data['port_pairs'][pp_id][direction])
+                for pp_id in chain_data['groups'][pg_id]['port_pairs']
+                if chain_data['port_pairs'][pp_id].get(direction))
 
         # Detect cross-subnet transit
         # Compare subnets for logical source ports
         # and first PPG ingress ports
-        for fc in self._get_fcs_by_ids(port_chain['flow_classifiers']):
-            subnet1 = self._get_subnet_by_port(fc['logical_source_port'])
-            cidr1 = subnet1['cidr']
-            ppg = context._plugin.get_port_pair_group(context._plugin_context,
-                                                      port_pair_groups[0])
-            for pp_id1 in ppg['port_pairs']:
-                pp1 = context._plugin.get_port_pair(context._plugin_context,
-                                                    pp_id1)
-                filter1 = {}
-                if pp1.get('ingress', None):
-                    filter1 = dict(dict(ingress=pp1['ingress']), **filter1)
-                    pd1 = self.get_port_detail_by_filter(filter1)
-                    subnet2 = self._get_subnet_by_port(pd1['ingress'])
-                    cidr2 = subnet2['cidr']
-                    if cidr1 != cidr2:
-                        LOG.error(_LE('Cross-subnet chain not supported'))
-                        raise exc.SfcDriverError()
-                        return None
+        first_ingress_cidrs = _group_cidrs(port_pair_groups[0], 'ingress')
+        for fc in chain_data['flow_classifiers']:
+            cidr1 = cidrs.get(fc['logical_source_port'])
+            if first_ingress_cidrs - set([cidr1]):
+                LOG.error(_LE('Cross-subnet chain not supported'))
+                raise exc.SfcDriverError()
 
         # Compare subnets for PPG egress ports
         # and next PPG ingress ports
-        for i in range(sf_path_length - 1):
-            ppg = context._plugin.get_port_pair_group(context._plugin_context,
-                                                      port_pair_groups[i])
-            next_ppg = context._plugin.get_port_pair_group(
-                context._plugin_context, port_pair_groups[i + 1])
-            for pp_id1 in ppg['port_pairs']:
-                pp1 = context._plugin.get_port_pair(context._plugin_context,
-                                                    pp_id1)
-                filter1 = {}
-                if pp1.get('egress', None):
-                    filter1 = dict(dict(egress=pp1['egress']), **filter1)
-                    pd1 = self.get_port_detail_by_filter(filter1)
-                    subnet1 = self._get_subnet_by_port(pd1['egress'])
-                    cidr3 = subnet1['cidr']
-
-                for pp_id2 in next_ppg['port_pairs']:
-                    pp2 = context._plugin.get_port_pair(
-                        context._plugin_context, pp_id2)
-                    filter2 = {}
-                    if pp2.get('ingress', None):
-                        filter2 = dict(dict(ingress=pp2['ingress']), **filter2)
-                        pd2 = self.get_port_detail_by_filter(filter2)
-                        subnet2 = self._get_subnet_by_port(pd2['ingress'])
-                        cidr4 = subnet2['cidr']
-                        if cidr3 != cidr4:
-                            LOG.error(_LE('Cross-subnet chain not supported'))
-                            raise exc.SfcDriverError()
-                            return None
-
-        next_group_intid, next_group_members = self._get_portgroup_members(
-            context, port_chain['port_pair_groups'][0])
+        for i in range(len(port_pair_groups) - 1):
+            egress_cidrs = _group_cidrs(port_pair_groups[i], 'egress')
+            ingress_cidrs = _group_cidrs(port_pair_groups[i + 1], 'ingress')
+            if egress_cidrs and ingress_cidrs and (
+                len(egress_cidrs | ingress_cidrs) > 1
+            ):
+                LOG.error(_LE('Cross-subnet chain not supported'))
+                raise exc.SfcDriverError()
+
+    def _get_portchain_path_args(self, port_chain, chain_data):
+        """Get the path nodes port_chain should have.
+
+        @return: (src node args, list of (sf node args, members of the
+        node port pair group), dst node args): tuple
+        """
+        path_id = port_chain['chain_id']
+        port_pair_groups = port_chain['port_pair_groups']
+        sf_path_length = len(port_pair_groups)
+
+        next_group_intid, next_group_members = (
+            self._get_prefetched_portgroup_members(
+                chain_data, port_pair_groups[0]))
 
         # Create a head node object for port chain
         src_args = {'tenant_id': port_chain['tenant_id'],
@@ -388,11 +438,8 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
                     'portchain_id': port_chain['id'],
                     'status': ovs_const.STATUS_BUILDING,
                     'next_group_id': next_group_intid,
-                    'next_hop': jsonutils.dumps(next_group_members),
+                    'next_hop': next_group_members,
                     }
-        src_node = self.create_path_node(src_args)
-        LOG.debug('create src node: %s', src_node)
-        path_nodes.append(src_node)
 
         # Create a destination node object for port chain
         dst_args = {
@@ -405,23 +452,15 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             'next_group_id': None,
             'next_hop': None
         }
-        dst_node = self.create_path_node(dst_args)
-        LOG.debug('create dst node: %s', dst_node)
-        path_nodes.append(dst_node)
-
-        self._add_flowclassifier_port_assoc(
-            port_chain['flow_classifiers'],
-            port_chain['tenant_id'],
-            src_node
-        )
 
+        sf_args = []
         for i in range(sf_path_length):
             cur_group_members = next_group_members
             # next_group for next hop
             if i < sf_path_length - 1:
                 next_group_intid, next_group_members = (
-                    self._get_portgroup_members(
-                        context, port_pair_groups[i + 1])
+                    self._get_prefetched_portgroup_members(
+                        chain_data, port_pair_groups[i + 1])
                 )
             else:
                 next_group_intid = None
@@ -436,24 +475,59 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
                 'portchain_id': port_chain['id'],
                 'status': ovs_const.STATUS_BUILDING,
                 'next_group_id': next_group_intid,
-                'next_hop': (
-                    None if not next_group_members else
-                    jsonutils.dumps(next_group_members)
-                )
+                'next_hop': next_group_members or None
             }
-            sf_node = self.create_path_node(node_args)
-            LOG.debug('chain path node: %s', sf_node)
-            # Create the assocation objects that combine the pathnode_id with
-            # the ingress of the port_pairs in the current group
-            # when port_group does not reach tail
-            for member in cur_group_members:
-                assco_args = {'portpair_id': member['portpair_id'],
-                              'pathnode_id': sf_node['id'],
-                              'weight': member['weight'], }
-                sfna = self.create_pathport_assoc(assco_args)
-                LOG.debug('create assoc port with node: %s', sfna)
-                sf_node['portpair_details'].append(member['portpair_id'])
-            path_nodes.append(sf_node)
+            sf_args.append((node_args, cur_group_members))
+
+        return src_args, sf_args, dst_args
+
+    def _create_sf_node(self, node_args, members):
+        sf_node = self.create_path_node(node_args)
+        LOG.debug('chain path node: %s', sf_node)
+        # Create the assocation objects that combine the pathnode_id with
+        # the ingress of the port_pairs in the current group
+        # when port_group does not reach tail
+        for member in members:
+            assco_args = {'portpair_id': member['portpair_id'],
+                          'pathnode_id': sf_node['id'],
+                          'weight': member['weight'], }
+            sfna = self.create_pathport_assoc(assco_args)
+            LOG.debug('create assoc port with node: %s', sfna)
+            sf_node['portpair_details'].append(member['portpair_id'])
+        return sf_node
+
+    @log_helpers.log_method_call
+    def _create_portchain_path(self, context, port_chain):
+        path_nodes = []
+        # Create an assoc object for chain_id and path_id
+        # context = context._plugin_context
+        path_id = port_chain['chain_id']
+
+        if not path_id:
+            LOG.error(_LE('No path_id available for creating port chain path'))
+            return
+
+        chain_data = self._prefetch_portchain_data(context, port_chain)
+        self._check_portchain_subnets(port_chain, chain_data)
+        src_args, sf_args, dst_args = self._get_portchain_path_args(
+            port_chain, chain_data)
+
+        src_node = self.create_path_node(src_args)
+        LOG.debug('create src node: %s', src_node)
+        path_nodes.append(src_node)
+
+        dst_node = self.create_path_node(dst_args)
+        LOG.debug('create dst node: %s', dst_node)
+        path_nodes.append(dst_node)
+
+        self._add_flowclassifier_port_assoc(
+            port_chain['flow_classifiers'],
+            port_chain['tenant_id'],
+            src_node
+        )
+
+        for node_args, members in sf_args:
+            path_nodes.append(self._create_sf_node(node_args, members))
 
         return path_nodes
 
@@ -467,9 +541,7 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             None,
             fc_ids)
 
-        self.ovs_driver_rpc.ask_agent_to_delete_flow_rules(
-            self.admin_context,
-            flow_rule)
+        self._notify_flowrule(ovs_const.FLOWRULE_DELETE, flow_rule)
 
         self._delete_agent_fdb_entries(flow_rule)
 
@@ -505,36 +577,171 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             src_node
         )
 
-    def _update_path_node_next_hops(self, flow_rule):
-        node_next_hops = []
+    def _update_src_node_flow_classifiers(self, port_chain, src_node,
+                                          add_fc_ids, del_fc_ids,
+                                          notify=True):
+        """Apply the flow classifier changes to the classifier ports.
+
+        @param: notify: whether to send the changed flows of the ports,
+        False when the flows of the whole node are reinstalled anyway
+        """
+        if del_fc_ids:
+            kept_ports = set(
+                fc['logical_source_port'] for fc in self._get_fcs_by_ids(
+                    list(set(port_chain['flow_classifiers']) -
+                         set(add_fc_ids))))
+            del_fcs = self._get_fcs_by_ids(del_fc_ids)
+            del_ports = set(fc['logical_source_port'] for fc in del_fcs)
+            for each in src_node['portpair_details'] if notify else []:
+                port = self.get_port_detail_by_filter(dict(id=each))
+                if not port or port['egress'] not in del_ports:
+                    continue
+                if port['egress'] in kept_ports:
+                    self._update_path_node_port_flowrules(
+                        src_node, port, None, del_fc_ids)
+                else:
+                    self._delete_path_node_port_flowrule(
+                        src_node, port, del_fc_ids)
+            # the ports still used by another classifier keep their assoc
+            self._remove_flowclassifier_port_assoc(
+                [fc['id'] for fc in del_fcs
+                 if fc['logical_source_port'] not in kept_ports],
+                port_chain['tenant_id'],
+                src_node
+            )
+        if add_fc_ids:
+            self._add_flowclassifier_port_assoc(
+                add_fc_ids, port_chain['tenant_id'], src_node)
+            add_ports = set(fc['logical_source_port']
+                            for fc in self._get_fcs_by_ids(add_fc_ids))
+            for each in src_node['portpair_details'] if notify else []:
+                port = self.get_port_detail_by_filter(dict(id=each))
+                if port and port['egress'] in add_ports:
+                    self._update_path_node_port_flowrules(
+                        src_node, port, add_fc_ids, None)
+
+    def _relink_path_node(self, node, node_args, members, orig_fc_ids,
+                          fc_ids):
+        """Move node to its new place in the path and reinstall its flows."""
+        self._delete_path_node_flowrule(node, orig_fc_ids)
+        member_ids = set(member['portpair_id'] for member in members)
+        for pd_id in set(node['portpair_details']) - member_ids:
+            self.delete_pathport_assoc(node['id'], pd_id)
+        for member in members:
+            if member['portpair_id'] not in node['portpair_details']:
+                self.create_pathport_assoc({
+                    'portpair_id': member['portpair_id'],
+                    'pathnode_id': node['id'],
+                    'weight': member['weight']})
+        node = self.update_path_node(node['id'], node_args)
+        self._update_path_node_flowrules(node, fc_ids, None)
+
+    @staticmethod
+    def _path_node_changed(node, node_args, members=None):
+        if any(node[key] != node_args[key]
+               for key in ('nsi', 'next_group_id')):
+            return True
+        if _next_hop_weights(node['next_hop']) != _next_hop_weights(
+            node_args['next_hop']
+        ):
+            return True
+        return members is not None and (
+            set(node['portpair_details']) !=
+            set(member['portpair_id'] for member in members))
+
+    @log_helpers.log_method_call
+    def _update_portchain_path(self, context, orig, port_chain):
+        """Update the path of orig to the one of port_chain.
+
+        The nodes which keep their place, next hop and port pair details
+        only get the added and deleted flow classifiers. The nodes of new
+        port pair groups are created, the ones of removed groups deleted,
+        and the other nodes have their flows deleted and reinstalled.
+        """
+        nodes = self.get_path_nodes_by_filter(
+            dict(portchain_id=port_chain['id']))
+        if not nodes:
+            path_nodes = self._create_portchain_path(context, port_chain)
+            self._update_path_nodes(
+                path_nodes, port_chain['flow_classifiers'], None)
+            return
+
+        chain_data = self._prefetch_portchain_data(context, port_chain)
+        self._check_portchain_subnets(port_chain, chain_data)
+        src_args, sf_args, dst_args = self._get_portchain_path_args(
+            port_chain, chain_data)
+        del_fc_ids, add_fc_ids = self._get_diff_set(
+            orig['flow_classifiers'], port_chain['flow_classifiers'])
+        orig_fc_ids = orig['flow_classifiers']
+        fc_ids = port_chain['flow_classifiers']
+
+        src_node = dst_node = None
+        sf_nodes = {}
+        orig_groups = orig['port_pair_groups']
+        for node in nodes:
+            if node['node_type'] == ovs_const.SRC_NODE:
+                src_node = node
+            elif node['node_type'] == ovs_const.DST_NODE:
+                dst_node = node
+            elif 0 <= 0xfe - node['nsi'] < len(orig_groups):
+                sf_nodes[orig_groups[0xfe - node['nsi']]] = node
+
+        # from the tail to the head, so that a node is ready before the
+        # node in front of it is linked to it
+        for pg_id, (node_args, members) in reversed(
+            list(zip(port_chain['port_pair_groups'], sf_args))
+        ):
+            node = sf_nodes.pop(pg_id, None)
+            if node is None:
+                node = self._create_sf_node(node_args, members)
+                self._update_path_node_flowrules(node, fc_ids, None)
+            elif self._path_node_changed(node, node_args, members):
+                self._relink_path_node(
+                    node, node_args, members, orig_fc_ids, fc_ids)
+            elif add_fc_ids or del_fc_ids:
+                self._update_path_node_flowrules(
+                    node, list(add_fc_ids), list(del_fc_ids))
+
+        if self._path_node_changed(src_node, src_args):
+            self._delete_path_node_flowrule(src_node, orig_fc_ids)
+            src_node = self.update_path_node(src_node['id'], src_args)
+            self._update_src_node_flow_classifiers(
+                port_chain, src_node, list(add_fc_ids), list(del_fc_ids),
+                notify=False)
+            self._update_path_node_flowrules(src_node, fc_ids, None)
+        else:
+            self._update_src_node_flow_classifiers(
+                port_chain, src_node, list(add_fc_ids), list(del_fc_ids))
+
+        # the nodes of the removed port pair groups
+        for node in sf_nodes.values():
+            self._delete_path_node_flowrule(node, orig_fc_ids)
+            self.delete_path_node(node['id'])
+
+        if dst_node and dst_node['nsi'] != dst_args['nsi']:
+            self.update_path_node(dst_node['id'], {'nsi': dst_args['nsi']})
+
+    def _update_path_node_next_hops(self, flow_rule, next_hop_details=None):
         if not flow_rule['next_hop']:
             return None
-        next_hops = jsonutils.loads(flow_rule['next_hop'])
-        if not next_hops:
-            return None
-        core_plugin = manager.NeutronManager.get_plugin()
-        for member in next_hops:
-            detail = {}
-            port_detail = self.get_port_detail_by_filter(
-                dict(id=member['portpair_id']))
-            if not port_detail or not port_detail['host_id']:
-                continue
-            detail['local_endpoint'] = port_detail['local_endpoint']
-            detail['weight'] = member['weight']
-            detail['mac_address'] = port_detail['mac_address']
-            detail['segment_id'] = port_detail['segment_id']
-            detail['network_type'] = port_detail['network_type']
-            port = core_plugin.get_port(
-                self.admin_context, port_detail['ingress'])
-            detail['net_uuid'] = port['network_id']
-            node_next_hops.append(detail)
+        if next_hop_details is None:
+            next_hop_details = self.get_next_hop_details([flow_rule['id']])
+        node_next_hops = next_hop_details.get(flow_rule['id'], [])
         flow_rule['next_hops'] = node_next_hops
         flow_rule.pop('next_hop')
 
         return node_next_hops
 
     def _build_portchain_flowrule_body(self, node, port,
-                                       add_fc_ids=None, del_fc_ids=None):
+                                       add_fc_ids=None, del_fc_ids=None,
+                                       prefetched=None):
+        """Build the flow rule sent to the agent for node and port.
+
+        @param: prefetched: dict filled by _prefetch_flowrule_data, when
+        given the flow classifiers, group reference counts and next hops
+        are taken from it instead of being queried for this flow rule.
+        """
+        prefetched = prefetched or {}
         node_info = node.copy()
         node_info.pop('tenant_id')
         node_info.pop('portpair_details')
@@ -549,21 +756,29 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
         # if this port is belong to NSH/MPLS-aware vm, only to
         # notify the flow classifier for 1st SF.
         flow_rule['add_fcs'] = self._filter_flow_classifiers(
-            flow_rule, add_fc_ids)
+            flow_rule, add_fc_ids, prefetched.get('flow_classifiers'),
+            prefetched.get('filtered_flow_classifiers'))
         flow_rule['del_fcs'] = self._filter_flow_classifiers(
-            flow_rule, del_fc_ids)
+            flow_rule, del_fc_ids, prefetched.get('flow_classifiers'),
+            prefetched.get('filtered_flow_classifiers'))
 
-        self._update_portchain_group_reference_count(flow_rule,
-                                                     port['host_id'])
+        self._update_portchain_group_reference_count(
+            flow_rule, port['host_id'], prefetched.get('group_refcnts'))
 
         # update next hop info
-        self._update_path_node_next_hops(flow_rule)
+        self._update_path_node_next_hops(
+            flow_rule, prefetched.get('next_hops'))
 
         return flow_rule
 
-    def _filter_flow_classifiers(self, flow_rule, fc_ids):
+    def _filter_flow_classifiers(self, flow_rule, fc_ids, fcs_by_id=None,
+                                 filtered_fcs=None):
         """Filter flow classifiers.
 
+        @param: fcs_by_id: dict of already fetched flow classifiers
+        @param: filtered_fcs: dict of the copies of the flow classifiers
+        already built for other flow rules, by id, updated with the new
+        ones; by default the one of the _batch_flowrules block
         @return: list of the flow classifiers
         """
 
@@ -571,13 +786,24 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
 
         if not fc_ids:
             return fc_return
-        fcs = self._get_fcs_by_ids(fc_ids)
+        if fcs_by_id is not None:
+            fcs = [fcs_by_id[fc_id] for fc_id in fc_ids
+                   if fc_id in fcs_by_id]
+        else:
+            fcs = self._get_fcs_by_ids(fc_ids)
+        if filtered_fcs is None:
+            filtered_fcs = getattr(
+                self._flowrule_batch, 'filtered_fcs', None)
+        if filtered_fcs is None:
+            filtered_fcs = {}
         for fc in fcs:
-            new_fc = fc.copy()
-            new_fc.pop('id')
-            new_fc.pop('name')
-            new_fc.pop('tenant_id')
-            new_fc.pop('description')
+            new_fc = filtered_fcs.get(fc['id'])
+            if new_fc is None:
+                new_fc = filtered_fcs[fc['id']] = fc.copy()
+                new_fc.pop('id')
+                new_fc.pop('name')
+                new_fc.pop('tenant_id')
+                new_fc.pop('description')
 
             if (
                 flow_rule['node_type'] == ovs_const.SRC_NODE and
@@ -601,12 +827,49 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             add_fc_ids,
             del_fc_ids)
 
-        self.ovs_driver_rpc.ask_agent_to_update_flow_rules(
-            self.admin_context,
-            flow_rule)
+        self._notify_flowrule(ovs_const.FLOWRULE_UPDATE, flow_rule)
 
         self._update_agent_fdb_entries(flow_rule)
 
+    @contextlib.contextmanager
+    def _batch_flowrules(self):
+        """Send the flow rules of the block with one cast per host.
+
+        The updates and deletes keep their order within a host. A nested
+        block joins the outer one.
+        """
+        if getattr(self._flowrule_batch, 'entries', None) is not None:
+            yield
+            return
+        entries = self._flowrule_batch.entries = {}
+        # the flow classifiers of the block and their copies sent in the
+        # flow rules, by id
+        self._flowrule_batch.fcs = {}
+        self._flowrule_batch.filtered_fcs = {}
+        try:
+            yield
+        finally:
+            self._flowrule_batch.entries = None
+            self._flowrule_batch.fcs = None
+            self._flowrule_batch.filtered_fcs = None
+            for host, flowrule_entries in entries.items():
+                self.ovs_driver_rpc.ask_agent_to_update_flow_rules_batch(
+                    self.admin_context, host, flowrule_entries)
+
+    def _notify_flowrule(self, action, flow_rule):
+        entries = getattr(self._flowrule_batch, 'entries', None)
+        if entries is not None:
+            entries.setdefault(flow_rule['host'], []).append(
+                {'action': action, 'flowrule': flow_rule})
+        elif action == ovs_const.FLOWRULE_DELETE:
+            self.ovs_driver_rpc.ask_agent_to_delete_flow_rules(
+                self.admin_context,
+                flow_rule)
+        else:
+            self.ovs_driver_rpc.ask_agent_to_update_flow_rules(
+                self.admin_context,
+                flow_rule)
+
     def _update_path_node_flowrules(self, node,
                                     add_fc_ids=None, del_fc_ids=None):
         if node['portpair_details'] is None:
@@ -626,6 +889,21 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
         return self._get_fcs_by_ids(port_chain['flow_classifiers'])
 
     def _get_fcs_by_ids(self, fc_ids):
+        """Get the flow classifiers of fc_ids.
+
+        Within a _batch_flowrules block, a flow classifier is fetched once
+        and the same dict is returned to all the callers.
+        """
+        fcs = getattr(self._flowrule_batch, 'fcs', None)
+        if fcs is None:
+            return self._fetch_fcs_by_ids(fc_ids)
+        missing_ids = [fc_id for fc_id in fc_ids if fc_id not in fcs]
+        if missing_ids:
+            fcs.update((fc['id'], fc)
+                       for fc in self._fetch_fcs_by_ids(missing_ids))
+        return [fcs[fc_id] for fc_id in fc_ids if fc_id in fcs]
+
+    def _fetch_fcs_by_ids(self, fc_ids):
         flow_classifiers = []
         if not fc_ids:
             return flow_classifiers
@@ -639,26 +917,25 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             LOG.warning(_LW("Not found the flow classifier service plugin"))
             return flow_classifiers
 
-        for fc_id in fc_ids:
-            fc = fc_plugin.get_flow_classifier(self.admin_context, fc_id)
-            flow_classifiers.append(fc)
-
-        return flow_classifiers
+        return fc_plugin.get_flow_classifiers_by_ids(
+            self.admin_context, fc_ids)
 
     @log_helpers.log_method_call
     def create_port_chain(self, context):
         port_chain = context.current
-        path_nodes = self._create_portchain_path(context, port_chain)
-        self._update_path_nodes(
-            path_nodes,
-            port_chain['flow_classifiers'],
-            None)
+        with self._batch_flowrules():
+            path_nodes = self._create_portchain_path(context, port_chain)
+            self._update_path_nodes(
+                path_nodes,
+                port_chain['flow_classifiers'],
+                None)
 
     @log_helpers.log_method_call
     def delete_port_chain(self, context):
         port_chain = context.current
         LOG.debug("to delete portchain path")
-        self._delete_portchain_path(context, port_chain)
+        with self._batch_flowrules():
+            self._delete_portchain_path(context, port_chain)
 
     def _get_diff_set(self, orig, cur):
         orig_set = set(item for item in orig)
@@ -673,12 +950,10 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
     def update_port_chain(self, context):
         port_chain = context.current
         orig = context.original
-        self._delete_portchain_path(context, orig)
-        path_nodes = self._create_portchain_path(context, port_chain)
-        self._update_path_nodes(
-            path_nodes,
-            port_chain['flow_classifiers'],
-            None)
+        with self._batch_flowrules():
+            self._update_portchain_path(context, orig, port_chain)
+            # the flow classifiers are not kept with the path nodes
+            self.invalidate_flowrules(portchain_ids=[port_chain['id']])
 
     @log_helpers.log_method_call
     def create_port_pair_group(self, context):
@@ -690,6 +965,10 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
 
     @log_helpers.log_method_call
     def update_port_pair_group(self, context):
+        with self._batch_flowrules():
+            self._update_port_pair_group(context)
+
+    def _update_port_pair_group(self, context):
         current = context.current
         original = context.original
 
@@ -719,10 +998,7 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             # Update the previous node
             curr_group_intid, curr_group_members = self._get_portgroup_members(
                 context, current['id'])
-            prev_node['next_hop'] = (
-                jsonutils.dumps(curr_group_members)
-                if curr_group_members else None
-            )
+            prev_node['next_hop'] = curr_group_members or None
             # update next hop to database
             self.update_path_node(prev_node['id'], prev_node)
             self._delete_path_node_flowrule(
@@ -775,76 +1051,108 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
                 self.delete_pathport_assoc(curr_node['id'], ppd['id'])
 
     @log_helpers.log_method_call
-    def _get_portpair_detail_info(self, portpair_id):
-        """Get port detail.
+    def _get_portpair_detail_infos(self, port_ids):
+        """Get the port details of ports.
 
-        @param: portpair_id: uuid
-        @return: (host_id, local_ip, network_type, segment_id,
-        service_insert_type): tuple
+        The ports and their networks are looked up once for all the ports,
+        the tunnel endpoint once for each host of the ports.
+
+        @param: port_ids: list of uuid
+        @return: {port_id: (host_id, local_ip, network_type, segment_id,
+        mac_address)}: dict, without the ports that can not be used
         """
 
         core_plugin = manager.NeutronManager.get_plugin()
-        port_detail = core_plugin.get_port(self.admin_context, portpair_id)
-        host_id, local_ip, network_type, segment_id, mac_address = (
-            (None, ) * 5)
-
-        if port_detail:
+        ports = core_plugin.get_ports(
+            self.admin_context, filters={'id': list(set(port_ids))})
+        networks = dict(
+            (network['id'], network)
+            for network in core_plugin.get_networks(
+                self.admin_context,
+                filters={'id': list(set(
+                    port['network_id'] for port in ports))})
+        ) if ports else {}
+        host_endpoints = {}
+        infos = {}
+        for port_detail in ports:
             host_id = port_detail['binding:host_id']
-            network_id = port_detail['network_id']
-            mac_address = port_detail['mac_address']
-            network_info = core_plugin.get_network(
-                self.admin_context, network_id)
+            network_info = networks[port_detail['network_id']]
             network_type = network_info['provider:network_type']
-            segment_id = network_info['provider:segmentation_id']
-
-        if network_type != np_const.TYPE_VXLAN:
-            LOG.warning(_LW("Currently only support vxlan network"))
-            return ((None, ) * 5)
-        elif not host_id:
-            LOG.warning(_LW("This port has not been binding"))
-            return ((None, ) * 5)
-        else:
-            driver = core_plugin.type_manager.drivers.get(network_type)
-            host_endpoint = driver.obj.get_endpoint_by_host(host_id)
-            if host_endpoint:
-                local_ip = host_endpoint['ip_address']
-            else:
-                local_ip = None
+            if network_type != np_const.TYPE_VXLAN:
+                LOG.warning(_LW("Currently only support vxlan network"))
+                continue
+            elif not host_id:
+                LOG.warning(_LW("This port has not been binding"))
+                continue
+            if host_id not in host_endpoints:
+                driver = core_plugin.type_manager.drivers.get(network_type)
+                host_endpoint = driver.obj.get_endpoint_by_host(host_id)
+                host_endpoints[host_id] = (
+                    host_endpoint['ip_address'] if host_endpoint else None)
+            infos[port_detail['id']] = (
+                host_id, host_endpoints[host_id], network_type,
+                network_info['provider:segmentation_id'],
+                port_detail['mac_address'])
+        return infos
 
-        return host_id, local_ip, network_type, segment_id, mac_address
+    def _get_portpair_detail_info(self, portpair_id):
+        """Get port detail.
 
-    @log_helpers.log_method_call
-    def _create_port_detail(self, port_pair):
+        @param: portpair_id: uuid
+        @return: (host_id, local_ip, network_type, segment_id,
+        service_insert_type): tuple
+        """
+        return self._get_portpair_detail_infos([portpair_id]).get(
+            portpair_id, (None, ) * 5)
+
+    @staticmethod
+    def _get_port_pair_key_port(port_pair):
         # since first node may not assign the ingress port, and last node may
         # not assign the egress port. we use one of the
         # port as the key to get the SF information.
-        port = None
         if port_pair.get('ingress', None):
-            port = port_pair['ingress']
+            return port_pair['ingress']
         elif port_pair.get('egress', None):
-            port = port_pair['egress']
-
-        host_id, local_endpoint, network_type, segment_id, mac_address = (
-            self._get_portpair_detail_info(port))
-        port_detail = {
-            'ingress': port_pair.get('ingress', None),
-            'egress': port_pair.get('egress', None),
-            'tenant_id': port_pair['tenant_id'],
-            'host_id': host_id,
-            'segment_id': segment_id,
-            'network_type': network_type,
-            'local_endpoint': local_endpoint,
-            'mac_address': mac_address
-        }
-        r = self.create_port_detail(port_detail)
-        LOG.debug('create port detail: %s', r)
+            return port_pair['egress']
+        return None
+
+    def _create_port_details(self, port_pairs):
+        """Create the port details of port_pairs in one transaction."""
+        infos = self._get_portpair_detail_infos([
+            port for port in map(self._get_port_pair_key_port, port_pairs)
+            if port])
+        port_details = []
+        for port_pair in port_pairs:
+            host_id, local_endpoint, network_type, segment_id, mac_address = (
+                infos.get(self._get_port_pair_key_port(port_pair),
+                          (None, ) * 5))
+            port_details.append({
+                'ingress': port_pair.get('ingress', None),
+                'egress': port_pair.get('egress', None),
+                'tenant_id': port_pair['tenant_id'],
+                'host_id': host_id,
+                'segment_id': segment_id,
+                'network_type': network_type,
+                'local_endpoint': local_endpoint,
+                'mac_address': mac_address
+            })
+        r = self.create_port_details(port_details)
+        LOG.debug('create port details: %s', r)
         return r
 
+    @log_helpers.log_method_call
+    def _create_port_detail(self, port_pair):
+        return self._create_port_details([port_pair])[0]
+
     @log_helpers.log_method_call
     def create_port_pair(self, context):
         port_pair = context.current
         self._create_port_detail(port_pair)
 
+    @log_helpers.log_method_call
+    def create_port_pair_bulk(self, contexts):
+        self._create_port_details([context.current for context in contexts])
+
     @log_helpers.log_method_call
     def delete_port_pair(self, context):
         port_pair = context.current
@@ -927,6 +1235,163 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             LOG.exception(e)
             LOG.error(_LE("get_flowrules_by_host_portid failed"))
 
+    def get_flowrules_by_host_portids(self, context, host, port_ids):
+        """Get the flow rules of many ports bound on host at once.
+
+        Same result as calling get_flowrules_by_host_portid for each port,
+        but the port details, path nodes, port chains, flow classifiers,
+        group reference counts and next hops are each fetched by a single
+        query for all the ports.
+        """
+        try:
+            if not port_ids:
+                return []
+            ingress_ports = self.get_port_details_by_filter(
+                dict(ingress=list(port_ids))) or []
+            egress_ports = self.get_port_details_by_filter(
+                dict(egress=list(port_ids))) or []
+            ports_by_id = dict(
+                (port_id, []) for port_id in port_ids)
+            for port_detail in ingress_ports:
+                ports_by_id[port_detail['ingress']].append(port_detail)
+            for port_detail in egress_ports:
+                ports_by_id[port_detail['egress']].append(port_detail)
+            port_details = []
+            for port_id in port_ids:
+                port_details.extend(ports_by_id.pop(port_id, []))
+            # SF migrate to other host
+            for port_detail in port_details:
+                port_detail['host_id'] = host
+            return self._get_flowrules_by_port_details(
+                context, host, port_details)
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("get_flowrules_by_host_portids failed"))
+
+    def get_flowrules_by_host(self, context, host):
+        """Get the flow rules of all the ports bound on host."""
+        try:
+            port_details = self.get_port_details_by_filter(
+                dict(host_id=host)) or []
+            return self._get_flowrules_by_port_details(
+                context, host, port_details)
+        except Exception as e:
+            LOG.exception(e)
+            LOG.error(_LE("get_flowrules_by_host failed"))
+
+    @oslo_db_api.wrap_db_retry(
+        max_retries=ovs_sfc_db.DB_MAX_ATTEMPTS, retry_on_deadlock=True,
+        exception_checker=lambda e: isinstance(e, db_exc.DBDuplicateEntry))
+    def get_flowrule_changes_by_host(self, context, host, version=None):
+        """Get the flow rules of host changed since version.
+
+        The flow rules are kept built in the database, only those whose
+        port chain changed since they were built are built again.
+
+        @return: see OVSSfcDriverDB.get_host_flowrule_changes
+        """
+        self.refresh_host_flowrules(
+            host, lambda keys: self._build_host_flowrules(context, host, keys))
+        return self.get_host_flowrule_changes(host, version)
+
+    def _build_host_flowrules(self, context, host, keys):
+        port_details = self.get_port_details_by_filter(
+            dict(id=list(set(portpair_id for _, portpair_id in keys)))) or []
+        flowrules = {}
+        for key, flow_rule in self._iter_flowrules_by_port_details(
+            context, host, port_details, keys=set(keys)
+        ):
+            flow_rule.pop('status', None)
+            flowrules[key] = flow_rule
+        return flowrules
+
+    def _get_flowrules_by_port_details(self, context, host, port_details):
+        return [
+            flow_rule for key, flow_rule in
+            self._iter_flowrules_by_port_details(context, host, port_details)
+        ]
+
+    def _iter_flowrules_by_port_details(self, context, host, port_details,
+                                        keys=None):
+        """Yield the (pathnode_id, portpair_id) and flow rule of ports.
+
+        @param: keys: only build the flow rules of these keys when given
+        """
+        sfc_plugin = (
+            manager.NeutronManager.get_service_plugins().get(
+                sfc.SFC_EXT
+            )
+        )
+        if not sfc_plugin or not port_details:
+            return
+
+        nodes = self._get_path_nodes_by_ids(
+            [assoc['pathnode_id']
+             for port_detail in port_details
+             for assoc in port_detail['path_nodes']
+             if keys is None or
+             (assoc['pathnode_id'], port_detail['id']) in keys])
+        port_chain_ids = set(
+            node['portchain_id'] for node in nodes.values())
+        port_chains = {}
+        if port_chain_ids:
+            for port_chain in sfc_plugin.get_port_chains(
+                context, filters={'id': list(port_chain_ids)}
+            ):
+                port_chains[port_chain['id']] = port_chain
+        prefetched = self._prefetch_flowrule_data(
+            host, list(nodes.values()), list(port_chains.values()))
+
+        for port_detail in port_details:
+            for assoc in port_detail['path_nodes']:
+                node = nodes.get(assoc['pathnode_id'])
+                if not node or (
+                    keys is not None and
+                    (node['id'], port_detail['id']) not in keys
+                ):
+                    continue
+                port_chain = port_chains.get(node['portchain_id'])
+                if not port_chain:
+                    continue
+                flow_rule = self._build_portchain_flowrule_body(
+                    node,
+                    port_detail,
+                    add_fc_ids=port_chain['flow_classifiers'],
+                    prefetched=prefetched
+                )
+                yield (node['id'], port_detail['id']), flow_rule
+
+    def _get_path_nodes_by_ids(self, node_ids):
+        if not node_ids:
+            return {}
+        nodes = self.get_path_nodes_by_filter(
+            dict(id=list(set(node_ids)))) or []
+        return dict((node['id'], node) for node in nodes)
+
+    def _prefetch_flowrule_data(self, host, nodes, port_chains):
+        """Fetch what the flow rules of nodes need in a few queries.
+
+        @return: dict with the flow classifiers by id, the copies of them
+        shared by the flow rules, the reference count of every next group
+        on host and the next hop details by node id
+        """
+        fc_ids = set()
+        for port_chain in port_chains:
+            fc_ids.update(port_chain['flow_classifiers'])
+        fcs_by_id = dict(
+            (fc['id'], fc) for fc in self._get_fcs_by_ids(list(fc_ids)))
+
+        group_ids = set(node['next_group_id'] for node in nodes
+                        if node['next_group_id'] is not None)
+
+        return {
+            'flow_classifiers': fcs_by_id,
+            'filtered_flow_classifiers': {},
+            'group_refcnts': self.get_group_refcnts(host, group_ids),
+            'next_hops': self.get_next_hop_details(
+                [node['id'] for node in nodes if node['next_hop']])
+        }
+
     def update_flowrule_status(self, context, id, status):
         try:
             flowrule_status = dict(status=status)
@@ -935,30 +1400,17 @@ class OVSSfcDriver(driver_base.SfcDriverBase,
             LOG.exception(e)
             LOG.error(_LE("update_flowrule_status failed"))
 
-    def _update_portchain_group_reference_count(self, flow_rule, host):
+    def _update_portchain_group_reference_count(self, flow_rule, host,
+                                                group_refcnts=None):
         group_refcnt = 0
         flow_rule['host'] = host
 
-        if flow_rule['next_group_id'] is not None:
-            all_nodes = self.get_path_nodes_by_filter(
-                filters={'next_group_id': flow_rule['next_group_id'],
-                         'nsi': 0xff})
-            if all_nodes is not None:
-                for node in all_nodes:
-                    if not node['portpair_details']:
-                        group_refcnt += 1
-
-            port_details = self.get_port_details_by_filter(
-                dict(host_id=flow_rule['host']))
-            if port_details is not None:
-                for pd in port_details:
-                    for path in pd['path_nodes']:
-                        path_node = self.get_path_node(path['pathnode_id'])
-                        if (
-                            path_node['next_group_id'] ==
-                            flow_rule['next_group_id']
-                        ):
-                            group_refcnt += 1
+        if group_refcnts is not None:
+            group_refcnt = group_refcnts.get(flow_rule['next_group_id'], 0)
+        elif flow_rule['next_group_id'] is not None:
+            group_refcnt = self.get_group_refcnts(
+                host, [flow_rule['next_group_id']]
+            )[flow_rule['next_group_id']]
 
         flow_rule['group_refcnt'] = group_refcnt
 
@@ -25,10 +25,16 @@ LOG = logging.getLogger(__name__)
 
 
 class SfcRpcCallback(object):
-    """Sfc RPC server."""
+    """Sfc RPC server.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Add get_flowrules_by_host and get_flowrules_by_host_portids.
+        1.2 - Add get_flowrule_changes_by_host.
+    """
 
     def __init__(self, driver):
-        self.target = oslo_messaging.Target(version='1.0')
+        self.target = oslo_messaging.Target(version='1.2')
         self.driver = driver
 
     def get_flowrules_by_host_portid(self, context, **kwargs):
@@ -40,6 +46,25 @@ class SfcRpcCallback(object):
         LOG.debug('host: %s, port_id: %s', host, port_id)
         return pcfrs
 
+    def get_flowrules_by_host_portids(self, context, **kwargs):
+        host = kwargs.get('host')
+        port_ids = kwargs.get('port_ids')
+        LOG.debug('host: %s, port_ids: %s', host, port_ids)
+        return self.driver.get_flowrules_by_host_portids(
+            context, host, port_ids)
+
+    def get_flowrules_by_host(self, context, **kwargs):
+        host = kwargs.get('host')
+        LOG.debug('host: %s', host)
+        return self.driver.get_flowrules_by_host(context, host)
+
+    def get_flowrule_changes_by_host(self, context, **kwargs):
+        host = kwargs.get('host')
+        version = kwargs.get('version')
+        LOG.debug('host: %s, version: %s', host, version)
+        return self.driver.get_flowrule_changes_by_host(
+            context, host, version)
+
     def update_flowrules_status(self, context, **kwargs):
         flowrules_status = kwargs.get('flowrules_status')
         LOG.info(_LI('update_flowrules_status: %s'), flowrules_status)
@@ -49,7 +74,12 @@ class SfcRpcCallback(object):
 
 
 class SfcAgentRpcClient(object):
-    """RPC client for ovs sfc agent."""
+    """RPC client for ovs sfc agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Add update_flow_rules_batch.
+    """
 
     def __init__(self, topic=sfc_topics.SFC_AGENT):
         self.topic = topic
@@ -75,3 +105,20 @@ class SfcAgentRpcClient(object):
                 self.topic, sfc_topics.PORTFLOW, topics.DELETE),
             server=host)
         cctxt.cast(context, 'delete_flow_rules', flowrule_entries=flows)
+
+    def ask_agent_to_update_flow_rules_batch(self, context, host,
+                                             flowrule_entries):
+        """Send the ordered flow rule updates and deletes of host.
+
+        @param: flowrule_entries: list of dicts with the 'action', update
+        or delete, and the 'flowrule'
+        """
+        LOG.debug('Ask agent on host %(host)s to apply %(count)d flow '
+                  'rule changes', {'host': host,
+                                   'count': len(flowrule_entries)})
+        cctxt = self.client.prepare(
+            topic=topics.get_topic_name(
+                self.topic, sfc_topics.PORTFLOW, topics.UPDATE),
+            server=host, version='1.1')
+        cctxt.cast(context, 'update_flow_rules_batch',
+                   flowrule_entries=flowrule_entries)
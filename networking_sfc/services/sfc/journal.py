@@ -0,0 +1,107 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from neutron.common import config
+from neutron import context as n_context
+from neutron import worker
+
+from networking_sfc._i18n import _LE
+from networking_sfc.db import journal_db
+
+LOG = logging.getLogger(__name__)
+
+
+class JournalThread(object):
+    """Runs the entries of the sfc journal in the background.
+
+    The thread of the journal worker runs from the start of neutron-server,
+    and the API workers start their own thread on their first recorded
+    entry. Entries are claimed in the database, so the threads of the
+    processes share the work.
+
+    :param process: function called with an admin context and the entry
+        dict for every claimed entry; it completes the entry.
+    """
+
+    def __init__(self, process):
+        self._process = process
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name='sfc-journal')
+            thread.daemon = True
+            thread.start()
+
+    def wake(self):
+        """Run the journal now instead of at the next interval."""
+        self.start()
+        self._event.set()
+
+    def _run(self):
+        while True:
+            self._event.wait(cfg.CONF.sfc.journal_sync_interval)
+            self._event.clear()
+            try:
+                self.sync()
+            except Exception:
+                LOG.exception(_LE("Failed to run the sfc journal"))
+
+    def sync(self):
+        """Run the entries that can be run until none is left."""
+        context = n_context.get_admin_context()
+        journal_db.reset_stale_entries(context.session)
+        while True:
+            entry = journal_db.claim_next_entry(context.session)
+            if entry is None:
+                return
+            LOG.debug("Running sfc journal entry %s", entry)
+            self._process(n_context.get_admin_context(), entry)
+
+
+class JournalWorker(worker.NeutronWorker):
+    """Runs the sfc journal in a neutron-server worker process.
+
+    The thread starts once the process is forked, so the entries left over
+    by a previous neutron-server are run without waiting for a request.
+    """
+
+    def __init__(self, journal):
+        super(JournalWorker, self).__init__()
+        self._journal = journal
+
+    def start(self):
+        super(JournalWorker, self).start()
+        self._journal.wake()
+
+    def stop(self):
+        pass
+
+    def wait(self):
+        pass
+
+    @staticmethod
+    def reset():
+        config.reset_service()
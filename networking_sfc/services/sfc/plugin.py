@@ -12,34 +12,106 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from neutron_lib import constants as const
+from oslo_config import cfg
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from oslo_utils import excutils
 
 from networking_sfc._i18n import _LE
+from networking_sfc.db import journal_db
 from networking_sfc.db import sfc_db
 from networking_sfc.extensions import sfc as sfc_ext
+from networking_sfc.extensions import sfc_changes as sfc_changes_ext
 from networking_sfc.services.sfc.common import context as sfc_ctx
 from networking_sfc.services.sfc.common import exceptions as sfc_exc
 from networking_sfc.services.sfc import driver_manager as sfc_driver
+from networking_sfc.services.sfc import journal
 
 
 LOG = logging.getLogger(__name__)
 
+PORT_CHAIN = 'port_chain'
+
+PENDING_STATUS = {
+    'create': const.PENDING_CREATE,
+    'update': const.PENDING_UPDATE,
+    'delete': const.PENDING_DELETE
+}
+
 
 class SfcPlugin(sfc_db.SfcDbPlugin):
     """SFC plugin implementation."""
 
-    supported_extension_aliases = [sfc_ext.SFC_EXT]
+    supported_extension_aliases = [sfc_ext.SFC_EXT,
+                                   sfc_changes_ext.SFC_CHANGES_EXT]
     path_prefix = sfc_ext.SFC_PREFIX
+    __native_pagination_support = True
+    __native_sorting_support = True
 
     def __init__(self):
         self.driver_manager = sfc_driver.SfcDriverManager()
         super(SfcPlugin, self).__init__()
         self.driver_manager.initialize()
+        self.__native_bulk_support = self.driver_manager.native_bulk_support
+        self.journal = None
+        if cfg.CONF.sfc.async_driver_calls:
+            self.journal = journal.JournalThread(self._process_journal_entry)
+
+    def get_workers(self):
+        if self.journal:
+            return [journal.JournalWorker(self.journal)]
+        return []
+
+    def _record_port_chain_call(self, context, operation, port_chain,
+                                original_portchain=None):
+        status = PENDING_STATUS[operation]
+        self._set_port_chain_status(context, port_chain['id'], status)
+        journal_db.record(
+            context.session, PORT_CHAIN, port_chain['id'], operation,
+            {'current': port_chain, 'original': original_portchain})
+        port_chain['status'] = status
+
+    def _process_journal_entry(self, context, entry):
+        portchain_id = entry['resource_id']
+        operation = entry['operation']
+        portchain_db_context = sfc_ctx.PortChainContext(
+            self, context, entry['data']['current'],
+            original_portchain=entry['data']['original'])
+        driver_call = getattr(
+            self.driver_manager, '%s_port_chain' % operation)
+        try:
+            driver_call(portchain_db_context)
+        except Exception:
+            LOG.exception(_LE("Failed to %(operation)s port chain "
+                              "'%(id)s' in the background"),
+                          {'operation': operation, 'id': portchain_id})
+            status = const.ERROR
+        else:
+            status = const.ACTIVE
+        with context.session.begin(subtransactions=True):
+            journal_db.complete_entry(context.session, entry['seqnum'])
+            if status == const.ACTIVE and operation == 'delete':
+                super(SfcPlugin, self).delete_port_chain(
+                    context, portchain_id)
+            elif (
+                status == const.ERROR or
+                not journal_db.has_entries(context.session, portchain_id)
+            ):
+                # a later entry keeps its own pending status
+                self._set_port_chain_status(context, portchain_id, status)
 
     @log_helpers.log_method_call
     def create_port_chain(self, context, port_chain):
+        if self.journal:
+            with context.session.begin(subtransactions=True):
+                port_chain_db = super(SfcPlugin, self).create_port_chain(
+                    context, port_chain)
+                self._record_port_chain_call(
+                    context, 'create', port_chain_db)
+            self.journal.wake()
+            return port_chain_db
+
         port_chain_db = super(SfcPlugin, self).create_port_chain(
             context, port_chain)
         portchain_db_context = sfc_ctx.PortChainContext(
@@ -56,8 +128,37 @@ class SfcPlugin(sfc_db.SfcDbPlugin):
 
         return port_chain_db
 
+    @log_helpers.log_method_call
+    def create_port_chain_bulk(self, context, port_chains):
+        port_chain_dbs = []
+        try:
+            for item in port_chains['port_chains']:
+                port_chain_dbs.append(self.create_port_chain(context, item))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for port_chain_db in port_chain_dbs:
+                    LOG.error(_LE("Create port chains failed, "
+                                  "deleting port_chain '%s'"),
+                              port_chain_db['id'])
+                    self.delete_port_chain(context, port_chain_db['id'])
+        return port_chain_dbs
+
     @log_helpers.log_method_call
     def update_port_chain(self, context, portchain_id, port_chain):
+        if self.journal:
+            with context.session.begin(subtransactions=True):
+                original_portchain = self.get_port_chain(
+                    context, portchain_id)
+                if original_portchain['status'] == const.PENDING_DELETE:
+                    raise sfc_ext.PortChainPendingDelete(id=portchain_id)
+                updated_portchain = super(SfcPlugin, self).update_port_chain(
+                    context, portchain_id, port_chain)
+                self._record_port_chain_call(
+                    context, 'update', updated_portchain,
+                    original_portchain=original_portchain)
+            self.journal.wake()
+            return updated_portchain
+
         original_portchain = self.get_port_chain(context, portchain_id)
         updated_portchain = super(SfcPlugin, self).update_port_chain(
             context, portchain_id, port_chain)
@@ -78,6 +179,15 @@ class SfcPlugin(sfc_db.SfcDbPlugin):
 
     @log_helpers.log_method_call
     def delete_port_chain(self, context, portchain_id):
+        if self.journal:
+            with context.session.begin(subtransactions=True):
+                pc = self.get_port_chain(context, portchain_id)
+                if pc['status'] == const.PENDING_DELETE:
+                    return
+                self._record_port_chain_call(context, 'delete', pc)
+            self.journal.wake()
+            return
+
         pc = self.get_port_chain(context, portchain_id)
         pc_context = sfc_ctx.PortChainContext(self, context, pc)
         try:
@@ -108,6 +218,26 @@ class SfcPlugin(sfc_db.SfcDbPlugin):
 
         return portpair_db
 
+    @log_helpers.log_method_call
+    def create_port_pair_bulk(self, context, port_pairs):
+        portpair_dbs = super(SfcPlugin, self).create_port_pair_bulk(
+            context, port_pairs)
+        portpair_contexts = [
+            sfc_ctx.PortPairContext(self, context, portpair_db)
+            for portpair_db in portpair_dbs]
+        try:
+            self.driver_manager.create_port_pair_bulk(portpair_contexts)
+        except sfc_exc.SfcDriverError as e:
+            LOG.exception(e)
+            with excutils.save_and_reraise_exception():
+                for portpair_db in portpair_dbs:
+                    LOG.error(_LE("Create port pairs failed, "
+                                  "deleting port_pair '%s'"),
+                              portpair_db['id'])
+                    self.delete_port_pair(context, portpair_db['id'])
+
+        return portpair_dbs
+
     @log_helpers.log_method_call
     def update_port_pair(self, context, portpair_id, port_pair):
         original_portpair = self.get_port_pair(context, portpair_id)
@@ -159,6 +289,28 @@ class SfcPlugin(sfc_db.SfcDbPlugin):
 
         return portpairgroup_db
 
+    @log_helpers.log_method_call
+    def create_port_pair_group_bulk(self, context, port_pair_groups):
+        portpairgroup_dbs = super(SfcPlugin, self).create_port_pair_group_bulk(
+            context, port_pair_groups)
+        portpairgroup_contexts = [
+            sfc_ctx.PortPairGroupContext(self, context, portpairgroup_db)
+            for portpairgroup_db in portpairgroup_dbs]
+        try:
+            self.driver_manager.create_port_pair_group_bulk(
+                portpairgroup_contexts)
+        except sfc_exc.SfcDriverError as e:
+            LOG.exception(e)
+            with excutils.save_and_reraise_exception():
+                for portpairgroup_db in portpairgroup_dbs:
+                    LOG.error(_LE("Create port pair groups failed, "
+                                  "deleting port_pair_group '%s'"),
+                              portpairgroup_db['id'])
+                    self.delete_port_pair_group(
+                        context, portpairgroup_db['id'])
+
+        return portpairgroup_dbs
+
     @log_helpers.log_method_call
     def update_port_pair_group(
         self, context, portpairgroup_id, port_pair_group
@@ -0,0 +1,154 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare flow programming rate of the ovs-ofctl and native backends.
+
+Both backends talk to the same stand-in OpenFlow 1.3 switch listening on
+the loopback, so neither root nor a running ovs-vswitchd is required.
+"""
+
+import socket
+import struct
+import threading
+import time
+
+from neutron.agent.common import ovs_lib
+from neutron.agent.common import utils
+from neutron.tests import base
+from oslo_log import log as logging
+
+from networking_sfc.services.sfc.common import ofp_lib
+
+LOG = logging.getLogger(__name__)
+
+FLOW_COUNT = 200
+
+
+class FakeOpenFlowSwitch(object):
+    """Accepts OpenFlow 1.3 connections and acknowledges every request."""
+
+    def __init__(self):
+        self.flow_mods = 0
+        self.group_mods = 0
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(16)
+        self.target = 'tcp:127.0.0.1:%d' % self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _addr = self._server.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _recv(self, conn, length):
+        data = b''
+        while len(data) < length:
+            chunk = conn.recv(length - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def _reply(self, conn, msg_type, xid, body=b''):
+        conn.sendall(ofp_lib.OFP_HEADER.pack(
+            ofp_lib.OFP_VERSION, msg_type,
+            ofp_lib.OFP_HEADER.size + len(body), xid) + body)
+
+    def _serve(self, conn):
+        self._reply(conn, ofp_lib.OFPT_HELLO, 0)
+        try:
+            while True:
+                version, msg_type, length, xid = ofp_lib.OFP_HEADER.unpack(
+                    self._recv(conn, ofp_lib.OFP_HEADER.size))
+                body = self._recv(conn, length - ofp_lib.OFP_HEADER.size)
+                if msg_type == ofp_lib.OFPT_FLOW_MOD:
+                    self.flow_mods += 1
+                elif msg_type == ofp_lib.OFPT_GROUP_MOD:
+                    self.group_mods += 1
+                elif msg_type == ofp_lib.OFPT_ECHO_REQUEST:
+                    self._reply(conn, ofp_lib.OFPT_ECHO_REPLY, xid, body)
+                elif msg_type == ofp_lib.OFPT_BARRIER_REQUEST:
+                    self._reply(conn, ofp_lib.OFPT_BARRIER_REPLY, xid)
+                elif msg_type == ofp_lib.OFPT_MULTIPART_REQUEST:
+                    # empty reply for dump-flows, dump-groups and friends
+                    self._reply(conn, ofp_lib.OFPT_MULTIPART_REPLY, xid,
+                                body[:2] + struct.pack('!H4x', 0))
+        except (EOFError, socket.error):
+            pass
+        finally:
+            conn.close()
+
+
+def _flows():
+    return [{'table': 5, 'priority': 30, 'dl_type': 0x0800,
+             'nw_proto': 6, 'nw_src': '10.0.%d.0/24' % (i // 256),
+             'tp_dst': i, 'in_port': 1,
+             'actions': 'push_mpls:0x8847,set_mpls_label:%d,'
+                        'set_mpls_ttl:255,group:1' % (i + 256)}
+            for i in range(FLOW_COUNT)]
+
+
+class OpenFlowBackendBenchmarkTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(OpenFlowBackendBenchmarkTestCase, self).setUp()
+        self.switch = FakeOpenFlowSwitch()
+        self.addCleanup(self.switch.stop)
+
+    def _rate(self, func):
+        start = time.time()
+        for flow in _flows():
+            func(flow)
+        return FLOW_COUNT / max(time.time() - start, 1e-6)
+
+    def _native_rate(self):
+        channel = ofp_lib.OpenFlowChannel(self.switch.target)
+        self.addCleanup(channel.close)
+        return self._rate(lambda flow: channel.send(
+            [ofp_lib.encode_flow_mod('add', flow)]))
+
+    def _ofctl_rate(self):
+        def add_flow(flow):
+            utils.execute(['ovs-ofctl', '-O', 'openflow13', 'add-flows',
+                           self.switch.target, '-'],
+                          process_input=ovs_lib._build_flow_expr_str(
+                              dict(flow), 'add'))
+        return self._rate(add_flow)
+
+    def test_native_backend_programs_every_flow(self):
+        self._native_rate()
+        self.assertEqual(FLOW_COUNT, self.switch.flow_mods)
+
+    def test_flows_per_second(self):
+        try:
+            utils.execute(['ovs-ofctl', '--version'])
+        except Exception:
+            self.skipTest("ovs-ofctl is not installed")
+        native = self._native_rate()
+        ofctl = self._ofctl_rate()
+        LOG.info("flows per second: native %(native).1f, "
+                 "ovs-ofctl %(ofctl).1f", {'native': native, 'ofctl': ofctl})
+        self.assertEqual(2 * FLOW_COUNT, self.switch.flow_mods)
+        self.assertGreater(native, ofctl)
@@ -25,8 +25,10 @@ from oslo_utils import uuidutils
 
 from neutron.api import extensions as api_ext
 from neutron.common import config
+from neutron import context
 import neutron.extensions as nextensions
 
+from networking_sfc.db import changes_db
 from networking_sfc.db import flowclassifier_db as fdb
 from networking_sfc import extensions
 from networking_sfc.extensions import flowclassifier as fc_ext
@@ -56,6 +58,19 @@ class FlowClassifierDbPluginTestCaseBase(base.BaseTestCase):
             self.assertEqual(expected_res_status, res.status_int)
         return res
 
+    def _create_flow_classifier_bulk(
+        self, fmt, flow_classifiers, expected_res_status=None
+    ):
+        data = {'flow_classifiers': [
+            {'flow_classifier': dict(flow_classifier,
+                                     tenant_id=self._tenant_id)}
+            for flow_classifier in flow_classifiers]}
+        req = self.new_create_request('flow_classifiers', data, fmt)
+        res = req.get_response(self.ext_api)
+        if expected_res_status:
+            self.assertEqual(expected_res_status, res.status_int)
+        return res
+
     @contextlib.contextmanager
     def flow_classifier(
         self, fmt=None, flow_classifier=None, do_delete=True, **kwargs
@@ -1381,6 +1396,78 @@ class FlowClassifierDbPluginTestCase(
                 expected_res_status=404
             )
 
+    def test_create_flow_classifier_bulk(self):
+        with self.port(
+            name='test1'
+        ) as port, self.port(
+            name='test2'
+        ) as port2:
+            flow_classifiers = [{
+                'name': 'test%d' % i,
+                'source_ip_prefix': '192.168.%d.0/24' % i,
+                'logical_source_port': port['port']['id'],
+                'logical_destination_port': port2['port']['id']
+            } for i in range(3)]
+            res = self._create_flow_classifier_bulk(
+                self.fmt, flow_classifiers, expected_res_status=201)
+            fcs = self.deserialize(self.fmt, res)['flow_classifiers']
+            self.assertEqual(3, len(fcs))
+            for fc, flow_classifier in zip(fcs, flow_classifiers):
+                for k, v in six.iteritems(
+                    self._get_expected_flow_classifier(flow_classifier)
+                ):
+                    self.assertEqual(v, fc[k])
+            self._test_list_resources(
+                'flow_classifier',
+                [{'flow_classifier': fc} for fc in fcs])
+            for fc in fcs:
+                self._delete('flow_classifiers', fc['id'])
+
+    def test_create_flow_classifier_bulk_conflict(self):
+        with self.port(
+            name='test1'
+        ) as port:
+            # the classifiers of the request conflict with each other
+            self._create_flow_classifier_bulk(
+                self.fmt, [{
+                    'source_ip_prefix': '192.168.0.0/16',
+                    'logical_source_port': port['port']['id']
+                }, {
+                    'source_ip_prefix': '192.168.100.0/24',
+                    'logical_source_port': port['port']['id']
+                }],
+                expected_res_status=400)
+            self._test_list_resources('flow_classifier', [])
+            with self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.100.0/24',
+                'logical_source_port': port['port']['id']
+            }) as fc:
+                # the last classifier conflicts with an existing one
+                self._create_flow_classifier_bulk(
+                    self.fmt, [{
+                        'source_ip_prefix': '192.168.101.0/24',
+                        'logical_source_port': port['port']['id']
+                    }, {
+                        'logical_source_port': port['port']['id']
+                    }],
+                    expected_res_status=400)
+                self._test_list_resources('flow_classifier', [fc])
+
+    def test_create_flow_classifier_bulk_with_unknown_port_id(self):
+        with self.port(
+            name='test1'
+        ) as port:
+            self._create_flow_classifier_bulk(
+                self.fmt, [{
+                    'source_ip_prefix': '192.168.100.0/24',
+                    'logical_source_port': port['port']['id']
+                }, {
+                    'source_ip_prefix': '192.168.101.0/24',
+                    'logical_source_port': uuidutils.generate_uuid()
+                }],
+                expected_res_status=404)
+            self._test_list_resources('flow_classifier', [])
+
     def test_list_flow_classifiers(self):
         with self.port(
             name='test1'
@@ -1460,6 +1547,58 @@ class FlowClassifierDbPluginTestCase(
                 for k, v in six.iteritems(fc['flow_classifier']):
                     self.assertEqual(res['flow_classifier'][k], v)
 
+    def test_get_flow_classifiers_by_ids(self):
+        with self.port(
+            name='test1'
+        ) as port:
+            with self.flow_classifier(flow_classifier={
+                'name': 'test1',
+                'source_ip_prefix': '10.100.0.0/16',
+                'logical_source_port': port['port']['id']
+            }) as fc1, self.flow_classifier(flow_classifier={
+                'name': 'test2',
+                'source_ip_prefix': '10.101.0.0/16',
+                'logical_source_port': port['port']['id']
+            }) as fc2:
+                ctx = context.get_admin_context()
+                fc_ids = [fc2['flow_classifier']['id'],
+                          uuidutils.generate_uuid(),
+                          fc1['flow_classifier']['id']]
+                self.assertEqual(
+                    [fc2['flow_classifier'], fc1['flow_classifier']],
+                    self.flowclassifier_plugin.get_flow_classifiers_by_ids(
+                        ctx, fc_ids))
+                self.assertEqual(
+                    [{'name': 'test2'}, {'name': 'test1'}],
+                    self.flowclassifier_plugin.get_flow_classifiers_by_ids(
+                        ctx, fc_ids, fields=['name']))
+                self.assertEqual(
+                    [], self.flowclassifier_plugin.get_flow_classifiers_by_ids(
+                        ctx, []))
+
+    def test_flow_classifier_changes_recorded(self):
+        with self.port(
+            name='test1'
+        ) as port:
+            with self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '10.100.0.0/16',
+                'logical_source_port': port['port']['id']
+            }) as fc:
+                fc_id = fc['flow_classifier']['id']
+                self._update('flow_classifiers', fc_id, {
+                    'flow_classifier': {'name': 'test2'}
+                })
+        session = context.get_admin_context().session
+        self.assertEqual(
+            [('flow_classifier', fc_id, changes_db.CREATE),
+             ('flow_classifier', fc_id, changes_db.UPDATE),
+             ('flow_classifier', fc_id, changes_db.DELETE)],
+            session.query(
+                changes_db.SfcChange.resource_type,
+                changes_db.SfcChange.resource_id,
+                changes_db.SfcChange.operation
+            ).order_by(changes_db.SfcChange.seqnum).all())
+
     def test_show_flow_classifier_noexist(self):
         req = self.new_show_request(
             'flow_classifiers', '1'
@@ -1563,6 +1702,24 @@ class FlowClassifierDbPluginTestCase(
                 res = req.get_response(self.ext_api)
                 self.assertEqual(404, res.status_int)
 
+    def test_delete_flow_classifier_bulk(self):
+        with self.port(
+            name='test1'
+        ) as port:
+            res = self._create_flow_classifier_bulk(
+                self.fmt, [{
+                    'source_ip_prefix': '192.168.%d.0/24' % i,
+                    'logical_source_port': port['port']['id']
+                } for i in range(3)],
+                expected_res_status=201)
+            fcs = self.deserialize(self.fmt, res)['flow_classifiers']
+            self.flowclassifier_plugin.delete_flow_classifier_bulk(
+                context.get_admin_context(),
+                [fcs[0]['id'], fcs[2]['id'], uuidutils.generate_uuid()])
+            self._test_list_resources(
+                'flow_classifier', [{'flow_classifier': fcs[1]}])
+            self._delete('flow_classifiers', fcs[1]['id'])
+
     def test_delete_flow_classifier_noexist(self):
         req = self.new_delete_request(
             'flow_classifiers', '1'
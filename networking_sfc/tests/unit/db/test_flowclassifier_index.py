@@ -0,0 +1,177 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+import time
+
+import mock
+
+from neutron.tests import base
+from oslo_log import log as logging
+
+from networking_sfc.db import flowclassifier_db as fdb
+from networking_sfc.db import flowclassifier_index
+
+LOG = logging.getLogger(__name__)
+
+
+def _flow_classifier(fc_id, **kwargs):
+    flow_classifier = {
+        'id': fc_id,
+        'ethertype': 'IPv4',
+        'protocol': None,
+        'source_ip_prefix': None,
+        'destination_ip_prefix': None,
+        'source_port_range_min': None,
+        'source_port_range_max': None,
+        'destination_port_range_min': None,
+        'destination_port_range_max': None,
+        'logical_source_port': None,
+        'logical_destination_port': None,
+    }
+    flow_classifier.update(kwargs)
+    return flow_classifier
+
+
+class FlowClassifierConflictIndexTestCase(base.BaseTestCase):
+    def _random_ip_prefix(self, rand, ethertype):
+        if rand.random() < 0.3:
+            return None
+        if ethertype == 'IPv4':
+            return '10.%d.%d.%d/%d' % (
+                rand.randint(0, 3), rand.randint(0, 3),
+                rand.randint(0, 255), rand.choice([8, 16, 20, 24, 30, 32]))
+        return 'fd00:%x::%x/%d' % (
+            rand.randint(0, 3), rand.randint(0, 5),
+            rand.choice([16, 32, 48, 64, 128]))
+
+    def _random_port_range(self, rand):
+        choice = rand.random()
+        if choice < 0.3:
+            return None, None
+        port_range_min = rand.randint(1, 100)
+        port_range_max = rand.randint(port_range_min, 120)
+        if choice < 0.4:
+            return port_range_min, None
+        if choice < 0.5:
+            return None, port_range_max
+        return port_range_min, port_range_max
+
+    def _random_flow_classifier(self, rand, fc_id):
+        ethertype = rand.choice(['IPv4', 'IPv4', 'IPv6'])
+        protocol = rand.choice([None, 'tcp', 'udp'])
+        source_ports = destination_ports = (None, None)
+        if protocol:
+            source_ports = self._random_port_range(rand)
+            destination_ports = self._random_port_range(rand)
+        return _flow_classifier(
+            fc_id,
+            ethertype=ethertype,
+            protocol=protocol,
+            source_ip_prefix=self._random_ip_prefix(rand, ethertype),
+            destination_ip_prefix=self._random_ip_prefix(rand, ethertype),
+            source_port_range_min=source_ports[0],
+            source_port_range_max=source_ports[1],
+            destination_port_range_min=destination_ports[0],
+            destination_port_range_max=destination_ports[1],
+            logical_source_port=rand.choice([None, 'p1', 'p2', 'p3']),
+            logical_destination_port=rand.choice([None, 'p1', 'p2']))
+
+    def test_same_answers_as_pairwise_conflict(self):
+        rand = random.Random(1)
+        flow_classifiers = [
+            self._random_flow_classifier(rand, 'fc%d' % i)
+            for i in range(300)]
+        index = flowclassifier_index.FlowClassifierConflictIndex(
+            flow_classifiers[:200])
+        for i in rand.sample(range(200), 50):
+            index.remove('fc%d' % i)
+        indexed = [fc for fc in flow_classifiers[:200] if fc['id'] in index]
+        self.assertEqual(150, len(index))
+        for flow_classifier in flow_classifiers[200:]:
+            flow_classifier.pop('id')
+            self.assertEqual(
+                sorted(fc['id'] for fc in indexed
+                       if fdb.FlowClassifierDbPlugin.flowclassifier_conflict(
+                           flow_classifier, fc)),
+                sorted(index.conflicts(flow_classifier)))
+
+    def test_same_answers_as_pairwise_basic_conflict(self):
+        rand = random.Random(2)
+        flow_classifiers = [
+            self._random_flow_classifier(rand, 'fc%d' % i)
+            for i in range(200)]
+        index = flowclassifier_index.FlowClassifierConflictIndex(
+            flow_classifiers[:150], logical_ports=False)
+        for flow_classifier in flow_classifiers[150:]:
+            flow_classifier.pop('id')
+            self.assertEqual(
+                sorted(fc['id'] for fc in flow_classifiers[:150]
+                       if fdb.FlowClassifierDbPlugin
+                       .flowclassifier_basic_conflict(flow_classifier, fc)),
+                sorted(index.conflicts(flow_classifier)))
+
+    def test_find_conflict(self):
+        index = flowclassifier_index.FlowClassifierConflictIndex([
+            _flow_classifier('fc1', source_ip_prefix='10.0.0.0/16'),
+            _flow_classifier('fc2', protocol='tcp',
+                             destination_port_range_min=80,
+                             destination_port_range_max=80,
+                             logical_source_port='p1'),
+        ])
+        self.assertEqual('fc1', index.find_conflict(_flow_classifier(
+            None, source_ip_prefix='10.0.1.1/32', protocol='udp')))
+        self.assertIsNone(index.find_conflict(_flow_classifier(
+            None, source_ip_prefix='10.1.0.0/16', protocol='tcp',
+            destination_port_range_min=81, logical_source_port='p1')))
+        self.assertEqual('fc2', index.find_conflict(_flow_classifier(
+            None, source_ip_prefix='10.1.0.0/16', protocol='tcp',
+            destination_port_range_max=80)))
+        self.assertIsNone(index.find_conflict(_flow_classifier(
+            None, ethertype='IPv6')))
+        # a classifier does not conflict with itself
+        self.assertIsNone(index.find_conflict(_flow_classifier(
+            'fc1', source_ip_prefix='10.0.0.0/16', protocol='udp')))
+
+    def test_compares_only_candidates(self):
+        count = 20000
+
+        def flow_classifier(i):
+            return _flow_classifier(
+                'fc%d' % i, protocol='tcp',
+                source_ip_prefix='10.%d.%d.0/24' % (i // 256 % 256, i % 256),
+                destination_port_range_min=i % 1000 + 1,
+                destination_port_range_max=i % 1000 + 1,
+                logical_source_port='port%d' % i)
+
+        start = time.time()
+        index = flowclassifier_index.FlowClassifierConflictIndex(
+            flow_classifier(i) for i in range(count))
+        build_time = time.time() - start
+        conflict = flowclassifier_index._IndexedFlowClassifier.conflict
+        with mock.patch.object(
+            flowclassifier_index._IndexedFlowClassifier, 'conflict',
+            autospec=True, side_effect=conflict
+        ) as mocked_conflict:
+            start = time.time()
+            for i in range(count - 100, count + 100):
+                query = flow_classifier(i)
+                query['id'] = None
+                index.find_conflict(query)
+            check_time = (time.time() - start) / 200
+        LOG.info("%(count)d flow classifiers indexed in %(build).3f "
+                 "seconds, %(check).6f seconds per conflict check",
+                 {'count': count, 'build': build_time, 'check': check_time})
+        # the logical source port bucket holds one classifier at most
+        self.assertLessEqual(mocked_conflict.call_count, 200)
@@ -0,0 +1,143 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from oslo_db import exception as db_exc
+
+from neutron import context
+from neutron.tests.unit import testlib_api
+
+from networking_sfc.db import id_allocator
+
+
+class IdAllocatorTestCase(testlib_api.SqlTestCase):
+    def setUp(self):
+        super(IdAllocatorTestCase, self).setUp()
+        self.session = context.get_admin_context().session
+
+    def _allocator(self, min_id=1, max_id=10, used_ids=()):
+        def _used_ids(session, id_=None):
+            rows = [(used_id,) for used_id in used_ids
+                    if id_ in (None, used_id)]
+            query = mock.MagicMock()
+            query.__iter__.return_value = iter(rows)
+            query.first.return_value = rows[0] if rows else None
+            return query
+
+        return id_allocator.IdAllocator('test', min_id, max_id, _used_ids)
+
+    def _free_ranges(self):
+        return [
+            tuple(free_range) for free_range in self.session.query(
+                id_allocator.IdFreeRange.first_id,
+                id_allocator.IdFreeRange.last_id
+            ).order_by(id_allocator.IdFreeRange.first_id)
+        ]
+
+    def test_free_ranges(self):
+        self.assertEqual(
+            [(1, 1), (4, 4), (7, 10)],
+            list(id_allocator._free_ranges(1, 10, [2, 3, 5, 6])))
+        self.assertEqual(
+            [], list(id_allocator._free_ranges(1, 2, [1, 2])))
+
+    def test_allocate_lowest_until_exhausted(self):
+        allocator = self._allocator(max_id=3)
+        self.assertEqual(
+            [1, 2, 3, None],
+            [allocator.allocate(self.session) for i in range(4)])
+        self.assertEqual([], self._free_ranges())
+
+    def test_allocate_skips_used_ids(self):
+        allocator = self._allocator(used_ids=[1, 2, 4, 11])
+        self.assertEqual(3, allocator.allocate(self.session))
+        self.assertEqual(5, allocator.allocate(self.session))
+        self.assertEqual([(6, 10)], self._free_ranges())
+
+    def test_allocate_skips_ids_used_without_pool(self):
+        used_ids = []
+        allocator = self._allocator(used_ids=used_ids)
+        self.assertEqual(1, allocator.allocate(self.session))
+        # taken by a server not using the pool
+        used_ids.extend([2, 3, 5])
+        self.assertIsNone(allocator.allocate(self.session, 5))
+        self.assertEqual(4, allocator.allocate(self.session))
+        self.assertEqual([(6, 10)], self._free_ranges())
+        allocator.release(self.session, 3)
+        used_ids.remove(3)
+        self.assertEqual(3, allocator.allocate(self.session))
+
+    def test_allocate_given_id(self):
+        allocator = self._allocator()
+        self.assertEqual(5, allocator.allocate(self.session, 5))
+        self.assertEqual([(1, 4), (6, 10)], self._free_ranges())
+        self.assertIsNone(allocator.allocate(self.session, 5))
+        self.assertIsNone(allocator.allocate(self.session, 11))
+        self.assertEqual(10, allocator.allocate(self.session, 10))
+        self.assertEqual(1, allocator.allocate(self.session, 1))
+        self.assertEqual([(2, 4), (6, 9)], self._free_ranges())
+
+    def test_release_reuses_id(self):
+        allocator = self._allocator(max_id=5)
+        for i in range(5):
+            allocator.allocate(self.session)
+        allocator.release(self.session, 3)
+        self.assertEqual([(3, 3)], self._free_ranges())
+        self.assertEqual(3, allocator.allocate(self.session))
+        self.assertIsNone(allocator.allocate(self.session))
+
+    def test_release_merges_free_ranges(self):
+        allocator = self._allocator()
+        for i in range(10):
+            allocator.allocate(self.session)
+        allocator.release(self.session, 2)
+        allocator.release(self.session, 4)
+        allocator.release(self.session, 5)
+        self.assertEqual([(2, 2), (4, 5)], self._free_ranges())
+        allocator.release(self.session, 3)
+        self.assertEqual([(2, 5)], self._free_ranges())
+        allocator.release(self.session, 1)
+        self.assertEqual([(1, 5)], self._free_ranges())
+
+    def test_release_free_or_foreign_id(self):
+        allocator = self._allocator()
+        allocator.allocate(self.session)
+        allocator.release(self.session, 4)
+        allocator.release(self.session, 11)
+        allocator.release(self.session, None)
+        self.assertEqual([(2, 10)], self._free_ranges())
+
+    def test_allocate_retries_changed_range(self):
+        allocator = self._allocator()
+        swap = allocator._swap
+        results = [False]
+
+        def changed_once(*args, **kwargs):
+            if results:
+                return results.pop()
+            return swap(*args, **kwargs)
+
+        with mock.patch.object(
+            allocator, '_swap', side_effect=changed_once
+        ) as mocked_swap:
+            self.assertEqual(1, allocator.allocate(self.session))
+        self.assertEqual(2, mocked_swap.call_count)
+        self.assertEqual([(2, 10)], self._free_ranges())
+
+    def test_allocate_retry_request_after_attempts(self):
+        allocator = self._allocator()
+        with mock.patch.object(allocator, '_swap', return_value=False):
+            self.assertRaises(db_exc.RetryRequest,
+                              allocator.allocate, self.session)
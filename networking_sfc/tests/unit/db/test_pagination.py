@@ -0,0 +1,45 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.tests import base
+
+from networking_sfc.db import pagination
+
+
+class GetSortsTestCase(base.BaseTestCase):
+    def test_not_paged(self):
+        self.assertIsNone(pagination.get_sorts(None))
+        self.assertEqual([('name', False)],
+                         pagination.get_sorts([('name', False)]))
+
+    def test_created_order_by_default(self):
+        for sorts, limit, marker in [
+            (None, 10, None),
+            ([], None, 'marker'),
+            ([('id', True)], 10, 'marker'),
+        ]:
+            self.assertEqual(
+                [('created_at', True), ('id', True)],
+                pagination.get_sorts(sorts, limit, marker))
+        self.assertEqual(
+            [('created_at', False), ('id', False)],
+            pagination.get_sorts([('id', False)], 10))
+
+    def test_id_ends_the_sort_keys(self):
+        self.assertEqual(
+            [('name', False), ('id', True)],
+            pagination.get_sorts([('name', False)], 10))
+        self.assertEqual(
+            [('id', False), ('name', True)],
+            pagination.get_sorts([('id', False), ('name', True)], 10))
@@ -0,0 +1,102 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron import context
+from neutron.tests.unit import testlib_api
+
+from networking_sfc.db import resource_cache
+
+
+class ResourceCacheTestCase(testlib_api.SqlTestCase):
+    def setUp(self):
+        super(ResourceCacheTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.cache = resource_cache.ResourceCache(2, 60)
+        self.version = 0
+
+    def _load(self, id='id1', tenant_id='tenant1'):
+        def load():
+            self.version += 1
+            return {'id': id, 'tenant_id': tenant_id,
+                    'version': self.version}
+        return load
+
+    def _get(self, id='id1', context=None):
+        return self.cache.get(
+            context or self.context, 'port_pair', id, self._load(id))
+
+    def test_read_through(self):
+        self.assertEqual(1, self._get()['version'])
+        port_pair = self._get()
+        self.assertEqual(1, port_pair['version'])
+        # the callers get their own copy
+        port_pair['version'] = 10
+        self.assertEqual(1, self._get()['version'])
+        self.assertEqual(
+            {'hits': 2, 'misses': 1, 'evictions': 0, 'size': 1},
+            self.cache.stats())
+
+    def test_disabled(self):
+        self.cache = resource_cache.ResourceCache(2, 0)
+        self.assertEqual(1, self._get()['version'])
+        self.assertEqual(2, self._get()['version'])
+
+    def test_least_recently_used_evicted(self):
+        self._get('id1')
+        self._get('id2')
+        self._get('id1')
+        self._get('id3')
+        self.assertEqual(1, self._get('id1')['version'])
+        self.assertEqual(4, self._get('id2')['version'])
+        self.assertEqual(2, self.cache.stats()['evictions'])
+
+    def test_expired(self):
+        with mock.patch('time.time', return_value=1000):
+            self._get()
+        with mock.patch('time.time', return_value=1059):
+            self.assertEqual(1, self._get()['version'])
+        with mock.patch('time.time', return_value=1061):
+            self.assertEqual(2, self._get()['version'])
+
+    def test_other_tenant_not_hit(self):
+        self._get()
+        tenant_context = mock.Mock(is_admin=False, tenant_id='tenant2')
+        tenant_context.session.is_active = False
+        self.assertEqual(2, self._get(context=tenant_context)['version'])
+        tenant_context.tenant_id = 'tenant1'
+        self.assertEqual(2, self._get(context=tenant_context)['version'])
+
+    def test_not_used_in_transaction(self):
+        self._get()
+        with self.context.session.begin():
+            self.assertEqual(2, self._get()['version'])
+        self.assertEqual(1, self._get()['version'])
+
+    def test_invalidate_on_commit(self):
+        self._get()
+        with self.context.session.begin():
+            self.cache.invalidate(self.context.session, 'port_pair', 'id1')
+            # read from the committed state by another session meanwhile
+            self.assertEqual(
+                2, self._get(context=context.get_admin_context())['version'])
+        self.assertEqual(3, self._get()['version'])
+
+    def test_load_during_invalidation_not_cached(self):
+        def load():
+            self.cache.invalidate(self.context.session, 'port_pair', 'id1')
+            return {'id': 'id1', 'tenant_id': 'tenant1', 'version': 0}
+        self.cache.get(self.context, 'port_pair', 'id1', load)
+        self.assertEqual(1, self._get()['version'])
@@ -13,24 +13,32 @@
 #    under the License.
 
 import contextlib
+import datetime
 import logging
 import mock
 import six
+from sqlalchemy import event
 import webob.exc
 
 from oslo_config import cfg
 from oslo_utils import importutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 
 from neutron.api import extensions as api_ext
 from neutron.common import config
+from neutron import context
+from neutron.db import api as db_api
 import neutron.extensions as nextensions
 
+from networking_sfc.db import changes_db
 from networking_sfc.db import flowclassifier_db as fdb
+from networking_sfc.db import resource_cache
 from networking_sfc.db import sfc_db
 from networking_sfc import extensions
 from networking_sfc.extensions import flowclassifier as fc_ext
 from networking_sfc.extensions import sfc
+from networking_sfc.extensions import sfc_changes
 from networking_sfc.tests import base
 from networking_sfc.tests.unit.db import test_flowclassifier_db
 
@@ -122,6 +130,17 @@ class SfcDbPluginTestCaseBase(
             self.assertEqual(expected_res_status, res.status_int)
         return res
 
+    def _create_bulk(self, fmt, resource, items, expected_res_status=None):
+        collection = resource + 's'
+        data = {collection: [
+            {resource: dict(item, tenant_id=self._tenant_id)}
+            for item in items]}
+        req = self.new_create_request(collection, data, fmt)
+        res = req.get_response(self.ext_api)
+        if expected_res_status:
+            self.assertEqual(expected_res_status, res.status_int)
+        return res
+
     @contextlib.contextmanager
     def port_pair(self, fmt=None, port_pair=None, do_delete=True, **kwargs):
         if not fmt:
@@ -251,6 +270,9 @@ class SfcDbPluginTestCase(
     ] + [
         (k, fc_ext.FLOW_CLASSIFIER_PREFIX)
         for k in fc_ext.RESOURCE_ATTRIBUTE_MAP.keys()
+    ] + [
+        (k, sfc.SFC_PREFIX)
+        for k in sfc_changes.RESOURCE_ATTRIBUTE_MAP.keys()
     ])
 
     def setUp(self, core_plugin=None, sfc_plugin=None,
@@ -269,7 +291,7 @@ class SfcDbPluginTestCase(
             fc_ext.FLOW_CLASSIFIER_EXT: flowclassifier_plugin
         }
         sfc_db.SfcDbPlugin.supported_extension_aliases = [
-            "sfc"]
+            "sfc", "sfc_changes"]
         sfc_db.SfcDbPlugin.path_prefix = sfc.SFC_PREFIX
         fdb.FlowClassifierDbPlugin.supported_extension_aliases = [
             "flow_classifier"]
@@ -338,6 +360,35 @@ class SfcDbPluginTestCase(
                 'chain_parameters': {'correlation': 'mpls'}
             })
 
+    def test_create_port_chain_chain_id(self):
+        with self.port_pair_group(port_pair_group={}) as pg:
+            with self.port_chain(port_chain={
+                'chain_id': 3,
+                'port_pair_groups': [pg['port_pair_group']['id']]
+            }) as pc:
+                self.assertEqual(3, pc['port_chain']['chain_id'])
+                self._create_port_chain(
+                    self.fmt, {
+                        'chain_id': 3,
+                        'port_pair_groups': [pg['port_pair_group']['id']]
+                    }, expected_res_status=400)
+
+    def test_delete_port_chain_reuses_chain_id(self):
+        with self.port_pair_group(port_pair_group={}) as pg:
+            with self.port_chain(port_chain={
+                'port_pair_groups': [pg['port_pair_group']['id']]
+            }) as pc1:
+                with self.port_chain(port_chain={
+                    'port_pair_groups': [pg['port_pair_group']['id']]
+                }, do_delete=False) as pc2:
+                    self.assertEqual(1, pc1['port_chain']['chain_id'])
+                    self.assertEqual(2, pc2['port_chain']['chain_id'])
+                self._delete('port_chains', pc2['port_chain']['id'])
+                with self.port_chain(port_chain={
+                    'port_pair_groups': [pg['port_pair_group']['id']]
+                }) as pc3:
+                    self.assertEqual(2, pc3['port_chain']['chain_id'])
+
     def test_create_port_chain_multi_port_pair_groups(self):
         with self.port_pair_group(
             port_pair_group={}
@@ -513,6 +564,7 @@ class SfcDbPluginTestCase(
                         })
 
     def test_create_multi_port_chain_with_conflict_flow_classifiers(self):
+        cfg.CONF.set_override('check_port_chain_conflicts', True, 'sfc')
         with self.port(
             name='test1'
         ) as port1, self.port(
@@ -637,6 +689,7 @@ class SfcDbPluginTestCase(
         )
 
     def test_create_port_chain_with_same_port_pair_groups(self):
+        cfg.CONF.set_override('check_port_chain_conflicts', True, 'sfc')
         with self.port_pair_group(
             port_pair_group={}
         ) as pg:
@@ -651,6 +704,96 @@ class SfcDbPluginTestCase(
                     }, expected_res_status=409
                 )
 
+    def test_create_port_chain_conflicts_not_checked(self):
+        cfg.CONF.set_override('check_port_chain_conflicts', False, 'sfc')
+        with self.port(
+            name='test1'
+        ) as port1, self.port(
+            name='test2'
+        ) as port2:
+            with self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.100.0/24',
+                'logical_source_port': port1['port']['id']
+            }) as fc1, self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.100.0/24',
+                'logical_source_port': port2['port']['id']
+            }) as fc2:
+                with self.port_pair_group(
+                    port_pair_group={}
+                ) as pg:
+                    with self.port_chain(port_chain={
+                        'port_pair_groups': [pg['port_pair_group']['id']],
+                        'flow_classifiers': [fc1['flow_classifier']['id']]
+                    }), self.port_chain(port_chain={
+                        'port_pair_groups': [pg['port_pair_group']['id']],
+                        'flow_classifiers': [fc2['flow_classifier']['id']]
+                    }):
+                        pass
+
+    def test_validate_query_count(self):
+        cfg.CONF.set_override('check_port_chain_conflicts', True, 'sfc')
+        with self.port(
+            name='test1'
+        ) as port:
+            with self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.100.0/24',
+                'logical_source_port': port['port']['id']
+            }) as fc1, self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.101.0/24',
+                'logical_source_port': port['port']['id']
+            }) as fc2, self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.102.0/24',
+                'logical_source_port': port['port']['id']
+            }) as fc3, self.flow_classifier(flow_classifier={
+                'source_ip_prefix': '192.168.103.0/24',
+                'logical_source_port': port['port']['id']
+            }) as fc4:
+                fc_id = fc4['flow_classifier']['id']
+                with self.port_pair_group(
+                    port_pair_group={}
+                ) as pg1, self.port_pair_group(
+                    port_pair_group={}
+                ) as pg2, self.port_pair_group(
+                    port_pair_group={}
+                ) as pg3:
+                    pg_ids = [pg1['port_pair_group']['id'],
+                              pg2['port_pair_group']['id']]
+                    with self.port_chain(port_chain={
+                        'port_pair_groups': [pg_ids[0]],
+                        'flow_classifiers': [fc1['flow_classifier']['id']]
+                    }):
+                        one_chain = (
+                            self._count_queries(
+                                self.sfc_plugin._validate_port_pair_groups,
+                                pg_ids)[1],
+                            self._count_queries(
+                                self.sfc_plugin._validate_flow_classifiers,
+                                [fc_id])[1])
+                        with self.port_chain(port_chain={
+                            'port_pair_groups': [pg_ids[0], pg_ids[1]],
+                            'flow_classifiers': [
+                                fc2['flow_classifier']['id']]
+                        }), self.port_chain(port_chain={
+                            'port_pair_groups': [
+                                pg_ids[0], pg3['port_pair_group']['id']],
+                            'flow_classifiers': [
+                                fc3['flow_classifier']['id']]
+                        }):
+                            self.assertRaises(
+                                sfc.InvalidPortPairGroups,
+                                self.sfc_plugin._validate_port_pair_groups,
+                                context.get_admin_context(), pg_ids)
+                            self.assertEqual(
+                                one_chain,
+                                (self._count_queries(
+                                    self.sfc_plugin
+                                    ._validate_port_pair_groups,
+                                    pg_ids[::-1])[1],
+                                 self._count_queries(
+                                    self.sfc_plugin
+                                    ._validate_flow_classifiers,
+                                    [fc_id])[1]))
+
     def test_create_port_chain_with_no_port_pair_groups(self):
         self._create_port_chain(
             self.fmt, {}, expected_res_status=400
@@ -980,6 +1123,7 @@ class SfcDbPluginTestCase(
                             self.assertEqual(res['port_chain'][k], v)
 
     def test_update_port_chain_conflict_flow_classifiers(self):
+        cfg.CONF.set_override('check_port_chain_conflicts', True, 'sfc')
         with self.port(
             name='test1'
         ) as port1, self.port(
@@ -1285,6 +1429,54 @@ class SfcDbPluginTestCase(
             expected_res_status=404
         )
 
+    def test_create_port_pair_group_bulk(self):
+        with self.port(
+            name='port1',
+            device_id='default'
+        ) as src_port, self.port(
+            name='port2',
+            device_id='default'
+        ) as dst_port:
+            with self.port_pair(port_pair={
+                'ingress': src_port['port']['id'],
+                'egress': dst_port['port']['id']
+            }) as pp1, self.port_pair(port_pair={
+                'ingress': dst_port['port']['id'],
+                'egress': src_port['port']['id']
+            }) as pp2:
+                port_pair_groups = [{
+                    'name': 'test1',
+                    'port_pairs': [pp1['port_pair']['id']]
+                }, {
+                    'name': 'test2',
+                    'port_pairs': [pp2['port_pair']['id']]
+                }, {
+                    'name': 'test3'
+                }]
+                res = self._create_bulk(
+                    self.fmt, 'port_pair_group', port_pair_groups,
+                    expected_res_status=201)
+                pgs = self.deserialize(self.fmt, res)['port_pair_groups']
+                self.assertEqual(3, len(pgs))
+                for pg, port_pair_group in zip(pgs, port_pair_groups):
+                    for k, v in six.iteritems(
+                        self._get_expected_port_pair_group(port_pair_group)
+                    ):
+                        self.assertEqual(v, pg[k])
+                self.assertEqual(
+                    3, len(set(pg['group_id'] for pg in pgs)))
+                for pg in pgs:
+                    self._delete('port_pair_groups', pg['id'])
+
+    def test_create_port_pair_group_bulk_with_unknown_port_pair_id(self):
+        self._create_bulk(
+            self.fmt, 'port_pair_group', [
+                {'port_pairs': []},
+                {'port_pairs': [uuidutils.generate_uuid()]}
+            ],
+            expected_res_status=404)
+        self._test_list_resources('port_pair_group', [])
+
     def test_create_port_pair_group_share_port_pair_id(self):
         with self.port(
             name='port1',
@@ -1665,6 +1857,56 @@ class SfcDbPluginTestCase(
                 expected_res_status=400
             )
 
+    def test_create_port_pair_bulk(self):
+        with self.port(
+            name='port1',
+            device_id='default'
+        ) as src_port, self.port(
+            name='port2',
+            device_id='default'
+        ) as dst_port:
+            port_pairs = [{
+                'name': 'test1',
+                'ingress': src_port['port']['id'],
+                'egress': dst_port['port']['id']
+            }, {
+                'name': 'test2',
+                'ingress': dst_port['port']['id'],
+                'egress': src_port['port']['id']
+            }]
+            res = self._create_bulk(
+                self.fmt, 'port_pair', port_pairs, expected_res_status=201)
+            pps = self.deserialize(self.fmt, res)['port_pairs']
+            self.assertEqual(2, len(pps))
+            for pp, port_pair in zip(pps, port_pairs):
+                for k, v in six.iteritems(
+                    self._get_expected_port_pair(port_pair)
+                ):
+                    self.assertEqual(v, pp[k])
+            self._test_list_resources(
+                'port_pair', [{'port_pair': pp} for pp in pps])
+            for pp in pps:
+                self._delete('port_pairs', pp['id'])
+
+    def test_create_port_pair_bulk_with_unknown_ingress(self):
+        with self.port(
+            name='port1',
+            device_id='default'
+        ) as src_port, self.port(
+            name='port2',
+            device_id='default'
+        ) as dst_port:
+            self._create_bulk(
+                self.fmt, 'port_pair', [{
+                    'ingress': src_port['port']['id'],
+                    'egress': dst_port['port']['id']
+                }, {
+                    'ingress': uuidutils.generate_uuid(),
+                    'egress': dst_port['port']['id']
+                }],
+                expected_res_status=404)
+            self._test_list_resources('port_pair', [])
+
     def test_create_port_pair_with_invalid_service_function_parameters(self):
         with self.port(
             name='port1',
@@ -1850,6 +2092,240 @@ class SfcDbPluginTestCase(
                 for k, v in six.iteritems(expected):
                     self.assertEqual(res['port_pair'][k], v)
 
+    def test_port_pair_group_cached(self):
+        self.sfc_plugin.resource_cache = resource_cache.ResourceCache(10, 60)
+        with self.port(
+            name='port1',
+            device_id='default'
+        ) as src_port, self.port(
+            name='port2',
+            device_id='default'
+        ) as dst_port:
+            with self.port_pair(port_pair={
+                'ingress': src_port['port']['id'],
+                'egress': dst_port['port']['id']
+            }) as pp, self.port_pair_group(port_pair_group={
+                'name': 'test1'
+            }, do_delete=False) as pg:
+                pg_id = pg['port_pair_group']['id']
+                for i in range(2):
+                    self.assertEqual(
+                        'test1',
+                        self._show('port_pair_groups', pg_id)[
+                            'port_pair_group']['name'])
+                self.assertEqual(
+                    1, self.sfc_plugin.resource_cache.stats()['hits'])
+                self._update('port_pair_groups', pg_id, {
+                    'port_pair_group': {
+                        'name': 'test2',
+                        'port_pairs': [pp['port_pair']['id']]
+                    }
+                })
+                res = self._show('port_pair_groups', pg_id)
+                self.assertEqual('test2', res['port_pair_group']['name'])
+                self.assertEqual([pp['port_pair']['id']],
+                                 res['port_pair_group']['port_pairs'])
+                self._delete('port_pair_groups', pg_id)
+                self._show('port_pair_groups', pg_id,
+                           expected_code=webob.exc.HTTPNotFound.code)
+
+    def _count_queries(self, method, *args, **kwargs):
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append(statement)
+
+        engine = db_api.get_engine()
+        event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            result = method(context.get_admin_context(), *args, **kwargs)
+        finally:
+            event.remove(engine, 'before_cursor_execute', _record)
+        return result, len(statements)
+
+    def _count_list_queries(self, list_method, fields=None):
+        items, count = self._count_queries(list_method, fields=fields)
+        return len(items), count
+
+    def test_list_query_count(self):
+        with self.port_pair_group(
+            port_pair_group={}
+        ) as pg1, self.port_chain(port_chain={
+            'port_pair_groups': [pg1['port_pair_group']['id']],
+            'chain_parameters': {'correlation': 'mpls'}
+        }):
+            one_group = self._count_list_queries(
+                self.sfc_plugin.get_port_pair_groups)
+            one_chain = self._count_list_queries(
+                self.sfc_plugin.get_port_chains)
+            with self.port_pair_group(
+                port_pair_group={}
+            ) as pg2, self.port_pair_group(
+                port_pair_group={}
+            ) as pg3, self.port_chain(port_chain={
+                'port_pair_groups': [pg2['port_pair_group']['id']]
+            }), self.port_chain(port_chain={
+                'port_pair_groups': [pg3['port_pair_group']['id']]
+            }):
+                # the relationships are loaded for all the rows at once
+                self.assertEqual(
+                    (3, one_group[1]),
+                    self._count_list_queries(
+                        self.sfc_plugin.get_port_pair_groups))
+                self.assertEqual(
+                    (3, one_chain[1]),
+                    self._count_list_queries(
+                        self.sfc_plugin.get_port_chains))
+                # the relationships of other fields are not loaded
+                self.assertEqual(
+                    (3, 1),
+                    self._count_list_queries(
+                        self.sfc_plugin.get_port_chains,
+                        fields=['id', 'name']))
+                self.assertEqual(
+                    (3, 1),
+                    self._count_list_queries(
+                        self.sfc_plugin.get_port_pair_groups,
+                        fields=['id', 'name']))
+
+    def _create_port_pair_group_at(self, name, seconds):
+        timeutils.set_time_override(
+            datetime.datetime(2016, 9, 1) + datetime.timedelta(0, seconds))
+        self.addCleanup(timeutils.clear_time_override)
+        return self.port_pair_group(port_pair_group={'name': name})
+
+    def _get_port_pair_group_names(self, **kwargs):
+        return [
+            port_pair_group['name']
+            for port_pair_group in self.sfc_plugin.get_port_pair_groups(
+                context.get_admin_context(), fields=['id', 'name'],
+                **kwargs)
+        ]
+
+    def test_list_port_pair_groups_pages(self):
+        with self._create_port_pair_group_at(
+            'pg1', 2
+        ) as pg1, self._create_port_pair_group_at(
+            'pg0', 1
+        ), self._create_port_pair_group_at(
+            'pg2', 2
+        ) as pg2:
+            pg1_id = pg1['port_pair_group']['id']
+            pg2_id = pg2['port_pair_group']['id']
+            first, last = sorted([('pg1', pg1_id), ('pg2', pg2_id)],
+                                 key=lambda name_id: name_id[1])
+            # in created order, the created at the same time by id
+            self.assertEqual(
+                ['pg0', first[0]],
+                self._get_port_pair_group_names(limit=2))
+            self.assertEqual(
+                [last[0]],
+                self._get_port_pair_group_names(limit=2, marker=first[1]))
+            self.assertEqual(
+                ['pg0', first[0]],
+                self._get_port_pair_group_names(
+                    limit=2, marker=last[1], page_reverse=True))
+            self.assertEqual(
+                [first[0], 'pg0'],
+                self._get_port_pair_group_names(
+                    limit=2, sorts=[('id', False)], marker=last[1]))
+            # the requested sort keys are kept
+            self.assertEqual(
+                ['pg0', 'pg1'],
+                self._get_port_pair_group_names(
+                    limit=2, sorts=[('name', True)]))
+
+    def _list_changes(self, since,
+                      expected_code=webob.exc.HTTPOk.code):
+        # let every call compact the changes
+        self.sfc_plugin._changes_compacted_at = 0
+        res = self._list('changes', query_params='since=%s' % since,
+                         expected_code=expected_code)
+        if expected_code == webob.exc.HTTPOk.code:
+            return [(change['resource_id'], change['operation'])
+                    for change in res['changes']], res['changes']
+
+    def test_change_feed(self):
+        cfg.CONF.set_override('change_feed_settle_time', 0, 'sfc')
+        with self.port_pair_group(port_pair_group={
+            'name': 'test1'
+        }) as pg:
+            pg_id = pg['port_pair_group']['id']
+            self._update('port_pair_groups', pg_id, {
+                'port_pair_group': {'name': 'test2'}
+            })
+        operations, changes = self._list_changes(0)
+        self.assertEqual(
+            [(pg_id, 'create'), (pg_id, 'update'), (pg_id, 'delete')],
+            operations)
+        self.assertEqual('port_pair_group', changes[0]['resource_type'])
+        self.assertEqual(
+            [(pg_id, 'update'), (pg_id, 'delete')],
+            self._list_changes(changes[0]['id'])[0])
+        self.assertEqual([], self._list_changes(changes[-1]['id'])[0])
+        self._list_changes('last', expected_code=webob.exc.HTTPBadRequest.code)
+        req = self.new_create_request('changes', {'change': {}})
+        res = req.get_response(self.ext_api)
+        self.assertEqual(webob.exc.HTTPBadRequest.code, res.status_int)
+
+    def test_change_feed_compaction(self):
+        cfg.CONF.set_override('change_feed_compaction_delay', 60, 'sfc')
+        cfg.CONF.set_override('change_feed_retention', 3600, 'sfc')
+        cfg.CONF.set_override('change_feed_settle_time', 0, 'sfc')
+        now = datetime.datetime(2016, 9, 1)
+        timeutils.set_time_override(now)
+        self.addCleanup(timeutils.clear_time_override)
+        with self.port_pair_group(
+            port_pair_group={}
+        ) as pg1, self.port_pair_group(
+            port_pair_group={}
+        ) as pg2:
+            pg1_id = pg1['port_pair_group']['id']
+            pg2_id = pg2['port_pair_group']['id']
+            self._update('port_pair_groups', pg1_id, {
+                'port_pair_group': {'name': 'test2'}
+            })
+            operations, changes = self._list_changes(0)
+            self.assertEqual(
+                [(pg1_id, 'create'), (pg2_id, 'create'),
+                 (pg1_id, 'update')], operations)
+            # the superseded create of pg1 is dropped
+            timeutils.advance_time_seconds(61)
+            self._list_changes(0, expected_code=webob.exc.HTTPConflict.code)
+            self.assertEqual(
+                [(pg2_id, 'create'), (pg1_id, 'update')],
+                self._list_changes(changes[0]['id'])[0])
+            # only the last change is kept once they expire
+            timeutils.advance_time_seconds(3600)
+            self._list_changes(changes[0]['id'],
+                               expected_code=webob.exc.HTTPConflict.code)
+            self.assertEqual(
+                [(pg1_id, 'update')],
+                self._list_changes(changes[1]['id'])[0])
+
+    def test_change_feed_settle_time(self):
+        cfg.CONF.set_override('change_feed_settle_time', 10, 'sfc')
+        timeutils.set_time_override(datetime.datetime(2016, 9, 1))
+        self.addCleanup(timeutils.clear_time_override)
+        session1 = db_api.get_session()
+        session2 = db_api.get_session()
+        # the first change is recorded and committed after the second one
+        session1.begin()
+        changes_db.record(session1, 'port_pair', 'pp1', changes_db.CREATE,
+                          self._tenant_id)
+        timeutils.advance_time_seconds(1)
+        with session2.begin():
+            changes_db.record(session2, 'port_pair', 'pp2',
+                              changes_db.CREATE, self._tenant_id)
+        self.assertEqual([], self._list_changes(0)[0])
+        session1.commit()
+        timeutils.advance_time_seconds(9)
+        self.assertEqual([('pp1', 'create')], self._list_changes(0)[0])
+        timeutils.advance_time_seconds(1)
+        self.assertEqual([('pp1', 'create'), ('pp2', 'create')],
+                         self._list_changes(0)[0])
+
     def test_update_port_pair_service_function_parameters(self):
         with self.port(
             name='port1',
@@ -101,6 +101,25 @@ class DriverManagerTestCase(base.BaseTestCase):
             driver2.create_flow_classifier_precommit.assert_called_once_with(
                 mocked_context)
 
+    def test_create_flow_classifier_bulk_called(self):
+        driver1 = mock.Mock()
+        driver2 = mock.Mock()
+        with self.driver_manager_context({
+            'dummy1': driver1,
+            'dummy2': driver2
+        }) as manager:
+            mocked_contexts = [mock.Mock(), mock.Mock()]
+            manager.create_flow_classifier_bulk_precommit(mocked_contexts)
+            manager.create_flow_classifier_bulk(mocked_contexts)
+            manager.delete_flow_classifier_bulk(mocked_contexts)
+            for driver in (driver1, driver2):
+                for method in (
+                    driver.create_flow_classifier_bulk_precommit,
+                    driver.create_flow_classifier_bulk,
+                    driver.delete_flow_classifier_bulk
+                ):
+                    method.assert_called_once_with(mocked_contexts)
+
     def test_create_flow_classifier_exception(self):
         mock_driver = mock.Mock()
         mock_driver.create_flow_classifier = mock.Mock(
@@ -125,6 +125,50 @@ class FlowClassifierPluginTestCase(
             driver_manager.delete_flow_classifier.assert_not_called()
             self._test_list_resources('flow_classifier', [])
 
+    def test_create_flow_classifier_bulk_driver_manager_called(self):
+        with self.port(
+            name='test1'
+        ) as port:
+            res = self._create_flow_classifier_bulk(
+                self.fmt, [{
+                    'source_ip_prefix': '192.168.%d.0/24' % i,
+                    'logical_source_port': port['port']['id']
+                } for i in range(3)],
+                expected_res_status=201)
+            fcs = self.deserialize(self.fmt, res)['flow_classifiers']
+            driver_manager = self.fake_driver_manager
+            for method in (
+                driver_manager.create_flow_classifier_bulk_precommit,
+                driver_manager.create_flow_classifier_bulk
+            ):
+                method.assert_called_once_with(mock.ANY)
+                contexts = method.call_args[0][0]
+                self.assertEqual(
+                    fcs, [fc_context.current for fc_context in contexts])
+            self.assertFalse(driver_manager.create_flow_classifier.called)
+            for fc in fcs:
+                self._delete('flow_classifiers', fc['id'])
+
+    def test_create_flow_classifier_bulk_driver_manager_exception(self):
+        self.fake_driver_manager.create_flow_classifier_bulk = mock.Mock(
+            side_effect=fc_exc.FlowClassifierDriverError(
+                method='create_flow_classifier_bulk'
+            )
+        )
+        with self.port(
+            name='test1'
+        ) as port:
+            self._create_flow_classifier_bulk(
+                self.fmt, [{
+                    'source_ip_prefix': '192.168.%d.0/24' % i,
+                    'logical_source_port': port['port']['id']
+                } for i in range(3)],
+                expected_res_status=500)
+            driver_manager = self.fake_driver_manager
+            driver_manager.delete_flow_classifier_bulk.assert_called_once_with(
+                mock.ANY)
+            self._test_list_resources('flow_classifier', [])
+
     def test_update_flow_classifier_driver_manager_called(self):
         self.fake_driver_manager.update_flow_classifier = mock.Mock(
             side_effect=self._record_context)
@@ -16,6 +16,7 @@ import mock
 import six
 
 from oslo_config import cfg
+import oslo_messaging
 from oslo_utils import uuidutils
 
 from neutron.agent.common import ovs_lib
@@ -46,6 +47,9 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
         self.plugin_rpc.get_flowrules_by_host_portid = mock.Mock(
             side_effect=self.mock_get_flowrules_by_host_portid
         )
+        self.plugin_rpc.get_flowrules_by_host_portids = mock.Mock(
+            side_effect=self.mock_get_flowrules_by_host_portids
+        )
         self.plugin_rpc.get_all_src_node_flowrules = mock.Mock(
             side_effect=self.mock_get_all_src_node_flowrules
         )
@@ -170,6 +174,17 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.mock_dump_group_for_id
         )
         self.dump_group_for_id.start()
+        self.dump_group_ids = mock.patch.object(
+            ovs_ext_lib.OVSBridgeExt, "dump_group_ids",
+            self.mock_dump_group_ids
+        )
+        self.dump_group_ids.start()
+        self.conj_ids = set()
+        self.dump_conj_ids = mock.patch.object(
+            ovs_ext_lib.OVSBridgeExt, "dump_conj_ids",
+            self.mock_dump_conj_ids
+        )
+        self.dump_conj_ids.start()
         self.add_group = mock.patch.object(
             ovs_ext_lib.OVSBridgeExt, "add_group",
             self.mock_add_group
@@ -200,11 +215,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
         }, {
             'actions': 'drop', 'priority': 0, 'table': 10
         }]
-        self.default_delete_flow_rules = [{
-            'table': 5
-        }, {
-            'table': 10
-        }]
+        self.default_delete_flow_rules = []
         self.init_agent()
 
     def init_agent(self):
@@ -250,6 +261,12 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
         else:
             return ''
 
+    def mock_dump_group_ids(self):
+        return set(self.group_mapping)
+
+    def mock_dump_conj_ids(self, table):
+        return set(self.conj_ids)
+
     def mock_set_secure_mode(self):
         pass
 
@@ -382,6 +399,16 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             )
         ]
 
+    def mock_get_flowrules_by_host_portids(self, context, port_ids):
+        return [
+            flowrule
+            for flowrule in self.node_flowrules
+            if (
+                flowrule['ingress'] in port_ids or
+                flowrule['egress'] in port_ids
+            )
+        ]
+
     def mock_get_all_src_node_flowrules(self, context):
         return [
             flowrule
@@ -418,6 +445,8 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
         self.capabilities.stop()
         self.apply_flows.stop()
         self.dump_group_for_id.stop()
+        self.dump_conj_ids.stop()
+        self.dump_group_ids.stop()
         self.add_group.stop()
         self.mod_group.stop()
         self.delete_group.stop()
@@ -1149,9 +1178,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.deleted_flows
         )
         self.assertEqual(
-            [
-                "all"
-            ],
+            [],
             self.deleted_groups
         )
 
@@ -1192,9 +1219,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.deleted_flows
         )
         self.assertEqual(
-            [
-                "all"
-            ],
+            [],
             self.deleted_groups
         )
 
@@ -1259,9 +1284,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.deleted_flows
         )
         self.assertEqual(
-            [
-                "all"
-            ],
+            [],
             self.deleted_groups
         )
 
@@ -1321,9 +1344,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.deleted_flows
         )
         self.assertEqual(
-            [
-                "all"
-            ],
+            [],
             self.deleted_groups
         )
 
@@ -1396,7 +1417,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.deleted_flows
         )
         self.assertEqual(
-            ['all', 1],
+            [1],
             self.deleted_groups
         )
 
@@ -1474,7 +1495,7 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.deleted_flows
         )
         self.assertEqual(
-            ['all', 1],
+            [1],
             self.deleted_groups
         )
 
@@ -1495,3 +1516,384 @@ class OVSSfcAgentTestCase(ovs_test_base.OVSOFCtlTestBase):
             self.added_flows
         )
         self.assertEqual({}, self.group_mapping)
+
+    def test_init_agent_keeps_existing_groups(self):
+        self.group_mapping = {1: {'group_id': 1}}
+        self.agent = agent.OVSSfcAgent(
+            self.bridge_classes,
+            cfg.CONF
+        )
+        self.assertEqual([], self.deleted_flows)
+        self.assertEqual([], self.deleted_groups)
+        self.assertEqual({1: None}, self.agent.int_br._mirror_groups)
+        self.assertEqual(
+            agent.SFC_COOKIE_TAG,
+            self.agent.sfc_cookie & agent.SFC_COOKIE_MASK)
+
+    def test_init_agent_drop_flows_on_start(self):
+        cfg.CONF.set_override('drop_flows_on_start', True, 'sfc_agent')
+        self.init_agent()
+        self.assertEqual(
+            [{'table': 5}, {'table': 10}],
+            self.deleted_flows
+        )
+        self.assertEqual(['all'], self.deleted_groups)
+
+    def test_cleanup_stale_after_start(self):
+        with mock.patch.object(
+            self.agent.int_br, 'delete_stale_flows', return_value=2
+        ) as delete_stale_flows, mock.patch.object(
+            self.agent.int_br, 'delete_stale_groups', return_value=1
+        ):
+            self.agent._sfc_cleanup_stale()
+        delete_stale_flows.assert_called_once_with(
+            (0, agent.ACROSS_SUBNET_TABLE, agent.INGRESS_TABLE),
+            self.agent.sfc_cookie, agent.SFC_COOKIE_MASK)
+        self.assertTrue(self.agent.sfc_stale_cleaned)
+        self.assertGreaterEqual(self.agent.sfc_reconvergence_time, 0)
+
+    def _flow_classifier(self, source_range, destination_range):
+        return {
+            'source_port_range_min': source_range[0],
+            'source_port_range_max': source_range[1],
+            'destination_port_range_min': destination_range[0],
+            'destination_port_range_max': destination_range[1],
+            'source_ip_prefix': '10.100.0.0/16',
+            'destination_ip_prefix': '10.200.0.0/16',
+            'protocol': u'tcp',
+            'ethertype': 'IPv4',
+            'l7_parameters': {},
+        }
+
+    def test_conjunction_flow_count(self):
+        flow_classifiers = [
+            self._flow_classifier((None, None), (80, 80)),
+            self._flow_classifier((None, None), (8000, 8999)),
+            self._flow_classifier((1, 65535), (1024, 65535)),
+            self._flow_classifier((1024, 65535), (1, 1023)),
+            self._flow_classifier((32768, 61000), (3306, 3306)),
+            self._flow_classifier((100, 200), (5000, 6000)),
+        ]
+        cfg.CONF.set_override('conjunction_threshold', 0, 'sfc_agent')
+        cross_flows = self.agent._get_flow_infos_from_flow_classifier_list(
+            flow_classifiers)
+        cfg.CONF.set_override('conjunction_threshold', 16, 'sfc_agent')
+        conj_flows = self.agent._get_flow_infos_from_flow_classifier_list(
+            flow_classifiers)
+        self.assertEqual(1 + 6 + 16 * 6 + 6 * 10 + 8 + 6 * 10,
+                         len(cross_flows))
+        self.assertEqual(1 + 6 + (16 + 6 + 1) + (6 + 10 + 1) + 8 +
+                         (6 + 10 + 1), len(conj_flows))
+
+    def test_update_flow_rules_conjunction(self):
+        self.port_mapping = {
+            '8768d2b3-746d-4868-ae0e-e81861c2b4e6': {
+                'port_name': 'port1',
+                'ofport': 6,
+                'vif_mac': '00:01:02:03:05:07',
+            }
+        }
+        cfg.CONF.set_override('conjunction_threshold', 2, 'sfc_agent')
+        flowrule = {
+            'nsi': 255,
+            'ingress': None,
+            'next_hops': None,
+            'del_fcs': [],
+            'group_refcnt': 1,
+            'node_type': 'src_node',
+            'egress': '8768d2b3-746d-4868-ae0e-e81861c2b4e6',
+            'next_group_id': None,
+            'nsp': 256,
+            'add_fcs': [self._flow_classifier((100, 103), (101, 104))],
+            'id': uuidutils.generate_uuid()
+        }
+        self.agent.update_flow_rules(
+            self.context, flowrule_entries=flowrule)
+        added_flows = self.added_flows[len(self.default_flow_rules):]
+        self.assertEqual(
+            ['conjunction(1,1/2)'] + ['conjunction(1,2/2)'] * 3 +
+            ['normal'],
+            [flow['actions'] for flow in added_flows])
+        self.assertEqual({'conj_id': 1, 'priority': 30, 'table': 0,
+                          'actions': 'normal'}, added_flows[-1])
+        self.assertEqual('0x64/0xfffc', added_flows[0]['tp_src'])
+        self.assertEqual(6, added_flows[0]['in_port'])
+
+        flowrule['del_fcs'] = flowrule['add_fcs']
+        flowrule['add_fcs'] = []
+        self.agent.update_flow_rules(
+            self.context, flowrule_entries=flowrule)
+        self.assertEqual({'conj_id': 1, 'table': 0}, self.deleted_flows[-1])
+        self.assertEqual(5, len(self.deleted_flows))
+        self.assertEqual({}, self.agent.sfc_conj_ids)
+
+    def _conj_flowrule(self, add_fcs):
+        self.port_mapping = {
+            '8768d2b3-746d-4868-ae0e-e81861c2b4e6': {
+                'port_name': 'port1',
+                'ofport': 6,
+                'vif_mac': '00:01:02:03:05:07',
+            }
+        }
+        cfg.CONF.set_override('conjunction_threshold', 2, 'sfc_agent')
+        return {
+            'nsi': 255,
+            'ingress': None,
+            'next_hops': None,
+            'del_fcs': [],
+            'group_refcnt': 1,
+            'node_type': 'src_node',
+            'egress': '8768d2b3-746d-4868-ae0e-e81861c2b4e6',
+            'next_group_id': None,
+            'nsp': 256,
+            'add_fcs': add_fcs,
+            'id': uuidutils.generate_uuid()
+        }
+
+    def test_update_flow_rules_conjunctions_share_clause(self):
+        # same addresses and source ports, other destination ports
+        fc1 = self._flow_classifier((100, 103), (101, 104))
+        fc2 = self._flow_classifier((100, 103), (2001, 2004))
+        flowrule = self._conj_flowrule([fc1, fc2])
+        self.agent.update_flow_rules(
+            self.context, flowrule_entries=flowrule)
+        added_flows = self.added_flows[len(self.default_flow_rules):]
+        self.assertEqual(
+            ['conjunction(1,1/2)'] + ['conjunction(1,2/2)'] * 3 +
+            ['normal'] +
+            ['conjunction(1,1/2),conjunction(2,1/2)'] +
+            ['conjunction(2,2/2)'] * 3 + ['normal'],
+            [flow['actions'] for flow in added_flows])
+        # the source clause flow is the same flow for both conjunctions
+        self.assertEqual(
+            [('0x64/0xfffc', None)] * 2,
+            [(flow['tp_src'], flow.get('tp_dst'))
+             for flow in (added_flows[0], added_flows[5])])
+        self.assertEqual({'0x65/0xffff', '0x66/0xfffe', '0x68/0xffff'},
+                         set(flow['tp_dst'] for flow in added_flows[1:4]))
+        self.assertEqual({'0x7d1/0xffff', '0x7d2/0xfffe', '0x7d4/0xffff'},
+                         set(flow['tp_dst'] for flow in added_flows[6:9]))
+        self.assertEqual([1, 2], [added_flows[4]['conj_id'],
+                                  added_flows[9]['conj_id']])
+
+        del self.added_flows[:]
+        flowrule['del_fcs'] = [fc1]
+        flowrule['add_fcs'] = []
+        self.agent.update_flow_rules(
+            self.context, flowrule_entries=flowrule)
+        # the source clause flow is kept for the other conjunction
+        self.assertEqual(['conjunction(2,1/2)'],
+                         [flow['actions'] for flow in self.added_flows])
+        self.assertEqual({'0x65/0xffff', '0x66/0xfffe', '0x68/0xffff'},
+                         set(flow['tp_dst'] for flow in
+                             self.deleted_flows[:-1]))
+        self.assertEqual({'conj_id': 1, 'table': 0}, self.deleted_flows[-1])
+        self.assertEqual([2], [conj['conj_id'] for conj in
+                               self.agent.sfc_conj_ids.values()])
+
+    def test_conj_ids_follow_former_run(self):
+        self.conj_ids = {1, 7}
+        self.init_agent()
+        flowrule = self._conj_flowrule(
+            [self._flow_classifier((100, 103), (101, 104))])
+        self.agent.update_flow_rules(
+            self.context, flowrule_entries=flowrule)
+        self.assertEqual(
+            ['conjunction(8,1/2)'] + ['conjunction(8,2/2)'] * 3,
+            [flow['actions'] for flow in self.added_flows[
+                len(self.default_flow_rules):-1]])
+        self.assertEqual(8, self.added_flows[-1]['conj_id'])
+
+    def test_conjunction_shared_by_flow_rules(self):
+        fc = self._flow_classifier((100, 103), (101, 104))
+        flowrule1 = self._conj_flowrule([fc])
+        flowrule2 = dict(flowrule1, egress=uuidutils.generate_uuid())
+        for flowrule in (flowrule1, flowrule2):
+            self.agent._setup_local_switch_flows_on_int_br(
+                flowrule, [fc], 'normal', add_flow=True, match_inport=False)
+        self.assertEqual(1, len(self.agent.sfc_conj_ids))
+        self.agent._setup_local_switch_flows_on_int_br(
+            flowrule1, [fc], None, add_flow=False, match_inport=False)
+        self.assertEqual([], self.deleted_flows)
+        self.agent._setup_local_switch_flows_on_int_br(
+            flowrule2, [fc], None, add_flow=False, match_inport=False)
+        self.assertEqual(5, len(self.deleted_flows))
+        self.assertEqual({}, self.agent.sfc_conj_ids)
+        self.assertEqual({}, self.agent.sfc_conj_clauses)
+
+    def _sf_node_flowrule(self):
+        return {
+            'nsi': 254,
+            'ingress': u'dd7374b9-a6ac-4a66-a4a6-7d3dee2a1579',
+            'next_hops': None,
+            'del_fcs': [],
+            'group_refcnt': 1,
+            'node_type': 'sf_node',
+            'egress': u'2f1d2140-42ce-4979-9542-7ef25796e536',
+            'next_group_id': None,
+            'nsp': 256,
+            'add_fcs': [],
+            'id': uuidutils.generate_uuid()
+        }
+
+    def test_treat_devices_added_updated_batch(self):
+        self.port_mapping = {
+            'dd7374b9-a6ac-4a66-a4a6-7d3dee2a1579': {
+                'port_name': 'src_port',
+                'ofport': 6,
+                'vif_mac': '00:01:02:03:05:07',
+            },
+            '2f1d2140-42ce-4979-9542-7ef25796e536': {
+                'port_name': 'dst_port',
+                'ofport': 42,
+                'vif_mac': '00:01:02:03:06:08',
+            }
+        }
+        self.node_flowrules = [self._sf_node_flowrule()]
+        port_ids = list(self.port_mapping)
+        self.assertFalse(
+            self.agent.sfc_treat_devices_added_updated_batch(port_ids))
+        self.plugin_rpc.get_flowrules_by_host_portids.assert_called_once_with(
+            self.agent.context, port_ids)
+        self.assertFalse(self.plugin_rpc.get_flowrules_by_host_portid.called)
+        self.assertEqual(
+            self.default_flow_rules + [{
+                'actions': 'strip_vlan, pop_mpls:0x0800,output:6',
+                'dl_dst': '00:01:02:03:05:07',
+                'dl_type': 34887,
+                'dl_vlan': 0,
+                'mpls_label': 65791,
+                'priority': 1,
+                'table': 10
+            }],
+            self.added_flows
+        )
+
+    def test_treat_devices_added_updated_batch_old_server(self):
+        self.plugin_rpc.get_flowrules_by_host_portids.side_effect = (
+            oslo_messaging.RemoteError('UnsupportedVersion'))
+        self.node_flowrules = [self._sf_node_flowrule()]
+        port_ids = [u'dd7374b9-a6ac-4a66-a4a6-7d3dee2a1579',
+                    u'2f1d2140-42ce-4979-9542-7ef25796e536']
+        self.assertFalse(
+            self.agent.sfc_treat_devices_added_updated_batch(port_ids))
+        self.assertEqual(
+            [mock.call(self.agent.context, port_id) for port_id in port_ids],
+            self.plugin_rpc.get_flowrules_by_host_portid.call_args_list)
+
+    def test_treat_devices_added_updated_batch_failure(self):
+        self.plugin_rpc.get_flowrules_by_host_portids.side_effect = (
+            oslo_messaging.MessagingTimeout())
+        self.assertTrue(self.agent.sfc_treat_devices_added_updated_batch(
+            [u'dd7374b9-a6ac-4a66-a4a6-7d3dee2a1579']))
+        self.assertFalse(self.plugin_rpc.get_flowrules_by_host_portid.called)
+
+    def test_update_flow_rules_batch(self):
+        self.port_mapping = {
+            'dd7374b9-a6ac-4a66-a4a6-7d3dee2a1579': {
+                'port_name': 'src_port',
+                'ofport': 6,
+                'vif_mac': '00:01:02:03:05:07',
+            },
+            '2f1d2140-42ce-4979-9542-7ef25796e536': {
+                'port_name': 'dst_port',
+                'ofport': 42,
+                'vif_mac': '00:01:02:03:06:08',
+            }
+        }
+        flowrule = self._sf_node_flowrule()
+        self.agent.update_flow_rules_batch(
+            self.context, flowrule_entries=[{
+                'action': 'delete',
+                'flowrule': flowrule
+            }, {
+                'action': 'update',
+                'flowrule': flowrule
+            }]
+        )
+        self.assertEqual(
+            self.default_delete_flow_rules + [{
+                'dl_dst': '00:01:02:03:05:07',
+                'dl_type': 34887,
+                'mpls_label': 65791,
+                'table': 10
+            }],
+            self.deleted_flows
+        )
+        self.assertEqual(
+            self.default_flow_rules + [{
+                'actions': 'strip_vlan, pop_mpls:0x0800,output:6',
+                'dl_dst': '00:01:02:03:05:07',
+                'dl_type': 34887,
+                'dl_vlan': 0,
+                'mpls_label': 65791,
+                'priority': 1,
+                'table': 10
+            }],
+            self.added_flows
+        )
+        self.plugin_rpc.update_flowrules_status.assert_called_once_with(
+            self.agent.context,
+            [{'id': flowrule['id'], 'status': 'active'}])
+
+    def test_sync_flowrules(self):
+        self.port_mapping = {
+            'dd7374b9-a6ac-4a66-a4a6-7d3dee2a1579': {
+                'port_name': 'src_port',
+                'ofport': 6,
+                'vif_mac': '00:01:02:03:05:07',
+            },
+            '2f1d2140-42ce-4979-9542-7ef25796e536': {
+                'port_name': 'dst_port',
+                'ofport': 42,
+                'vif_mac': '00:01:02:03:06:08',
+            }
+        }
+        flowrule = self._sf_node_flowrule()
+        moved_flowrule = dict(flowrule, nsi=253)
+        entry = {'pathnode_id': 'node1', 'portpair_id': 'pd1'}
+        self.plugin_rpc.get_flowrule_changes_by_host.side_effect = [
+            {'version': 3, 'full': True, 'deleted': [],
+             'flowrules': [dict(entry, flowrule=flowrule)]},
+            {'version': 5, 'full': False, 'deleted': [],
+             'flowrules': [dict(entry, flowrule=moved_flowrule)]},
+            {'version': 6, 'full': False, 'flowrules': [],
+             'deleted': [dict(entry, flowrule=moved_flowrule)]},
+        ]
+
+        # the first sync only records the flow rules
+        self.agent._sfc_sync_flowrules()
+        self.assertEqual(self.default_flow_rules, self.added_flows)
+        self.assertEqual(3, self.agent.sfc_flowrules_version)
+
+        self.agent._sfc_sync_flowrules()
+        self.assertEqual(
+            self.default_delete_flow_rules + [{
+                'dl_dst': '00:01:02:03:05:07',
+                'dl_type': 34887,
+                'mpls_label': 65791,
+                'table': 10
+            }],
+            self.deleted_flows
+        )
+        self.assertEqual(
+            self.default_flow_rules + [{
+                'actions': 'strip_vlan, pop_mpls:0x0800,output:6',
+                'dl_dst': '00:01:02:03:05:07',
+                'dl_type': 34887,
+                'dl_vlan': 0,
+                'mpls_label': 65790,
+                'priority': 1,
+                'table': 10
+            }],
+            self.added_flows
+        )
+
+        self.agent._sfc_sync_flowrules()
+        self.assertEqual(65790, self.deleted_flows[-1]['mpls_label'])
+        self.assertEqual({}, self.agent.sfc_flowrules)
+        self.assertEqual(
+            [mock.call(self.agent.context, None),
+             mock.call(self.agent.context, 3),
+             mock.call(self.agent.context, 5)],
+            self.plugin_rpc.get_flowrule_changes_by_host.call_args_list)
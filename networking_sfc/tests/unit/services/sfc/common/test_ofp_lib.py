@@ -0,0 +1,174 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import struct
+
+import mock
+
+from neutron.tests import base
+
+from networking_sfc.services.sfc.common import ofp_lib
+
+
+def _unpack_header(message):
+    return ofp_lib.OFP_HEADER.unpack(message[:ofp_lib.OFP_HEADER.size])
+
+
+def _unpack_flow_mod(message):
+    return struct.unpack('!QQBBHHHIIIH2x', message[8:48])
+
+
+class OfpLibTestCase(base.BaseTestCase):
+    def test_encode_match_proto_shorthand(self):
+        match = ofp_lib.encode_match({'proto': 'tcp', 'tp_dst': 80})
+        # eth_type, ip_proto, tcp_dst in this order
+        self.assertEqual(
+            struct.pack('!HH', 1, 4 + 6 + 5 + 6) +
+            struct.pack('!IH', 0x80000a02, 0x0800) +
+            struct.pack('!IB', 0x80001401, 6) +
+            struct.pack('!IH', 0x80001c02, 80) + b'\x00' * 3,
+            match)
+
+    def test_encode_match_masked(self):
+        match = ofp_lib.encode_match({
+            'dl_type': 0x0800, 'nw_src': '10.0.0.0/24',
+            'tp_src': '0x0/0x0', 'nw_proto': 17})
+        self.assertIn(struct.pack('!I', 0x80001708) +
+                      b'\x0a\x00\x00\x00\xff\xff\xff\x00', match)
+        # fully wildcarded fields are left out
+        self.assertNotIn(struct.pack('!I', 0x80001e04), match)
+
+    def test_encode_match_unsupported(self):
+        self.assertRaises(ofp_lib.UnsupportedFlow,
+                          ofp_lib.encode_match, {'nw_tos': 4})
+        self.assertRaises(ofp_lib.UnsupportedFlow,
+                          ofp_lib.encode_match, {'tp_dst': 80})
+
+    def test_encode_flow_mod_add(self):
+        message = ofp_lib.encode_flow_mod('add', {
+            'table': 5, 'priority': 1, 'in_port': 3, 'cookie': 0x10,
+            'actions': 'push_mpls:0x8847,set_mpls_label:511,'
+                       'set_mpls_ttl:255,group:1'})
+        version, msg_type, length, xid = _unpack_header(message)
+        self.assertEqual(ofp_lib.OFP_VERSION, version)
+        self.assertEqual(ofp_lib.OFPT_FLOW_MOD, msg_type)
+        self.assertEqual(len(message), length)
+        (cookie, cookie_mask, table, command, idle, hard, priority,
+         buffer_id, out_port, out_group, flags) = _unpack_flow_mod(message)
+        self.assertEqual((0x10, 0, 5, ofp_lib.OFPFC_ADD, 1),
+                         (cookie, cookie_mask, table, command, priority))
+        self.assertTrue(message.endswith(
+            struct.pack('!HHI', ofp_lib.OFPAT_GROUP, 8, 1)))
+
+    def test_encode_flow_mod_default_priority(self):
+        message = ofp_lib.encode_flow_mod('add', {'actions': 'normal'})
+        self.assertEqual(1, _unpack_flow_mod(message)[6])
+        self.assertTrue(message.endswith(
+            struct.pack('!HHIH6x', ofp_lib.OFPAT_OUTPUT, 16,
+                        ofp_lib.OFPP_NORMAL, 0)))
+
+    def test_encode_flow_mod_delete(self):
+        message = ofp_lib.encode_flow_mod('del', {'cookie': '0x10/-1'})
+        (cookie, cookie_mask, table, command) = _unpack_flow_mod(
+            message)[:4]
+        self.assertEqual((0x10, ofp_lib.UINT64_MAX), (cookie, cookie_mask))
+        self.assertEqual((ofp_lib.OFPTT_ALL, ofp_lib.OFPFC_DELETE),
+                         (table, command))
+        self.assertRaises(ofp_lib.UnsupportedFlow,
+                          ofp_lib.encode_flow_mod, 'del', {'priority': 1})
+
+    def test_encode_flow_mod_mod_vlan_vid_pushes_tag(self):
+        message = ofp_lib.encode_flow_mod(
+            'add', {'in_port': 1, 'actions': 'mod_vlan_vid:3,output:2'})
+        self.assertIn(struct.pack('!HHH2x', ofp_lib.OFPAT_PUSH_VLAN, 8,
+                                  0x8100), message)
+        message = ofp_lib.encode_flow_mod(
+            'add', {'dl_vlan': 1, 'actions': 'mod_vlan_vid:3,output:2'})
+        self.assertNotIn(struct.pack('!HHH2x', ofp_lib.OFPAT_PUSH_VLAN, 8,
+                                     0x8100), message)
+
+    def test_encode_flow_mod_resubmit_and_goto(self):
+        message = ofp_lib.encode_flow_mod(
+            'add', {'actions': 'resubmit(,10),goto_table:5'})
+        self.assertIn(struct.pack('!IHHB3x', ofp_lib.NX_VENDOR_ID,
+                                  ofp_lib.NXAST_RESUBMIT_TABLE, 0xfff8, 10),
+                      message)
+        self.assertTrue(message.endswith(
+            struct.pack('!HHB3x', ofp_lib.OFPIT_GOTO_TABLE, 8, 5)))
+
+    def test_encode_flow_mod_unsupported_action(self):
+        self.assertRaises(ofp_lib.UnsupportedFlow,
+                          ofp_lib.encode_flow_mod, 'add',
+                          {'actions': 'learn(table=1)'})
+
+    def test_encode_group_mod(self):
+        message = ofp_lib.encode_group_mod('add', {
+            'group_id': 1, 'type': 'select',
+            'buckets': 'bucket=weight=2,mod_dl_dst:00:01:02:03:04:05,'
+                       'resubmit(,5),bucket=output:2'})
+        self.assertEqual(ofp_lib.OFPT_GROUP_MOD, _unpack_header(message)[1])
+        self.assertEqual(
+            (ofp_lib.OFPGC_ADD, ofp_lib.OFPGT_SELECT, 1),
+            struct.unpack('!HBxI', message[8:16]))
+        self.assertEqual(2, struct.unpack('!H', message[18:20])[0])
+
+    def test_encode_group_mod_delete_all(self):
+        message = ofp_lib.encode_group_mod('del', {'group_id': 'all'})
+        self.assertEqual(16, len(message))
+        self.assertEqual(ofp_lib.OFPG_ALL,
+                         struct.unpack('!I', message[12:16])[0])
+
+    def test_encode_bundle_add(self):
+        inner = ofp_lib.encode_group_mod('del', {'group_id': 1})
+        inner = inner[:4] + struct.pack('!I', 7) + inner[8:]
+        message = ofp_lib.encode_bundle_add(3, inner, 7)
+        version, msg_type, length, xid = _unpack_header(message)
+        self.assertEqual((ofp_lib.OFPT_EXPERIMENTER, len(message), 7),
+                         (msg_type, length, xid))
+        self.assertEqual(
+            (ofp_lib.ONF_VENDOR_ID, ofp_lib.ONF_ET_BUNDLE_ADD_MESSAGE, 3),
+            struct.unpack('!III', message[8:20]))
+        self.assertEqual(inner, message[24:])
+
+
+class OpenFlowChannelTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(OpenFlowChannelTestCase, self).setUp()
+        self.channel = ofp_lib.OpenFlowChannel('unix:/tmp/br-int.mgmt')
+        mock.patch.object(self.channel, 'connect').start()
+        self.channel._sock = mock.Mock()
+        self.transact = mock.patch.object(self.channel, '_transact').start()
+        self.message = ofp_lib.encode_group_mod('del', {'group_id': 1})
+
+    def _reject_first(self, err_type, err_code):
+        def _transact(messages, xids):
+            if len(messages) > 1:
+                return [(min(xids), err_type, err_code)]
+            return []
+        self.transact.side_effect = _transact
+
+    def test_send_bundle_unsupported(self):
+        self._reject_first(ofp_lib.OFPET_BAD_REQUEST,
+                           ofp_lib.OFPBRC_BAD_EXPERIMENTER)
+        self.assertRaises(ofp_lib.BundleUnsupported,
+                          self.channel.send, [self.message], bundle=True)
+        # the bundle was not opened, neither committed nor discarded
+        self.assertEqual(1, self.transact.call_count)
+        self.assertIsNotNone(self.channel._sock)
+
+    def test_send_bundle_rejected(self):
+        self._reject_first(ofp_lib.OFPET_BAD_REQUEST, 0)
+        self.assertRaises(ofp_lib.OpenFlowRejected,
+                          self.channel.send, [self.message], bundle=True)
+        self.assertEqual(2, self.transact.call_count)
@@ -12,10 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 from neutron_lib import exceptions
+from oslo_config import cfg
 
+from neutron.agent.common import utils
 from neutron.tests import base
 
+from networking_sfc.services.sfc.common import ofp_lib
 from networking_sfc.services.sfc.common import ovs_ext_lib
 
 
@@ -94,3 +98,316 @@ class GetPortMaskTestCase(base.BaseTestCase):
             ['0x7fff/0xffff', '0x8000/0x8000'],
             masks
         )
+
+
+class OVSBridgeExtBundleTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(OVSBridgeExtBundleTestCase, self).setUp()
+        self.execute = mock.patch.object(utils, "execute").start()
+        self.br = ovs_ext_lib.OVSBridgeExt('br-int')
+        self.br._ofctl_bundles = True
+
+    def _bundle_lines(self):
+        self.assertEqual(1, self.execute.call_count)
+        args, kwargs = self.execute.call_args
+        self.assertEqual('bundle', args[0][3])
+        self.assertTrue(kwargs['run_as_root'])
+        return kwargs['process_input'].splitlines()
+
+    def test_bundle_applies_changes_at_once(self):
+        with self.br.bundle():
+            self.br.add_flow(table=5, priority=0, dl_dst='00:01:02:03:04:05',
+                             actions='normal')
+            self.br.delete_flows(table=10, dl_type=0x8847)
+            self.br.add_group(group_id=1, type='select',
+                              buckets='bucket=output:1')
+            self.assertFalse(self.execute.called)
+        lines = self._bundle_lines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[0].startswith('flow add '))
+        self.assertIn('cookie=%s' % self.br._default_cookie, lines[0])
+        self.assertIn('dl_dst=00:01:02:03:04:05', lines[0])
+        self.assertTrue(lines[1].startswith('flow delete '))
+        self.assertIn('table=10', lines[1])
+        self.assertEqual(
+            'group add group_id=1,type=select,bucket=output:1', lines[2])
+
+    def test_nested_bundle_joins_outer(self):
+        with self.br.bundle():
+            with self.br.bundle():
+                self.br.delete_flows(table=5)
+            self.assertFalse(self.execute.called)
+            self.br.delete_group(group_id=1)
+        lines = self._bundle_lines()
+        self.assertEqual(['flow delete table=5', 'group delete group_id=1'],
+                         lines)
+
+    def test_bundle_discarded_on_exception(self):
+        def _update():
+            with self.br.bundle():
+                self.br.delete_flows(table=5)
+                raise RuntimeError()
+        self.assertRaises(RuntimeError, _update)
+        self.assertFalse(self.execute.called)
+        self.assertIsNone(self.br._bundle)
+
+    def test_bundle_commit_failure_raises(self):
+        self.execute.side_effect = RuntimeError()
+
+        def _update():
+            with self.br.bundle():
+                self.br.delete_flows(table=5)
+        self.assertRaises(RuntimeError, _update)
+
+    def test_bundle_support_probed_once(self):
+        self.br._ofctl_bundles = None
+        for i in range(2):
+            with self.br.bundle():
+                self.br.delete_flows(table=5)
+        self.assertEqual(3, self.execute.call_count)
+        self.assertEqual(
+            'group delete group_id=%d' % ovs_ext_lib.BUNDLE_PROBE_GROUP_ID,
+            self.execute.call_args_list[0][1]['process_input'])
+        self.assertEqual(['bundle'] * 3,
+                         [call[0][0][3]
+                          for call in self.execute.call_args_list])
+
+    def test_bundle_unsupported_applies_changes_one_by_one(self):
+        self.br._ofctl_bundles = None
+        self.execute.side_effect = [RuntimeError(), None, None, None]
+        with self.br.bundle():
+            self.br.add_group(group_id=1, type='select',
+                              buckets='bucket=output:1')
+            self.br.add_flow(table=5, priority=0, actions='group:1')
+            self.br.add_flow(table=10, priority=0, actions='drop')
+            self.br.delete_flows(table=15)
+        self.assertFalse(self.br._ofctl_bundles)
+        self.assertEqual(
+            ['bundle', 'add-groups', 'add-flows', 'del-flows'],
+            [call[0][0][3] if call[0][0][1] == '-O' else call[0][0][2]
+             for call in self.execute.call_args_list])
+        self.assertEqual(
+            2, len(self.execute.call_args_list[2][1][
+                'process_input'].splitlines()))
+
+    def test_bundle_unsupported_failure_raises(self):
+        self.br._ofctl_bundles = False
+        self.br.add_group(group_id=1, type='select',
+                          buckets='bucket=output:1')
+        self.execute.side_effect = [None, RuntimeError()]
+
+        def _update():
+            with self.br.bundle():
+                self.br.delete_group(group_id=1)
+                self.br.add_flow(table=5, priority=0, actions='drop')
+        self.assertRaises(RuntimeError, _update)
+        self.assertEqual([1], list(self.br._mirror_groups))
+
+
+class OVSBridgeExtNativeTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(OVSBridgeExtNativeTestCase, self).setUp()
+        cfg.CONF.set_override('of_backend', 'native', 'sfc_agent')
+        self.execute = mock.patch.object(utils, "execute").start()
+        self.br = ovs_ext_lib.OVSBridgeExt('br-int')
+        self.br._ofctl_bundles = True
+        self.br._of_channel = mock.Mock()
+        self.send = self.br._of_channel.send
+
+    def test_channel_failure_falls_back(self):
+        self.send.side_effect = ofp_lib.OpenFlowError()
+        self.br.delete_flows(table=5)
+        self.assertEqual(1, self.send.call_count)
+        self.assertEqual('del-flows', self.execute.call_args[0][0][2])
+
+    def test_rejected_changes_raise(self):
+        self.send.side_effect = ofp_lib.OpenFlowRejected()
+        self.assertRaises(ofp_lib.OpenFlowRejected,
+                          self.br.delete_flows, table=5)
+        self.assertFalse(self.execute.called)
+
+    def test_rejected_changes_leave_mirror(self):
+        self.send.side_effect = ofp_lib.OpenFlowRejected()
+        self.assertRaises(ofp_lib.OpenFlowRejected, self.br.add_group,
+                          group_id=1, type='select',
+                          buckets='bucket=output:1')
+        self.assertEqual({}, self.br._mirror_groups)
+
+    def test_rejected_bundle_raises(self):
+        self.send.side_effect = ofp_lib.OpenFlowRejected()
+
+        def _update():
+            with self.br.bundle():
+                self.br.delete_flows(table=5)
+        self.assertRaises(ofp_lib.OpenFlowRejected, _update)
+        self.assertFalse(self.execute.called)
+
+    def test_bundle_unsupported_falls_back(self):
+        self.send.side_effect = ofp_lib.BundleUnsupported()
+        for i in range(2):
+            with self.br.bundle():
+                self.br.delete_flows(table=5)
+        # the native bundles are not tried again
+        self.assertEqual(1, self.send.call_count)
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual('bundle', self.execute.call_args[0][0][3])
+
+
+class OVSBridgeExtMirrorTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(OVSBridgeExtMirrorTestCase, self).setUp()
+        self.execute = mock.patch.object(utils, "execute").start()
+        self.br = ovs_ext_lib.OVSBridgeExt('br-int')
+        self.br._ofctl_bundles = True
+        self.br.mirrored_tables = (5, 10)
+
+    def _ofctl_cmds(self):
+        return [call[0][0][2] for call in self.execute.call_args_list]
+
+    def test_install_group_without_dump(self):
+        self.br.install_group(group_id=1, type='select',
+                              buckets='bucket=output:1')
+        self.br.install_group(group_id=1, type='select',
+                              buckets='bucket=output:2')
+        self.br.delete_group(group_id=1)
+        self.br.install_group(group_id=1, type='select',
+                              buckets='bucket=output:3')
+        self.assertEqual(
+            ['add-groups', 'mod-group', 'del-groups', 'add-groups'],
+            self._ofctl_cmds())
+
+    def test_delete_all_groups_clears_mirror(self):
+        self.br.add_group(group_id=1, type='select',
+                          buckets='bucket=output:1')
+        self.br.delete_group(group_id='all')
+        self.assertEqual({}, self.br._mirror_groups)
+
+    def test_mod_flow_without_dump(self):
+        self.br.mod_flow(table=5, dl_dst='00:01:02:03:04:05',
+                         actions='output:1')
+        self.br.mod_flow(table=5, dl_dst='00:01:02:03:04:05',
+                         actions='output:2')
+        self.assertEqual(['add-flows', 'mod-flows'], self._ofctl_cmds())
+        self.br.delete_flows(table=5)
+        self.assertEqual({}, self.br._mirror_flows)
+
+    def test_unmirrored_table_is_not_tracked(self):
+        self.br.add_flow(table=0, priority=1, actions='normal')
+        self.assertEqual({}, self.br._mirror_flows)
+
+    def test_bundle_failure_restores_mirror(self):
+        self.br.add_group(group_id=1, type='select',
+                          buckets='bucket=output:1')
+        self.execute.side_effect = RuntimeError()
+
+        def _update():
+            with self.br.bundle():
+                self.br.delete_group(group_id=1)
+                self.br.add_flow(table=10, priority=1, actions='drop')
+        self.assertRaises(RuntimeError, _update)
+        self.assertEqual([1], list(self.br._mirror_groups))
+        self.assertEqual({}, self.br._mirror_flows)
+
+    def test_failed_changes_leave_mirror(self):
+        self.br.add_group(group_id=1, type='select',
+                          buckets='bucket=output:1')
+        self.br.add_flow(table=5, priority=0, dl_dst='00:01:02:03:04:05',
+                         actions='output:1')
+        self.execute.side_effect = RuntimeError()
+        self.br.install_group(group_id=2, type='select',
+                              buckets='bucket=output:2')
+        self.br.delete_group(group_id=1)
+        self.br.mod_flow(table=5, dl_dst='00:01:02:03:04:05',
+                         actions='output:2')
+        self.br.add_flow(table=10, priority=0, actions='drop')
+        self.assertEqual([1], list(self.br._mirror_groups))
+        self.assertEqual(['output:1'],
+                         [flow['actions'] for flow in
+                          self.br._mirror_flows.values()])
+        # the group which was not added is added again
+        self.execute.side_effect = None
+        self.br.install_group(group_id=2, type='select',
+                              buckets='bucket=output:2')
+        self.assertEqual('add-groups', self._ofctl_cmds()[-1])
+
+    def test_bundle_failure_restores_modified_flow(self):
+        self.br.add_flow(table=5, priority=0, dl_dst='00:01:02:03:04:05',
+                         actions='output:1')
+        self.execute.side_effect = RuntimeError()
+
+        def _update():
+            with self.br.bundle():
+                self.br.mod_flow(table=5, dl_dst='00:01:02:03:04:05',
+                                 actions='output:2')
+        self.assertRaises(RuntimeError, _update)
+        self.assertEqual(['output:1'],
+                         [flow['actions'] for flow in
+                          self.br._mirror_flows.values()])
+
+    def test_audit_mirror(self):
+        self.br.add_group(group_id=1, type='select',
+                          buckets='bucket=output:1')
+        self.br.add_flow(table=5, priority=0, dl_dst='00:01:02:03:04:05',
+                         actions='output:1')
+        self.execute.reset_mock()
+        self.execute.side_effect = [
+            'OFPST_GROUP_DESC reply (OF1.3):\n'
+            ' group_id=2,type=select,bucket=actions=output:2\n',
+            None, None,
+            '+table=5, priority=0,dl_dst=00:01:02:03:04:05 '
+            'actions=output:1\n',
+            None]
+        self.assertEqual(3, self.br.audit_mirror())
+        self.assertEqual(
+            ['dump-groups', 'add-groups', 'del-groups', 'diff-flows',
+             'add-flows'],
+            self._ofctl_cmds())
+        self.assertEqual(
+            'table=5, priority=0,dl_dst=00:01:02:03:04:05 actions=output:1',
+            self.execute.call_args[1]['process_input'])
+
+    def test_bundle_cookie(self):
+        with self.br.bundle(cookie=0x5fc0000000000001):
+            self.br.add_flow(table=10, priority=0, actions='drop')
+        self.assertIn('cookie=%s' % 0x5fc0000000000001,
+                      self.execute.call_args[1]['process_input'])
+
+    def test_stale_groups(self):
+        self.execute.return_value = (
+            'OFPST_GROUP_DESC reply (OF1.3):\n'
+            ' group_id=1,type=select,bucket=actions=output:1\n'
+            ' group_id=2,type=select,bucket=actions=output:2\n')
+        self.br.seed_mirror_groups()
+        self.br.install_group(group_id=1, type='select',
+                              buckets='bucket=output:3')
+        self.assertEqual(1, self.br.delete_stale_groups())
+        self.assertEqual(['dump-groups', 'mod-group', 'del-groups'],
+                         self._ofctl_cmds())
+        self.assertEqual('group_id=2',
+                         self.execute.call_args[1]['process_input'])
+
+    def test_dump_conj_ids(self):
+        self.execute.return_value = (
+            'OFPST_FLOW reply (OF1.3):\n'
+            ' cookie=0x1, table=0, priority=30,conj_id=3 '
+            'actions=normal\n'
+            ' cookie=0x1, table=0, priority=30,tcp,tp_src=0x64/0xfffc '
+            'actions=conjunction(3,1/2),conjunction(12,1/2)\n')
+        self.assertEqual({3, 12}, self.br.dump_conj_ids(0))
+        self.assertEqual('table=0', self.execute.call_args[0][0][4])
+
+    def test_delete_stale_flows(self):
+        self.br.add_flow(table=5, priority=0, cookie=0x5fc0000000000002,
+                         dl_dst='00:01:02:03:04:05', actions='output:1')
+        self.execute.reset_mock()
+        self.execute.side_effect = [
+            ' cookie=0x5fc0000000000001, table=5, priority=0 actions=drop\n'
+            ' cookie=0x5fc0000000000002, table=5, priority=0 actions=drop\n'
+            ' cookie=0x1, table=5, priority=0 actions=drop\n',
+            None]
+        self.assertEqual(1, self.br.delete_stale_flows(
+            [5], 0x5fc0000000000002, 0xffff << 48))
+        self.assertEqual(['dump-flows', 'del-flows'], self._ofctl_cmds())
+        self.assertIn('cookie=0x5fc0000000000001/-1',
+                      self.execute.call_args[1]['process_input'])
+        self.assertEqual(1, len(self.br._mirror_flows))
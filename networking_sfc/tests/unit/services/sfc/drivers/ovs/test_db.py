@@ -0,0 +1,70 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.tests.unit import testlib_api
+
+from networking_sfc.services.sfc.drivers.ovs import db as ovs_db
+
+
+class OVSSfcDriverDBQueryPlanTestCase(testlib_api.SqlTestCase):
+    """The lookups of the driver and the agent RPCs use an index."""
+
+    def setUp(self):
+        super(OVSSfcDriverDBQueryPlanTestCase, self).setUp()
+        self.db = ovs_db.OVSSfcDriverDB()
+        self.db.initialize()
+        self.session = self.db.admin_context.session
+
+    def _query_plan(self, query):
+        statement = query.statement.compile(
+            dialect=self.session.bind.dialect,
+            compile_kwargs={'literal_binds': True})
+        return ' '.join(
+            str(row[-1]) for row in self.session.execute(
+                'EXPLAIN QUERY PLAN %s' % statement))
+
+    def _assert_uses_index(self, index, query):
+        plan = self._query_plan(query)
+        self.assertIn(index, plan)
+
+    def test_port_detail_lookups(self):
+        for filters, index in [
+            ({'ingress': 'in'}, 'ix_sfc_portpair_details_ingress_egress'),
+            ({'ingress': ['in1', 'in2']},
+             'ix_sfc_portpair_details_ingress_egress'),
+            ({'ingress': 'in', 'egress': 'out'},
+             'ix_sfc_portpair_details_ingress_egress'),
+            ({'egress': 'out'}, 'ix_sfc_portpair_details_egress'),
+            ({'host_id': 'test'}, 'ix_sfc_portpair_details_host_id'),
+        ]:
+            self._assert_uses_index(
+                index, self.db._get_port_details_by_filter(filters))
+
+    def test_path_node_lookups(self):
+        for filters, index in [
+            ({'portchain_id': 'pc'},
+             'ix_sfc_path_nodes_portchain_id_next_group_id'),
+            ({'portchain_id': 'pc', 'next_group_id': 1},
+             'ix_sfc_path_nodes_portchain_id_next_group_id'),
+            ({'next_group_id': [1, 2]}, 'ix_sfc_path_nodes_next_group_id'),
+            ({'nsp': 256, 'nsi': 254}, 'ix_sfc_path_nodes_nsp_nsi'),
+        ]:
+            self._assert_uses_index(
+                index, self.db._get_path_nodes_by_filter(filters))
+
+    def test_next_hop_lookups(self):
+        self._assert_uses_index(
+            'ix_sfc_path_node_next_hops_portpair_id',
+            self.session.query(ovs_db.PathNodeNextHop.pathnode_id).filter_by(
+                portpair_id='pd'))
@@ -15,13 +15,16 @@
 from eventlet import greenthread
 import mock
 import six
+from sqlalchemy import event
 
 from oslo_utils import importutils
+from oslo_utils import uuidutils
 
 from neutron.api import extensions as api_ext
 from neutron.common import config
 from neutron.common import rpc as n_rpc
 from neutron import context
+from neutron.db import api as db_api
 from neutron.extensions import portbindings
 from neutron.plugins.ml2.drivers import type_vxlan
 
@@ -30,6 +33,7 @@ from networking_sfc.db import sfc_db
 from networking_sfc.extensions import flowclassifier
 from networking_sfc.extensions import sfc
 from networking_sfc.services.sfc.common import context as sfc_ctx
+from networking_sfc.services.sfc.drivers.ovs import db as ovs_db
 from networking_sfc.services.sfc.drivers.ovs import driver
 from networking_sfc.services.sfc.drivers.ovs import rpc
 from networking_sfc.tests import base
@@ -60,6 +64,14 @@ class OVSSfcDriverTestCase(
     def ask_agent_to_delete_flow_rules(self, context, flows):
         self.record_rpc('delete_flow_rules', flows)
 
+    def ask_agent_to_update_flow_rules_batch(self, context, host,
+                                             flowrule_entries):
+        self.record_rpc('update_flow_rules_batch', host)
+        for entry in flowrule_entries:
+            self.assertEqual(host, entry['flowrule']['host'])
+            self.record_rpc('%s_flow_rules' % entry['action'],
+                            entry['flowrule'])
+
     def ask_agent_to_update_src_node_flow_rules(self, context, flows):
         self.record_rpc('update_src_node_flow_rules', flows)
 
@@ -81,7 +93,8 @@ class OVSSfcDriverTestCase(
         self.rpc_calls = {
             'update_flow_rules': [], 'delete_flow_rules': [],
             'update_src_node_flow_rules': [],
-            'delete_src_node_flow_rules': []
+            'delete_src_node_flow_rules': [],
+            'update_flow_rules_batch': []
         }
 
     def setUp(self):
@@ -129,6 +142,11 @@ class OVSSfcDriverTestCase(
         self.mocked_notifier.ask_agent_to_delete_flow_rules = mock.Mock(
             side_effect=self.ask_agent_to_delete_flow_rules
         )
+        self.mocked_notifier.ask_agent_to_update_flow_rules_batch = (
+            mock.Mock(
+                side_effect=self.ask_agent_to_update_flow_rules_batch
+            )
+        )
         self.mocked_notifier.ask_agent_to_delete_src_node_flow_rules = (
             mock.Mock(
                 side_effect=self.ask_agent_to_delete_src_node_flow_rules
@@ -301,6 +319,85 @@ class OVSSfcDriverTestCase(
                             update_flow_rules[flow1]['next_group_id']
                         )
 
+    def test_create_port_chain_one_cast_per_host(self):
+        with self.port(
+            name='port1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as src_port, self.port(
+            name='port2',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as ingress, self.port(
+            name='port3',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as egress:
+            self.host_endpoint_mapping = {
+                'test': '10.0.0.1',
+            }
+            with self.flow_classifier(flow_classifier={
+                'logical_source_port': src_port['port']['id']
+            }) as fc, self.port_pair(port_pair={
+                'ingress': ingress['port']['id'],
+                'egress': egress['port']['id']
+            }) as pp:
+                pp_context = sfc_ctx.PortPairContext(
+                    self.sfc_plugin, self.ctx,
+                    pp['port_pair']
+                )
+                self.driver.create_port_pair(pp_context)
+                with self.port_pair_group(port_pair_group={
+                    'port_pairs': [pp['port_pair']['id']]
+                }) as pg:
+                    pg_context = sfc_ctx.PortPairGroupContext(
+                        self.sfc_plugin, self.ctx,
+                        pg['port_pair_group']
+                    )
+                    self.driver.create_port_pair_group(pg_context)
+                    with self.port_chain(port_chain={
+                        'name': 'test1',
+                        'port_pair_groups': [pg['port_pair_group']['id']],
+                        'flow_classifiers': [fc['flow_classifier']['id']]
+                    }) as pc:
+                        pc_context = sfc_ctx.PortChainContext(
+                            self.sfc_plugin, self.ctx,
+                            pc['port_chain']
+                        )
+                        self.driver.create_port_chain(pc_context)
+                        self.wait()
+                        self.assertEqual(
+                            ['test'],
+                            self.rpc_calls['update_flow_rules_batch'])
+                        self.assertEqual(
+                            2, len(self.rpc_calls['update_flow_rules']))
+                        self.assertFalse(
+                            self.mocked_notifier.
+                            ask_agent_to_update_flow_rules.called)
+
+                        self.init_rpc_calls()
+                        self.driver.delete_port_chain(pc_context)
+                        self.assertEqual(
+                            ['test'],
+                            self.rpc_calls['update_flow_rules_batch'])
+                        self.assertEqual(
+                            2, len(self.rpc_calls['delete_flow_rules']))
+                        self.assertFalse(
+                            self.mocked_notifier.
+                            ask_agent_to_delete_flow_rules.called)
+
     def test_create_port_chain_with_flow_classifiers(self):
         with self.port(
             name='src',
@@ -2407,7 +2504,7 @@ class OVSSfcDriverTestCase(
                             ingress['port']['id'], egress['port']['id'])
                         self.assertEqual(
                             set(delete_flow_rules.keys()),
-                            set([flow1, flow3]))
+                            set([flow1]))
                         del_fcs = delete_flow_rules[flow1]['del_fcs']
                         self.assertEqual(len(del_fcs), 1)
                         self.assertDictContainsSubset({
@@ -2431,28 +2528,6 @@ class OVSSfcDriverTestCase(
                         self.assertEqual(
                             delete_flow_rules[flow1]['node_type'],
                             'src_node')
-                        del_fcs = delete_flow_rules[flow3]['del_fcs']
-                        self.assertEqual(len(del_fcs), 1)
-                        self.assertDictContainsSubset({
-                            'destination_ip_prefix': None,
-                            'destination_port_range_max': None,
-                            'destination_port_range_min': None,
-                            'ethertype': u'IPv4',
-                            'l7_parameters': {},
-                            'protocol': None,
-                            'source_ip_prefix': None,
-                            'source_port_range_max': None,
-                            'source_port_range_min': None
-                        }, del_fcs[0])
-                        next_hops = self.next_hops_info(
-                            delete_flow_rules[flow3].get('next_hops'))
-                        self.assertEqual(
-                            next_hops, {
-                            }
-                        )
-                        self.assertEqual(
-                            delete_flow_rules[flow3]['node_type'],
-                            'sf_node')
                         self.assertEqual(
                             set(update_flow_rules.keys()),
                             set([flow2, flow3]))
@@ -2478,6 +2553,9 @@ class OVSSfcDriverTestCase(
                         self.assertEqual(
                             update_flow_rules[flow2]['node_type'],
                             'src_node')
+                        # the sf node only swaps the flow classifiers
+                        self.assertEqual(
+                            len(update_flow_rules[flow3]['del_fcs']), 1)
                         add_fcs = update_flow_rules[flow3]['add_fcs']
                         self.assertEqual(len(add_fcs), 1)
                         self.assertDictContainsSubset({
@@ -2630,30 +2708,7 @@ class OVSSfcDriverTestCase(
                             ingress2['port']['id'], egress2['port']['id'])
                         self.assertEqual(
                             set(delete_flow_rules.keys()),
-                            set([flow1, flow2]))
-                        del_fcs = delete_flow_rules[flow1]['del_fcs']
-                        self.assertEqual(len(del_fcs), 1)
-                        self.assertDictContainsSubset({
-                            'destination_ip_prefix': None,
-                            'destination_port_range_max': None,
-                            'destination_port_range_min': None,
-                            'ethertype': u'IPv4',
-                            'l7_parameters': {},
-                            'protocol': None,
-                            'source_ip_prefix': None,
-                            'source_port_range_max': None,
-                            'source_port_range_min': None
-                        }, del_fcs[0])
-                        next_hops = self.next_hops_info(
-                            delete_flow_rules[flow1].get('next_hops'))
-                        self.assertEqual(
-                            next_hops, {
-                                ingress1['port']['mac_address']: '10.0.0.1',
-                            }
-                        )
-                        self.assertEqual(
-                            delete_flow_rules[flow1]['node_type'],
-                            'src_node')
+                            set([flow2]))
                         del_fcs = delete_flow_rules[flow2]['del_fcs']
                         self.assertEqual(len(del_fcs), 1)
                         self.assertDictContainsSubset({
@@ -2678,30 +2733,7 @@ class OVSSfcDriverTestCase(
                             'sf_node')
                         self.assertEqual(
                             set(update_flow_rules.keys()),
-                            set([flow1, flow2, flow3]))
-                        add_fcs = update_flow_rules[flow1]['add_fcs']
-                        self.assertEqual(len(add_fcs), 1)
-                        self.assertDictContainsSubset({
-                            'destination_ip_prefix': None,
-                            'destination_port_range_max': None,
-                            'destination_port_range_min': None,
-                            'ethertype': u'IPv4',
-                            'l7_parameters': {},
-                            'protocol': None,
-                            'source_ip_prefix': None,
-                            'source_port_range_max': None,
-                            'source_port_range_min': None
-                        }, add_fcs[0])
-                        next_hops = self.next_hops_info(
-                            update_flow_rules[flow1].get('next_hops'))
-                        self.assertEqual(
-                            next_hops, {
-                                ingress1['port']['mac_address']: '10.0.0.1'
-                            }
-                        )
-                        self.assertEqual(
-                            update_flow_rules[flow1]['node_type'],
-                            'src_node')
+                            set([flow2, flow3]))
                         add_fcs = update_flow_rules[flow2]['add_fcs']
                         self.assertEqual(len(add_fcs), 1)
                         self.assertDictContainsSubset({
@@ -2879,30 +2911,7 @@ class OVSSfcDriverTestCase(
                             ingress2['port']['id'], egress2['port']['id'])
                         self.assertEqual(
                             set(delete_flow_rules.keys()),
-                            set([flow1, flow2, flow3]))
-                        del_fcs = delete_flow_rules[flow1]['del_fcs']
-                        self.assertEqual(len(del_fcs), 1)
-                        self.assertDictContainsSubset({
-                            'destination_ip_prefix': None,
-                            'destination_port_range_max': None,
-                            'destination_port_range_min': None,
-                            'ethertype': u'IPv4',
-                            'l7_parameters': {},
-                            'protocol': None,
-                            'source_ip_prefix': None,
-                            'source_port_range_max': None,
-                            'source_port_range_min': None
-                        }, del_fcs[0])
-                        next_hops = self.next_hops_info(
-                            delete_flow_rules[flow1].get('next_hops'))
-                        self.assertEqual(
-                            next_hops, {
-                                ingress1['port']['mac_address']: '10.0.0.1',
-                            }
-                        )
-                        self.assertEqual(
-                            delete_flow_rules[flow1]['node_type'],
-                            'src_node')
+                            set([flow2, flow3]))
                         del_fcs = delete_flow_rules[flow2]['del_fcs']
                         self.assertEqual(len(del_fcs), 1)
                         self.assertDictContainsSubset({
@@ -2950,30 +2959,7 @@ class OVSSfcDriverTestCase(
                             'sf_node')
                         self.assertEqual(
                             set(update_flow_rules.keys()),
-                            set([flow1, flow2]))
-                        add_fcs = update_flow_rules[flow1]['add_fcs']
-                        self.assertEqual(len(add_fcs), 1)
-                        self.assertDictContainsSubset({
-                            'destination_ip_prefix': None,
-                            'destination_port_range_max': None,
-                            'destination_port_range_min': None,
-                            'ethertype': u'IPv4',
-                            'l7_parameters': {},
-                            'protocol': None,
-                            'source_ip_prefix': None,
-                            'source_port_range_max': None,
-                            'source_port_range_min': None
-                        }, add_fcs[0])
-                        next_hops = self.next_hops_info(
-                            update_flow_rules[flow1].get('next_hops'))
-                        self.assertEqual(
-                            next_hops, {
-                                ingress1['port']['mac_address']: '10.0.0.1'
-                            }
-                        )
-                        self.assertEqual(
-                            update_flow_rules[flow1]['node_type'],
-                            'src_node')
+                            set([flow2]))
                         add_fcs = update_flow_rules[flow2]['add_fcs']
                         self.assertEqual(len(add_fcs), 1)
                         self.assertDictContainsSubset({
@@ -4209,6 +4195,214 @@ class OVSSfcDriverTestCase(
                                 flow_rules[flow3]['node_type'],
                                 'sf_node')
 
+    def test_agent_init_bulk_flowrules(self):
+        with self.port(
+            name='port1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as src_port, self.port(
+            name='ingress1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as ingress1, self.port(
+            name='egress1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as egress1, self.port(
+            name='ingress2',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as ingress2, self.port(
+            name='egress2',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as egress2:
+            self.host_endpoint_mapping = {
+                'test': '10.0.0.1'
+            }
+            with self.flow_classifier(flow_classifier={
+                'logical_source_port': src_port['port']['id']
+            }) as fc:
+                with self.port_pair(port_pair={
+                    'ingress': ingress1['port']['id'],
+                    'egress': egress1['port']['id']
+                }) as pp1, self.port_pair(port_pair={
+                    'ingress': ingress2['port']['id'],
+                    'egress': egress2['port']['id']
+                }) as pp2:
+                    for pp in (pp1, pp2):
+                        self.driver.create_port_pair(
+                            sfc_ctx.PortPairContext(
+                                self.sfc_plugin, self.ctx,
+                                pp['port_pair']))
+                    with self.port_pair_group(port_pair_group={
+                        'port_pairs': [pp1['port_pair']['id']]
+                    }) as pg1, self.port_pair_group(port_pair_group={
+                        'port_pairs': [pp2['port_pair']['id']]
+                    }) as pg2:
+                        for pg in (pg1, pg2):
+                            self.driver.create_port_pair_group(
+                                sfc_ctx.PortPairGroupContext(
+                                    self.sfc_plugin, self.ctx,
+                                    pg['port_pair_group']))
+                        with self.port_chain(port_chain={
+                            'name': 'test1',
+                            'port_pair_groups': [
+                                pg1['port_pair_group']['id'],
+                                pg2['port_pair_group']['id']
+                            ],
+                            'flow_classifiers': [fc['flow_classifier']['id']]
+                        }) as pc:
+                            pc_context = sfc_ctx.PortChainContext(
+                                self.sfc_plugin, self.ctx,
+                                pc['port_chain']
+                            )
+                            self.driver.create_port_chain(pc_context)
+                            self.wait()
+                            port_ids = [
+                                port['port']['id']
+                                for port in (src_port, ingress1, egress1,
+                                             ingress2, egress2)
+                            ]
+                            flow_rules = []
+                            for port_id in port_ids:
+                                flow_rules.extend(
+                                    self.driver.get_flowrules_by_host_portid(
+                                        self.ctx, host='test',
+                                        port_id=port_id) or [])
+                            self.assertEqual(
+                                flow_rules,
+                                self.driver.get_flowrules_by_host_portids(
+                                    self.ctx, host='test',
+                                    port_ids=port_ids))
+                            self.assertEqual(
+                                self.map_flow_rules([], flow_rules),
+                                self.map_flow_rules(
+                                    [], self.driver.get_flowrules_by_host(
+                                        self.ctx, host='test')))
+                            self.assertEqual(
+                                [],
+                                self.driver.get_flowrules_by_host_portids(
+                                    self.ctx, host='test', port_ids=[]))
+
+    def test_get_flowrule_changes_by_host(self):
+        with self.port(
+            name='port1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as src_port, self.port(
+            name='ingress1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as ingress1, self.port(
+            name='egress1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as egress1:
+            self.host_endpoint_mapping = {
+                'test': '10.0.0.1'
+            }
+            with self.flow_classifier(flow_classifier={
+                'logical_source_port': src_port['port']['id']
+            }) as fc:
+                with self.port_pair(port_pair={
+                    'ingress': ingress1['port']['id'],
+                    'egress': egress1['port']['id']
+                }) as pp1:
+                    self.driver.create_port_pair(
+                        sfc_ctx.PortPairContext(
+                            self.sfc_plugin, self.ctx,
+                            pp1['port_pair']))
+                    with self.port_pair_group(port_pair_group={
+                        'port_pairs': [pp1['port_pair']['id']]
+                    }) as pg1:
+                        with self.port_chain(port_chain={
+                            'name': 'test1',
+                            'port_pair_groups': [
+                                pg1['port_pair_group']['id']
+                            ],
+                            'flow_classifiers': [fc['flow_classifier']['id']]
+                        }) as pc:
+                            pc_context = sfc_ctx.PortChainContext(
+                                self.sfc_plugin, self.ctx,
+                                pc['port_chain']
+                            )
+                            self.driver.create_port_chain(pc_context)
+                            self.wait()
+                            changes = (
+                                self.driver.get_flowrule_changes_by_host(
+                                    self.ctx, 'test'))
+                            self.assertTrue(changes['full'])
+                            self.assertEqual([], changes['deleted'])
+                            flow_rules = self.driver.get_flowrules_by_host(
+                                self.ctx, host='test')
+                            for flow_rule in flow_rules:
+                                flow_rule.pop('status')
+                            self.assertEqual(
+                                self.map_flow_rules([], flow_rules),
+                                self.map_flow_rules([], [
+                                    entry['flowrule']
+                                    for entry in changes['flowrules']]))
+                            version = changes['version']
+
+                            # nothing changed, nothing is built
+                            with mock.patch.object(
+                                self.driver,
+                                '_build_portchain_flowrule_body'
+                            ) as build:
+                                self.assertEqual(
+                                    {'version': version, 'full': False,
+                                     'flowrules': [], 'deleted': []},
+                                    self.driver.get_flowrule_changes_by_host(
+                                        self.ctx, 'test', version))
+                            self.assertFalse(build.called)
+
+                            self.driver.delete_port_chain(pc_context)
+                            self.wait()
+                            changes = (
+                                self.driver.get_flowrule_changes_by_host(
+                                    self.ctx, 'test', version))
+                            self.assertFalse(changes['full'])
+                            self.assertLess(version, changes['version'])
+                            self.assertEqual([], changes['flowrules'])
+                            self.assertEqual(
+                                len(flow_rules), len(changes['deleted']))
+                            self.assertEqual(
+                                [], self.driver.get_flowrule_changes_by_host(
+                                    self.ctx, 'test')['flowrules'])
+
     def test_create_port_chain_cross_subnet_ppg(self):
         with self.subnet(
             gateway_ip='10.0.0.10',
@@ -4432,3 +4626,387 @@ class OVSSfcDriverTestCase(
                                 result = self.driver.create_port_chain(
                                     pc_context)
                                 self.assertIsNone(result)
+
+    def _create_chain_with_width(self, network_id, group_count, width):
+        pg_ids = []
+        for i in range(group_count):
+            pp_ids = []
+            for j in range(width):
+                ingress, egress = [
+                    self.deserialize(self.fmt, self._create_port(
+                        self.fmt, network_id,
+                        device_owner='compute',
+                        device_id='test',
+                        arg_list=(
+                            portbindings.HOST_ID,
+                        ),
+                        **{portbindings.HOST_ID: 'test'}
+                    ))['port']
+                    for k in range(2)
+                ]
+                pp = self.deserialize(self.fmt, self._create_port_pair(
+                    self.fmt, {'ingress': ingress['id'],
+                               'egress': egress['id']}))
+                self.driver.create_port_pair(sfc_ctx.PortPairContext(
+                    self.sfc_plugin, self.ctx, pp['port_pair']))
+                pp_ids.append(pp['port_pair']['id'])
+            pg = self.deserialize(self.fmt, self._create_port_pair_group(
+                self.fmt, {'port_pairs': pp_ids}))
+            pg_ids.append(pg['port_pair_group']['id'])
+        pc = self.deserialize(self.fmt, self._create_port_chain(
+            self.fmt, {'port_pair_groups': pg_ids}))
+        return pc['port_chain']
+
+    def _count_create_portchain_path_queries(self, port_chain):
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append(statement)
+
+        pc_context = sfc_ctx.PortChainContext(
+            self.sfc_plugin, self.ctx, port_chain)
+        engine = db_api.get_engine()
+        event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            self.driver._create_portchain_path(pc_context, port_chain)
+        finally:
+            event.remove(engine, 'before_cursor_execute', _record)
+        return len(statements)
+
+    def test_create_portchain_path_query_count(self):
+        self.host_endpoint_mapping = {
+            'test': '10.0.0.1',
+        }
+        with self.subnet() as subnet:
+            network_id = subnet['subnet']['network_id']
+            narrow = self._count_create_portchain_path_queries(
+                self._create_chain_with_width(network_id, 3, 1))
+            wide = self._count_create_portchain_path_queries(
+                self._create_chain_with_width(network_id, 3, 4))
+        # the lookups are prefetched once per chain: the count may grow
+        # with the number of ports, but not with the pairs of ports of
+        # adjacent groups
+        extra_ports = 3 * 2 * (4 - 1)
+        self.assertLessEqual(
+            wide - narrow, 3 * extra_ports,
+            'SELECT statements for groups of 1 port pair: %d, '
+            'of 4 port pairs: %d' % (narrow, wide))
+
+    def _count_group_references(self, host, group_id):
+        # the references as counted before they were stored
+        group_refcnt = len([
+            node for node in self.driver.get_path_nodes_by_filter(
+                {'next_group_id': group_id, 'nsi': 0xff}) or []
+            if not node['portpair_details']
+        ])
+        for pd in self.driver.get_port_details_by_filter(
+            {'host_id': host}
+        ) or []:
+            for path in pd['path_nodes']:
+                path_node = self.driver.get_path_node(path['pathnode_id'])
+                if path_node['next_group_id'] == group_id:
+                    group_refcnt += 1
+        return group_refcnt
+
+    def test_group_refcnts_follow_path_changes(self):
+        self.host_endpoint_mapping = {
+            'test': '10.0.0.1',
+        }
+        with self.subnet() as subnet:
+            network_id = subnet['subnet']['network_id']
+            port_chains = [
+                self._create_chain_with_width(network_id, 3, width)
+                for width in (1, 2)
+            ]
+            for port_chain in port_chains:
+                self.driver._create_portchain_path(
+                    sfc_ctx.PortChainContext(
+                        self.sfc_plugin, self.ctx, port_chain),
+                    port_chain)
+            group_ids = set(
+                node['next_group_id']
+                for node in self.driver.get_path_nodes_by_filter() or []
+                if node['next_group_id'] is not None)
+            self.assertEqual(6, len(group_ids))
+            self.assertEqual(
+                dict((group_id,
+                      self._count_group_references('test', group_id))
+                     for group_id in group_ids),
+                self.driver.get_group_refcnts('test', group_ids))
+            self.assertNotIn(
+                0, self.driver.get_group_refcnts('test', group_ids).values())
+
+            self.driver._delete_portchain_path(self.ctx, port_chains[1])
+            self.assertEqual(
+                dict((group_id,
+                      self._count_group_references('test', group_id))
+                     for group_id in group_ids),
+                self.driver.get_group_refcnts('test', group_ids))
+            self.driver._delete_portchain_path(self.ctx, port_chains[0])
+            self.assertEqual(
+                dict((group_id, 0) for group_id in group_ids),
+                self.driver.get_group_refcnts('test', group_ids))
+
+    def test_group_refcnts_counted_when_missing(self):
+        self.host_endpoint_mapping = {
+            'test': '10.0.0.1',
+        }
+        with self.subnet() as subnet:
+            network_id = subnet['subnet']['network_id']
+            port_chains = [
+                self._create_chain_with_width(network_id, 3, width)
+                for width in (1, 2)
+            ]
+            for port_chain in port_chains:
+                self.driver._create_portchain_path(
+                    sfc_ctx.PortChainContext(
+                        self.sfc_plugin, self.ctx, port_chain),
+                    port_chain)
+            group_ids = set(
+                node['next_group_id']
+                for node in self.driver.get_path_nodes_by_filter() or []
+                if node['next_group_id'] is not None)
+            # as the paths written by a server of the former release
+            self.ctx.session.query(ovs_db.GroupRefcount).delete()
+            self.assertEqual(
+                dict((group_id,
+                      self._count_group_references('test', group_id))
+                     for group_id in group_ids),
+                self.driver.get_group_refcnts('test', group_ids))
+
+            # a reference added to a missing count
+            src_node = self.driver.get_path_nodes_by_filter(
+                {'portchain_id': port_chains[1]['id'], 'nsi': 0xff})[0]
+            port_detail = self._create_test_port_detail(
+                uuidutils.generate_uuid())
+            self.driver.create_pathport_assoc({
+                'pathnode_id': src_node['id'],
+                'portpair_id': port_detail['id'],
+                'weight': 1})
+            group_id = src_node['next_group_id']
+            self.assertEqual(
+                self._count_group_references('test', group_id),
+                self.ctx.session.query(ovs_db.GroupRefcount).filter_by(
+                    host_id='test', next_group_id=group_id).one().refcnt)
+
+            self.driver._delete_portchain_path(self.ctx, port_chains[1])
+            self.driver._delete_portchain_path(self.ctx, port_chains[0])
+            self.assertEqual(
+                dict((group_id, 0) for group_id in group_ids),
+                self.driver.get_group_refcnts('test', group_ids))
+            self.assertEqual(
+                [], self.ctx.session.query(ovs_db.GroupRefcount).all())
+
+    def test_group_refcnt_inserted_concurrently(self):
+        session = self.driver.admin_context.session
+        table = ovs_db.GroupRefcount.__table__
+
+        def _count_group_refcnts(keys):
+            # another worker inserts the count from the paths it sees
+            session.execute(table.insert().values(
+                host_id='test', next_group_id=7, refcnt=3))
+            return {('test', 7): 2}
+
+        with mock.patch.object(self.driver, '_count_group_refcnts',
+                               side_effect=_count_group_refcnts):
+            self.driver._update_group_refcnt('test', 7, 1)
+        self.assertEqual(
+            4, session.query(ovs_db.GroupRefcount).filter_by(
+                host_id='test', next_group_id=7).one().refcnt)
+
+    def _create_test_port_detail(self, ingress, host_id='test'):
+        return self.driver.create_port_detail({
+            'tenant_id': 'test',
+            'ingress': ingress,
+            'egress': ingress,
+            'host_id': host_id,
+            'mac_address': '12:34:56:78:9a:bc',
+            'network_type': 'vxlan',
+            'segment_id': 33,
+            'local_endpoint': '10.0.0.1'
+        })
+
+    def test_path_node_next_hops(self):
+        with self.port(
+            name='ingress1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as ingress1:
+            bound = self._create_test_port_detail(ingress1['port']['id'])
+            unbound = self._create_test_port_detail(
+                ingress1['port']['id'], host_id='')
+            # more members than the former json column could hold
+            others = [
+                self._create_test_port_detail('port%d' % i)
+                for i in range(32)
+            ]
+            members = sorted(
+                [dict(portpair_id=pd['id'], weight=1)
+                 for pd in [bound, unbound] + others],
+                key=lambda member: member['portpair_id'])
+            node = self.driver.create_path_node({
+                'tenant_id': 'test',
+                'node_type': 'src_node',
+                'nsp': 256,
+                'nsi': 255,
+                'next_group_id': 1,
+                'next_hop': members
+            })
+            self.assertEqual(members, node['next_hop'])
+            self.assertEqual(
+                members, self.driver.get_path_node(node['id'])['next_hop'])
+            next_hop = {
+                'local_endpoint': '10.0.0.1',
+                'weight': 1,
+                'mac_address': '12:34:56:78:9a:bc',
+                'segment_id': 33,
+                'network_type': 'vxlan',
+                'net_uuid': ingress1['port']['network_id']
+            }
+            self.assertEqual(
+                {node['id']: [next_hop]},
+                self.driver.get_next_hop_details([node['id']]))
+
+            node = self.driver.update_path_node(node['id'], {
+                'next_hop': [dict(portpair_id=bound['id'], weight=2),
+                             dict(portpair_id=unbound['id'], weight=1)]})
+            self.assertEqual(
+                sorted([dict(portpair_id=bound['id'], weight=2),
+                        dict(portpair_id=unbound['id'], weight=1)],
+                       key=lambda member: member['portpair_id']),
+                node['next_hop'])
+            flow_rule = self.driver._build_portchain_flowrule_body(
+                node, bound)
+            self.assertEqual([dict(next_hop, weight=2)],
+                             flow_rule['next_hops'])
+            self.assertNotIn('next_hop', flow_rule)
+
+            node = self.driver.update_path_node(
+                node['id'], {'next_hop': None})
+            self.assertIsNone(node['next_hop'])
+            self.assertEqual(
+                {}, self.driver.get_next_hop_details([node['id']]))
+
+    def test_create_port_pair_bulk(self):
+        with self.port(
+            name='port1',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test'}
+        ) as port1, self.port(
+            name='port2',
+            device_owner='compute',
+            device_id='test',
+            arg_list=(
+                portbindings.HOST_ID,
+            ),
+            **{portbindings.HOST_ID: 'test2'}
+        ) as port2, self.port(
+            name='port3',
+            device_owner='compute',
+            device_id='test'
+        ) as port3:
+            self.host_endpoint_mapping = {
+                'test': '10.0.0.1',
+                'test2': '10.0.0.2'
+            }
+            with self.port_pair(port_pair={
+                'ingress': port1['port']['id'],
+                'egress': port1['port']['id']
+            }) as pp1, self.port_pair(port_pair={
+                'ingress': port2['port']['id'],
+                'egress': port2['port']['id']
+            }) as pp2, self.port_pair(port_pair={
+                'ingress': port3['port']['id'],
+                'egress': port3['port']['id']
+            }) as pp3:
+                self.driver.create_port_pair_bulk([
+                    sfc_ctx.PortPairContext(
+                        self.sfc_plugin, self.ctx, pp['port_pair'])
+                    for pp in [pp1, pp2, pp3]
+                ])
+                self.assertEqual(
+                    2,
+                    type_vxlan.VxlanTypeDriver.get_endpoint_by_host.call_count)
+                for pp, host_id, local_endpoint in [
+                    (pp1, 'test', '10.0.0.1'),
+                    (pp2, 'test2', '10.0.0.2'),
+                    (pp3, None, None)
+                ]:
+                    pd = self.driver.get_port_detail_by_filter({
+                        'ingress': pp['port_pair']['ingress'],
+                        'egress': pp['port_pair']['egress']
+                    })
+                    self.assertEqual(host_id, pd['host_id'])
+                    self.assertEqual(local_endpoint, pd['local_endpoint'])
+
+    def test_flow_classifiers_fetched_once_per_batch(self):
+        fc = {
+            'id': 'fc1',
+            'name': 'test',
+            'tenant_id': 'test',
+            'description': '',
+            'logical_source_port': 'port1'
+        }
+        flow_rule = {'node_type': 'sf_node', 'egress': 'port2'}
+        with mock.patch.object(
+            self.driver, '_fetch_fcs_by_ids', return_value=[fc]
+        ) as fetch:
+            with self.driver._batch_flowrules():
+                fcs1 = self.driver._filter_flow_classifiers(
+                    flow_rule, ['fc1'])
+                fcs2 = self.driver._filter_flow_classifiers(
+                    flow_rule, ['fc1'])
+            self.assertEqual(1, fetch.call_count)
+            self.assertEqual([{'logical_source_port': 'port1'}], fcs1)
+            self.assertIs(fcs1[0], fcs2[0])
+            # outside of a block every call fetches them
+            self.driver._filter_flow_classifiers(flow_rule, ['fc1'])
+            self.assertEqual(2, fetch.call_count)
+
+    def test_path_node_next_hops_derived_when_missing(self):
+        self.host_endpoint_mapping = {
+            'test': '10.0.0.1',
+        }
+        with self.subnet() as subnet:
+            port_chain = self._create_chain_with_width(
+                subnet['subnet']['network_id'], 3, 2)
+            self.driver._create_portchain_path(
+                sfc_ctx.PortChainContext(
+                    self.sfc_plugin, self.ctx, port_chain),
+                port_chain)
+            nodes = self.driver.get_path_nodes_by_filter(
+                {'portchain_id': port_chain['id']})
+            node_ids = [node['id'] for node in nodes]
+            next_hops = dict((node['id'], node['next_hop'])
+                             for node in nodes)
+            next_hop_details = self.driver.get_next_hop_details(node_ids)
+            self.assertEqual(3, len(next_hop_details))
+            next_hop_node_ids = dict(
+                (portpair_id, sorted(
+                    self.driver._get_next_hop_node_ids(portpair_id)))
+                for node in nodes for portpair_id in node['portpair_details'])
+
+            # as the path nodes written by a server of the former release
+            self.ctx.session.query(ovs_db.PathNodeNextHop).delete()
+            self.driver.admin_context.session.expire_all()
+            self.assertEqual(
+                next_hops,
+                dict((node['id'], node['next_hop']) for node in
+                     self.driver.get_path_nodes_by_filter(
+                         {'portchain_id': port_chain['id']})))
+            self.assertEqual(next_hop_details,
+                             self.driver.get_next_hop_details(node_ids))
+            self.assertEqual(
+                next_hop_node_ids,
+                dict((portpair_id, sorted(
+                    self.driver._get_next_hop_node_ids(portpair_id)))
+                    for portpair_id in next_hop_node_ids))
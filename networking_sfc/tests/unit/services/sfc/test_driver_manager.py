@@ -22,6 +22,7 @@ from oslo_config import cfg
 
 from neutron.tests import base
 
+from networking_sfc.services import driver_dispatch
 from networking_sfc.services.sfc.common import config as sfc_config
 from networking_sfc.services.sfc.common import exceptions as sfc_exc
 from networking_sfc.services.sfc import driver_manager as sfc_driver
@@ -100,6 +101,34 @@ class DriverManagerTestCase(base.BaseTestCase):
                 manager.create_port_chain, mocked_context
             )
 
+    def test_create_port_chain_parallel(self):
+        cfg.CONF.set_override('parallel_driver_calls', True, 'sfc')
+        mock_driver1 = mock.Mock()
+        mock_driver2 = mock.Mock(independent=True)
+        mock_driver2.create_port_chain = mock.Mock(
+            side_effect=sfc_exc.SfcException
+        )
+        driver_dispatch.LATENCIES.reset()
+        self.addCleanup(driver_dispatch.LATENCIES.reset)
+        with self.driver_manager_context({
+            'dummy1': mock_driver1,
+            'dummy2': mock_driver2
+        }) as manager:
+            mocked_context = mock.Mock()
+            self.assertRaises(
+                sfc_exc.SfcDriverError,
+                manager.create_port_chain, mocked_context
+            )
+            mock_driver1.create_port_chain.assert_called_once_with(
+                mocked_context)
+            histograms = driver_dispatch.get_latency_histograms()
+            self.assertEqual(
+                0, histograms[
+                    ('sfc', 'dummy1', 'create_port_chain')]['failures'])
+            self.assertEqual(
+                1, histograms[
+                    ('sfc', 'dummy2', 'create_port_chain')]['failures'])
+
     def test_update_port_chain_called(self):
         mock_driver1 = mock.Mock()
         mock_driver2 = mock.Mock()
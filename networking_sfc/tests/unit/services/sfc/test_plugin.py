@@ -15,8 +15,11 @@
 import copy
 import mock
 
+from neutron_lib import constants as const
+
 from networking_sfc.services.sfc.common import context as sfc_ctx
 from networking_sfc.services.sfc.common import exceptions as sfc_exc
+from networking_sfc.services.sfc import journal
 from networking_sfc.tests.unit.db import test_sfc_db
 
 SFC_PLUGIN_KLASS = (
@@ -43,6 +46,121 @@ class SfcPluginTestCase(test_sfc_db.SfcDbPluginTestCase):
     def _record_context(self, plugin_context):
         self.plugin_context = plugin_context
 
+    def _enable_journal(self):
+        mock.patch.object(journal.JournalThread, 'wake').start()
+        self.sfc_plugin.journal = journal.JournalThread(
+            self.sfc_plugin._process_journal_entry)
+        return self.sfc_plugin.journal
+
+    def _port_chain_status(self, portchain_id):
+        return self._show(
+            'port_chains', portchain_id)['port_chain']['status']
+
+    def _delete_port_chain_async(self, portchain_id):
+        req = self.new_delete_request('port_chains', portchain_id)
+        res = req.get_response(self.ext_api)
+        self.assertEqual(204, res.status_int)
+        self.assertEqual(const.PENDING_DELETE,
+                         self._port_chain_status(portchain_id))
+        self.sfc_plugin.journal.sync()
+        self._show('port_chains', portchain_id, expected_code=404)
+
+    def test_create_port_chain_async(self):
+        self.fake_driver_manager.create_port_chain = mock.Mock(
+            side_effect=self._record_context)
+        self._enable_journal()
+        with self.port_pair_group(port_pair_group={}) as pg:
+            with self.port_chain(port_chain={
+                'port_pair_groups': [pg['port_pair_group']['id']]
+            }, do_delete=False) as pc:
+                pc_id = pc['port_chain']['id']
+                self.assertEqual(const.PENDING_CREATE,
+                                 pc['port_chain']['status'])
+                self.assertFalse(
+                    self.fake_driver_manager.create_port_chain.called)
+                self.sfc_plugin.journal.sync()
+                driver_manager = self.fake_driver_manager
+                driver_manager.create_port_chain.assert_called_once_with(
+                    mock.ANY)
+                self.assertEqual(pc_id, self.plugin_context.current['id'])
+                self.assertEqual(const.ACTIVE, self._port_chain_status(pc_id))
+                self._delete_port_chain_async(pc_id)
+                driver_manager.delete_port_chain.assert_called_once_with(
+                    mock.ANY)
+
+    def test_create_port_chain_async_driver_manager_exception(self):
+        self.fake_driver_manager.create_port_chain = mock.Mock(
+            side_effect=sfc_exc.SfcDriverError(
+                method='create_port_chain'
+            )
+        )
+        self._enable_journal()
+        with self.port_pair_group(port_pair_group={}) as pg:
+            with self.port_chain(port_chain={
+                'port_pair_groups': [pg['port_pair_group']['id']]
+            }, do_delete=False) as pc:
+                pc_id = pc['port_chain']['id']
+                self.sfc_plugin.journal.sync()
+                self.assertEqual(const.ERROR, self._port_chain_status(pc_id))
+                self._delete_port_chain_async(pc_id)
+
+    def test_port_chain_async_calls_in_order(self):
+        calls = []
+        self.fake_driver_manager.create_port_chain = mock.Mock(
+            side_effect=lambda ctx: calls.append(('create', ctx)))
+        self.fake_driver_manager.update_port_chain = mock.Mock(
+            side_effect=lambda ctx: calls.append(('update', ctx)))
+        self._enable_journal()
+        with self.port_pair_group(port_pair_group={}) as pg:
+            with self.port_chain(port_chain={
+                'name': 'test1',
+                'port_pair_groups': [pg['port_pair_group']['id']]
+            }, do_delete=False) as pc:
+                pc_id = pc['port_chain']['id']
+                res = self._update('port_chains', pc_id,
+                                   {'port_chain': {'name': 'test2'}})
+                self.assertEqual(const.PENDING_UPDATE,
+                                 res['port_chain']['status'])
+                self.sfc_plugin.journal.sync()
+                self.assertEqual(['create', 'update'],
+                                 [call[0] for call in calls])
+                self.assertEqual('test1', calls[0][1].current['name'])
+                self.assertEqual('test1', calls[1][1].original['name'])
+                self.assertEqual('test2', calls[1][1].current['name'])
+                self.assertEqual(const.ACTIVE, self._port_chain_status(pc_id))
+                self._delete_port_chain_async(pc_id)
+
+    def test_update_port_chain_async_pending_delete(self):
+        self._enable_journal()
+        with self.port_pair_group(port_pair_group={}) as pg:
+            with self.port_chain(port_chain={
+                'port_pair_groups': [pg['port_pair_group']['id']]
+            }, do_delete=False) as pc:
+                pc_id = pc['port_chain']['id']
+                req = self.new_delete_request('port_chains', pc_id)
+                res = req.get_response(self.ext_api)
+                self.assertEqual(204, res.status_int)
+                self._update('port_chains', pc_id,
+                             {'port_chain': {'name': 'test2'}},
+                             expected_code=409)
+                self.sfc_plugin.journal.sync()
+                self.assertFalse(
+                    self.fake_driver_manager.update_port_chain.called)
+                self._show('port_chains', pc_id, expected_code=404)
+
+    def test_get_workers(self):
+        self.assertEqual([], self.sfc_plugin.get_workers())
+        self._enable_journal()
+        workers = self.sfc_plugin.get_workers()
+        self.assertEqual(1, len(workers))
+        self.assertIsInstance(workers[0], journal.JournalWorker)
+
+    def test_journal_worker_start(self):
+        sfc_journal = self._enable_journal()
+        with mock.patch('neutron.worker.NeutronWorker.start'):
+            self.sfc_plugin.get_workers()[0].start()
+        sfc_journal.wake.assert_called_once_with()
+
     def test_create_port_chain_driver_manager_called(self):
         self.fake_driver_manager.create_port_chain = mock.Mock(
             side_effect=self._record_context)
@@ -203,6 +321,36 @@ class SfcPluginTestCase(test_sfc_db.SfcDbPluginTestCase):
             mock.ANY
         )
 
+    def test_create_port_pair_group_bulk_driver_manager_called(self):
+        res = self._create_bulk(
+            self.fmt, 'port_pair_group',
+            [{'name': 'test1'}, {'name': 'test2'}],
+            expected_res_status=201)
+        pgs = self.deserialize(self.fmt, res)['port_pair_groups']
+        driver_manager = self.fake_driver_manager
+        driver_manager.create_port_pair_group_bulk.assert_called_once_with(
+            mock.ANY)
+        contexts = driver_manager.create_port_pair_group_bulk.call_args[0][0]
+        self.assertEqual(
+            pgs, [pg_context.current for pg_context in contexts])
+        self.assertFalse(driver_manager.create_port_pair_group.called)
+        for pg in pgs:
+            self._delete('port_pair_groups', pg['id'])
+
+    def test_create_port_pair_group_bulk_driver_manager_exception(self):
+        self.fake_driver_manager.create_port_pair_group_bulk = mock.Mock(
+            side_effect=sfc_exc.SfcDriverError(
+                method='create_port_pair_group_bulk'
+            )
+        )
+        self._create_bulk(
+            self.fmt, 'port_pair_group',
+            [{'name': 'test1'}, {'name': 'test2'}],
+            expected_res_status=500)
+        self._test_list_resources('port_pair_group', [])
+        self.assertEqual(
+            2, self.fake_driver_manager.delete_port_pair_group.call_count)
+
     def test_update_port_pair_group_driver_manager_called(self):
         self.fake_driver_manager.update_port_pair_group = mock.Mock(
             side_effect=self._record_context)
@@ -343,6 +491,34 @@ class SfcPluginTestCase(test_sfc_db.SfcDbPluginTestCase):
                 mock.ANY
             )
 
+    def test_create_port_pair_bulk_driver_manager_called(self):
+        with self.port(
+            name='port1',
+            device_id='default'
+        ) as src_port, self.port(
+            name='port2',
+            device_id='default'
+        ) as dst_port:
+            res = self._create_bulk(
+                self.fmt, 'port_pair', [{
+                    'ingress': src_port['port']['id'],
+                    'egress': dst_port['port']['id']
+                }, {
+                    'ingress': dst_port['port']['id'],
+                    'egress': src_port['port']['id']
+                }],
+                expected_res_status=201)
+            pps = self.deserialize(self.fmt, res)['port_pairs']
+            driver_manager = self.fake_driver_manager
+            driver_manager.create_port_pair_bulk.assert_called_once_with(
+                mock.ANY)
+            contexts = driver_manager.create_port_pair_bulk.call_args[0][0]
+            self.assertEqual(
+                pps, [pp_context.current for pp_context in contexts])
+            self.assertFalse(driver_manager.create_port_pair.called)
+            for pp in pps:
+                self._delete('port_pairs', pp['id'])
+
     def test_update_port_pair_driver_manager_called(self):
         self.fake_driver_manager.update_port_pair = mock.Mock(
             side_effect=self._record_context)
@@ -0,0 +1,148 @@
+# Copyright 2016 Futurewei. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from eventlet import greenthread
+
+from neutron import context as n_context
+from neutron.tests import base
+
+from networking_sfc.services import driver_dispatch
+from networking_sfc.services.sfc.common import context as sfc_ctx
+
+
+class DriverDispatchTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(DriverDispatchTestCase, self).setUp()
+        driver_dispatch.LATENCIES.reset()
+        self.addCleanup(driver_dispatch.LATENCIES.reset)
+        self.calls = []
+
+    def _driver(self, name, independent=False):
+        driver = mock.Mock()
+        driver.name = name
+        driver.obj.independent = independent
+        return driver
+
+    def _call(self, driver, method_name, context):
+        self.calls.append(('start', driver.name))
+        # let the other green threads run
+        greenthread.sleep(0)
+        self.calls.append(('end', driver.name))
+        if driver.name in ('fail1', 'fail2'):
+            raise RuntimeError(driver.name)
+
+    def test_latency_histograms(self):
+        driver_dispatch.LATENCIES('sfc', 'ovs', 'create_port_chain',
+                                  0.003, False)
+        driver_dispatch.LATENCIES('sfc', 'ovs', 'create_port_chain',
+                                  0.2, True)
+        driver_dispatch.LATENCIES('sfc', 'ovs', 'create_port_chain',
+                                  20, False)
+        histogram = driver_dispatch.get_latency_histograms()[
+            ('sfc', 'ovs', 'create_port_chain')]
+        self.assertEqual(3, histogram['count'])
+        self.assertEqual(1, histogram['failures'])
+        self.assertAlmostEqual(20.203, histogram['sum'])
+        self.assertEqual(
+            [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 1], histogram['buckets'])
+
+    def test_timed_call_notifies_hooks(self):
+        hook = mock.Mock()
+        driver_dispatch.register_metrics_hook(hook)
+        self.addCleanup(driver_dispatch.unregister_metrics_hook, hook)
+        driver = self._driver('test')
+        driver.obj.delete_port_chain.side_effect = RuntimeError
+        context = mock.Mock()
+        driver_dispatch.timed_call('sfc', driver, 'create_port_chain',
+                                   context)
+        self.assertRaises(
+            RuntimeError, driver_dispatch.timed_call,
+            'sfc', driver, 'delete_port_chain', context)
+        driver.obj.create_port_chain.assert_called_once_with(context)
+        self.assertEqual(
+            [mock.call('sfc', 'test', 'create_port_chain', mock.ANY, False),
+             mock.call('sfc', 'test', 'delete_port_chain', mock.ANY, True)],
+            hook.call_args_list)
+        histograms = driver_dispatch.get_latency_histograms()
+        self.assertEqual(
+            0, histograms[('sfc', 'test', 'create_port_chain')]['failures'])
+        self.assertEqual(
+            1, histograms[('sfc', 'test', 'delete_port_chain')]['failures'])
+
+    def test_failing_hook_is_ignored(self):
+        hook = mock.Mock(side_effect=RuntimeError)
+        driver_dispatch.register_metrics_hook(hook)
+        self.addCleanup(driver_dispatch.unregister_metrics_hook, hook)
+        driver_dispatch.timed_call('sfc', self._driver('test'),
+                                   'create_port_chain', mock.Mock())
+        self.assertEqual(1, hook.call_count)
+
+    def test_call_drivers_in_order(self):
+        drivers = [self._driver('d1', independent=True), self._driver('d2')]
+        driver_dispatch.call_drivers(drivers, self._call, 'method', None)
+        self.assertEqual(
+            [('start', 'd1'), ('end', 'd1'), ('start', 'd2'), ('end', 'd2')],
+            self.calls)
+
+    def test_call_drivers_parallel(self):
+        drivers = [self._driver('d1'), self._driver('d2', independent=True),
+                   self._driver('d3')]
+        driver_dispatch.call_drivers(
+            drivers, self._call, 'method', None, parallel=True)
+        self.assertEqual(6, len(self.calls))
+        # d2 runs while d1 is called
+        self.assertLess(self.calls.index(('start', 'd2')),
+                        self.calls.index(('end', 'd1')))
+        # the others keep their order
+        self.assertLess(self.calls.index(('end', 'd1')),
+                        self.calls.index(('start', 'd3')))
+
+    def test_call_drivers_parallel_waits_for_all_calls(self):
+        drivers = [self._driver('fail1'),
+                   self._driver('fail2', independent=True),
+                   self._driver('d3', independent=True)]
+        e = self.assertRaises(
+            RuntimeError, driver_dispatch.call_drivers,
+            drivers, self._call, 'method', None, parallel=True)
+        self.assertEqual('fail1', str(e))
+        self.assertIn(('end', 'fail2'), self.calls)
+        self.assertIn(('end', 'd3'), self.calls)
+
+    def test_call_drivers_parallel_own_session(self):
+        plugin_context = n_context.get_admin_context()
+        contexts = [
+            sfc_ctx.PortPairContext(mock.Mock(), plugin_context, {'id': i})
+            for i in range(2)]
+        calls = {}
+
+        def _call(driver, method_name, context):
+            calls[driver.name] = context
+
+        drivers = [self._driver('d1'), self._driver('d2', independent=True),
+                   self._driver('d3', independent=True)]
+        driver_dispatch.call_drivers(
+            drivers, _call, 'method', contexts, parallel=True)
+        self.assertIs(contexts, calls['d1'])
+        sessions = set()
+        for name in ('d2', 'd3'):
+            self.assertEqual([{'id': 0}, {'id': 1}],
+                             [context.current for context in calls[name]])
+            thread_context = calls[name][0]._plugin_context
+            self.assertIs(thread_context, calls[name][1]._plugin_context)
+            self.assertTrue(thread_context.is_admin)
+            self.assertIsNot(plugin_context.session, thread_context.session)
+            sessions.add(thread_context.session)
+        self.assertEqual(2, len(sessions))